@@ -2,7 +2,7 @@
 Configuration de l'application
 """
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -13,15 +13,28 @@ class Settings(BaseSettings):
     # ============================================================================
     
     # Provider selection for different tasks
-    DETECTION_PROVIDER: str = "camembert"  # camembert, xlm-roberta, qwen, llama
+    DETECTION_PROVIDER: str = "camembert"  # camembert, xlm-roberta, qwen, llama, cascade
     GENERATION_PROVIDER: str = "ollama"    # ollama, gpt, claude
     
+    # ============================================================================
+    # DETECTION CASCADE (DETECTION_PROVIDER=cascade)
+    # ============================================================================
+    # CamemBERT analyse tout; seuls les textes incertains (confiance dans la
+    # bande) ou avec explication demandée passent au modèle d'escalade
+    CASCADE_FAST_MODEL: str = "camembert-depression"
+    CASCADE_ESCALATION_MODEL: str = "qwen-depression"  # qwen-depression ou yansnet-llm
+    CASCADE_UNCERTAINTY_MIN: float = 0.0
+    CASCADE_UNCERTAINTY_MAX: float = 0.85
+    CASCADE_ESCALATE_ON_REASONING: bool = True
+    
     # ============================================================================
     # CAMEMBERT SETTINGS (Depression Detection)
     # ============================================================================
     CAMEMBERT_MODEL: str = "camembert-base"
     CAMEMBERT_DEVICE: str = "cpu"
     CAMEMBERT_MAX_LENGTH: int = 512
+    CAMEMBERT_INFERENCE_MODE: str = "fp32"  # fp32, int8 (quantification dynamique, CPU)
+    CAMEMBERT_BACKEND: str = "pytorch"  # pytorch, onnx (onnxruntime, CPU)
     
     # ============================================================================
     # XLM-ROBERTA SETTINGS (Alternative Detection)
@@ -30,6 +43,25 @@ class Settings(BaseSettings):
     XLM_ROBERTA_DEVICE: str = "cpu"
     XLM_ROBERTA_MAX_LENGTH: int = 512
     
+    # ============================================================================
+    # HATECOMMENT BERT SETTINGS (Hate Speech Detection)
+    # ============================================================================
+    HATECOMMENT_MAX_LENGTH: int = 512
+    HATECOMMENT_BATCH_SIZE: int = 32  # Taille des paquets (triés par longueur) en batch
+    HATECOMMENT_INFERENCE_MODE: str = "fp32"  # fp32, int8 (quantification dynamique, CPU)
+    HATECOMMENT_BACKEND: str = "pytorch"  # pytorch, onnx (onnxruntime, CPU)
+
+    # ============================================================================
+    # IMAGE CAPTION SETTINGS (BLIP + traduction EN→FR)
+    # ============================================================================
+    IMAGE_CAPTION_BATCH_SIZE: int = 16  # Images (et légendes traduites) par appel en batch
+
+    # ============================================================================
+    # CENSURE SETTINGS (ViT NSFW)
+    # ============================================================================
+    CENSURE_MAX_BATCH_SIZE: int = 32  # Images par forward pass en batch
+    CENSURE_BACKEND: str = "pytorch"  # pytorch, onnx (onnxruntime, CPU)
+
     # ============================================================================
     # QWEN SETTINGS (Ollama-based Detection - Better Reasoning)
     # ============================================================================
@@ -43,6 +75,17 @@ class Settings(BaseSettings):
     OLLAMA_DETECTION_MODEL: str = "llama3.2:1b"  # Fallback only
     OLLAMA_GENERATION_MODEL: str = "llama3.2:3b"  # Primary for generation
     OLLAMA_MODEL: str = "llama3.2"  # Legacy compatibility
+    # Client HTTP partagé (pool keep-alive, concurrence par modèle, retries)
+    OLLAMA_NUM_PARALLEL: int = 4  # Aligner sur OLLAMA_NUM_PARALLEL du serveur
+    OLLAMA_PARALLEL_OVERRIDES: str = ""  # ex: "llama3.2:3b=2,qwen2.5:1.5b=4"
+    OLLAMA_MAX_CONNECTIONS: int = 32
+    OLLAMA_KEEPALIVE_EXPIRY_S: float = 60.0
+    OLLAMA_CONNECT_TIMEOUT_S: float = 5.0
+    OLLAMA_READ_TIMEOUT_S: float = 120.0
+    OLLAMA_MAX_RETRIES: int = 2  # Erreurs transitoires: connexion, timeout, 429/502/503/504
+    OLLAMA_RETRY_BACKOFF_S: float = 0.5  # Backoff exponentiel avec jitter
+    OLLAMA_RETRY_MAX_BACKOFF_S: float = 5.0
+    OLLAMA_KEEP_ALIVE: str = "30m"  # Durée de résidence du modèle après un appel (défaut Ollama: 5m; "-1" = toujours)
     
     # ============================================================================
     # OPENAI SETTINGS (Optional external provider)
@@ -59,7 +102,19 @@ class Settings(BaseSettings):
     # ============================================================================
     # LEGACY LLM PROVIDER (Backward compatibility)
     # ============================================================================
-    LLM_PROVIDER: str = "gpt"  # gpt, claude, local
+    LLM_PROVIDER: str = "gpt"  # gpt, claude, local, mock (LLM simulé, tests de charge hors ligne)
+    
+    # ============================================================================
+    # LLM PROVIDER CLIENTS (Clients OpenAI / Anthropic partagés, keep-alive)
+    # ============================================================================
+    LLM_CLIENT_MAX_CONNECTIONS: int = 20
+    LLM_CLIENT_MAX_KEEPALIVE: int = 10
+    LLM_CLIENT_KEEPALIVE_EXPIRY_S: float = 30.0
+    LLM_CLIENT_TIMEOUT_S: float = 60.0
+    LLM_CLIENT_CONNECT_TIMEOUT_S: float = 5.0
+    LLM_CLIENT_MAX_RETRIES: int = 2  # Retries intégrés des SDK (429, 5xx, connexion)
+    MOCK_LLM_LATENCY_MS: float = 300.0  # Provider mock: latence d'une réponse
+    MOCK_LLM_TOKEN_DELAY_MS: float = 20.0  # Provider mock: délai entre fragments en streaming
     
     # ============================================================================
     # PERFORMANCE SETTINGS
@@ -69,7 +124,70 @@ class Settings(BaseSettings):
     MAX_QWEN_DETECTION_LATENCY_MS: int = 1000  # Qwen 2.5 1.5B latency target
     MAX_GENERATION_LATENCY_S: int = 30
     ENABLE_FALLBACK: bool = True
-    
+    QUANTIZED_MODEL_CACHE_DIR: str = "cache/quantized"  # Modèles int8 sur disque (vide = pas de cache)
+
+    # ============================================================================
+    # ONNX RUNTIME SETTINGS (Backend onnx des classifieurs BERT / ViT)
+    # ============================================================================
+    ONNX_CACHE_DIR: str = "cache/onnx"  # Graphes exportés (par modèle et version)
+    ONNX_OPSET: int = 17
+    # Threads par session: avec INFERENCE_MAX_CONCURRENCY > 1, limiter l'intra-op
+    # pour éviter la sursouscription des cœurs (0 = défaut onnxruntime)
+    ONNX_INTRA_OP_THREADS: int = 0
+    ONNX_INTER_OP_THREADS: int = 1
+
+    # ============================================================================
+    # MICRO-BATCHING SETTINGS (Regroupement des requêtes unitaires concurrentes)
+    # ============================================================================
+    ENABLE_MICRO_BATCHING: bool = False
+    MICRO_BATCH_MAX_SIZE: int = 32
+    MICRO_BATCH_MAX_WAIT_MS: float = 5.0
+    # Fan-out des batch_predict des modèles LLM (un appel par texte)
+    BATCH_FANOUT_CONCURRENCY: int = 8  # Appels LLM simultanés par batch
+    BATCH_DEADLINE_S: float = 60.0  # Délai global d'un batch; au-delà, éléments en timeout (0 = aucun)
+    LLM_PACK_SIZE: int = 0  # Textes par prompt LLM en batch (mode packé); 0 ou 1 = un appel par texte
+    # Génération de contenu YANSNET: appels LLM simultanés (commentaires, jeux de démo)
+    CONTENT_GENERATION_CONCURRENCY: int = 4
+    CONTENT_GENERATION_CONCURRENCY_OVERRIDES: str = ""  # Par provider, ex: "gpt=8,claude=4,local=2"
+
+    # ============================================================================
+    # PREDICTION CACHE SETTINGS (Résultats des modèles texte, adressés par contenu)
+    # ============================================================================
+    ENABLE_PREDICTION_CACHE: bool = False
+    PREDICTION_CACHE_TTL_S: int = 3600
+    PREDICTION_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Niveau mémoire (par process)
+    PREDICTION_CACHE_DISABLED_MODELS: str = ""  # ex: "yansnet-llm,qwen-depression"
+    PREDICTION_CACHE_SHARED_BACKEND: str = "none"  # none, sqlite, redis
+    PREDICTION_CACHE_SQLITE_PATH: str = "cache/predictions.sqlite3"
+    PREDICTION_CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+
+    # ============================================================================
+    # IMAGE CACHE SETTINGS (Hash exact + perceptuel des uploads)
+    # ============================================================================
+    ENABLE_IMAGE_CACHE: bool = False
+    IMAGE_CACHE_MODELS: str = "censure-nsfw,sensitive-image-caption"
+    IMAGE_CACHE_MAX_ENTRIES: int = 4096
+    IMAGE_CACHE_TTL_S: int = 86400
+    IMAGE_CACHE_HAMMING_THRESHOLD: int = 4  # Bits de dHash (sur 64) tolérés; -1 = exact seulement
+
+    # ============================================================================
+    # INFERENCE EXECUTOR SETTINGS (Inférence hors boucle asyncio + backpressure)
+    # ============================================================================
+    INFERENCE_MAX_CONCURRENCY: int = 2  # Appels simultanés par modèle
+    INFERENCE_MAX_QUEUE: int = 64  # Requêtes en attente max par modèle (au-delà: 429)
+    INFERENCE_QUEUE_TIMEOUT_S: float = 30.0  # Attente max d'un slot (au-delà: 429)
+    INFERENCE_CONCURRENCY_OVERRIDES: str = ""  # ex: "yansnet-llm=8,sensitive-image-caption=1"
+
+    # ============================================================================
+    # MODEL LOADING SETTINGS (Chargement à la demande + éviction)
+    # ============================================================================
+    MODEL_LOADING_MODE: str = "eager"  # eager (tout charger au démarrage), lazy (au premier usage)
+    MODEL_IDLE_TIMEOUT_S: int = 0  # Décharger un modèle inactif depuis N secondes (0 = jamais)
+    MODEL_MEMORY_LIMIT_MB: int = 0  # Décharger les modèles LRU au-delà de ce RSS (0 = pas de limite)
+    MODEL_EVICTION_INTERVAL_S: int = 60
+    MODEL_LOAD_WORKERS: int = 4  # Chargements de modèles simultanés au démarrage
+    REQUIRED_MODELS: str = ""  # Modèles requis pour /ready (vide = tous, en mode eager)
+
     # ============================================================================
     # POSTGRESQL SETTINGS (Metrics Database)
     # ============================================================================
@@ -85,6 +203,40 @@ class Settings(BaseSettings):
     ENABLE_METRICS: bool = True
     LOG_LATENCY: bool = True
     
+    # ============================================================================
+    # METRICS INGESTION SETTINGS (Écriture par lots des prédictions / erreurs)
+    # ============================================================================
+    METRICS_BATCH_SIZE: int = 500  # Lignes par lot (vidage anticipé au-delà)
+    METRICS_FLUSH_INTERVAL_S: float = 1.0  # Délai max avant écriture
+    METRICS_BUFFER_SIZE: int = 10000  # Par table; au-delà les plus anciennes sont abandonnées
+    METRICS_WRITE_METHOD: str = "copy"  # copy (COPY, repli executemany) ou executemany
+    
+    # ============================================================================
+    # METRICS PARTITIONS SETTINGS (Partitions temporelles et rétention)
+    # ============================================================================
+    METRICS_PARTITION_INTERVAL: str = "day"  # day ou hour (tables brutes; rollups: day)
+    METRICS_PARTITIONS_AHEAD: int = 3  # Partitions futures créées à l'avance
+    METRICS_RETENTION_DAYS: int = 30  # Tables brutes; 0 = conservation illimitée
+    METRICS_ROLLUP_RETENTION_DAYS: int = 400  # Rollups par minute; 0 = illimitée
+    METRICS_RETENTION_ACTION: str = "drop"  # drop ou archive (schéma metrics_archive)
+    METRICS_PARTITION_MAINTENANCE_INTERVAL_S: int = 3600
+    
+    # ============================================================================
+    # ERROR RATE ALERTING SETTINGS (Fenêtre glissante en mémoire)
+    # ============================================================================
+    ERROR_RATE_WINDOW_S: int = 3600  # Fenêtre du taux d'erreur
+    ERROR_RATE_BUCKET_S: int = 60  # Granularité de la fenêtre glissante
+    ERROR_RATE_ALERT_THRESHOLD_PCT: float = 10.0  # Alerte warning au-delà
+    ERROR_RATE_CRITICAL_PCT: float = 20.0  # Alerte critical au-delà
+    ERROR_RATE_MIN_REQUESTS: int = 1  # Requêtes minimum sur la fenêtre avant d'alerter
+    
+    # ============================================================================
+    # PROMETHEUS SETTINGS (Exposition des métriques runtime, sans accès base)
+    # ============================================================================
+    PROMETHEUS_LATENCY_BUCKETS: str = "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"  # Secondes
+    METRICS_MULTIPROC_DIR: str = ""  # Répertoire partagé par les workers uvicorn (vide: mono-process)
+    METRICS_MULTIPROC_SYNC_S: float = 5.0  # Publication de l'état de chaque worker
+    
     # ============================================================================
     # API SETTINGS
     # ============================================================================
@@ -104,5 +256,25 @@ class Settings(BaseSettings):
         case_sensitive = True
 
 
+def parse_key_value_list(value: str) -> Dict[str, str]:
+    """
+    Parse une liste "cle=valeur,cle2=valeur2" (format des variables d'environnement)
+
+    Args:
+        value: Chaîne à parser (les entrées mal formées sont ignorées)
+
+    Returns:
+        Dictionnaire {cle: valeur}
+    """
+    result = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        key, _, val = item.partition("=")
+        if key.strip():
+            result[key.strip()] = val.strip()
+    return result
+
+
 # Instance globale
 settings = Settings()
@@ -5,6 +5,19 @@ from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
 
 
+def is_failed_result(result: Any) -> bool:
+    """
+    Indique si un résultat de prédiction représente un échec.
+
+    Les modèles signalent une erreur par élément soit par un champ `error`
+    (on_error de batch_predict), soit par `prediction == "ERREUR"`
+    (prédicteurs LLM qui capturent les exceptions du provider).
+    """
+    return isinstance(result, dict) and (
+        bool(result.get("error")) or result.get("prediction") == "ERREUR"
+    )
+
+
 class BaseMLModel(ABC):
     """
     Interface générique que tous les modèles ML doivent implémenter.
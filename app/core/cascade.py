@@ -0,0 +1,248 @@
+"""
+Cascade de détection de dépression (DETECTION_PROVIDER=cascade)
+
+Le classifieur rapide (CamemBERT) analyse chaque texte. Seuls les textes dont
+la confiance tombe dans la bande d'incertitude [CASCADE_UNCERTAINTY_MIN,
+CASCADE_UNCERTAINTY_MAX], ou pour lesquels une explication est demandée,
+passent au modèle d'escalade (Qwen ou LLM). Une explication demandée
+(CASCADE_ESCALATE_ON_REASONING) escalade directement, sans premier étage; le
+modèle rapide ne sert alors que de repli si l'escalade échoue. Le résultat
+indique l'étage qui a décidé (`decided_by`, `escalated`).
+
+Métriques: textes par étage et motif (taux d'escalade), latence de
+l'escalade, et latence économisée (latence moyenne observée de l'escalade
+pour chaque texte décidé avec confiance par le premier étage).
+"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from app.config import settings
+from app.core.base_model import is_failed_result
+from app.core.inference_executor import run_inference
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.core.micro_batcher import get_batcher
+from app.core.model_registry import registry
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+cascade_decisions_counter = runtime_metrics.counter(
+    "detection_cascade_decisions",
+    "Textes décidés par la cascade (stage: fast, escalated; reason: confident, uncertain, reasoning, escalation_error)"
+)
+cascade_saved_counter = runtime_metrics.counter(
+    "detection_cascade_latency_saved_seconds",
+    "Latence d'escalade évitée (estimée) grâce aux textes décidés par le premier étage"
+)
+cascade_escalation_histogram = runtime_metrics.histogram(
+    "detection_cascade_escalation_seconds",
+    "Latence de l'étage d'escalade par texte",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+# Libellés des modèles d'escalade (Qwen: sans accents) -> vocabulaire CamemBERT
+_LABELS = {"DEPRESSION": "DÉPRESSION", "Elevee": "Élevée"}
+
+# Poids d'une nouvelle mesure dans la moyenne mobile de la latence d'escalade
+_EWMA_ALPHA = 0.2
+
+
+class DetectionCascade:
+    """
+    Détection en deux étages: modèle rapide, puis escalade des cas incertains.
+
+    Usage:
+        result = await detection_cascade.detect(text, include_reasoning=False)
+        results = await detection_cascade.detect_batch(texts, include_reasoning=False)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._escalation_latency_s: Optional[float] = None
+        self._totals = {"texts": 0, "escalated": 0}
+
+    # ------------------------------------------------------------------
+    # Décision
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def forced_escalation(include_reasoning: bool) -> Optional[str]:
+        """Motif d'escalade connu avant le premier étage (None: le premier étage décide)"""
+        if include_reasoning and settings.CASCADE_ESCALATE_ON_REASONING:
+            return "reasoning"
+        return None
+
+    @staticmethod
+    def escalation_reason(result: Dict[str, Any], include_reasoning: bool) -> Optional[str]:
+        """Motif d'escalade d'un résultat du premier étage (None: décision finale)"""
+        forced = DetectionCascade.forced_escalation(include_reasoning)
+        if forced is not None:
+            return forced
+        if is_failed_result(result):
+            return "uncertain"
+        confidence = float(result.get("confidence", 0.0))
+        if settings.CASCADE_UNCERTAINTY_MIN <= confidence <= settings.CASCADE_UNCERTAINTY_MAX:
+            return "uncertain"
+        return None
+
+    @staticmethod
+    def _normalize(result: Dict[str, Any]) -> Dict[str, Any]:
+        result = dict(result)
+        result["prediction"] = _LABELS.get(result.get("prediction"), result.get("prediction"))
+        result["severity"] = _LABELS.get(result.get("severity"), result.get("severity"))
+        return result
+
+    def _record(self, stage: str, reason: str, escalation_s: Optional[float] = None) -> None:
+        cascade_decisions_counter.inc(stage=stage, reason=reason)
+        with self._lock:
+            self._totals["texts"] += 1
+            if stage == "escalated":
+                self._totals["escalated"] += 1
+            if escalation_s is not None:
+                previous = self._escalation_latency_s
+                self._escalation_latency_s = escalation_s if previous is None else (
+                    previous + _EWMA_ALPHA * (escalation_s - previous)
+                )
+            elif reason == "confident" and self._escalation_latency_s is not None:
+                # Décidé avec confiance par le premier étage: escalade évitée
+                # (les escalades en échec, elles, n'économisent rien)
+                cascade_saved_counter.inc(self._escalation_latency_s)
+        if escalation_s is not None:
+            cascade_escalation_histogram.observe(escalation_s)
+
+    # ------------------------------------------------------------------
+    # Modèles
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    async def _models():
+        fast = await registry.aget(settings.CASCADE_FAST_MODEL)
+        if fast is None:
+            raise RuntimeError(f"Modèle rapide de la cascade indisponible: {settings.CASCADE_FAST_MODEL}")
+        escalation = await registry.aget(settings.CASCADE_ESCALATION_MODEL)
+        if escalation is None:
+            logger.warning(f"⚠️  Modèle d'escalade indisponible: {settings.CASCADE_ESCALATION_MODEL}")
+        return fast, escalation
+
+    @staticmethod
+    async def _predict(model, text: str, include_reasoning: bool) -> Dict[str, Any]:
+        """Prédiction unitaire, regroupée par le micro-batcher si activé"""
+        if settings.ENABLE_MICRO_BATCHING:
+            return await get_batcher(model).predict(text=text, include_reasoning=include_reasoning)
+        return await run_inference(model, "predict", text=text, include_reasoning=include_reasoning)
+
+    def _fast_result(self, fast, result: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        self._record("fast", reason)
+        return {**result, "decided_by": fast.model_name, "escalated": False}
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+
+    async def detect(self, text: str, include_reasoning: bool = False) -> Dict[str, Any]:
+        """Détection d'un texte par la cascade"""
+        fast, escalation = await self._models()
+        reason = self.forced_escalation(include_reasoning) if escalation is not None else None
+        first: Optional[Dict[str, Any]] = None
+        if reason is None:
+            first = await self._predict(fast, text, include_reasoning=False)
+            reason = self.escalation_reason(first, include_reasoning)
+            if reason is None or escalation is None:
+                return self._fast_result(fast, first, "confident" if reason is None else "escalation_error")
+
+        start = time.perf_counter()
+        try:
+            result = await self._predict(escalation, text, include_reasoning)
+            error = (result.get("error") or result.get("reasoning") or "ERREUR") if is_failed_result(result) else None
+        except Exception as e:
+            error = e
+        if error:
+            logger.warning(f"⚠️  Escalade {escalation.model_name} en échec, résultat {fast.model_name} utilisé: {error}")
+            if first is None:  # Escalade directe: premier étage en repli
+                first = await self._predict(fast, text, include_reasoning)
+            return self._fast_result(fast, first, "escalation_error")
+        self._record("escalated", reason, time.perf_counter() - start)
+        return {**self._normalize(result), "decided_by": escalation.model_name, "escalated": True}
+
+    async def detect_batch(self, texts: List[str], include_reasoning: bool = False) -> List[Dict[str, Any]]:
+        """
+        Détection batch: un batch_predict du modèle rapide sur tous les textes,
+        puis un batch_predict d'escalade sur les seuls textes retenus. Si
+        l'escalade est imposée (explication demandée), le modèle rapide ne
+        traite que les textes dont l'escalade a échoué.
+        """
+        fast, escalation = await self._models()
+        forced = self.forced_escalation(include_reasoning) if escalation is not None else None
+        firsts: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        if forced is None:
+            firsts = await run_inference(fast, "batch_predict", texts=texts, include_reasoning=False)
+            reasons = [self.escalation_reason(result, include_reasoning) for result in firsts]
+        else:
+            reasons = [forced] * len(texts)
+        to_escalate = [i for i, reason in enumerate(reasons) if reason is not None]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+
+        escalated: List[Dict[str, Any]] = []
+        per_text_s = 0.0
+        if to_escalate and escalation is not None:
+            start = time.perf_counter()
+            try:
+                escalated = await run_inference(
+                    escalation, "batch_predict",
+                    texts=[texts[i] for i in to_escalate],
+                    include_reasoning=include_reasoning
+                )
+            except Exception as e:
+                logger.warning(f"⚠️  Escalade batch {escalation.model_name} en échec: {e}")
+            per_text_s = (time.perf_counter() - start) / len(to_escalate)
+
+        for index, result in zip(to_escalate, escalated):
+            if is_failed_result(result):
+                continue  # Résultat du premier étage conservé ci-dessous
+            self._record("escalated", reasons[index], per_text_s)
+            results[index] = {**self._normalize(result), "decided_by": escalation.model_name, "escalated": True}
+
+        fallback = [i for i, result in enumerate(results) if result is None and firsts[i] is None]
+        if fallback:  # Escalade directe en échec: premier étage en repli
+            computed = await run_inference(
+                fast, "batch_predict", texts=[texts[i] for i in fallback], include_reasoning=include_reasoning
+            )
+            for index, result in zip(fallback, computed):
+                firsts[index] = result
+
+        for index, result in enumerate(results):
+            if result is None:
+                reason = "confident" if reasons[index] is None else "escalation_error"
+                results[index] = self._fast_result(fast, firsts[index], reason)
+
+        logger.info(
+            f"Cascade: {len(texts)} textes, {sum(r['escalated'] for r in results)} escaladés "
+            f"vers {settings.CASCADE_ESCALATION_MODEL}"
+        )
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Taux d'escalade et latence économisée depuis le démarrage"""
+        with self._lock:
+            texts = self._totals["texts"]
+            escalated = self._totals["escalated"]
+            latency = self._escalation_latency_s
+        return {
+            "fast_model": settings.CASCADE_FAST_MODEL,
+            "escalation_model": settings.CASCADE_ESCALATION_MODEL,
+            "uncertainty_band": [settings.CASCADE_UNCERTAINTY_MIN, settings.CASCADE_UNCERTAINTY_MAX],
+            "texts": texts,
+            "escalated": escalated,
+            "escalation_rate": round(escalated / texts, 4) if texts else 0.0,
+            "escalation_latency_ms": round(latency * 1000, 1) if latency is not None else None,
+            "latency_saved_s": round(cascade_saved_counter.get(), 3)
+        }
+
+
+def cascade_enabled() -> bool:
+    return settings.DETECTION_PROVIDER.lower() == "cascade"
+
+
+# Instance globale
+detection_cascade = DetectionCascade()
@@ -18,7 +18,7 @@ def validate_configuration() -> bool:
     warnings = []
     
     # Validate detection provider
-    valid_detection_providers = ["camembert", "xlm-roberta", "llama"]
+    valid_detection_providers = ["camembert", "xlm-roberta", "llama", "cascade"]
     if settings.DETECTION_PROVIDER not in valid_detection_providers:
         errors.append(
             f"DETECTION_PROVIDER invalide: {settings.DETECTION_PROVIDER}. "
@@ -0,0 +1,92 @@
+"""
+Fan-out borné pour les prédictions batch des modèles servis par un LLM
+
+Les modèles LLM (Qwen via Ollama, GPT, Claude) ne savent pas traiter un batch
+en un seul appel: chaque texte est une requête indépendante. `map_bounded`
+lance ces requêtes en parallèle (concurrence bornée), rend les résultats dans
+l'ordre d'entrée, isole les erreurs par élément et applique un délai global:
+les éléments non terminés à l'échéance reviennent en erreur de timeout.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional, Sequence, TypeVar
+from app.config import settings
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+fanout_timeouts_counter = runtime_metrics.counter(
+    "batch_fanout_timeouts",
+    "Éléments de batch non terminés avant l'échéance du batch (par modèle)"
+)
+
+
+class BatchDeadlineExceeded(TimeoutError):
+    """Élément de batch non terminé avant l'échéance globale"""
+
+
+def map_bounded(
+    func: Callable[[T], Any],
+    items: Sequence[T],
+    on_error: Callable[[T, Exception], Any],
+    max_concurrency: Optional[int] = None,
+    deadline_s: Optional[float] = None,
+    name: str = "batch"
+) -> List[Any]:
+    """
+    Applique `func` à chaque élément, en parallèle, dans un pool de threads.
+
+    Args:
+        func: Appel bloquant pour un élément (ex: prédiction d'un texte)
+        items: Éléments à traiter
+        on_error: Construit le résultat d'un élément en échec (exception ou timeout)
+        max_concurrency: Appels simultanés max (défaut: BATCH_FANOUT_CONCURRENCY)
+        deadline_s: Délai global du batch (défaut: BATCH_DEADLINE_S, 0 = aucun)
+        name: Nom du modèle (logs et métriques)
+
+    Returns:
+        Résultats dans l'ordre de `items`
+    """
+    if not items:
+        return []
+
+    max_concurrency = max(1, max_concurrency or settings.BATCH_FANOUT_CONCURRENCY)
+    deadline_s = settings.BATCH_DEADLINE_S if deadline_s is None else deadline_s
+    start = time.perf_counter()
+
+    pool = ThreadPoolExecutor(
+        max_workers=min(max_concurrency, len(items)),
+        thread_name_prefix=f"fanout-{name}"
+    )
+    try:
+        futures = [pool.submit(func, item) for item in items]
+        _, not_done = wait(futures, timeout=deadline_s or None)
+    finally:
+        # Ne pas attendre les appels en retard: ils se terminent en arrière-plan
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for item, future in zip(items, futures):
+        if future in not_done:
+            results.append(on_error(item, BatchDeadlineExceeded(f"délai du batch dépassé ({deadline_s}s)")))
+            continue
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"Erreur sur un élément du batch {name}: {e}")
+            results.append(on_error(item, e))
+
+    if not_done:
+        fanout_timeouts_counter.inc(len(not_done), model=name)
+        logger.warning(
+            f"⚠️  Batch {name}: {len(not_done)}/{len(items)} éléments hors délai ({deadline_s}s)"
+        )
+
+    logger.info(
+        f"Batch {name}: {len(items)} éléments en {(time.perf_counter() - start) * 1000:.2f}ms "
+        f"(concurrence: {min(max_concurrency, len(items))})"
+    )
+    return results
@@ -0,0 +1,222 @@
+"""
+Cache des résultats d'analyse d'images (hash exact + hash perceptuel)
+
+Chaque résultat est indexé par le sha256 des octets uploadés et par un dHash
+64 bits de l'image. Une image ré-encodée ou redimensionnée (même dHash à
+quelques bits près) réutilise le résultat précédent du même modèle.
+"""
+import asyncio
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+from app.config import settings
+from app.core.base_model import is_failed_result
+from app.core.inference_executor import run_inference
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+image_cache_lookups_counter = runtime_metrics.counter(
+    "image_cache_lookups",
+    "Recherches dans le cache d'images (outcome: exact, perceptual, miss)"
+)
+
+
+def compute_dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Calcule le dHash (difference hash) d'une image.
+
+    L'image est réduite en niveaux de gris à (hash_size+1)×hash_size; chaque
+    bit indique si un pixel est plus clair que son voisin de droite.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class _Entry:
+    __slots__ = ("model_key", "dhash", "expires_at", "result")
+
+    def __init__(self, model_key: Tuple[str, str], dhash: int, expires_at: float, result: Dict[str, Any]):
+        self.model_key = model_key
+        self.dhash = dhash
+        self.expires_at = expires_at
+        self.result = result
+
+
+class ImageResultCache:
+    """LRU borné (nombre d'entrées + TTL) des résultats par modèle et image"""
+
+    def __init__(self, max_entries: int, ttl_s: float, hamming_threshold: int):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.hamming_threshold = hamming_threshold
+        self._entries: "OrderedDict[Tuple[str, str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"exact": 0, "perceptual": 0, "miss": 0, "evictions": 0}
+
+    @staticmethod
+    def fingerprint(image_bytes: bytes, image: Image.Image) -> Tuple[str, int]:
+        """Retourne (sha256 des octets, dHash de l'image)"""
+        return hashlib.sha256(image_bytes).hexdigest(), compute_dhash(image)
+
+    def get(self, model_name: str, model_version: str, sha: str, dhash: int) -> Optional[Dict[str, Any]]:
+        """Cherche un résultat exact puis perceptuel; None si absent"""
+        model_key = (model_name, model_version)
+        now = time.monotonic()
+
+        with self._lock:
+            key = model_key + (sha,)
+            entry = self._entries.get(key)
+            outcome = "exact"
+
+            if entry is not None and entry.expires_at < now:
+                del self._entries[key]
+                entry = None
+
+            if entry is None and self.hamming_threshold >= 0:
+                key, entry = self._find_near_duplicate(model_key, dhash, now)
+                outcome = "perceptual"
+
+            if entry is None:
+                outcome = "miss"
+            else:
+                self._entries.move_to_end(key)
+
+            self._stats[outcome] += 1
+
+        image_cache_lookups_counter.inc(model=model_name, outcome=outcome)
+        return copy.deepcopy(entry.result) if entry is not None else None
+
+    def _find_near_duplicate(self, model_key: Tuple[str, str], dhash: int, now: float):
+        """Entrée du même modèle au dHash le plus proche (distance <= seuil)"""
+        best_key, best, best_distance = None, None, self.hamming_threshold + 1
+        for key, entry in self._entries.items():
+            if entry.model_key != model_key or entry.expires_at < now:
+                continue
+            distance = hamming_distance(entry.dhash, dhash)
+            if distance < best_distance:
+                best_key, best, best_distance = key, entry, distance
+                if distance == 0:
+                    break
+        return best_key, best
+
+    def set(self, model_name: str, model_version: str, sha: str, dhash: int, result: Dict[str, Any]) -> None:
+        """Enregistre un résultat (les résultats en échec sont ignorés)"""
+        if not isinstance(result, dict) or is_failed_result(result):
+            return
+        model_key = (model_name, model_version)
+        with self._lock:
+            self._entries[model_key + (sha,)] = _Entry(
+                model_key, dhash, time.monotonic() + self.ttl_s, copy.deepcopy(result)
+            )
+            self._entries.move_to_end(model_key + (sha,))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            entries = len(self._entries)
+        lookups = stats["exact"] + stats["perceptual"] + stats["miss"]
+        hits = stats["exact"] + stats["perceptual"]
+        return {
+            "enabled": settings.ENABLE_IMAGE_CACHE,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hamming_threshold": self.hamming_threshold,
+            "hits_exact": stats["exact"],
+            "hits_perceptual": stats["perceptual"],
+            "misses": stats["miss"],
+            "evictions": stats["evictions"],
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Instance globale
+image_cache = ImageResultCache(
+    max_entries=settings.IMAGE_CACHE_MAX_ENTRIES,
+    ttl_s=settings.IMAGE_CACHE_TTL_S,
+    hamming_threshold=settings.IMAGE_CACHE_HAMMING_THRESHOLD
+)
+
+
+def _is_enabled_for(model_name: str) -> bool:
+    if not settings.ENABLE_IMAGE_CACHE:
+        return False
+    return model_name in {name.strip() for name in settings.IMAGE_CACHE_MODELS.split(",")}
+
+
+async def predict_images_cached(
+    model,
+    images_bytes: List[bytes],
+    images: List[Image.Image],
+    batch: bool = False,
+    **options
+) -> List[Dict[str, Any]]:
+    """
+    Analyse des images en réutilisant les résultats en cache.
+
+    Seules les images absentes du cache passent par le modèle: `batch_predict`
+    pour un endpoint batch (même avec une seule image à analyser: une image
+    invalide y donne une entrée d'erreur au lieu d'une exception), `predict`
+    sinon. Les résultats sont dans l'ordre d'entrée.
+
+    Args:
+        model: Modèle image (censure-nsfw, sensitive-image-caption...)
+        images_bytes: Octets bruts de chaque upload (hash exact)
+        images: Images PIL correspondantes (hash perceptuel)
+        batch: Requête batch de l'appelant (sémantique de batch_predict)
+        **options: Options transmises au modèle
+    """
+    use_cache = _is_enabled_for(model.model_name)
+    fingerprints: List[Tuple[str, int]] = []
+    results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+
+    if use_cache:
+        # Le dHash décode l'image: calcul hors boucle asyncio
+        fingerprints = await asyncio.to_thread(
+            lambda: [image_cache.fingerprint(b, image) for b, image in zip(images_bytes, images)]
+        )
+        for i, fingerprint in enumerate(fingerprints):
+            results[i] = image_cache.get(model.model_name, model.model_version, *fingerprint)
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        if batch:
+            computed = await run_inference(
+                model, "batch_predict", images=[images[i] for i in missing], **options
+            )
+        else:
+            computed = [
+                await run_inference(model, "predict", image=images[i], **options) for i in missing
+            ]
+
+        for index, result in zip(missing, computed):
+            # Entrées d'erreur de batch_predict non mises en cache
+            if use_cache and not is_failed_result(result):
+                image_cache.set(model.model_name, model.model_version, *fingerprints[index], result)
+            results[index] = result
+
+    return results
@@ -0,0 +1,291 @@
+"""
+Exécution des inférences hors de la boucle asyncio
+
+Chaque modèle dispose de son propre pool de threads et d'une limite de
+concurrence. Quand un modèle est saturé, les requêtes attendent dans une file
+bornée (avec timeout) puis sont rejetées avec InferenceSaturatedError
+(HTTP 429), ce qui garde la boucle libre pour /health et /metrics.
+"""
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from fastapi import HTTPException, status
+from app.config import settings, parse_key_value_list
+from app.core.metrics.prometheus import latency_buckets
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+inference_calls_counter = runtime_metrics.counter(
+    "model_inference_calls",
+    "Appels de modèle via run_inference (outcome: ok, error, rejected)"
+)
+inference_duration_histogram = runtime_metrics.histogram(
+    "model_inference_duration_seconds",
+    "Durée des appels de modèle (attente d'un slot comprise) par modèle et méthode",
+    buckets=latency_buckets()
+)
+
+
+class InferenceSaturatedError(HTTPException):
+    """
+    Levée quand la file d'attente d'un modèle est pleine ou le délai dépassé.
+
+    Hérite de HTTPException (429) pour traverser les `except HTTPException: raise`
+    des routes sans être transformée en 500.
+    """
+
+    def __init__(self, model_name: str, reason: str):
+        self.model_name = model_name
+        self.reason = reason
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Modèle '{model_name}' saturé: {reason}",
+            headers={"Retry-After": "1"}
+        )
+
+
+class _ModelLane:
+    """Pool de threads + sémaphore de concurrence pour un modèle"""
+
+    def __init__(self, model_name: str, max_concurrency: int, max_queue: int):
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix=f"inference-{model_name}"
+        )
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self.completed = 0
+
+    def get_semaphore(self) -> asyncio.Semaphore:
+        """Sémaphore lié à la boucle courante (recréé si la boucle change)"""
+        loop = asyncio.get_running_loop()
+        if self.semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self.semaphore
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected
+        }
+
+
+class InferenceExecutor:
+    """
+    Couche d'exécution partagée pour les appels bloquants aux modèles.
+
+    Usage:
+        result = await inference_executor.run(model.model_name, model.predict, text=...)
+    """
+
+    def __init__(self):
+        self._lanes: Dict[str, _ModelLane] = {}
+        self._lock = threading.Lock()
+
+    def _concurrency_for(self, model_name: str) -> int:
+        overrides = parse_key_value_list(settings.INFERENCE_CONCURRENCY_OVERRIDES)
+        try:
+            return max(1, int(overrides.get(model_name, settings.INFERENCE_MAX_CONCURRENCY)))
+        except ValueError:
+            logger.warning(f"Limite de concurrence invalide pour {model_name}, valeur par défaut utilisée")
+            return max(1, settings.INFERENCE_MAX_CONCURRENCY)
+
+    def _get_lane(self, model_name: str) -> _ModelLane:
+        with self._lock:
+            lane = self._lanes.get(model_name)
+            if lane is None:
+                lane = _ModelLane(
+                    model_name,
+                    max_concurrency=self._concurrency_for(model_name),
+                    max_queue=settings.INFERENCE_MAX_QUEUE
+                )
+                self._lanes[model_name] = lane
+                logger.info(
+                    f"✓ Pool d'inférence créé pour {model_name} "
+                    f"(concurrence: {lane.max_concurrency}, file: {lane.max_queue})"
+                )
+            return lane
+
+    async def _acquire(self, model_name: str) -> _ModelLane:
+        """Admission dans la file du modèle puis attente d'un slot d'exécution"""
+        lane = self._get_lane(model_name)
+        semaphore = lane.get_semaphore()
+
+        # Admission synchrone: slots d'exécution + places dans la file
+        if lane.running + lane.waiting >= lane.max_concurrency + lane.max_queue:
+            lane.rejected += 1
+            raise InferenceSaturatedError(model_name, f"file d'attente pleine ({lane.max_queue})")
+
+        lane.waiting += 1
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        try:
+            done, _ = await asyncio.wait({acquire}, timeout=settings.INFERENCE_QUEUE_TIMEOUT_S)
+        except BaseException:  # Appelant annulé pendant l'attente
+            self._abandon(acquire, semaphore)
+            raise
+        finally:
+            lane.waiting -= 1
+
+        if not done:
+            self._abandon(acquire, semaphore)
+            lane.rejected += 1
+            raise InferenceSaturatedError(
+                model_name,
+                f"délai d'attente dépassé ({settings.INFERENCE_QUEUE_TIMEOUT_S}s)"
+            )
+
+        lane.running += 1
+        return lane
+
+    @staticmethod
+    def _abandon(acquire: asyncio.Future, semaphore: asyncio.Semaphore) -> None:
+        """
+        Abandonne une acquisition en attente. Si elle aboutit malgré
+        l'annulation (timeout au moment où le slot se libère), le slot est
+        rendu: sinon la concurrence du modèle diminuerait définitivement.
+        """
+        acquire.cancel()
+
+        def on_done(task: asyncio.Future) -> None:
+            if not task.cancelled() and task.exception() is None:
+                semaphore.release()
+
+        acquire.add_done_callback(on_done)
+
+    @staticmethod
+    def _release(lane: _ModelLane) -> None:
+        lane.running -= 1
+        lane.completed += 1
+        lane.semaphore.release()
+
+    async def run(self, model_name: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Exécute un appel bloquant dans le pool du modèle.
+
+        Args:
+            model_name: Nom du modèle (clé du pool et de la limite)
+            func: Fonction synchrone à exécuter (ex: model.predict)
+            *args, **kwargs: Arguments transmis à func
+
+        Returns:
+            Le résultat de func
+
+        Raises:
+            InferenceSaturatedError: Si la file est pleine ou l'attente trop longue
+        """
+        lane = await self._acquire(model_name)
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(func, *args, **kwargs)
+            future = loop.run_in_executor(lane.executor, call)
+        except BaseException:
+            self._release(lane)
+            raise
+
+        # Le slot est libéré à la fin du thread, pas à l'annulation de
+        # l'appelant (déconnexion, timeout): le thread continue de tourner et
+        # les nouvelles requêtes doivent rester dans la file bornée
+        def on_done(done: asyncio.Future) -> None:
+            self._release(lane)
+            if not done.cancelled():
+                done.exception()  # Évite "exception was never retrieved" si l'appelant est parti
+
+        future.add_done_callback(on_done)
+        return await asyncio.shield(future)
+
+    async def run_async(self, model_name: str, func: Callable, *args, **kwargs) -> Any:
+        """
+        Exécute une coroutine (ex: model.apredict) sous la même limite de
+        concurrence et la même file que `run`, sans occuper de thread.
+
+        Raises:
+            InferenceSaturatedError: Si la file est pleine ou l'attente trop longue
+        """
+        lane = await self._acquire(model_name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self._release(lane)
+
+    async def reserve(self, model_name: str) -> Callable[[], None]:
+        """
+        Réserve un slot du modèle pour un traitement long (ex: réponse en
+        streaming). L'admission (429) a lieu ici, avant tout envoi.
+
+        Returns:
+            Fonction de libération du slot, sans effet après le premier appel
+        """
+        lane = await self._acquire(model_name)
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release(lane)
+
+        return release
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Retourne l'état de chaque pool (en cours, en attente, rejets)"""
+        return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    def shutdown(self) -> None:
+        """Arrête tous les pools de threads"""
+        with self._lock:
+            for lane in self._lanes.values():
+                lane.executor.shutdown(wait=False)
+            self._lanes.clear()
+
+
+# Instance globale
+inference_executor = InferenceExecutor()
+
+
+async def run_inference(model, method: str, *args, **kwargs) -> Any:
+    """
+    Raccourci: exécute `model.<method>(...)` dans le pool du modèle.
+
+    Si le modèle expose une variante coroutine `a<method>` (ex: apredict pour
+    les modèles servis par Ollama), elle est attendue directement.
+
+    Args:
+        model: Instance BaseMLModel
+        method: Nom de la méthode (predict, batch_predict, generate_post...)
+    """
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        async_method = getattr(model, f"a{method}", None)
+        if async_method is not None and inspect.iscoroutinefunction(async_method):
+            result = await inference_executor.run_async(model.model_name, async_method, *args, **kwargs)
+        else:
+            result = await inference_executor.run(model.model_name, getattr(model, method), *args, **kwargs)
+        outcome = "ok"
+        return result
+    except InferenceSaturatedError:
+        outcome = "rejected"
+        raise
+    finally:
+        inference_calls_counter.inc(model=model.model_name, method=method, outcome=outcome)
+        if outcome != "rejected":
+            inference_duration_histogram.observe(
+                time.perf_counter() - start, model=model.model_name, method=method
+            )
@@ -0,0 +1,256 @@
+"""
+Clients des providers LLM externes, partagés et réutilisés
+
+Un client OpenAI / Anthropic par provider (synchrone) et par boucle asyncio
+(asynchrone), créé au premier usage avec un pool de connexions keep-alive
+configuré: les connexions TCP/TLS sont réutilisées d'un appel à l'autre au
+lieu d'être renégociées à chaque requête.
+
+Le provider "mock" simule un LLM en local (latence configurable, réponses
+déterministes) pour tester en charge toute la chaîne sans réseau ni clé.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Tuple
+from app.config import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+PROVIDERS = ("gpt", "claude", "mock")
+
+
+def _limits(sdk):
+    # Même classe Limits que le transport HTTP du SDK (exportée via DEFAULT_CONNECTION_LIMITS)
+    return type(sdk.DEFAULT_CONNECTION_LIMITS)(
+        max_connections=settings.LLM_CLIENT_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_CLIENT_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_CLIENT_KEEPALIVE_EXPIRY_S
+    )
+
+
+def _timeout(sdk):
+    return sdk.Timeout(settings.LLM_CLIENT_TIMEOUT_S, connect=settings.LLM_CLIENT_CONNECT_TIMEOUT_S)
+
+
+# ============================================================================
+# FACTORIES
+# ============================================================================
+
+def _openai_client(async_client: bool):
+    import openai
+
+    if not settings.OPENAI_API_KEY:
+        raise ValueError("OPENAI_API_KEY non définie dans .env")
+
+    if async_client:
+        return openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            timeout=_timeout(openai),
+            max_retries=settings.LLM_CLIENT_MAX_RETRIES,
+            http_client=openai.DefaultAsyncHttpxClient(limits=_limits(openai), timeout=_timeout(openai))
+        )
+    return openai.OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        timeout=_timeout(openai),
+        max_retries=settings.LLM_CLIENT_MAX_RETRIES,
+        http_client=openai.DefaultHttpxClient(limits=_limits(openai), timeout=_timeout(openai))
+    )
+
+
+def _anthropic_client(async_client: bool):
+    import anthropic
+
+    if not settings.ANTHROPIC_API_KEY:
+        raise ValueError("ANTHROPIC_API_KEY non définie dans .env")
+
+    if async_client:
+        return anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            timeout=_timeout(anthropic),
+            max_retries=settings.LLM_CLIENT_MAX_RETRIES,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=_limits(anthropic), timeout=_timeout(anthropic))
+        )
+    return anthropic.Anthropic(
+        api_key=settings.ANTHROPIC_API_KEY,
+        timeout=_timeout(anthropic),
+        max_retries=settings.LLM_CLIENT_MAX_RETRIES,
+        http_client=anthropic.DefaultHttpxClient(limits=_limits(anthropic), timeout=_timeout(anthropic))
+    )
+
+
+# ============================================================================
+# PROVIDER MOCK
+# ============================================================================
+
+class MockLLMClient:
+    """
+    LLM simulé, sans réseau.
+
+    - Mode JSON: prédiction de dépression déterministe (mots-clés), au format
+      unitaire ou packé (un résultat par texte numéroté "[n] ...")
+    - Mode texte: texte généré à partir d'un hash du prompt
+    La latence (MOCK_LLM_LATENCY_MS) et le délai entre fragments en streaming
+    (MOCK_LLM_TOKEN_DELAY_MS) imitent un vrai provider.
+    """
+
+    DEPRESSION_KEYWORDS = (
+        "vide", "désespoir", "desespoir", "inutile", "fardeau", "disparaître", "disparaitre",
+        "suicid", "seul", "hopeless", "worthless", "empty", "sad", "triste"
+    )
+    WORDS = (
+        "franchement", "les", "partiels", "arrivent", "vite", "et", "on", "révise",
+        "ensemble", "à", "la", "bibliothèque", "ce", "soir", "qui", "est", "partant",
+        "courage", "à", "tous", "le", "campus", "est", "calme", "aujourd'hui"
+    )
+    NUMBERED_ITEM = re.compile(r'^\[(\d+)\] (".*")$', re.MULTILINE)
+
+    def _classify(self, text: str) -> Dict[str, Any]:
+        hits = sum(keyword in text.lower() for keyword in self.DEPRESSION_KEYWORDS)
+        if hits:
+            confidence = min(0.95, 0.6 + 0.1 * hits)
+            return {
+                "prediction": "DÉPRESSION",
+                "confidence": round(confidence, 2),
+                "reasoning": "Réponse simulée: vocabulaire associé à la dépression.",
+                "severity": "Élevée" if confidence >= 0.8 else "Moyenne"
+            }
+        return {
+            "prediction": "NORMAL",
+            "confidence": 0.85,
+            "reasoning": "Réponse simulée: aucun indicateur détecté.",
+            "severity": "Aucune"
+        }
+
+    def _text(self, prompt: str) -> str:
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        words = [self.WORDS[(seed >> (5 * i)) % len(self.WORDS)] for i in range(30)]
+        return " ".join(words).capitalize() + "."
+
+    def _respond(self, system_prompt: str, user_prompt: str, json_mode: bool) -> str:
+        if not json_mode:
+            return self._text(system_prompt + user_prompt)
+        items = self.NUMBERED_ITEM.findall(user_prompt)
+        if items:
+            return json.dumps({"results": [
+                {"id": int(number), **self._classify(json.loads(text))}
+                for number, text in items
+            ]}, ensure_ascii=False)
+        return json.dumps(self._classify(user_prompt), ensure_ascii=False)
+
+    @staticmethod
+    def _usage(system_prompt: str, user_prompt: str, content: str) -> Dict[str, int]:
+        # Approximation: ~4 caractères par token
+        return {
+            "prompt_tokens": (len(system_prompt) + len(user_prompt)) // 4,
+            "completion_tokens": len(content) // 4
+        }
+
+    def complete(self, system_prompt: str, user_prompt: str, json_mode: bool = False) -> Tuple[str, Dict[str, int]]:
+        time.sleep(settings.MOCK_LLM_LATENCY_MS / 1000)
+        content = self._respond(system_prompt, user_prompt, json_mode)
+        return content, self._usage(system_prompt, user_prompt, content)
+
+    async def acomplete(self, system_prompt: str, user_prompt: str, json_mode: bool = False) -> Tuple[str, Dict[str, int]]:
+        await asyncio.sleep(settings.MOCK_LLM_LATENCY_MS / 1000)
+        content = self._respond(system_prompt, user_prompt, json_mode)
+        return content, self._usage(system_prompt, user_prompt, content)
+
+    async def astream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Texte fragment par fragment (latence avant le premier, puis délai par mot)"""
+        await asyncio.sleep(settings.MOCK_LLM_LATENCY_MS / 1000)
+        for i, word in enumerate(self._text(system_prompt + user_prompt).split(" ")):
+            if i:
+                await asyncio.sleep(settings.MOCK_LLM_TOKEN_DELAY_MS / 1000)
+            yield word if i == 0 else " " + word
+
+    def close(self) -> None:
+        pass
+
+
+_FACTORIES = {
+    "gpt": _openai_client,
+    "claude": _anthropic_client,
+    "mock": lambda async_client: MockLLMClient(),
+}
+
+
+# ============================================================================
+# REGISTRE
+# ============================================================================
+
+class LLMClientRegistry:
+    """
+    Clients LLM réutilisables par provider.
+
+    Usage:
+        client = llm_clients.get("gpt")           # OpenAI (synchrone)
+        client = llm_clients.get_async("claude")  # AsyncAnthropic de la boucle courante
+    """
+
+    def __init__(self):
+        self._sync: Dict[str, Any] = {}
+        # Les clients async sont liés à une boucle: un jeu de clients par boucle
+        self._async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _factory(provider: str):
+        provider = provider.lower()
+        if provider not in _FACTORIES:
+            raise ValueError(f"Provider LLM non supporté: {provider}")
+        return provider, _FACTORIES[provider]
+
+    def get(self, provider: str):
+        """Client synchrone du provider (créé au premier appel)"""
+        provider, factory = self._factory(provider)
+        with self._lock:
+            client = self._sync.get(provider)
+            if client is None:
+                client = factory(False)
+                self._sync[provider] = client
+                logger.info(
+                    f"✓ Client {provider} créé (connexions: {settings.LLM_CLIENT_MAX_CONNECTIONS}, "
+                    f"timeout: {settings.LLM_CLIENT_TIMEOUT_S}s)"
+                )
+            return client
+
+    def get_async(self, provider: str):
+        """Client asynchrone du provider pour la boucle asyncio courante"""
+        provider, factory = self._factory(provider)
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async.setdefault(loop, {})
+            client = clients.get(provider)
+            if client is None:
+                client = factory(True)
+                clients[provider] = client
+            return client
+
+    async def aclose(self) -> None:
+        """Ferme les clients (synchrones et ceux de la boucle courante)"""
+        with self._lock:
+            sync_clients = list(self._sync.values())
+            async_clients = list(self._async.pop(asyncio.get_running_loop(), {}).values())
+            self._sync.clear()
+        for client in sync_clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"⚠️  Fermeture d'un client LLM: {e}")
+        for client in async_clients:
+            try:
+                if asyncio.iscoroutinefunction(getattr(client, "close", None)):
+                    await client.close()
+            except Exception as e:
+                logger.warning(f"⚠️  Fermeture d'un client LLM async: {e}")
+
+
+# Instance globale
+llm_clients = LLMClientRegistry()
@@ -0,0 +1,203 @@
+"""
+Taux d'erreur glissant par (modèle, provider), en mémoire
+
+Chaque requête (prédiction ou erreur) incrémente un anneau de buckets
+horodatés couvrant ERROR_RATE_WINDOW_S secondes, découpé en buckets de
+ERROR_RATE_BUCKET_S secondes. Les totaux sont maintenus à l'insertion et à
+l'expiration des buckets: lire le taux d'erreur est O(1), sans COUNT(*) sur
+model_errors / model_predictions.
+
+`evaluate()` ne retourne une transition que lorsque l'alerte change d'état
+(déclenchement au-delà du seuil, résolution sous RESOLVE_RATIO * seuil):
+la table alerts n'est touchée qu'à ces moments-là. L'état n'est modifié
+qu'une fois la transition écrite en base (`apply()`), et l'alerte active en
+base est chargée au premier passage de chaque clé (`restore()`), si bien
+qu'une écriture échouée est retentée et qu'une alerte ouverte avant un
+redémarrage peut être résolue.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.config import settings
+from app.core.metrics.metrics_models import AlertSeverity
+from app.core.metrics.runtime_metrics import runtime_metrics
+
+error_rate_gauge = runtime_metrics.gauge(
+    "model_error_rate_percent",
+    "Taux d'erreur sur la fenêtre glissante par modèle et provider",
+    multiprocess_mode="max"
+)
+
+# Résolution sous 80% du seuil: évite qu'une alerte oscille autour du seuil
+RESOLVE_RATIO = 0.8
+
+
+class SlidingWindowCounter:
+    """
+    Compteur sur fenêtre glissante (anneau de buckets).
+
+    Usage:
+        counter = SlidingWindowCounter(window_s=3600, bucket_s=60)
+        counter.add()
+        counter.total()  # événements des window_s dernières secondes
+    """
+
+    def __init__(self, window_s: float, bucket_s: float):
+        self.bucket_s = float(bucket_s)
+        self._size = max(1, int(-(-window_s // bucket_s)))
+        self._counts = [0] * self._size
+        self._head: Optional[int] = None  # Index absolu du bucket le plus récent
+        self._total = 0
+
+    def _advance(self, bucket: int) -> None:
+        """Expire les buckets sortis de la fenêtre (au plus un tour d'anneau)"""
+        if self._head is None:
+            self._head = bucket
+            return
+        if bucket <= self._head:
+            return
+        for index in range(max(self._head + 1, bucket - self._size + 1), bucket + 1):
+            slot = index % self._size
+            self._total -= self._counts[slot]
+            self._counts[slot] = 0
+        self._head = bucket
+
+    def add(self, amount: int = 1, now: Optional[float] = None) -> None:
+        bucket = int((time.monotonic() if now is None else now) // self.bucket_s)
+        self._advance(bucket)
+        if self._head - bucket >= self._size:
+            return  # Événement plus ancien que la fenêtre
+        self._counts[bucket % self._size] += amount
+        self._total += amount
+
+    def total(self, now: Optional[float] = None) -> int:
+        self._advance(int((time.monotonic() if now is None else now) // self.bucket_s))
+        return self._total
+
+
+@dataclass
+class AlertTransition:
+    """Changement d'état d'une alerte de taux d'erreur"""
+    action: str  # fire, resolve
+    severity: AlertSeverity
+    error_rate: float
+    threshold: float
+
+
+class ErrorRateMonitor:
+    """
+    Requêtes et erreurs par (modèle, provider) sur fenêtre glissante.
+
+    Usage:
+        error_rate_monitor.record(model_name, provider, error=False)
+        if error_rate_monitor.needs_restore(model_name, provider):
+            error_rate_monitor.restore(model_name, provider, active_severity_in_db)
+        transition = error_rate_monitor.evaluate(model_name, provider)
+        # ... écriture dans la table alerts, puis:
+        error_rate_monitor.apply(model_name, provider, transition)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, str], Tuple[SlidingWindowCounter, SlidingWindowCounter]] = {}
+        self._active: Dict[Tuple[str, str], AlertSeverity] = {}
+        self._restored: Set[Tuple[str, str]] = set()
+
+    def _counters(self, key: Tuple[str, str]) -> Tuple[SlidingWindowCounter, SlidingWindowCounter]:
+        counters = self._windows.get(key)
+        if counters is None:
+            counters = tuple(
+                SlidingWindowCounter(settings.ERROR_RATE_WINDOW_S, settings.ERROR_RATE_BUCKET_S)
+                for _ in range(2)
+            )
+            self._windows[key] = counters
+        return counters
+
+    def record(self, model_name: str, provider: str, error: bool = False, now: Optional[float] = None) -> None:
+        """Comptabilise une requête (et une erreur si `error`)"""
+        with self._lock:
+            requests, errors = self._counters((model_name, provider))
+            requests.add(now=now)
+            if error:
+                errors.add(now=now)
+
+    def rate(self, model_name: str, provider: str, now: Optional[float] = None) -> Tuple[int, int, float]:
+        """(erreurs, requêtes, taux d'erreur en %) sur la fenêtre"""
+        with self._lock:
+            requests, errors = self._counters((model_name, provider))
+            total, failed = requests.total(now), errors.total(now)
+        return failed, total, (failed / total * 100) if total else 0.0
+
+    def evaluate(
+        self,
+        model_name: str,
+        provider: str,
+        threshold: Optional[float] = None,
+        now: Optional[float] = None
+    ) -> Optional[AlertTransition]:
+        """
+        Transition d'état de l'alerte, ou None si l'état ne change pas.
+
+        L'état n'est pas modifié ici: appeler `apply()` une fois la
+        transition enregistrée en base.
+        """
+        threshold = settings.ERROR_RATE_ALERT_THRESHOLD_PCT if threshold is None else threshold
+        _, total, error_rate = self.rate(model_name, provider, now)
+        error_rate_gauge.set(round(error_rate, 2), model=model_name, provider=provider)
+        key = (model_name, provider)
+
+        with self._lock:
+            active = self._active.get(key)
+            if active is None and total >= settings.ERROR_RATE_MIN_REQUESTS and error_rate > threshold:
+                severity = (
+                    AlertSeverity.CRITICAL if error_rate > settings.ERROR_RATE_CRITICAL_PCT
+                    else AlertSeverity.WARNING
+                )
+                return AlertTransition("fire", severity, error_rate, threshold)
+            if active is not None and error_rate < threshold * RESOLVE_RATIO:
+                return AlertTransition("resolve", active, error_rate, threshold)
+        return None
+
+    def apply(self, model_name: str, provider: str, transition: AlertTransition) -> None:
+        """Enregistre une transition écrite avec succès dans la table alerts"""
+        key = (model_name, provider)
+        with self._lock:
+            if transition.action == "fire":
+                self._active[key] = transition.severity
+            else:
+                self._active.pop(key, None)
+
+    def needs_restore(self, model_name: str, provider: str) -> bool:
+        """True tant que l'état de l'alerte n'a pas été chargé depuis la base"""
+        with self._lock:
+            return (model_name, provider) not in self._restored
+
+    def restore(self, model_name: str, provider: str, severity: Optional[AlertSeverity]) -> None:
+        """Charge l'état de l'alerte depuis la base (None: aucune alerte active)"""
+        key = (model_name, provider)
+        with self._lock:
+            self._restored.add(key)
+            if severity is not None:
+                self._active[key] = severity
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            keys = list(self._windows)
+            active = dict(self._active)
+        stats = []
+        for model_name, provider in keys:
+            errors, total, error_rate = self.rate(model_name, provider)
+            stats.append({
+                "model_name": model_name,
+                "provider": provider,
+                "requests": total,
+                "errors": errors,
+                "error_rate_pct": round(error_rate, 2),
+                "alert": active[(model_name, provider)].value if (model_name, provider) in active else None
+            })
+        return stats
+
+
+# Instance globale
+error_rate_monitor = ErrorRateMonitor()
@@ -0,0 +1,316 @@
+"""
+Ingestion par lots des métriques PostgreSQL
+
+Les prédictions et erreurs ne sont plus insérées une par une: chaque
+événement est ajouté à un tampon borné en mémoire (un par table), vidé par
+une tâche de fond dès que METRICS_BATCH_SIZE événements sont en attente ou
+toutes les METRICS_FLUSH_INTERVAL_S secondes, en un seul
+`copy_records_to_table` (ou `executemany` si COPY échoue).
+
+- Surcharge: le tampon est circulaire, les événements les plus anciens sont
+  abandonnés (compteur `dropped`) plutôt que de bloquer les requêtes
+- L'horodatage est pris à l'enregistrement, pas à l'écriture
+- Chaque lot alimente aussi les rollups par minute (app.core.metrics.rollups)
+- Le taux d'erreur (fenêtre glissante en mémoire) est évalué une fois par
+  lot et par modèle; les alertes ne touchent la base qu'aux changements d'état
+- `stop()` vide les tampons à l'arrêt de l'API
+- Sans base (connexion PostgreSQL en échec), `disable_persistence()` coupe
+  la mise en tampon: seules les métriques en mémoire (Prometheus, taux
+  d'erreur) sont alimentées
+
+Utilisable depuis n'importe quel thread (inférence hors boucle asyncio).
+"""
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.config import settings
+from app.core.metrics.database import db
+from app.core.metrics.error_rate import error_rate_monitor
+from app.core.metrics.metrics_models import ErrorMetric, PredictionMetric
+from app.core.metrics.prometheus import observe_error, observe_prediction
+from app.core.metrics.rollups import build_rollups, write_rollups
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+ingestion_events_counter = runtime_metrics.counter(
+    "metrics_ingestion_events",
+    "Événements de métriques par table (outcome: queued, flushed, dropped, failed)"
+)
+ingestion_buffer_gauge = runtime_metrics.gauge(
+    "metrics_ingestion_buffer_depth",
+    "Événements en attente d'écriture par table"
+)
+ingestion_flush_histogram = runtime_metrics.histogram(
+    "metrics_ingestion_flush_seconds",
+    "Durée d'écriture d'un lot de métriques",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+# Colonnes écrites par table (ordre des tuples du tampon)
+TABLE_COLUMNS: Dict[str, Tuple[str, ...]] = {
+    "model_predictions": (
+        "model_name", "model_version", "provider", "endpoint", "request_id",
+        "prediction", "confidence", "severity", "latency_ms", "fallback_used",
+        "input_length", "batch_size", "created_at"
+    ),
+    "model_errors": (
+        "model_name", "provider", "error_type", "error_message",
+        "endpoint", "request_id", "input_length", "stack_trace", "created_at"
+    ),
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def prediction_record(metric: PredictionMetric) -> tuple:
+    """Ligne model_predictions d'une prédiction"""
+    return (
+        metric.model_name, metric.model_version, metric.provider, metric.endpoint,
+        metric.request_id, metric.prediction, metric.confidence, metric.severity,
+        metric.latency_ms, metric.fallback_used, metric.input_length,
+        metric.batch_size, metric.created_at or _now()
+    )
+
+
+def error_record(metric: ErrorMetric) -> tuple:
+    """Ligne model_errors d'une erreur"""
+    return (
+        metric.model_name, metric.provider, metric.error_type, metric.error_message,
+        metric.endpoint, metric.request_id, metric.input_length, metric.stack_trace,
+        metric.created_at or _now()
+    )
+
+
+class MetricsIngestion:
+    """
+    Tampons bornés + tâche de vidage par lots.
+
+    Usage:
+        await metrics_ingestion.start()       # au démarrage
+        metrics_ingestion.enqueue_prediction(metric)
+        await metrics_ingestion.stop()        # à l'arrêt (vide les tampons)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers: Dict[str, Deque[tuple]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._wake_pending = False
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._persist = True
+
+    def _buffer(self, table: str) -> Deque[tuple]:
+        buffer = self._buffers.get(table)
+        if buffer is None or buffer.maxlen != settings.METRICS_BUFFER_SIZE:
+            buffer = deque(buffer or (), maxlen=settings.METRICS_BUFFER_SIZE)
+            self._buffers[table] = buffer
+        return buffer
+
+    # ------------------------------------------------------------------
+    # Enregistrement (non bloquant)
+    # ------------------------------------------------------------------
+
+    def enqueue(self, table: str, record: tuple) -> None:
+        """Ajoute une ligne au tampon de la table (abandonne la plus ancienne si plein)"""
+        if not self._persist:
+            return
+        with self._lock:
+            buffer = self._buffer(table)
+            dropped = len(buffer) == buffer.maxlen
+            buffer.append(record)
+            depth = len(buffer)
+            wake = depth >= settings.METRICS_BATCH_SIZE and not self._wake_pending
+            if wake:
+                self._wake_pending = True
+        ingestion_events_counter.inc(table=table, outcome="queued")
+        if dropped:
+            ingestion_events_counter.inc(table=table, outcome="dropped")
+        ingestion_buffer_gauge.set(depth, table=table)
+        if wake:
+            self._signal()
+
+    def enqueue_prediction(self, metric: PredictionMetric) -> None:
+        error_rate_monitor.record(metric.model_name, metric.provider)
+        observe_prediction(metric)
+        self.enqueue("model_predictions", prediction_record(metric))
+
+    def enqueue_error(self, metric: ErrorMetric) -> None:
+        error_rate_monitor.record(metric.model_name, metric.provider, error=True)
+        observe_error(metric)
+        self.enqueue("model_errors", error_record(metric))
+
+    def _signal(self) -> None:
+        """Réveille la tâche de vidage (depuis n'importe quel thread)"""
+        loop, wakeup = self._loop, self._wakeup
+        if loop is None or wakeup is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(wakeup.set)
+        except RuntimeError:
+            pass  # Boucle en cours d'arrêt
+
+    def _drain(self, table: str) -> List[tuple]:
+        with self._lock:
+            buffer = self._buffer(table)
+            batch = [buffer.popleft() for _ in range(min(len(buffer), settings.METRICS_BATCH_SIZE))]
+            depth = len(buffer)
+        ingestion_buffer_gauge.set(depth, table=table)
+        return batch
+
+    # ------------------------------------------------------------------
+    # Écriture
+    # ------------------------------------------------------------------
+
+    async def _write(self, table: str, records: List[tuple]) -> None:
+        """Lignes brutes et rollups par minute du lot, dans une même transaction"""
+        columns = TABLE_COLUMNS[table]
+        async with db.acquire() as conn:
+            async with conn.transaction():
+                await self._write_records(conn, table, columns, records)
+                await write_rollups(conn, build_rollups(table, columns, records))
+
+    @staticmethod
+    async def _write_records(conn, table: str, columns: Tuple[str, ...], records: List[tuple]) -> None:
+        if settings.METRICS_WRITE_METHOD.lower() == "copy":
+            try:
+                # Savepoint: un COPY en échec n'annule pas la transaction du lot
+                async with conn.transaction():
+                    await conn.copy_records_to_table(table, records=records, columns=list(columns))
+                return
+            except Exception as e:
+                # COPY indisponible (proxy de connexions, droits): INSERT multi-lignes
+                logger.warning(f"⚠️  COPY {table} en échec, repli sur executemany: {e}")
+        placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+        await conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            records
+        )
+
+    async def flush(self) -> int:
+        """Écrit tous les événements en attente; retourne le nombre de lignes écrites"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        written = 0
+        async with self._flush_lock:
+            for table, columns in TABLE_COLUMNS.items():
+                provider = columns.index("provider")
+                alerts = set()
+                while True:
+                    batch = self._drain(table)
+                    if not batch:
+                        break
+                    start = asyncio.get_running_loop().time()
+                    try:
+                        await self._write(table, batch)
+                    except Exception as e:
+                        ingestion_events_counter.inc(len(batch), table=table, outcome="failed")
+                        logger.error(f"✗ Écriture de {len(batch)} ligne(s) {table} impossible: {e}")
+                        break
+                    ingestion_flush_histogram.observe(asyncio.get_running_loop().time() - start)
+                    ingestion_events_counter.inc(len(batch), table=table, outcome="flushed")
+                    written += len(batch)
+                    alerts.update((record[0], record[provider]) for record in batch)
+                if alerts:
+                    await self._check_alerts(alerts)
+        if written:
+            logger.debug(f"Métriques écrites: {written} ligne(s)")
+        return written
+
+    @staticmethod
+    async def _check_alerts(models) -> None:
+        """Taux d'erreur (en mémoire) vérifié une fois par (modèle, provider) du lot"""
+        from app.core.metrics.metrics_service import MetricsService
+        service = MetricsService()
+        for model_name, provider in models:
+            await service._check_error_rate_alert(model_name, provider)
+
+    # ------------------------------------------------------------------
+    # Cycle de vie
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.METRICS_FLUSH_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            with self._lock:
+                self._wake_pending = False
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"✗ Vidage des métriques en échec: {e}")
+
+    def disable_persistence(self) -> None:
+        """Base indisponible: plus de mise en tampon ni d'écriture (métriques en mémoire conservées)"""
+        self._persist = False
+        with self._lock:
+            self._buffers.clear()
+        logger.warning("⚠️  Métriques non persistées: seules les métriques en mémoire sont disponibles")
+
+    async def start(self) -> None:
+        """Démarre la tâche de vidage sur la boucle courante"""
+        self._persist = True
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"✓ Ingestion des métriques par lots ({settings.METRICS_BATCH_SIZE} lignes "
+            f"ou {settings.METRICS_FLUSH_INTERVAL_S}s, tampon {settings.METRICS_BUFFER_SIZE})"
+        )
+        if self.pending():
+            self._signal()
+
+    async def stop(self) -> None:
+        """Arrête la tâche de vidage puis écrit les événements restants"""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        written = await self.flush()
+        self._loop = self._wakeup = None
+        if written:
+            logger.info(f"✓ {written} métrique(s) écrite(s) à l'arrêt")
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(len(buffer) for buffer in self._buffers.values())
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            depth = {table: len(buffer) for table, buffer in self._buffers.items()}
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "persist": self._persist,
+            "batch_size": settings.METRICS_BATCH_SIZE,
+            "flush_interval_s": settings.METRICS_FLUSH_INTERVAL_S,
+            "buffer_size": settings.METRICS_BUFFER_SIZE,
+            "pending": depth,
+            "events": {
+                table: {
+                    outcome: ingestion_events_counter.get(table=table, outcome=outcome)
+                    for outcome in ("queued", "flushed", "dropped", "failed")
+                }
+                for table in TABLE_COLUMNS
+            }
+        }
+
+
+# Instance globale
+metrics_ingestion = MetricsIngestion()
@@ -3,7 +3,6 @@ Décorateur et helpers pour l'enregistrement automatique des métriques
 """
 import time
 import traceback
-import asyncio
 from functools import wraps
 from typing import Callable, Optional
 from app.config import settings
@@ -25,45 +24,32 @@ def record_prediction_metric(
     request_id: Optional[str] = None
 ):
     """
-    Enregistre une métrique de prédiction de manière asynchrone.
+    Enregistre une métrique de prédiction sans bloquer.
     
-    Cette fonction peut être appelée depuis du code synchrone.
+    Cette fonction peut être appelée depuis du code synchrone (ou un thread
+    d'inférence): la métrique rejoint le tampon d'ingestion, écrit par lots.
     """
     if not settings.ENABLE_METRICS:
         return
     
-    async def _record():
-        try:
-            from app.core.metrics import MetricsService, PredictionMetric
-            
-            metric = PredictionMetric(
-                model_name=model_name,
-                provider=provider,
-                endpoint=endpoint,
-                prediction=prediction,
-                confidence=confidence,
-                severity=severity,
-                latency_ms=latency_ms,
-                fallback_used=fallback_used,
-                input_length=input_length,
-                request_id=request_id
-            )
-            
-            service = MetricsService()
-            await service.record_prediction(metric)
-        except Exception as e:
-            logger.debug(f"Erreur enregistrement métrique (non bloquant): {e}")
-    
-    # Exécuter de manière asynchrone sans bloquer
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            asyncio.create_task(_record())
-        else:
-            loop.run_until_complete(_record())
-    except RuntimeError:
-        # Pas de boucle d'événements, ignorer silencieusement
-        pass
+        from app.core.metrics import PredictionMetric
+        from app.core.metrics.ingestion import metrics_ingestion
+        
+        metrics_ingestion.enqueue_prediction(PredictionMetric(
+            model_name=model_name,
+            provider=provider,
+            endpoint=endpoint,
+            prediction=prediction,
+            confidence=confidence,
+            severity=severity,
+            latency_ms=latency_ms,
+            fallback_used=fallback_used,
+            input_length=input_length,
+            request_id=request_id
+        ))
+    except Exception as e:
+        logger.debug(f"Erreur enregistrement métrique (non bloquant): {e}")
 
 
 def record_error_metric(
@@ -76,39 +62,27 @@ def record_error_metric(
     request_id: Optional[str] = None
 ):
     """
-    Enregistre une métrique d'erreur de manière asynchrone.
+    Enregistre une métrique d'erreur sans bloquer (tampon d'ingestion).
     """
     if not settings.ENABLE_METRICS:
         return
     
-    async def _record():
-        try:
-            from app.core.metrics import MetricsService, ErrorMetric
-            
-            metric = ErrorMetric(
-                model_name=model_name,
-                provider=provider,
-                error_type=error_type,
-                error_message=error_message,
-                endpoint=endpoint,
-                input_length=input_length,
-                request_id=request_id,
-                stack_trace=traceback.format_exc() if error_message else None
-            )
-            
-            service = MetricsService()
-            await service.record_error(metric)
-        except Exception as e:
-            logger.debug(f"Erreur enregistrement erreur (non bloquant): {e}")
-    
     try:
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            asyncio.create_task(_record())
-        else:
-            loop.run_until_complete(_record())
-    except RuntimeError:
-        pass
+        from app.core.metrics import ErrorMetric
+        from app.core.metrics.ingestion import metrics_ingestion
+        
+        metrics_ingestion.enqueue_error(ErrorMetric(
+            model_name=model_name,
+            provider=provider,
+            error_type=error_type,
+            error_message=error_message,
+            endpoint=endpoint,
+            input_length=input_length,
+            request_id=request_id,
+            stack_trace=traceback.format_exc() if error_message else None
+        ))
+    except Exception as e:
+        logger.debug(f"Erreur enregistrement erreur (non bloquant): {e}")
 
 
 async def record_prediction_async(
@@ -6,6 +6,10 @@ from typing import Optional, List, Dict, Any
 from uuid import UUID
 import json
 from app.core.metrics.database import db
+from app.core.metrics.error_rate import error_rate_monitor
+from app.core.metrics.partitions import window_start
+from app.core.metrics.rollups import ROLLUP_WINDOW_QUERY, summarize_window
+from app.core.metrics.ingestion import metrics_ingestion
 from app.core.metrics.metrics_models import (
     PredictionMetric,
     ErrorMetric,
@@ -38,54 +42,22 @@ class MetricsService:
     # =========================================================================
     
     async def record_prediction(self, metric: PredictionMetric) -> None:
-        """Enregistre une prédiction dans la base de données"""
+        """Ajoute une prédiction au tampon d'ingestion (écrite par lots)"""
         try:
-            await db.execute("""
-                INSERT INTO model_predictions (
-                    model_name, model_version, provider, endpoint, request_id,
-                    prediction, confidence, severity, latency_ms, fallback_used,
-                    input_length, batch_size
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12)
-            """,
-                metric.model_name,
-                metric.model_version,
-                metric.provider,
-                metric.endpoint,
-                metric.request_id,
-                metric.prediction,
-                metric.confidence,
-                metric.severity,
-                metric.latency_ms,
-                metric.fallback_used,
-                metric.input_length,
-                metric.batch_size
-            )
-            logger.debug(f"Métrique enregistrée: {metric.model_name} - {metric.latency_ms}ms")
+            metrics_ingestion.enqueue_prediction(metric)
+            logger.debug(f"Métrique en attente: {metric.model_name} - {metric.latency_ms}ms")
         except Exception as e:
             logger.error(f"Erreur enregistrement métrique: {e}")
     
     async def record_error(self, metric: ErrorMetric) -> None:
-        """Enregistre une erreur dans la base de données"""
+        """
+        Ajoute une erreur au tampon d'ingestion (écrite par lots).
+        
+        Le taux d'erreur est vérifié après l'écriture du lot.
+        """
         try:
-            await db.execute("""
-                INSERT INTO model_errors (
-                    model_name, provider, error_type, error_message,
-                    endpoint, request_id, input_length, stack_trace
-                ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            """,
-                metric.model_name,
-                metric.provider,
-                metric.error_type,
-                metric.error_message,
-                metric.endpoint,
-                metric.request_id,
-                metric.input_length,
-                metric.stack_trace
-            )
+            metrics_ingestion.enqueue_error(metric)
             logger.warning(f"Erreur enregistrée: {metric.model_name} - {metric.error_type}")
-            
-            # Vérifier si une alerte doit être créée
-            await self._check_error_rate_alert(metric.model_name, metric.provider)
         except Exception as e:
             logger.error(f"Erreur enregistrement erreur: {e}")
     
@@ -131,78 +103,56 @@ class MetricsService:
     # RÉCUPÉRATION DES MÉTRIQUES
     # =========================================================================
     
+    async def _window_rollups(self, hours: int, model_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Agrégats par (modèle, provider) de la fenêtre, fusionnés depuis les rollups par minute"""
+        since = window_start(hours).replace(second=0, microsecond=0)
+        if model_name:
+            query = ROLLUP_WINDOW_QUERY + " AND model_name = $2 GROUP BY model_name, provider"
+            rows = await db.fetch(query, since, model_name)
+        else:
+            rows = await db.fetch(ROLLUP_WINDOW_QUERY + " GROUP BY model_name, provider", since)
+        return [summarize_window(row) for row in rows]
+    
+    @staticmethod
+    def _model_stats(windows: List[Dict[str, Any]], hours: int) -> List[ModelStats]:
+        """ModelStats des modèles ayant au moins une prédiction sur la fenêtre"""
+        stats = []
+        for row in windows:
+            total = row['total_requests']
+            if total == 0:
+                continue
+            fallback = row['fallback_count']
+            error_count = row['error_count']
+            
+            stats.append(ModelStats(
+                model_name=row['model_name'],
+                provider=row['provider'],
+                total_requests=total,
+                avg_latency_ms=row['avg_latency_ms'] or 0,
+                p50_latency_ms=row['p50_latency_ms'],
+                p95_latency_ms=row['p95_latency_ms'],
+                p99_latency_ms=row['p99_latency_ms'],
+                min_latency_ms=row['min_latency_ms'],
+                max_latency_ms=row['max_latency_ms'],
+                avg_confidence=row['avg_confidence'],
+                fallback_count=fallback,
+                fallback_rate=fallback / total * 100,
+                error_count=error_count,
+                error_rate=error_count / total * 100,
+                depression_count=row['depression_count'],
+                normal_count=row['normal_count'],
+                period=f"{hours}h"
+            ))
+        return stats
+    
     async def get_model_stats(
         self, 
         model_name: Optional[str] = None,
         hours: int = 24
     ) -> List[ModelStats]:
-        """Récupère les statistiques des modèles"""
+        """Récupère les statistiques des modèles (depuis les rollups par minute)"""
         try:
-            query = """
-                SELECT 
-                    model_name,
-                    provider,
-                    COUNT(*) as total_requests,
-                    AVG(latency_ms) as avg_latency_ms,
-                    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY latency_ms) as p50_latency_ms,
-                    PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms) as p95_latency_ms,
-                    PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY latency_ms) as p99_latency_ms,
-                    MIN(latency_ms) as min_latency_ms,
-                    MAX(latency_ms) as max_latency_ms,
-                    AVG(confidence) as avg_confidence,
-                    SUM(CASE WHEN fallback_used THEN 1 ELSE 0 END) as fallback_count,
-                    SUM(CASE WHEN prediction = 'DÉPRESSION' THEN 1 ELSE 0 END) as depression_count,
-                    SUM(CASE WHEN prediction = 'NORMAL' THEN 1 ELSE 0 END) as normal_count
-                FROM model_predictions
-                WHERE created_at > NOW() - INTERVAL '%s hours'
-            """
-            
-            if model_name:
-                query += " AND model_name = $1"
-                query += " GROUP BY model_name, provider"
-                rows = await db.fetch(query % hours, model_name)
-            else:
-                query += " GROUP BY model_name, provider"
-                rows = await db.fetch(query % hours)
-            
-            stats = []
-            for row in rows:
-                total = row['total_requests']
-                fallback = row['fallback_count'] or 0
-                
-                # Récupérer le nombre d'erreurs
-                error_query = """
-                    SELECT COUNT(*) FROM model_errors
-                    WHERE model_name = $1 AND provider = $2
-                    AND created_at > NOW() - INTERVAL '%s hours'
-                """
-                error_count = await db.fetchval(
-                    error_query % hours, 
-                    row['model_name'], 
-                    row['provider']
-                ) or 0
-                
-                stats.append(ModelStats(
-                    model_name=row['model_name'],
-                    provider=row['provider'],
-                    total_requests=total,
-                    avg_latency_ms=float(row['avg_latency_ms'] or 0),
-                    p50_latency_ms=float(row['p50_latency_ms']) if row['p50_latency_ms'] else None,
-                    p95_latency_ms=float(row['p95_latency_ms']) if row['p95_latency_ms'] else None,
-                    p99_latency_ms=float(row['p99_latency_ms']) if row['p99_latency_ms'] else None,
-                    min_latency_ms=float(row['min_latency_ms']) if row['min_latency_ms'] else None,
-                    max_latency_ms=float(row['max_latency_ms']) if row['max_latency_ms'] else None,
-                    avg_confidence=float(row['avg_confidence']) if row['avg_confidence'] else None,
-                    fallback_count=fallback,
-                    fallback_rate=(fallback / total * 100) if total > 0 else 0,
-                    error_count=error_count,
-                    error_rate=(error_count / total * 100) if total > 0 else 0,
-                    depression_count=row['depression_count'] or 0,
-                    normal_count=row['normal_count'] or 0,
-                    period=f"{hours}h"
-                ))
-            
-            return stats
+            return self._model_stats(await self._window_rollups(hours, model_name), hours)
         except Exception as e:
             logger.error(f"Erreur récupération stats: {e}")
             return []
@@ -212,28 +162,12 @@ class MetricsService:
         model_name: str,
         hours: int = 24
     ) -> Optional[LatencyPercentiles]:
-        """Récupère les percentiles de latence pour un modèle"""
+        """Récupère les percentiles de latence pour un modèle (depuis les rollups par minute)"""
         try:
-            row = await db.fetchrow("""
-                SELECT 
-                    model_name,
-                    provider,
-                    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY latency_ms) as p50_ms,
-                    PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms) as p95_ms,
-                    PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY latency_ms) as p99_ms,
-                    AVG(latency_ms) as avg_ms,
-                    MIN(latency_ms) as min_ms,
-                    MAX(latency_ms) as max_ms,
-                    COUNT(*) as total_requests,
-                    SUM(CASE WHEN fallback_used THEN 1 ELSE 0 END) as fallback_count
-                FROM model_predictions
-                WHERE model_name = $1
-                AND created_at > NOW() - INTERVAL '%s hours'
-                GROUP BY model_name, provider
-            """ % hours, model_name)
-            
-            if not row:
+            rows = [row for row in await self._window_rollups(hours, model_name) if row['total_requests']]
+            if not rows:
                 return None
+            row = rows[0]
             
             now = datetime.utcnow()
             return LatencyPercentiles(
@@ -241,14 +175,15 @@ class MetricsService:
                 provider=row['provider'],
                 period_start=now - timedelta(hours=hours),
                 period_end=now,
-                p50_ms=float(row['p50_ms']) if row['p50_ms'] else None,
-                p95_ms=float(row['p95_ms']) if row['p95_ms'] else None,
-                p99_ms=float(row['p99_ms']) if row['p99_ms'] else None,
-                avg_ms=float(row['avg_ms']) if row['avg_ms'] else None,
-                min_ms=float(row['min_ms']) if row['min_ms'] else None,
-                max_ms=float(row['max_ms']) if row['max_ms'] else None,
+                p50_ms=row['p50_latency_ms'],
+                p95_ms=row['p95_latency_ms'],
+                p99_ms=row['p99_latency_ms'],
+                avg_ms=row['avg_latency_ms'],
+                min_ms=row['min_latency_ms'],
+                max_ms=row['max_latency_ms'],
                 total_requests=row['total_requests'],
-                fallback_count=row['fallback_count'] or 0
+                error_count=row['error_count'],
+                fallback_count=row['fallback_count']
             )
         except Exception as e:
             logger.error(f"Erreur récupération percentiles: {e}")
@@ -257,23 +192,26 @@ class MetricsService:
     async def get_recent_errors(
         self,
         model_name: Optional[str] = None,
-        limit: int = 50
+        limit: int = 50,
+        hours: int = 24
     ) -> List[Dict[str, Any]]:
-        """Récupère les erreurs récentes"""
+        """Récupère les erreurs récentes (sur les `hours` dernières heures)"""
         try:
+            since = window_start(hours)
             if model_name:
                 rows = await db.fetch("""
                     SELECT * FROM model_errors
-                    WHERE model_name = $1
+                    WHERE model_name = $1 AND created_at >= $2
                     ORDER BY created_at DESC
-                    LIMIT $2
-                """, model_name, limit)
+                    LIMIT $3
+                """, model_name, since, limit)
             else:
                 rows = await db.fetch("""
                     SELECT * FROM model_errors
+                    WHERE created_at >= $1
                     ORDER BY created_at DESC
-                    LIMIT $1
-                """, limit)
+                    LIMIT $2
+                """, since, limit)
             
             return [dict(row) for row in rows]
         except Exception as e:
@@ -285,25 +223,17 @@ class MetricsService:
         try:
             now = datetime.utcnow()
             
-            # Total prédictions
-            total_predictions = await db.fetchval("""
-                SELECT COUNT(*) FROM model_predictions
-                WHERE created_at > NOW() - INTERVAL '%s hours'
-            """ % hours) or 0
-            
-            # Total erreurs
-            total_errors = await db.fetchval("""
-                SELECT COUNT(*) FROM model_errors
-                WHERE created_at > NOW() - INTERVAL '%s hours'
-            """ % hours) or 0
+            # Totaux et stats par modèle: une seule lecture des rollups
+            windows = await self._window_rollups(hours)
+            total_predictions = sum(row['total_requests'] for row in windows)
+            total_errors = sum(row['error_count'] for row in windows)
             
             # Alertes actives
             active_alerts = await db.fetchval("""
                 SELECT COUNT(*) FROM alerts WHERE status = 'active'
             """) or 0
             
-            # Stats par modèle
-            models = await self.get_model_stats(hours=hours)
+            models = self._model_stats(windows, hours)
             
             return MetricsSummary(
                 total_predictions=total_predictions,
@@ -401,45 +331,68 @@ class MetricsService:
         self, 
         model_name: str, 
         provider: str,
-        threshold: float = 10.0
+        threshold: Optional[float] = None
     ) -> None:
-        """Vérifie si le taux d'erreur dépasse le seuil et crée une alerte"""
+        """
+        Crée ou résout l'alerte de taux d'erreur du modèle.
+        
+        Le taux est lu sur la fenêtre glissante en mémoire (O(1)): la base
+        n'est sollicitée qu'au premier passage de la clé (alerte encore
+        active, ex: avant un redémarrage) et lorsque l'alerte change d'état.
+        L'état en mémoire n'est mis à jour qu'après une écriture réussie.
+        """
         try:
-            # Compter les erreurs de la dernière heure
-            error_count = await db.fetchval("""
-                SELECT COUNT(*) FROM model_errors
-                WHERE model_name = $1 AND provider = $2
-                AND created_at > NOW() - INTERVAL '1 hour'
-            """, model_name, provider) or 0
+            if error_rate_monitor.needs_restore(model_name, provider):
+                severity = await db.fetchval("""
+                    SELECT severity FROM alerts
+                    WHERE model_name = $1 AND provider = $2
+                    AND alert_type = 'error_rate_high' AND status = 'active'
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                """, model_name, provider)
+                error_rate_monitor.restore(
+                    model_name, provider, AlertSeverity(severity) if severity else None
+                )
             
-            # Compter les requêtes de la dernière heure
-            request_count = await db.fetchval("""
-                SELECT COUNT(*) FROM model_predictions
-                WHERE model_name = $1 AND provider = $2
-                AND created_at > NOW() - INTERVAL '1 hour'
-            """, model_name, provider) or 0
+            transition = error_rate_monitor.evaluate(model_name, provider, threshold)
+            if transition is None:
+                return
             
-            if request_count > 0:
-                error_rate = (error_count / request_count) * 100
-                
-                if error_rate > threshold:
-                    # Vérifier si une alerte similaire existe déjà
-                    existing = await db.fetchval("""
-                        SELECT id FROM alerts
-                        WHERE model_name = $1 AND alert_type = 'error_rate_high'
-                        AND status = 'active'
-                    """, model_name)
-                    
-                    if not existing:
-                        await self.create_alert(Alert(
-                            alert_type="error_rate_high",
-                            severity=AlertSeverity.CRITICAL if error_rate > 20 else AlertSeverity.WARNING,
-                            model_name=model_name,
-                            provider=provider,
-                            message=f"Taux d'erreur élevé: {error_rate:.1f}% (seuil: {threshold}%)",
-                            threshold_value=threshold,
-                            actual_value=error_rate
-                        ))
+            if transition.action == "resolve":
+                await db.execute("""
+                    UPDATE alerts
+                    SET status = 'resolved', resolved_at = NOW()
+                    WHERE model_name = $1 AND provider = $2
+                    AND alert_type = 'error_rate_high' AND status = 'active'
+                """, model_name, provider)
+                error_rate_monitor.apply(model_name, provider, transition)
+                logger.info(
+                    f"✓ Alerte taux d'erreur résolue: {model_name} ({transition.error_rate:.1f}%)"
+                )
+                return
+            
+            # Alerte déjà créée par un autre worker
+            existing = await db.fetchval("""
+                SELECT id FROM alerts
+                WHERE model_name = $1 AND alert_type = 'error_rate_high'
+                AND status = 'active'
+            """, model_name)
+            
+            if not existing:
+                existing = await self.create_alert(Alert(
+                    alert_type="error_rate_high",
+                    severity=transition.severity,
+                    model_name=model_name,
+                    provider=provider,
+                    message=(
+                        f"Taux d'erreur élevé: {transition.error_rate:.1f}% "
+                        f"(seuil: {transition.threshold}%)"
+                    ),
+                    threshold_value=transition.threshold,
+                    actual_value=transition.error_rate
+                ))
+            if existing:  # create_alert retourne None en cas d'échec: nouvel essai au prochain lot
+                error_rate_monitor.apply(model_name, provider, transition)
         except Exception as e:
             logger.error(f"Erreur vérification taux d'erreur: {e}")
 
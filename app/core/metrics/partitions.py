@@ -0,0 +1,210 @@
+"""
+Partitions temporelles et rétention des tables de métriques
+
+Les tables brutes (model_predictions, model_errors, model_health_checks,
+throughput_metrics) sont partitionnées par plage sur leur horodatage, par jour
+ou par heure (METRICS_PARTITION_INTERVAL); les rollups par minute par jour.
+La maintenance (au démarrage puis toutes les
+METRICS_PARTITION_MAINTENANCE_INTERVAL_S secondes):
+
+- crée les METRICS_PARTITIONS_AHEAD prochaines partitions à l'avance; les
+  lignes déjà tombées dans la partition DEFAULT pour la période sont
+  déplacées dans la nouvelle partition avant son rattachement
+- supprime (drop) ou détache vers le schéma metrics_archive (archive) les
+  partitions entièrement plus anciennes que la rétention
+
+Un verrou consultatif PostgreSQL évite que plusieurs replicas fassent la
+maintenance en même temps. Les tables créées avant le partitionnement (non
+partitionnées) sont ignorées avec un avertissement.
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.core.metrics.database import db
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ARCHIVE_SCHEMA = "metrics_archive"
+_LOCK_KEY = "etsia_metrics_partitions"
+
+# Table -> (colonne de partitionnement, réglage de rétention, intervalle imposé)
+PARTITIONED_TABLES: Dict[str, Tuple[str, str, Optional[str]]] = {
+    "model_predictions": ("created_at", "METRICS_RETENTION_DAYS", None),
+    "model_errors": ("created_at", "METRICS_RETENTION_DAYS", None),
+    "model_health_checks": ("checked_at", "METRICS_RETENTION_DAYS", None),
+    "throughput_metrics": ("recorded_at", "METRICS_RETENTION_DAYS", None),
+    "metrics_rollup_minute": ("bucket_start", "METRICS_ROLLUP_RETENTION_DAYS", "day"),
+}
+
+_SUFFIX = re.compile(r"_p(\d{8}|\d{10})$")
+
+
+def _interval(forced: Optional[str] = None) -> timedelta:
+    name = (forced or settings.METRICS_PARTITION_INTERVAL).lower()
+    return timedelta(hours=1) if name == "hour" else timedelta(days=1)
+
+
+def period_start(moment: datetime, step: timedelta) -> datetime:
+    """Début (UTC) de la partition contenant `moment`"""
+    moment = moment.astimezone(timezone.utc)
+    if step < timedelta(days=1):
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def partition_name(table: str, start: datetime, step: timedelta) -> str:
+    return f"{table}_p{start:%Y%m%d%H}" if step < timedelta(days=1) else f"{table}_p{start:%Y%m%d}"
+
+
+def partition_range(name: str) -> Optional[Tuple[datetime, datetime]]:
+    """Bornes d'une partition d'après son nom (None: DEFAULT ou nom inconnu)"""
+    match = _SUFFIX.search(name)
+    if match is None:
+        return None
+    suffix = match.group(1)
+    if len(suffix) == 10:
+        start = datetime.strptime(suffix, "%Y%m%d%H").replace(tzinfo=timezone.utc)
+        return start, start + timedelta(hours=1)
+    start = datetime.strptime(suffix, "%Y%m%d").replace(tzinfo=timezone.utc)
+    return start, start + timedelta(days=1)
+
+
+def window_start(hours: float) -> datetime:
+    """
+    Borne basse d'une fenêtre glissante, passée en paramètre des requêtes:
+    une constante (et non NOW() - INTERVAL) permet l'élagage des partitions
+    dès la planification.
+    """
+    return datetime.now(timezone.utc) - timedelta(hours=hours)
+
+
+class PartitionManager:
+    """
+    Création anticipée et expiration des partitions.
+
+    Usage:
+        await partition_manager.run_maintenance()
+        task = asyncio.create_task(partition_manager.run_maintenance_loop())
+    """
+
+    async def _is_partitioned(self, conn, table: str) -> bool:
+        return bool(await conn.fetchval("""
+            SELECT EXISTS (
+                SELECT 1 FROM pg_partitioned_table pt
+                JOIN pg_class c ON c.oid = pt.partrelid
+                WHERE c.relname = $1
+            )
+        """, table))
+
+    async def _partitions(self, conn, table: str) -> List[str]:
+        rows = await conn.fetch("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = $1
+        """, table)
+        return [row["relname"] for row in rows]
+
+    async def _create(self, conn, table: str, column: str, name: str, start: datetime, end: datetime) -> None:
+        """Crée la partition, y déplace les lignes de la DEFAULT, puis la rattache"""
+        async with conn.transaction():
+            await conn.execute(
+                f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+            await conn.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {table}_default
+                    WHERE {column} >= $1 AND {column} < $2
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, start, end)
+            await conn.execute(
+                f"ALTER TABLE {table} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+
+    async def _expire(self, conn, table: str, name: str) -> None:
+        if settings.METRICS_RETENTION_ACTION.lower() == "archive":
+            await conn.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+            await conn.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+            await conn.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+        else:
+            await conn.execute(f"DROP TABLE {name}")
+
+    async def maintain_table(self, conn, table: str, now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """Partitions créées et expirées pour une table"""
+        column, retention_setting, forced = PARTITIONED_TABLES[table]
+        step = _interval(forced)
+        now = now or datetime.now(timezone.utc)
+        result: Dict[str, List[str]] = {"created": [], "expired": []}
+
+        if not await self._is_partitioned(conn, table):
+            logger.warning(f"⚠️  {table} n'est pas partitionnée (schéma antérieur), maintenance ignorée")
+            return result
+
+        existing = set(await self._partitions(conn, table))
+        start = period_start(now, step)
+        for _ in range(settings.METRICS_PARTITIONS_AHEAD + 1):
+            name = partition_name(table, start, step)
+            if name not in existing:
+                try:
+                    await self._create(conn, table, column, name, start, start + step)
+                    result["created"].append(name)
+                except Exception as e:
+                    # Ex: chevauchement avec une partition d'un autre intervalle
+                    logger.warning(f"⚠️  Partition {name} non créée: {e}")
+            start += step
+
+        retention_days = getattr(settings, retention_setting)
+        if retention_days > 0:
+            cutoff = now - timedelta(days=retention_days)
+            for name in sorted(existing):
+                bounds = partition_range(name)
+                if bounds is not None and bounds[1] <= cutoff:
+                    await self._expire(conn, table, name)
+                    result["expired"].append(name)
+            if settings.METRICS_RETENTION_ACTION.lower() != "archive":
+                await conn.execute(f"DELETE FROM {table}_default WHERE {column} < $1", cutoff)
+        return result
+
+    async def run_maintenance(self, now: Optional[datetime] = None) -> Dict[str, Dict[str, List[str]]]:
+        """Maintenance de toutes les tables (une seule instance à la fois)"""
+        results: Dict[str, Dict[str, List[str]]] = {}
+        async with db.acquire() as conn:
+            if not await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1))", _LOCK_KEY):
+                logger.debug("Maintenance des partitions déjà en cours sur un autre replica")
+                return results
+            try:
+                for table in PARTITIONED_TABLES:
+                    try:
+                        results[table] = await self.maintain_table(conn, table, now)
+                    except Exception as e:
+                        logger.error(f"✗ Maintenance des partitions de {table} en échec: {e}")
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1))", _LOCK_KEY)
+
+        created = sum(len(r["created"]) for r in results.values())
+        expired = sum(len(r["expired"]) for r in results.values())
+        if created or expired:
+            logger.info(
+                f"✓ Partitions de métriques: {created} créée(s), {expired} expirée(s) "
+                f"({settings.METRICS_RETENTION_ACTION})"
+            )
+        return results
+
+    async def run_maintenance_loop(self) -> None:
+        """Tâche de fond: maintenance périodique (erreurs journalisées, puis nouvel essai)"""
+        while True:
+            await asyncio.sleep(settings.METRICS_PARTITION_MAINTENANCE_INTERVAL_S)
+            try:
+                await self.run_maintenance()
+            except Exception as e:
+                logger.error(f"✗ Maintenance des partitions en échec: {e}")
+
+
+# Instance globale
+partition_manager = PartitionManager()
@@ -0,0 +1,334 @@
+"""
+Exposition Prometheus des métriques runtime (sans accès base)
+
+- `PrometheusMiddleware`: requêtes HTTP par méthode, route (gabarit, ex:
+  /api/v1/models/{model_name}) et statut, durée et requêtes en cours
+- `observe_prediction` / `observe_error`: prédictions et erreurs par modèle,
+  provider et endpoint (appelées par l'ingestion des métriques)
+- `render_prometheus()`: format texte 0.0.4 de toutes les métriques du
+  registre runtime_metrics (compteurs, jauges, histogrammes à buckets
+  configurables via PROMETHEUS_LATENCY_BUCKETS)
+
+Multi-process (uvicorn --workers N): si METRICS_MULTIPROC_DIR est défini,
+chaque worker y écrit l'état de ses métriques (metrics_<pid>.json, toutes les
+METRICS_MULTIPROC_SYNC_S secondes et à l'arrêt). Le worker qui répond au
+scrape fusionne les fichiers: compteurs et histogrammes sont additionnés
+(y compris ceux des workers redémarrés), les jauges des workers vivants sont
+agrégées selon leur `multiprocess_mode` (sum, max, all). Au démarrage, le
+premier worker d'un nouveau lancement du serveur (identifié par le process
+maître) vide les fichiers du lancement précédent (`reset_multiprocess_dir`):
+sans cela, les compteurs d'avant le redémarrage seraient additionnés
+indéfiniment et un PID réutilisé ferait passer d'anciennes jauges pour vivantes.
+"""
+import asyncio
+import glob
+import json
+import math
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.config import settings
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRIC_PREFIX = "etsia_"
+
+
+def latency_buckets() -> Tuple[float, ...]:
+    """Bornes des histogrammes de latence (secondes) depuis la configuration"""
+    buckets = []
+    for item in settings.PROMETHEUS_LATENCY_BUCKETS.split(","):
+        try:
+            buckets.append(float(item))
+        except ValueError:
+            continue
+    return tuple(sorted(set(buckets)))
+
+
+http_requests_counter = runtime_metrics.counter(
+    "http_requests",
+    "Requêtes HTTP par méthode, route et statut"
+)
+http_duration_histogram = runtime_metrics.histogram(
+    "http_request_duration_seconds",
+    "Durée des requêtes HTTP par méthode et route",
+    buckets=latency_buckets()
+)
+http_in_progress_gauge = runtime_metrics.gauge(
+    "http_requests_in_progress",
+    "Requêtes HTTP en cours par méthode"
+)
+predictions_counter = runtime_metrics.counter(
+    "model_predictions",
+    "Prédictions par modèle, provider et endpoint"
+)
+prediction_latency_histogram = runtime_metrics.histogram(
+    "model_prediction_latency_seconds",
+    "Latence des prédictions par modèle, provider et endpoint",
+    buckets=latency_buckets()
+)
+errors_counter = runtime_metrics.counter(
+    "model_errors",
+    "Erreurs par modèle, provider et type"
+)
+
+
+def observe_prediction(metric) -> None:
+    """Comptabilise une PredictionMetric (compteur + histogramme de latence)"""
+    labels = {"model": metric.model_name, "provider": metric.provider, "endpoint": metric.endpoint}
+    predictions_counter.inc(**labels, fallback=str(bool(metric.fallback_used)).lower())
+    prediction_latency_histogram.observe(metric.latency_ms / 1000, **labels)
+
+
+def observe_error(metric) -> None:
+    """Comptabilise une ErrorMetric"""
+    errors_counter.inc(model=metric.model_name, provider=metric.provider, error_type=metric.error_type)
+
+
+# ----------------------------------------------------------------------------
+# Middleware HTTP
+# ----------------------------------------------------------------------------
+
+class PrometheusMiddleware:
+    """
+    Middleware ASGI: compteur, durée et requêtes en cours par route.
+
+    La route est le gabarit FastAPI (scope["route"].path), pas le chemin brut:
+    la cardinalité des labels reste bornée. Les chemins sans route sont
+    regroupés sous "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "GET")
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_progress_gauge.inc(method=method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_progress_gauge.dec(method=method)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            http_requests_counter.inc(method=method, endpoint=endpoint, status=str(status_code))
+            http_duration_histogram.observe(time.perf_counter() - start, method=method, endpoint=endpoint)
+
+
+# ----------------------------------------------------------------------------
+# Multi-process
+# ----------------------------------------------------------------------------
+
+def multiprocess_enabled() -> bool:
+    return bool(settings.METRICS_MULTIPROC_DIR)
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(settings.METRICS_MULTIPROC_DIR, f"metrics_{pid}.json")
+
+
+def _process_start_time(pid: int) -> Optional[str]:
+    """Date de démarrage d'un process (ticks depuis le boot, Linux), None si illisible"""
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as f:
+            return f.read().rsplit(")", 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+
+def _server_run_id() -> str:
+    """
+    Identifiant du lancement courant du serveur, commun à tous ses workers:
+    PID et date de démarrage du process maître (ou de ce process s'il est
+    seul). La date distingue deux lancements qui réutilisent le même PID
+    (ex: PID 1 d'un conteneur redémarré).
+    """
+    for pid in (os.getppid(), os.getpid()):
+        start_time = _process_start_time(pid)
+        if start_time is not None:
+            return f"{pid}:{start_time}"
+    return str(os.getppid())
+
+
+def reset_multiprocess_dir() -> None:
+    """
+    Vide les snapshots d'un lancement précédent du serveur (appelé au
+    démarrage de chaque worker; seul le premier d'un lancement les supprime).
+    """
+    if not multiprocess_enabled():
+        return
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+    marker = os.path.join(settings.METRICS_MULTIPROC_DIR, "server_run")
+    run_id = _server_run_id()
+    try:
+        with open(marker, encoding="utf-8") as f:
+            if f.read().strip() == run_id:
+                return
+    except OSError:
+        pass
+
+    stale = glob.glob(os.path.join(settings.METRICS_MULTIPROC_DIR, "metrics_*.json*"))
+    for path in stale:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Déjà supprimé par un autre worker démarrant en même temps
+    with open(marker, "w", encoding="utf-8") as f:
+        f.write(run_id)
+    logger.info(f"✓ Métriques multi-process: {len(stale)} snapshot(s) du lancement précédent supprimé(s)")
+
+
+def write_worker_snapshot() -> None:
+    """Écrit l'état des métriques de ce worker (remplacement atomique)"""
+    if not multiprocess_enabled():
+        return
+    os.makedirs(settings.METRICS_MULTIPROC_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "metrics": runtime_metrics.snapshot()}, f)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def merge_snapshots(workers: Sequence[Tuple[int, bool, Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Fusionne les snapshots de plusieurs workers.
+
+    Args:
+        workers: (pid, vivant, snapshot runtime_metrics) par worker
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for pid, alive, snapshot in workers:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {
+                "type": metric["type"],
+                "description": metric.get("description", ""),
+                "series": {}
+            })
+            series = target["series"]
+            mode = metric.get("multiprocess_mode", "sum")
+            if metric["type"] == "gauge" and not alive:
+                continue  # Jauge d'un worker arrêté: valeur obsolète
+            for value in metric["values"]:
+                labels = dict(value["labels"])
+                if metric["type"] == "gauge" and mode == "all":
+                    labels["pid"] = str(pid)
+                key = _label_key(labels)
+                if metric["type"] == "histogram":
+                    current = series.setdefault(key, {"buckets": {}, "sum": 0.0, "count": 0})
+                    for bound, count in value["buckets"].items():
+                        current["buckets"][bound] = current["buckets"].get(bound, 0) + count
+                    current["sum"] += value["sum"]
+                    current["count"] += value["count"]
+                elif metric["type"] == "gauge" and mode == "max":
+                    series[key] = max(series.get(key, value["value"]), value["value"])
+                else:
+                    series[key] = series.get(key, 0.0) + value["value"]
+    return merged
+
+
+def _local_series() -> Dict[str, Any]:
+    return merge_snapshots([(os.getpid(), True, runtime_metrics.snapshot())])
+
+
+def collect() -> Dict[str, Any]:
+    """Métriques à exposer: ce process, ou tous les workers en multi-process"""
+    if not multiprocess_enabled():
+        return _local_series()
+    write_worker_snapshot()
+    workers = []
+    for path in glob.glob(os.path.join(settings.METRICS_MULTIPROC_DIR, "metrics_*.json")):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            pid = int(data["pid"])
+            workers.append((pid, _pid_alive(pid), data["metrics"]))
+        except (OSError, ValueError, KeyError) as e:
+            logger.debug(f"Snapshot de métriques ignoré ({path}): {e}")
+    return merge_snapshots(workers)
+
+
+async def run_multiprocess_sync() -> None:
+    """Tâche de fond: publie l'état de ce worker pour les scrapes des autres"""
+    while True:
+        try:
+            await asyncio.to_thread(write_worker_snapshot)
+        except Exception as e:
+            logger.warning(f"⚠️  Écriture du snapshot de métriques impossible: {e}")
+        await asyncio.sleep(settings.METRICS_MULTIPROC_SYNC_S)
+
+
+# ----------------------------------------------------------------------------
+# Format texte Prometheus
+# ----------------------------------------------------------------------------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Sequence[Tuple[str, str]], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    return repr(float(value))
+
+
+def render_prometheus(merged: Optional[Dict[str, Any]] = None) -> str:
+    """Métriques au format d'exposition texte Prometheus (0.0.4)"""
+    merged = collect() if merged is None else merged
+    lines: List[str] = []
+    for name in sorted(merged):
+        metric = merged[name]
+        full_name = METRIC_PREFIX + name
+        if metric["type"] == "counter" and not full_name.endswith("_total"):
+            full_name += "_total"
+        lines.append(f"# HELP {full_name} {_escape(metric['description'])}")
+        lines.append(f"# TYPE {full_name} {metric['type']}")
+        for key, value in sorted(metric["series"].items()):
+            if metric["type"] == "histogram":
+                bounds = sorted(value["buckets"], key=lambda b: float("inf") if b == "+Inf" else float(b))
+                for bound in bounds:
+                    le = "+Inf" if bound == "+Inf" else _format_value(float(bound))
+                    lines.append(f"{full_name}_bucket{_format_labels(key, ('le', le))} {value['buckets'][bound]}")
+                lines.append(f"{full_name}_sum{_format_labels(key)} {_format_value(value['sum'])}")
+                lines.append(f"{full_name}_count{_format_labels(key)} {value['count']}")
+            else:
+                lines.append(f"{full_name}{_format_labels(key)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
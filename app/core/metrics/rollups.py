@@ -0,0 +1,185 @@
+"""
+Rollups par minute des métriques (table metrics_rollup_minute)
+
+Chaque lot écrit par l'ingestion est aussi agrégé par (minute, modèle,
+provider, endpoint): compteurs, sommes, min/max et un DDSketch des
+latences. Les rollups sont fusionnés en base (ON CONFLICT ... DO UPDATE,
+sketches additionnés par merge_latency_sketch): plusieurs lots et plusieurs
+replicas peuvent contribuer à la même minute.
+
+Les API de lecture (stats, percentiles, résumé, Prometheus) agrègent ces
+rollups sur la fenêtre demandée au lieu de PERCENTILE_CONT sur les lignes
+brutes.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.core.metrics.sketch import DDSketch
+
+RollupKey = Tuple[datetime, str, str, str]
+
+ROLLUP_UPSERT = """
+    INSERT INTO metrics_rollup_minute (
+        bucket_start, model_name, provider, endpoint,
+        request_count, error_count, fallback_count,
+        depression_count, normal_count,
+        latency_sum_ms, latency_min_ms, latency_max_ms,
+        confidence_sum, confidence_count, latency_sketch
+    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15::jsonb)
+    ON CONFLICT (bucket_start, model_name, provider, endpoint) DO UPDATE SET
+        request_count = metrics_rollup_minute.request_count + EXCLUDED.request_count,
+        error_count = metrics_rollup_minute.error_count + EXCLUDED.error_count,
+        fallback_count = metrics_rollup_minute.fallback_count + EXCLUDED.fallback_count,
+        depression_count = metrics_rollup_minute.depression_count + EXCLUDED.depression_count,
+        normal_count = metrics_rollup_minute.normal_count + EXCLUDED.normal_count,
+        latency_sum_ms = metrics_rollup_minute.latency_sum_ms + EXCLUDED.latency_sum_ms,
+        latency_min_ms = LEAST(metrics_rollup_minute.latency_min_ms, EXCLUDED.latency_min_ms),
+        latency_max_ms = GREATEST(metrics_rollup_minute.latency_max_ms, EXCLUDED.latency_max_ms),
+        confidence_sum = metrics_rollup_minute.confidence_sum + EXCLUDED.confidence_sum,
+        confidence_count = metrics_rollup_minute.confidence_count + EXCLUDED.confidence_count,
+        latency_sketch = merge_latency_sketch(metrics_rollup_minute.latency_sketch, EXCLUDED.latency_sketch)
+"""
+
+# Agrégats d'une fenêtre par (modèle, provider); $1 = début de la fenêtre
+# arrondi à la minute (constante: élagage des partitions à la planification)
+ROLLUP_WINDOW_QUERY = """
+    SELECT
+        model_name,
+        provider,
+        SUM(request_count) AS total_requests,
+        SUM(error_count) AS error_count,
+        SUM(fallback_count) AS fallback_count,
+        SUM(depression_count) AS depression_count,
+        SUM(normal_count) AS normal_count,
+        SUM(latency_sum_ms) AS latency_sum_ms,
+        MIN(latency_min_ms) AS min_latency_ms,
+        MAX(latency_max_ms) AS max_latency_ms,
+        SUM(confidence_sum) AS confidence_sum,
+        SUM(confidence_count) AS confidence_count,
+        latency_sketch_agg(latency_sketch) AS latency_sketch
+    FROM metrics_rollup_minute
+    WHERE bucket_start >= $1
+"""
+
+
+class MinuteRollup:
+    """Agrégats d'une minute pour un (modèle, provider, endpoint)"""
+
+    __slots__ = (
+        "key", "request_count", "error_count", "fallback_count",
+        "depression_count", "normal_count", "latency_sum_ms",
+        "latency_min_ms", "latency_max_ms", "confidence_sum",
+        "confidence_count", "sketch"
+    )
+
+    def __init__(self, key: RollupKey):
+        self.key = key
+        self.request_count = self.error_count = self.fallback_count = 0
+        self.depression_count = self.normal_count = 0
+        self.latency_sum_ms = 0.0
+        self.latency_min_ms: Optional[float] = None
+        self.latency_max_ms: Optional[float] = None
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+        self.sketch = DDSketch()
+
+    def add_prediction(
+        self,
+        latency_ms: float,
+        confidence: Optional[float],
+        prediction: Optional[str],
+        fallback_used: bool
+    ) -> None:
+        latency_ms = float(latency_ms)
+        self.request_count += 1
+        self.latency_sum_ms += latency_ms
+        self.latency_min_ms = latency_ms if self.latency_min_ms is None else min(self.latency_min_ms, latency_ms)
+        self.latency_max_ms = latency_ms if self.latency_max_ms is None else max(self.latency_max_ms, latency_ms)
+        self.sketch.add(latency_ms)
+        if confidence is not None:
+            self.confidence_sum += float(confidence)
+            self.confidence_count += 1
+        if fallback_used:
+            self.fallback_count += 1
+        if prediction == "DÉPRESSION":
+            self.depression_count += 1
+        elif prediction == "NORMAL":
+            self.normal_count += 1
+
+    def as_record(self) -> tuple:
+        return (
+            *self.key,
+            self.request_count, self.error_count, self.fallback_count,
+            self.depression_count, self.normal_count,
+            self.latency_sum_ms, self.latency_min_ms, self.latency_max_ms,
+            self.confidence_sum, self.confidence_count, self.sketch.to_json()
+        )
+
+
+def _minute(created_at: datetime) -> datetime:
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.replace(second=0, microsecond=0)
+
+
+def build_rollups(table: str, columns: Sequence[str], records: List[tuple]) -> List[MinuteRollup]:
+    """Rollups par minute d'un lot de lignes model_predictions ou model_errors"""
+    index = {name: i for i, name in enumerate(columns)}
+    rollups: Dict[RollupKey, MinuteRollup] = {}
+    for record in records:
+        key = (
+            _minute(record[index["created_at"]]),
+            record[index["model_name"]],
+            record[index["provider"]],
+            record[index["endpoint"]] or ""
+        )
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = MinuteRollup(key)
+        if table == "model_errors":
+            rollup.error_count += 1
+        else:
+            rollup.add_prediction(
+                record[index["latency_ms"]],
+                record[index["confidence"]],
+                record[index["prediction"]],
+                record[index["fallback_used"]]
+            )
+    return list(rollups.values())
+
+
+async def write_rollups(conn, rollups: List[MinuteRollup]) -> None:
+    """Fusionne les rollups dans metrics_rollup_minute"""
+    if rollups:
+        await conn.executemany(ROLLUP_UPSERT, [rollup.as_record() for rollup in rollups])
+
+
+def summarize_window(row: Any) -> Dict[str, Any]:
+    """Statistiques d'une ligne de ROLLUP_WINDOW_QUERY (quantiles depuis le sketch)"""
+    total = int(row["total_requests"] or 0)
+    sketch = DDSketch.from_dict(row["latency_sketch"])
+    low, high = row["min_latency_ms"], row["max_latency_ms"]
+
+    def quantile(q: float) -> Optional[float]:
+        value = sketch.quantile(q)
+        if value is None:
+            return None
+        # Le représentant du bin est ramené dans [min, max] observés
+        return min(max(value, float(low)), float(high)) if low is not None else value
+
+    confidence_count = int(row["confidence_count"] or 0)
+    return {
+        "model_name": row["model_name"],
+        "provider": row["provider"],
+        "total_requests": total,
+        "error_count": int(row["error_count"] or 0),
+        "fallback_count": int(row["fallback_count"] or 0),
+        "depression_count": int(row["depression_count"] or 0),
+        "normal_count": int(row["normal_count"] or 0),
+        "avg_latency_ms": float(row["latency_sum_ms"] or 0) / total if total else None,
+        "min_latency_ms": float(low) if low is not None else None,
+        "max_latency_ms": float(high) if high is not None else None,
+        "p50_latency_ms": quantile(0.5),
+        "p95_latency_ms": quantile(0.95),
+        "p99_latency_ms": quantile(0.99),
+        "avg_confidence": float(row["confidence_sum"]) / confidence_count if confidence_count else None,
+    }
@@ -0,0 +1,200 @@
+"""
+Métriques runtime en mémoire (compteurs, jauges, histogrammes)
+
+Contrairement au MetricsService qui persiste chaque événement dans PostgreSQL,
+ces métriques vivent dans le process et sont lues sans aucun accès base.
+"""
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    """Normalise un dict de labels en clé hashable triée"""
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class _Metric:
+    """Base commune: nom, description et valeurs par jeu de labels"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Compteur monotone"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, description: str = ""):
+        super().__init__(name, description)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "type": self.metric_type,
+                "description": self.description,
+                "values": [
+                    {"labels": dict(key), "value": value}
+                    for key, value in self._values.items()
+                ]
+            }
+
+
+class Gauge(_Metric):
+    """
+    Valeur instantanée (peut monter et descendre).
+
+    `multiprocess_mode` indique comment agréger les valeurs des workers
+    (exposition Prometheus multi-process): sum, max ou all (label pid).
+    """
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, description: str = "", multiprocess_mode: str = "sum"):
+        super().__init__(name, description)
+        self.multiprocess_mode = multiprocess_mode
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "type": self.metric_type,
+                "description": self.description,
+                "multiprocess_mode": self.multiprocess_mode,
+                "values": [
+                    {"labels": dict(key), "value": value}
+                    for key, value in self._values.items()
+                ]
+            }
+
+
+class Histogram(_Metric):
+    """Histogramme à buckets cumulés (bornes supérieures inclusives)"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, description: str = "", buckets: Sequence[float] = ()):
+        super().__init__(name, description)
+        self.buckets: List[float] = sorted(float(b) for b in buckets)
+        # Par jeu de labels: [compteurs par bucket..., +Inf], somme, total
+        self._values: Dict[LabelKey, Dict[str, Any]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+                self._values[key] = series
+
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = []
+            for key, series in self._values.items():
+                cumulative = 0
+                buckets = {}
+                for bound, count in zip(self.buckets + [float("inf")], series["counts"]):
+                    cumulative += count
+                    buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+                values.append({
+                    "labels": dict(key),
+                    "buckets": buckets,
+                    "sum": series["sum"],
+                    "count": series["count"]
+                })
+            return {
+                "type": self.metric_type,
+                "description": self.description,
+                "values": values
+            }
+
+
+class RuntimeMetricsRegistry:
+    """
+    Registre des métriques runtime.
+
+    Les appels répétés avec le même nom retournent la même instance,
+    ce qui permet de déclarer une métrique au niveau module sans
+    se soucier de l'ordre d'import.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs) -> _Metric:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Métrique '{name}' déjà déclarée avec un autre type")
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str = "", multiprocess_mode: str = "sum") -> Gauge:
+        return self._get_or_create(Gauge, name, description, multiprocess_mode)
+
+    def histogram(self, name: str, description: str = "", buckets: Sequence[float] = ()) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets)
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Retourne l'état de toutes les métriques (sérialisable JSON)"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {name: metric.snapshot() for name, metric in metrics}
+
+
+# Instance globale
+runtime_metrics = RuntimeMetricsRegistry()
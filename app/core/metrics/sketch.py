@@ -0,0 +1,101 @@
+"""
+DDSketch: quantiles de latence fusionnables à erreur relative bornée
+
+Chaque valeur v > 0 tombe dans le bin ceil(log_gamma(v)) avec
+gamma = (1 + alpha) / (1 - alpha); le représentant d'un bin est à moins de
+alpha (erreur relative) de toute valeur du bin. Deux sketches se fusionnent
+en additionnant leurs bins, ce qui permet d'agréger des rollups par minute
+sur n'importe quelle fenêtre sans relire les latences brutes.
+
+Sérialisation: {"<index>": effectif, "z": effectif des valeurs <= 0}, format
+fusionné côté PostgreSQL par merge_latency_sketch / latency_sketch_agg
+(scripts/init_db.sql).
+"""
+import json
+import math
+from typing import Dict, Optional, Union
+
+# Précision partagée par tous les rollups: la modifier impose de vider
+# metrics_rollup_minute (les bins ne seraient plus compatibles)
+SKETCH_RELATIVE_ACCURACY = 0.01
+
+_ZERO_KEY = "z"
+
+
+class DDSketch:
+    """
+    Sketch de quantiles à erreur relative bornée.
+
+    Usage:
+        sketch = DDSketch()
+        sketch.add(latency_ms)
+        sketch.merge(other)
+        sketch.quantile(0.95)
+    """
+
+    def __init__(self, relative_accuracy: float = SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1) -> None:
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        if other.gamma != self.gamma:
+            raise ValueError("Sketches de précisions différentes")
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Valeur au quantile q (0 <= q <= 1), None si le sketch est vide"""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> Dict[str, int]:
+        data = {str(index): count for index, count in self.bins.items()}
+        if self.zero_count:
+            data[_ZERO_KEY] = self.zero_count
+        return data
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Optional[Union[Dict[str, int], str]],
+        relative_accuracy: float = SKETCH_RELATIVE_ACCURACY
+    ) -> "DDSketch":
+        """Sketch depuis sa forme sérialisée (dict ou JSON renvoyé par asyncpg)"""
+        sketch = cls(relative_accuracy)
+        if isinstance(data, str):
+            data = json.loads(data)
+        for key, count in (data or {}).items():
+            if key == _ZERO_KEY:
+                sketch.zero_count += int(count)
+            else:
+                sketch.bins[int(key)] = sketch.bins.get(int(key), 0) + int(count)
+        return sketch
@@ -0,0 +1,244 @@
+"""
+Micro-batching dynamique des prédictions unitaires
+
+Les requêtes `predict` concurrentes sur un même modèle sont mises en file,
+regroupées en un batch (taille max ou délai max atteint), envoyées en un seul
+appel à `batch_predict`, puis chaque résultat est rendu à son appelant.
+"""
+import asyncio
+from typing import Dict, Any, List, Optional, Set, Tuple
+from app.core.base_model import BaseMLModel, is_failed_result
+from app.core.inference_executor import inference_executor
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.config import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+queue_depth_gauge = runtime_metrics.gauge(
+    "micro_batch_queue_depth",
+    "Nombre de requêtes en attente dans le micro-batcher"
+)
+batch_size_histogram = runtime_metrics.histogram(
+    "micro_batch_size",
+    "Taille des batchs envoyés à batch_predict",
+    buckets=BATCH_SIZE_BUCKETS
+)
+
+
+class _PendingRequest:
+    """Requête en attente: texte, options et future du résultat"""
+
+    __slots__ = ("text", "options", "future")
+
+    def __init__(self, text: str, options: Dict[str, Any], future: asyncio.Future):
+        self.text = text
+        self.options = options
+        self.future = future
+
+    @property
+    def options_key(self) -> Tuple:
+        return tuple(sorted(self.options.items()))
+
+
+class MicroBatcher:
+    """
+    Regroupe les appels `predict` concurrents d'un modèle en appels `batch_predict`.
+
+    Les requêtes n'ayant pas les mêmes options (ex: include_reasoning) ne sont
+    jamais mélangées dans un même batch.
+    """
+
+    def __init__(
+        self,
+        model: BaseMLModel,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None
+    ):
+        """
+        Args:
+            model: Modèle cible (doit supporter batch_predict(texts=...))
+            max_batch_size: Taille max d'un batch (défaut: settings)
+            max_wait_ms: Attente max avant envoi d'un batch incomplet (défaut: settings)
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size or settings.MICRO_BATCH_MAX_SIZE
+        self.max_wait_s = (
+            max_wait_ms if max_wait_ms is not None else settings.MICRO_BATCH_MAX_WAIT_MS
+        ) / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+        # Références fortes: une tâche en attente peut sinon être collectée
+        # par le GC et laisser les appelants bloqués
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self) -> None:
+        """Démarre la tâche de fond dans la boucle courante si nécessaire"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def predict(self, text: str, **options) -> Dict[str, Any]:
+        """
+        Soumet un texte et attend son résultat individuel.
+
+        Args:
+            text: Texte à analyser
+            **options: Options transmises à batch_predict (ex: include_reasoning)
+
+        Returns:
+            Résultat de prédiction pour ce texte
+        """
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put(_PendingRequest(text, options, future))
+        queue_depth_gauge.set(self._queue.qsize(), model=self.model.model_name)
+        return await future
+
+    def close(self) -> None:
+        """
+        Arrête le worker une fois la file vidée (thread-safe).
+
+        Les requêtes déjà en file sont traitées et le worker attend la fin des
+        batchs en cours; le batcher ne retient plus ensuite le modèle
+        (nécessaire pour qu'un modèle déchargé soit libéré).
+        """
+        if self._worker is None or self._worker.done() or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    async def _collect_batch(self) -> List[_PendingRequest]:
+        """Attend une première requête puis complète le batch jusqu'au délai max"""
+        first = await self._queue.get()
+        if first is None:
+            self._closing = True
+            return []
+        batch = [first]
+        deadline = self._loop.time() + self.max_wait_s
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if request is None:
+                self._closing = True
+                break
+            batch.append(request)
+
+        queue_depth_gauge.set(self._queue.qsize(), model=self.model.model_name)
+        return batch
+
+    async def _run(self) -> None:
+        """Boucle principale: collecte et dispatch des batchs"""
+        while True:
+            batch = await self._collect_batch()
+
+            groups: Dict[Tuple, List[_PendingRequest]] = {}
+            for request in batch:
+                if not request.future.cancelled():
+                    groups.setdefault(request.options_key, []).append(request)
+
+            for requests in groups.values():
+                task = self._loop.create_task(self._dispatch(requests))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+            if self._closing:
+                if self._tasks:
+                    await asyncio.gather(*self._tasks, return_exceptions=True)
+                return
+
+    async def _dispatch(self, requests: List[_PendingRequest]) -> None:
+        """Exécute un batch et distribue les résultats aux appelants"""
+        texts = [request.text for request in requests]
+        options = requests[0].options
+        batch_size_histogram.observe(len(texts), model=self.model.model_name)
+
+        try:
+            results = await inference_executor.run(
+                self.model.model_name, self.model.batch_predict, texts=texts, **options
+            )
+
+            if len(results) != len(requests):
+                raise RuntimeError(
+                    f"batch_predict a retourné {len(results)} résultats pour {len(requests)} textes"
+                )
+        except Exception as e:
+            logger.error(f"Erreur micro-batch {self.model.model_name} ({len(texts)} textes): {e}")
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        for request, result in zip(requests, results):
+            if request.future.done():
+                continue
+            # batch_predict convertit les erreurs par élément en résultat
+            # ({"error": ...} ou prediction "ERREUR"): l'appelant doit recevoir
+            # une exception, comme avec predict(), pour que le fallback du
+            # registre s'applique
+            if is_failed_result(result):
+                request.future.set_exception(
+                    RuntimeError(result.get("error") or result.get("reasoning") or "ERREUR")
+                )
+            else:
+                request.future.set_result(result)
+
+
+# Un batcher par modèle (recréé si l'instance du modèle change)
+_batchers: Dict[str, MicroBatcher] = {}
+
+
+def get_batcher(model: BaseMLModel) -> MicroBatcher:
+    """
+    Retourne le micro-batcher associé à un modèle enregistré.
+
+    Args:
+        model: Instance du modèle
+
+    Returns:
+        MicroBatcher dédié à ce modèle
+    """
+    batcher = _batchers.get(model.model_name)
+    if batcher is None or batcher.model is not model:
+        batcher = MicroBatcher(model)
+        _batchers[model.model_name] = batcher
+        logger.info(
+            f"✓ Micro-batcher créé pour {model.model_name} "
+            f"(max_batch={batcher.max_batch_size}, max_wait={batcher.max_wait_s * 1000:.1f}ms)"
+        )
+    return batcher
+
+
+def release_batcher(model_name: str) -> None:
+    """Retire le batcher d'un modèle (ex: modèle déchargé par le registre)"""
+    batcher = _batchers.pop(model_name, None)
+    if batcher is not None:
+        batcher.close()
+
+
+def get_batcher_stats() -> Dict[str, Dict[str, Any]]:
+    """Retourne l'état des micro-batchers actifs (profondeur de file, config)"""
+    return {
+        name: {
+            "queue_depth": batcher.queue_depth,
+            "max_batch_size": batcher.max_batch_size,
+            "max_wait_ms": batcher.max_wait_s * 1000
+        }
+        for name, batcher in _batchers.items()
+    }
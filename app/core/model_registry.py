@@ -1,13 +1,59 @@
 """
 Registre centralisé des modèles ML YANSNET - Enhanced Version
 """
-from typing import Dict, Optional, List
+import asyncio
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, List
 from app.core.base_model import BaseMLModel
+from app.config import settings
 from app.utils.logger import setup_logger
+from app.utils.memory import get_model_memory_mb, get_rss_mb
 
 logger = setup_logger(__name__)
 
 
+# Délai avant de retenter le chargement d'un modèle en échec
+FAILED_LOAD_RETRY_S = 60.0
+
+
+class _ModelSlot:
+    """Modèle enregistré par factory: chargé au premier usage, déchargeable"""
+
+    def __init__(self, name: str, factory: Callable[[], BaseMLModel]):
+        self.name = name
+        self.factory = factory
+        self.lock = threading.Lock()  # Single-flight: un seul chargement à la fois
+        self.instance: Optional[BaseMLModel] = None
+        self.state = "unloaded"  # unloaded, loading, loaded, failed
+        self.error: Optional[str] = None
+        self.failed_at = 0.0
+        self.load_time_s: Optional[float] = None
+        # Taille des poids (paramètres + buffers), indépendante des chargements
+        # simultanés; None si le modèle ne porte pas de module PyTorch
+        self.memory_mb: Optional[float] = None
+        # Delta de RSS du chargement (indicatif); None si d'autres chargements
+        # se sont recouverts avec lui (le RSS du process inclurait leur mémoire)
+        self.rss_delta_mb: Optional[float] = None
+        self.load_overlapped = False
+        self.loaded_at: Optional[float] = None
+        self.last_used = 0.0
+        self.load_count = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "load_time_s": round(self.load_time_s, 2) if self.load_time_s is not None else None,
+            "memory_mb": round(self.memory_mb, 1) if self.memory_mb is not None else None,
+            "rss_delta_mb": round(self.rss_delta_mb, 1) if self.rss_delta_mb is not None else None,
+            "idle_s": round(time.monotonic() - self.last_used, 1) if self.instance is not None else None,
+            "load_count": self.load_count,
+            "error": self.error
+        }
+
+
 class EnhancedModelRegistry:
     """
     Registre singleton pour gérer tous les modèles ML disponibles.
@@ -17,6 +63,7 @@ class EnhancedModelRegistry:
     - Priority-based model selection
     - Separate detection and generation model management
     - Fallback chains for reliability
+    - Lazy loading from factories (single-flight) with idle / memory eviction
     
     Supporte différents types de modèles :
     - Classification de texte (dépression, hate speech)
@@ -37,6 +84,9 @@ class EnhancedModelRegistry:
     _primary_detection_model: Optional[str] = None
     _primary_generation_model: Optional[str] = None
     
+    # Lazy loading: factories par nom de modèle
+    _slots: Dict[str, _ModelSlot] = {}
+    
     def __new__(cls):
         """Singleton pattern"""
         if cls._instance is None:
@@ -47,6 +97,10 @@ class EnhancedModelRegistry:
             cls._instance._generation_models = {}
             cls._instance._primary_detection_model = None
             cls._instance._primary_generation_model = None
+            cls._instance._slots = {}
+            cls._instance._unload_listeners = []
+            cls._instance._active_loads = set()
+            cls._instance._active_loads_lock = threading.Lock()
         return cls._instance
     
     def register(self, model: BaseMLModel, set_as_default: bool = False):
@@ -89,11 +143,27 @@ class EnhancedModelRegistry:
         Args:
             model_name: Nom du modèle
         
+        Un modèle enregistré par factory est chargé ici au premier appel
+        (bloquant: depuis une route async, utiliser `aget`).
+        
         Returns:
             Instance du modèle ou None si non trouvé
         """
+        slot = self._slots.get(model_name)
+        if slot is not None:
+            return self._load_slot(slot)
         return self._models.get(model_name)
     
+    async def aget(self, model_name: str) -> Optional[BaseMLModel]:
+        """
+        Version async de `get`: un chargement éventuel s'exécute dans un
+        thread pour ne pas bloquer la boucle asyncio.
+        """
+        slot = self._slots.get(model_name)
+        if slot is not None and slot.instance is None:
+            return await asyncio.to_thread(self.get, model_name)
+        return self.get(model_name)
+    
     def get_default(self) -> Optional[BaseMLModel]:
         """
         Retourne le modèle par défaut.
@@ -102,9 +172,19 @@ class EnhancedModelRegistry:
             Instance du modèle par défaut ou None
         """
         if self._default_model:
-            return self._models.get(self._default_model)
+            return self.get(self._default_model)
         return None
     
+    async def aget_default(self) -> Optional[BaseMLModel]:
+        """Version async de `get_default`"""
+        if self._default_model:
+            return await self.aget(self._default_model)
+        return None
+    
+    def get_default_name(self) -> Optional[str]:
+        """Nom du modèle par défaut (sans le charger)"""
+        return self._default_model
+    
     def list_models(self) -> Dict[str, Dict]:
         """
         Liste tous les modèles disponibles avec leurs métadonnées.
@@ -112,13 +192,18 @@ class EnhancedModelRegistry:
         Returns:
             Dict {model_name: model_info}
         """
-        return {
+        models = {
             name: {
                 **model.get_info(),
                 "is_default": name == self._default_model
             }
             for name, model in self._models.items()
         }
+        # Modèles lazy: état de chargement, sans forcer le chargement
+        for name, slot in self._slots.items():
+            models.setdefault(name, {"name": name, "is_default": name == self._default_model})
+            models[name]["loading"] = slot.status()
+        return models
     
     def get_model_names(self) -> List[str]:
         """
@@ -127,7 +212,7 @@ class EnhancedModelRegistry:
         Returns:
             Liste des noms
         """
-        return list(self._models.keys())
+        return list(dict.fromkeys([*self._models.keys(), *self._slots.keys()]))
     
     def unregister(self, model_name: str) -> bool:
         """
@@ -139,13 +224,14 @@ class EnhancedModelRegistry:
         Returns:
             True si retiré, False si non trouvé
         """
-        if model_name in self._models:
-            del self._models[model_name]
+        if model_name in self._models or model_name in self._slots:
+            self._models.pop(model_name, None)
+            self._slots.pop(model_name, None)
             logger.info(f"✓ Modèle désenregistré: {model_name}")
             
             # Si c'était le défaut, choisir un autre
             if self._default_model == model_name:
-                self._default_model = next(iter(self._models.keys()), None)
+                self._default_model = next(iter(self.get_model_names()), None)
                 if self._default_model:
                     logger.info(f"  → Nouveau défaut: {self._default_model}")
             
@@ -155,6 +241,7 @@ class EnhancedModelRegistry:
     def clear(self):
         """Vide le registre (utile pour les tests)"""
         self._models.clear()
+        self._slots.clear()
         self._default_model = None
         logger.info("✓ Registre vidé")
     
@@ -165,10 +252,15 @@ class EnhancedModelRegistry:
         Returns:
             Dict {model_name: health_status}
         """
-        return {
+        health = {
             name: model.health_check()
             for name, model in self._models.items()
         }
+        # Les modèles lazy non chargés ne sont pas chargés pour un health check
+        for name, slot in self._slots.items():
+            if name not in health:
+                health[name] = {"status": slot.state, "model": name, "error": slot.error}
+        return health
     
     # ============================================================================
     # ENHANCED METHODS FOR HYBRID ARCHITECTURE
@@ -236,9 +328,19 @@ class EnhancedModelRegistry:
         Returns:
             Instance du modèle de détection ou None
         """
-        if self._primary_detection_model:
-            model, _ = self._detection_models.get(self._primary_detection_model, (None, 0))
-            return model
+        # Par priorité décroissante: un modèle lazy en échec cède la place au suivant
+        for model_name, _, _ in self._detection_entries_by_priority():
+            model = self.get(model_name)
+            if model is not None:
+                return model
+        return None
+    
+    async def aget_detection_model(self) -> Optional[BaseMLModel]:
+        """Version async de `get_detection_model`"""
+        for model_name, _, _ in self._detection_entries_by_priority():
+            model = await self.aget(model_name)
+            if model is not None:
+                return model
         return None
     
     def get_detection_fallback(self) -> Optional[BaseMLModel]:
@@ -250,7 +352,14 @@ class EnhancedModelRegistry:
         """
         for model_name, (model, priority) in self._detection_models.items():
             if priority == 0:
-                return model
+                return self.get(model_name) or model
+        return None
+    
+    async def aget_detection_fallback(self) -> Optional[BaseMLModel]:
+        """Version async de `get_detection_fallback`"""
+        for model_name, (model, priority) in self._detection_models.items():
+            if priority == 0:
+                return (await self.aget(model_name)) or model
         return None
     
     def get_generation_model(self) -> Optional[BaseMLModel]:
@@ -268,14 +377,299 @@ class EnhancedModelRegistry:
         """
         Retourne tous les modèles de détection triés par priorité (décroissant).
         
+        Les modèles lazy non chargés sont retournés avec model=None.
+        
         Returns:
             Liste de (model_name, model, priority)
         """
-        models = [
+        return [
+            (name, self._models.get(name, model), priority)
+            for name, model, priority in self._detection_entries_by_priority()
+        ]
+    
+    def _detection_entries_by_priority(self) -> List[tuple]:
+        """(name, model, priority) triés par priorité, le primaire en tête à égalité"""
+        entries = [
             (name, model, priority)
             for name, (model, priority) in self._detection_models.items()
         ]
-        return sorted(models, key=lambda x: x[2], reverse=True)
+        return sorted(
+            entries,
+            key=lambda x: (x[2], x[0] == self._primary_detection_model),
+            reverse=True
+        )
+    
+    # ============================================================================
+    # LAZY LOADING (factories, single-flight, éviction)
+    # ============================================================================
+    
+    def register_factory(
+        self,
+        model_name: str,
+        factory: Callable[[], BaseMLModel],
+        set_as_default: bool = False,
+        detection_priority: Optional[int] = None
+    ):
+        """
+        Enregistre un modèle par sa factory, sans le construire.
+        
+        Le modèle est construit au premier `get`/`aget` (un seul chargement
+        même en cas de requêtes concurrentes) et peut être déchargé puis
+        rechargé à la demande.
+        
+        Args:
+            model_name: Nom sous lequel le modèle sera servi
+            factory: Callable sans argument retournant l'instance
+            set_as_default: Si True, définit ce modèle comme défaut
+            detection_priority: Si fourni, enregistre aussi comme modèle de détection
+        """
+        if model_name in self._slots or model_name in self._models:
+            logger.warning(f"⚠️  Modèle '{model_name}' déjà enregistré, écrasement")
+            self._models.pop(model_name, None)
+        
+        self._slots[model_name] = _ModelSlot(model_name, factory)
+        logger.info(f"✓ Modèle enregistré (chargement à la demande): {model_name}")
+        
+        if set_as_default or self._default_model is None:
+            self._default_model = model_name
+            logger.info(f"  → Défini comme modèle par défaut")
+        
+        if detection_priority is not None:
+            self._detection_models[model_name] = (None, detection_priority)
+            current = self._detection_models.get(self._primary_detection_model, (None, -1))[1]
+            if self._primary_detection_model is None or detection_priority > current:
+                self._primary_detection_model = model_name
+                logger.info(f"✓ Modèle de détection primaire: {model_name} (priorité: {detection_priority})")
+    
+    def load(self, model_name: str) -> Optional[BaseMLModel]:
+        """Force le chargement d'un modèle lazy (ex: au démarrage en mode eager)"""
+        slot = self._slots.get(model_name)
+        if slot is None:
+            return self._models.get(model_name)
+        if slot.state == "failed":
+            slot.failed_at = 0.0  # Chargement explicite: pas de délai de retry
+        return self._load_slot(slot)
+    
+    def load_many(self, model_names: List[str], max_workers: int) -> Dict[str, bool]:
+        """
+        Charge plusieurs modèles en parallèle (I/O disque et désérialisation
+        des poids se recouvrent).
+        
+        Args:
+            model_names: Modèles à charger
+            max_workers: Nombre de chargements simultanés
+        
+        Returns:
+            Dict {model_name: chargé avec succès}
+        """
+        if not model_names:
+            return {}
+        workers = max(1, min(max_workers, len(model_names)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-load") as pool:
+            models = pool.map(self.load, model_names)
+            return {name: model is not None for name, model in zip(model_names, models)}
+    
+    def get_readiness(self, model_names: List[str]) -> Dict[str, List[str]]:
+        """
+        Classe les modèles demandés par état de chargement (sans les charger).
+        
+        Un modèle déjà chargé puis déchargé par l'éviction est classé dans
+        evicted: il se recharge au prochain appel et ne doit pas rendre le
+        replica indisponible (sinon il ne recevrait plus le trafic qui le
+        rechargerait).
+        
+        Returns:
+            Dict avec les listes loaded, evicted, pending, failed et unknown
+        """
+        status = self.get_load_status()
+        readiness = {"loaded": [], "evicted": [], "pending": [], "failed": [], "unknown": []}
+        for name in model_names:
+            info = status.get(name, {})
+            state = info.get("state")
+            if state is None:
+                readiness["unknown"].append(name)
+            elif state in ("loaded", "failed"):
+                readiness[state].append(name)
+            elif state == "unloaded" and info.get("load_count"):
+                readiness["evicted"].append(name)
+            else:
+                readiness["pending"].append(name)
+        return readiness
+    
+    def _load_slot(self, slot: _ModelSlot) -> Optional[BaseMLModel]:
+        """Charge le modèle d'un slot (single-flight) et met à jour son état"""
+        instance = slot.instance
+        if instance is not None:
+            slot.last_used = time.monotonic()
+            return instance
+        
+        with slot.lock:
+            # Un autre thread a pu terminer le chargement pendant l'attente
+            if slot.instance is not None:
+                slot.last_used = time.monotonic()
+                return slot.instance
+            
+            if slot.state == "failed" and time.monotonic() - slot.failed_at < FAILED_LOAD_RETRY_S:
+                return None
+            
+            slot.state = "loading"
+            logger.info(f"⏳ Chargement du modèle {slot.name}...")
+            self._begin_load(slot)
+            rss_before = get_rss_mb()
+            start = time.perf_counter()
+            
+            try:
+                instance = slot.factory()
+            except Exception as e:
+                self._end_load(slot)
+                slot.state = "failed"
+                slot.error = str(e)
+                slot.failed_at = time.monotonic()
+                logger.error(f"✗ Échec du chargement de {slot.name}: {e}")
+                return None
+            
+            if instance.model_name != slot.name:
+                logger.warning(f"⚠️  {slot.name}: la factory a retourné '{instance.model_name}'")
+            
+            slot.load_time_s = time.perf_counter() - start
+            rss_delta_mb = get_rss_mb() - rss_before
+            self._end_load(slot)
+            slot.rss_delta_mb = None if slot.load_overlapped else rss_delta_mb
+            slot.memory_mb = get_model_memory_mb(instance)
+            slot.loaded_at = slot.last_used = time.monotonic()
+            slot.load_count += 1
+            slot.error = None
+            slot.state = "loaded"
+            slot.instance = instance
+            self._models[slot.name] = instance
+            
+            rss = (
+                f"poids {slot.memory_mb:.0f} Mo" if slot.memory_mb is not None
+                else f"RSS +{slot.rss_delta_mb:.0f} Mo" if slot.rss_delta_mb is not None
+                else "taille inconnue"
+            )
+            logger.info(
+                f"✓ Modèle chargé: {slot.name} v{instance.model_version} "
+                f"en {slot.load_time_s:.1f}s ({rss})"
+            )
+            return instance
+    
+    def _begin_load(self, slot: _ModelSlot) -> None:
+        """Marque les chargements qui se recouvrent (delta de RSS non attribuable)"""
+        with self._active_loads_lock:
+            slot.load_overlapped = bool(self._active_loads)
+            for other in self._active_loads:
+                other.load_overlapped = True
+            self._active_loads.add(slot)
+    
+    def _end_load(self, slot: _ModelSlot) -> None:
+        with self._active_loads_lock:
+            self._active_loads.discard(slot)
+    
+    def unload(self, model_name: str, reason: str = "manuel") -> bool:
+        """
+        Décharge un modèle lazy (il sera rechargé au prochain usage).
+        
+        Returns:
+            True si déchargé, False si absent ou non chargé
+        """
+        slot = self._slots.get(model_name)
+        if slot is None or slot.instance is None:
+            return False
+        
+        with slot.lock:
+            if slot.instance is None:
+                return False
+            slot.instance = None
+            slot.state = "unloaded"
+            self._models.pop(model_name, None)
+        
+        for listener in self._unload_listeners:
+            try:
+                listener(model_name)
+            except Exception as e:
+                logger.warning(f"⚠️  Listener de déchargement en erreur: {e}")
+        
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+        
+        logger.info(f"✓ Modèle déchargé: {model_name} ({reason})")
+        return True
+    
+    def add_unload_listener(self, listener: Callable[[str], None]):
+        """Enregistre un callback appelé avec le nom de chaque modèle déchargé (une seule fois)"""
+        if listener not in self._unload_listeners:
+            self._unload_listeners.append(listener)
+    
+    def evict_idle_models(self) -> List[str]:
+        """
+        Décharge les modèles inactifs depuis MODEL_IDLE_TIMEOUT_S, puis les
+        moins récemment utilisés si le RSS dépasse MODEL_MEMORY_LIMIT_MB.
+        
+        La mémoire libérée par PyTorch / glibc n'est pas rendue tout de suite
+        au système: le RSS n'est pas relu après chaque déchargement. Les
+        modèles sont déchargés jusqu'à ce que leur taille estimée couvre le
+        dépassement; un modèle de taille inconnue arrête la passe (le RSS est
+        revérifié à la passe suivante).
+        
+        Returns:
+            Noms des modèles déchargés
+        """
+        evicted = []
+        now = time.monotonic()
+        
+        if settings.MODEL_IDLE_TIMEOUT_S > 0:
+            for name, slot in list(self._slots.items()):
+                if slot.instance is not None and now - slot.last_used > settings.MODEL_IDLE_TIMEOUT_S:
+                    if self.unload(name, reason=f"inactif {now - slot.last_used:.0f}s"):
+                        evicted.append(name)
+        
+        if settings.MODEL_MEMORY_LIMIT_MB > 0:
+            loaded = sorted(
+                (slot for slot in self._slots.values() if slot.instance is not None),
+                key=lambda slot: slot.last_used
+            )
+            rss = get_rss_mb()
+            excess = rss - settings.MODEL_MEMORY_LIMIT_MB
+            for slot in loaded:
+                if excess <= 0:
+                    break
+                size_mb = slot.memory_mb if slot.memory_mb is not None else slot.rss_delta_mb
+                if self.unload(slot.name, reason=f"pression mémoire {rss:.0f} Mo"):
+                    evicted.append(slot.name)
+                if size_mb is None:
+                    break
+                excess -= size_mb
+        
+        return evicted
+    
+    async def run_eviction_loop(self):
+        """Tâche de fond: éviction périodique (MODEL_EVICTION_INTERVAL_S)"""
+        while True:
+            await asyncio.sleep(settings.MODEL_EVICTION_INTERVAL_S)
+            try:
+                await asyncio.to_thread(self.evict_idle_models)
+            except Exception as e:
+                logger.error(f"Erreur lors de l'éviction des modèles: {e}")
+    
+    def get_load_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        État de chargement de chaque modèle: état, temps de chargement,
+        taille des poids et delta de RSS au chargement, inactivité.
+        """
+        status = {
+            name: {"state": "loaded", "lazy": False}
+            for name in self._models
+            if name not in self._slots
+        }
+        for name, slot in self._slots.items():
+            status[name] = {**slot.status(), "lazy": True}
+        return status
 
 
 # Instance globale (singleton)
@@ -0,0 +1,403 @@
+"""
+Client HTTP partagé pour tous les appels Ollama
+
+Un seul `httpx.AsyncClient` (connexions keep-alive réutilisées) tourne sur une
+boucle asyncio dédiée, dans un thread de fond. Les appelants async (routes,
+`apredict`) et synchrones (modèles exécutés dans le pool d'inférence)
+partagent ainsi le même pool de connexions et les mêmes limites de
+concurrence par modèle, alignées sur OLLAMA_NUM_PARALLEL côté serveur.
+
+Les erreurs transitoires (connexion, timeout, 429/5xx) sont retentées avec un
+backoff exponentiel à jitter.
+"""
+import asyncio
+import json as json_module
+import random
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+from app.config import settings, parse_key_value_list
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+ollama_requests_counter = runtime_metrics.counter(
+    "ollama_requests",
+    "Requêtes HTTP vers Ollama (outcome: ok, retry, error)"
+)
+ollama_prefill_histogram = runtime_metrics.histogram(
+    "ollama_prefill_seconds",
+    "Durée d'évaluation du prompt (prefill) rapportée par Ollama; le préfixe déjà en cache KV n'est pas réévalué",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+ollama_prompt_tokens_counter = runtime_metrics.counter(
+    "ollama_prompt_eval_tokens",
+    "Tokens de prompt réellement évalués par Ollama (hors préfixe réutilisé)"
+)
+
+# Codes HTTP qui justifient une nouvelle tentative
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# Marqueur de fin de flux (relais entre la boucle du client et l'appelant)
+_END_OF_STREAM = object()
+
+
+class OllamaClient:
+    """
+    Client Ollama poolé, utilisable depuis du code sync ou async.
+
+    Usage:
+        client = get_ollama_client()
+        data = client.generate("qwen2.5:1.5b", prompt)          # bloquant
+        data = await client.agenerate("qwen2.5:1.5b", prompt)   # async
+    """
+
+    def __init__(self, base_url: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = (base_url or settings.OLLAMA_BASE_URL).rstrip("/")
+        self._transport = transport
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+        self._start_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Boucle dédiée
+    # ------------------------------------------------------------------
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="ollama-client",
+                    daemon=True
+                )
+                self._thread.start()
+                logger.info(
+                    f"✓ Client Ollama démarré ({self.base_url}, "
+                    f"{settings.OLLAMA_MAX_CONNECTIONS} connexions max)"
+                )
+            return self._loop
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Client httpx, créé dans la boucle dédiée au premier appel"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(
+                    settings.OLLAMA_READ_TIMEOUT_S,
+                    connect=settings.OLLAMA_CONNECT_TIMEOUT_S
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY_S
+                ),
+                transport=self._transport
+            )
+        return self._client
+
+    def _parallel_for(self, model: str) -> int:
+        overrides = parse_key_value_list(settings.OLLAMA_PARALLEL_OVERRIDES)
+        try:
+            return max(1, int(overrides.get(model, settings.OLLAMA_NUM_PARALLEL)))
+        except ValueError:
+            return max(1, settings.OLLAMA_NUM_PARALLEL)
+
+    def _get_semaphore(self, model: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self._parallel_for(model))
+            self._semaphores[model] = semaphore
+        return semaphore
+
+    # ------------------------------------------------------------------
+    # Requête avec retry (exécutée dans la boucle dédiée)
+    # ------------------------------------------------------------------
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        model: Optional[str] = None,
+        json: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        client = self._get_client()
+        label = model or "-"
+        request_timeout = (
+            httpx.Timeout(timeout, connect=settings.OLLAMA_CONNECT_TIMEOUT_S)
+            if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        )
+        attempts = settings.OLLAMA_MAX_RETRIES + 1
+
+        for attempt in range(attempts):
+            try:
+                if model is None:
+                    response = await client.request(method, path, json=json, timeout=request_timeout)
+                else:
+                    response = await self._limited(model, client, method, path, json, request_timeout)
+
+                if response.status_code in RETRYABLE_STATUS_CODES and attempt < attempts - 1:
+                    raise httpx.HTTPStatusError(
+                        f"HTTP {response.status_code}", request=response.request, response=response
+                    )
+                response.raise_for_status()
+                ollama_requests_counter.inc(model=label, outcome="ok")
+                return response.json()
+
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or (
+                    e.response.status_code in RETRYABLE_STATUS_CODES
+                )
+                if not retryable or attempt == attempts - 1:
+                    ollama_requests_counter.inc(model=label, outcome="error")
+                    raise
+                # Backoff exponentiel avec jitter complet
+                delay = random.uniform(
+                    0, min(settings.OLLAMA_RETRY_MAX_BACKOFF_S, settings.OLLAMA_RETRY_BACKOFF_S * 2 ** attempt)
+                )
+                ollama_requests_counter.inc(model=label, outcome="retry")
+                logger.warning(
+                    f"⚠️  Ollama {path} ({label}) tentative {attempt + 1}/{attempts} échouée: "
+                    f"{type(e).__name__}, nouvel essai dans {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    async def _limited(self, model, client, method, path, json, timeout) -> httpx.Response:
+        """Requête limitée à OLLAMA_NUM_PARALLEL appels simultanés pour ce modèle"""
+        semaphore = self._get_semaphore(model)
+        self._waiting[model] = self._waiting.get(model, 0) + 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self._waiting[model] -= 1
+
+        self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        try:
+            return await client.request(method, path, json=json, timeout=timeout)
+        finally:
+            self._in_flight[model] -= 1
+            semaphore.release()
+
+    async def _stream(
+        self,
+        path: str,
+        model: str,
+        json: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Requête en streaming (NDJSON): un dict par ligne reçue.
+
+        Les erreurs transitoires sont retentées tant qu'aucune ligne n'a été
+        transmise; au-delà, l'erreur est propagée à l'appelant.
+        """
+        client = self._get_client()
+        request_timeout = (
+            httpx.Timeout(timeout, connect=settings.OLLAMA_CONNECT_TIMEOUT_S)
+            if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        )
+        attempts = settings.OLLAMA_MAX_RETRIES + 1
+        semaphore = self._get_semaphore(model)
+
+        for attempt in range(attempts):
+            started = False
+            try:
+                self._waiting[model] = self._waiting.get(model, 0) + 1
+                try:
+                    await semaphore.acquire()
+                finally:
+                    self._waiting[model] -= 1
+                self._in_flight[model] = self._in_flight.get(model, 0) + 1
+                try:
+                    async with client.stream("POST", path, json=json, timeout=request_timeout) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if line.strip():
+                                started = True
+                                yield json_module.loads(line)
+                finally:
+                    self._in_flight[model] -= 1
+                    semaphore.release()
+                ollama_requests_counter.inc(model=model, outcome="ok")
+                return
+
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or (
+                    e.response.status_code in RETRYABLE_STATUS_CODES
+                )
+                if started or not retryable or attempt == attempts - 1:
+                    ollama_requests_counter.inc(model=model, outcome="error")
+                    raise
+                delay = random.uniform(
+                    0, min(settings.OLLAMA_RETRY_MAX_BACKOFF_S, settings.OLLAMA_RETRY_BACKOFF_S * 2 ** attempt)
+                )
+                ollama_requests_counter.inc(model=model, outcome="retry")
+                logger.warning(
+                    f"⚠️  Ollama {path} ({model}) stream, tentative {attempt + 1}/{attempts} échouée: "
+                    f"{type(e).__name__}, nouvel essai dans {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+    # ------------------------------------------------------------------
+    # API publique
+    # ------------------------------------------------------------------
+
+    async def arequest(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """Requête depuis n'importe quelle boucle asyncio (non bloquant)"""
+        loop = self._ensure_started()
+        future = asyncio.run_coroutine_threadsafe(self._request(method, path, **kwargs), loop)
+        return await asyncio.wrap_future(future)
+
+    def request(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        """Requête bloquante (depuis un thread, jamais depuis une boucle asyncio)"""
+        loop = self._ensure_started()
+        return asyncio.run_coroutine_threadsafe(self._request(method, path, **kwargs), loop).result()
+
+    # keep_alive: garder le modèle (et son cache KV) chargé entre deux appels
+    @staticmethod
+    def _generate_payload(model: str, prompt: str, options: Optional[Dict[str, Any]], **extra) -> Dict[str, Any]:
+        return {"model": model, "prompt": prompt, "stream": False, "options": options or {},
+                "keep_alive": settings.OLLAMA_KEEP_ALIVE, **extra}
+
+    @staticmethod
+    def _chat_payload(model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]], **extra) -> Dict[str, Any]:
+        return {"model": model, "messages": messages, "stream": False, "options": options or {},
+                "keep_alive": settings.OLLAMA_KEEP_ALIVE, **extra}
+
+    @staticmethod
+    def _record_prefill(model: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Comptabilise le prefill rapporté par Ollama (durées en nanosecondes)"""
+        if "prompt_eval_duration" in data:
+            ollama_prefill_histogram.observe(data["prompt_eval_duration"] / 1e9, model=model)
+        if data.get("prompt_eval_count"):
+            ollama_prompt_tokens_counter.inc(data["prompt_eval_count"], model=model)
+        return data
+
+    def generate(self, model: str, prompt: str, options: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None, **extra) -> Dict[str, Any]:
+        """POST /api/generate (bloquant)"""
+        payload = self._generate_payload(model, prompt, options, **extra)
+        return self._record_prefill(model, self.request("POST", "/api/generate", model=model, json=payload, timeout=timeout))
+
+    async def agenerate(self, model: str, prompt: str, options: Optional[Dict[str, Any]] = None,
+                        timeout: Optional[float] = None, **extra) -> Dict[str, Any]:
+        """POST /api/generate (async)"""
+        payload = self._generate_payload(model, prompt, options, **extra)
+        return self._record_prefill(model, await self.arequest("POST", "/api/generate", model=model, json=payload, timeout=timeout))
+
+    def chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+             timeout: Optional[float] = None, **extra) -> Dict[str, Any]:
+        """POST /api/chat (bloquant)"""
+        payload = self._chat_payload(model, messages, options, **extra)
+        return self._record_prefill(model, self.request("POST", "/api/chat", model=model, json=payload, timeout=timeout))
+
+    async def achat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                    timeout: Optional[float] = None, **extra) -> Dict[str, Any]:
+        """POST /api/chat (async)"""
+        payload = self._chat_payload(model, messages, options, **extra)
+        return self._record_prefill(model, await self.arequest("POST", "/api/chat", model=model, json=payload, timeout=timeout))
+
+    async def astream_chat(self, model: str, messages: List[Dict[str, str]], options: Optional[Dict[str, Any]] = None,
+                           timeout: Optional[float] = None, **extra) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POST /api/chat en streaming: produit chaque fragment NDJSON d'Ollama.
+
+        Le flux HTTP tourne dans la boucle dédiée; les fragments sont relayés
+        à la boucle appelante au fil de l'eau. Si l'appelant arrête d'itérer
+        (client déconnecté), la requête vers Ollama est annulée.
+        """
+        payload = {**self._chat_payload(model, messages, options, **extra), "stream": True}
+        loop = self._ensure_started()
+        caller_loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for chunk in self._stream("/api/chat", model, payload, timeout):
+                    caller_loop.call_soon_threadsafe(queue.put_nowait, (chunk, None))
+                caller_loop.call_soon_threadsafe(queue.put_nowait, (_END_OF_STREAM, None))
+            except BaseException as e:
+                caller_loop.call_soon_threadsafe(queue.put_nowait, (_END_OF_STREAM, e))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+
+        future = asyncio.run_coroutine_threadsafe(produce(), loop)
+        try:
+            while True:
+                chunk, error = await queue.get()
+                if chunk is _END_OF_STREAM:
+                    if error is not None and not isinstance(error, asyncio.CancelledError):
+                        raise error
+                    return
+                yield chunk
+        finally:
+            future.cancel()
+
+    def list_models(self, timeout: Optional[float] = None) -> List[str]:
+        """Noms des modèles disponibles (GET /api/tags)"""
+        data = self.request("GET", "/api/tags", timeout=timeout)
+        return [m.get("name", "") for m in data.get("models", [])]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Requêtes en cours / en attente par modèle"""
+        return {
+            "base_url": self.base_url,
+            "models": {
+                model: {
+                    "max_parallel": self._parallel_for(model),
+                    "in_flight": self._in_flight.get(model, 0),
+                    "waiting": self._waiting.get(model, 0)
+                }
+                for model in self._semaphores
+            }
+        }
+
+    def close(self) -> None:
+        """Ferme les connexions et arrête la boucle dédiée"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result(timeout=5)
+            self._client = None
+        self._semaphores.clear()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+        loop.close()
+        self._loop = None
+
+
+# Un client par URL Ollama
+_clients: Dict[str, OllamaClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_ollama_client(base_url: Optional[str] = None) -> OllamaClient:
+    """Retourne le client partagé pour une URL Ollama (défaut: OLLAMA_BASE_URL)"""
+    url = (base_url or settings.OLLAMA_BASE_URL).rstrip("/")
+    with _clients_lock:
+        client = _clients.get(url)
+        if client is None:
+            client = OllamaClient(url)
+            _clients[url] = client
+        return client
+
+
+def get_ollama_stats() -> Dict[str, Any]:
+    return {url: client.get_stats() for url, client in _clients.items()}
+
+
+def close_ollama_clients() -> None:
+    """Ferme tous les clients (arrêt de l'application)"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
@@ -0,0 +1,166 @@
+"""
+Backend d'exécution ONNX Runtime pour les classifieurs HuggingFace
+
+Le modèle PyTorch est exporté une fois en ONNX (graphe mis en cache disque,
+indexé par modèle et version), puis servi par onnxruntime. Le wrapper
+retourné s'appelle comme un modèle HF (`model(**inputs).logits`): tokenizer,
+pré- et post-traitements restent ceux du modèle.
+
+Dépendances optionnelles: onnx (export) et onnxruntime (inférence).
+"""
+import os
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+from app.config import settings
+from app.core.quantization import model_cache_path
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+BACKENDS = ("pytorch", "onnx")
+
+
+def resolve_backend(backend: str, device) -> str:
+    """
+    Valide le backend demandé pour un device.
+
+    Le backend ONNX est servi sur CPU: sur GPU on reste sur PyTorch.
+    """
+    backend = (backend or "pytorch").lower()
+    if backend not in BACKENDS:
+        logger.warning(f"⚠️  Backend inconnu '{backend}', utilisation de pytorch")
+        return "pytorch"
+    if backend == "onnx" and str(device) != "cpu":
+        logger.warning(f"⚠️  Backend ONNX servi sur CPU uniquement ({device}), utilisation de pytorch")
+        return "pytorch"
+    return backend
+
+
+class OnnxSessionModel:
+    """Session onnxruntime exposée avec l'interface d'un modèle HF (logits)"""
+
+    def __init__(self, session, path: str):
+        self.session = session
+        self.path = path
+        self.input_names = [node.name for node in session.get_inputs()]
+
+    def __call__(self, **inputs):
+        import torch
+
+        # L'export peut élaguer des entrées inutilisées (ex: token_type_ids)
+        feed = {
+            name: value.cpu().numpy() if hasattr(value, "numpy") else value
+            for name, value in inputs.items()
+            if name in self.input_names
+        }
+        logits = self.session.run(["logits"], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    # Compatibilité avec le code qui manipule un nn.Module
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+def _dynamic_axes(sample_inputs: Dict) -> Dict[str, Dict[int, str]]:
+    """Axe 0 = batch pour toutes les entrées, axe 1 = séquence pour les ids de tokens"""
+    axes = {}
+    for name, tensor in sample_inputs.items():
+        axes[name] = {0: "batch", 1: "sequence"} if tensor.dim() == 2 else {0: "batch"}
+    axes["logits"] = {0: "batch"}
+    return axes
+
+
+def export_onnx(model, sample_inputs: Dict, path: str) -> None:
+    """Exporte un classifieur HF en ONNX (sortie unique: logits)"""
+    import torch
+
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (),
+            path,
+            kwargs=dict(sample_inputs),
+            input_names=list(sample_inputs),
+            output_names=["logits"],
+            dynamic_axes=_dynamic_axes(sample_inputs),
+            opset_version=settings.ONNX_OPSET,
+            dynamo=False
+        )
+
+
+def create_session(path: str):
+    """Session onnxruntime CPU avec les réglages de threads configurés"""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if settings.ONNX_INTRA_OP_THREADS > 0:
+        options.intra_op_num_threads = settings.ONNX_INTRA_OP_THREADS
+    if settings.ONNX_INTER_OP_THREADS > 0:
+        options.inter_op_num_threads = settings.ONNX_INTER_OP_THREADS
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def load_onnx_model(
+    source: str,
+    version: str,
+    build_torch_model: Callable[[], object],
+    sample_inputs: Callable[[], Dict]
+) -> OnnxSessionModel:
+    """
+    Retourne le modèle servi par onnxruntime, en exportant le graphe si absent.
+
+    Lève une exception si onnxruntime est absent ou si l'export échoue:
+    l'appelant retombe alors sur PyTorch.
+
+    Args:
+        source: Identifiant du modèle (nom HuggingFace ou dossier local)
+        version: Version du modèle (fait partie de la clé de cache)
+        build_torch_model: Callable qui charge le modèle PyTorch (export seulement)
+        sample_inputs: Callable retournant des entrées d'exemple (tenseurs)
+    """
+    import onnxruntime  # noqa: F401  (échec rapide avant un export inutile)
+
+    cache_dir = settings.ONNX_CACHE_DIR or os.path.join("cache", "onnx")
+    path = model_cache_path(cache_dir, source, f"{version}.onnx")
+
+    if not path.exists():
+        logger.info(f"⏳ Export ONNX de {source}...")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            export_onnx(build_torch_model(), sample_inputs(), str(tmp_path))
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        logger.info(f"✓ Graphe ONNX exporté: {path}")
+
+    model = OnnxSessionModel(create_session(str(path)), str(path))
+    logger.info(
+        f"✓ Session ONNX Runtime prête: {path.name} "
+        f"(intra-op: {settings.ONNX_INTRA_OP_THREADS or 'auto'}, inter-op: {settings.ONNX_INTER_OP_THREADS or 'auto'})"
+    )
+    return model
+
+
+def load_with_fallback(
+    model_name: str,
+    source: str,
+    version: str,
+    build_torch_model: Callable[[], object],
+    sample_inputs: Callable[[], Dict]
+) -> Optional[OnnxSessionModel]:
+    """
+    Comme `load_onnx_model`, mais retourne None (fallback PyTorch) en cas d'échec.
+    """
+    try:
+        return load_onnx_model(source, version, build_torch_model, sample_inputs)
+    except Exception as e:
+        logger.warning(f"⚠️  Backend ONNX indisponible pour {model_name}, fallback PyTorch: {e}")
+        return None
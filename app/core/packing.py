@@ -0,0 +1,161 @@
+"""
+Regroupement de plusieurs textes dans un seul prompt LLM (batch « packé »)
+
+Le coût d'un appel LLM est dominé par le prompt système fixe et l'aller-retour
+réseau. En mode packé, N textes numérotés partagent un même prompt et le
+modèle répond par un tableau JSON (un résultat par numéro). Les éléments
+absents ou invalides de la réponse sont retentés un par un.
+"""
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from app.core.fanout import map_bounded
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+llm_tokens_counter = runtime_metrics.counter(
+    "llm_tokens",
+    "Tokens consommés par les appels LLM (kind: prompt, completion)"
+)
+llm_calls_counter = runtime_metrics.counter(
+    "llm_calls",
+    "Appels LLM (par modèle LLM)"
+)
+packed_retries_counter = runtime_metrics.counter(
+    "llm_packed_retries",
+    "Éléments d'un prompt packé absents ou invalides, retentés un par un"
+)
+
+
+def record_usage(llm_model: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Comptabilise un appel LLM et ses tokens (si le provider les renvoie)"""
+    llm_calls_counter.inc(model=llm_model)
+    if prompt_tokens:
+        llm_tokens_counter.inc(prompt_tokens, model=llm_model, kind="prompt")
+    if completion_tokens:
+        llm_tokens_counter.inc(completion_tokens, model=llm_model, kind="completion")
+
+
+def format_numbered_texts(texts: Sequence[str]) -> str:
+    """
+    Liste numérotée des textes, un par ligne.
+
+    Chaque texte est encodé en chaîne JSON: un retour à la ligne ou un
+    guillemet dans un texte ne peut pas créer un faux élément.
+    """
+    return "\n".join(
+        f"[{i}] {json.dumps(text, ensure_ascii=False)}"
+        for i, text in enumerate(texts, 1)
+    )
+
+
+def _load_json(raw: str) -> Any:
+    """JSON de la réponse, en tolérant du texte autour (```json, préambule...)"""
+    try:
+        return json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    match = re.search(r"[\[{].*[\]}]", raw or "", re.DOTALL)
+    if match is None:
+        raise ValueError("aucun JSON dans la réponse")
+    return json.loads(match.group())
+
+
+def parse_packed_response(raw: str, count: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Extrait les résultats par numéro d'une réponse packée.
+
+    Accepte un tableau JSON ou un objet {"results": [...]} (les modes JSON
+    d'OpenAI et d'Ollama imposent un objet). Un élément sans "id" prend sa
+    position dans le tableau; les numéros hors plage ou dupliqués sont ignorés.
+
+    Args:
+        raw: Texte brut de la réponse du LLM
+        count: Nombre de textes envoyés
+
+    Returns:
+        {numéro (1..count): élément JSON}
+    """
+    data = _load_json(raw)
+    if isinstance(data, dict):
+        data = data.get("results", data.get("items", []))
+    if not isinstance(data, list):
+        raise ValueError("la réponse n'est pas un tableau de résultats")
+
+    items: Dict[int, Dict[str, Any]] = {}
+    for position, item in enumerate(data, 1):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get("id", position))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= count and number not in items:
+            items[number] = item
+    return items
+
+
+def run_packed(
+    texts: Sequence[str],
+    pack_size: int,
+    call_pack: Callable[[List[str]], str],
+    call_single: Callable[[str], Dict[str, Any]],
+    normalize: Callable[[Dict[str, Any]], Dict[str, Any]],
+    on_error: Callable[[str, Exception], Dict[str, Any]],
+    name: str = "batch"
+) -> List[Dict[str, Any]]:
+    """
+    Prédiction batch par prompts packés, avec retry unitaire des manquants.
+
+    Les packs sont envoyés en parallèle via `map_bounded` (mêmes limites de
+    concurrence et délai global que le fan-out unitaire).
+
+    Args:
+        texts: Textes à analyser
+        pack_size: Nombre de textes par prompt
+        call_pack: Appel LLM pour un pack, retourne la réponse brute
+        call_single: Prédiction unitaire (retry d'un élément manquant)
+        normalize: Valide et normalise un élément (lève une exception si invalide)
+        on_error: Résultat d'un élément en échec
+        name: Nom du modèle (logs et métriques)
+
+    Returns:
+        Résultats dans l'ordre de `texts`
+    """
+    pack_size = max(1, pack_size)
+    packs = [list(texts[i:i + pack_size]) for i in range(0, len(texts), pack_size)]
+
+    def process(pack: List[str]) -> List[Dict[str, Any]]:
+        try:
+            items = parse_packed_response(call_pack(pack), len(pack))
+        except Exception as e:
+            logger.warning(f"⚠️  Réponse packée inexploitable ({name}, {len(pack)} textes): {e}")
+            items = {}
+
+        results = []
+        for number, text in enumerate(pack, 1):
+            result = None
+            if number in items:
+                try:
+                    result = normalize(items[number])
+                except Exception:
+                    result = None  # Élément malformé: retry unitaire
+            if result is None:
+                packed_retries_counter.inc(model=name)
+                try:
+                    result = call_single(text)
+                except Exception as e:
+                    result = on_error(text, e)
+            results.append(result)
+        return results
+
+    packed = map_bounded(
+        process,
+        packs,
+        on_error=lambda pack, e: [on_error(text, e) for text in pack],
+        name=name
+    )
+    return [result for pack_results in packed for result in pack_results]
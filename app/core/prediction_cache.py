@@ -0,0 +1,439 @@
+"""
+Cache des prédictions texte adressé par contenu
+
+Clé = sha256(model_name, model_version, texte normalisé, options). Deux niveaux:
+- Un LRU en mémoire (TTL + taille max en octets), propre au process
+- Un niveau partagé optionnel (SQLite sur disque ou Redis) entre workers
+
+Les décorateurs `cached_predict` / `cached_apredict` / `cached_batch_predict`
+se posent sur les méthodes `predict` / `apredict` / `batch_predict` des
+modèles texte. Un résultat servi depuis le cache porte `cached: true`, et son
+`processing_time` (ms) est remplacé par la durée de la lecture du cache.
+"""
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.core.base_model import is_failed_result
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+cache_hits_counter = runtime_metrics.counter(
+    "prediction_cache_hits",
+    "Prédictions servies depuis le cache (par modèle et niveau)"
+)
+cache_misses_counter = runtime_metrics.counter(
+    "prediction_cache_misses",
+    "Prédictions absentes du cache (calculées par le modèle)"
+)
+
+
+def normalize_text(text: str) -> str:
+    """Normalise un texte pour la clé de cache (NFC, espaces)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_cache_key(model_name: str, model_version: str, text: str, options: Dict[str, Any]) -> str:
+    """
+    Construit la clé de cache d'une prédiction.
+
+    Args:
+        model_name: Nom du modèle
+        model_version: Version du modèle (invalide le cache à chaque release)
+        text: Texte brut (normalisé ici)
+        options: Options influençant le résultat (ex: include_reasoning)
+    """
+    payload = json.dumps(
+        [model_name, model_version, normalize_text(text), sorted(options.items())],
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _served_from_cache(result: Dict[str, Any], start: float) -> Dict[str, Any]:
+    """Marque un résultat lu dans le cache (latence = durée de la lecture, en ms)"""
+    result["cached"] = True
+    if "processing_time" in result:
+        result["processing_time"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def _is_cacheable(result: Any) -> bool:
+    """Les erreurs (ERREUR, champ error) ne sont jamais mises en cache"""
+    return isinstance(result, dict) and not is_failed_result(result)
+
+
+# ============================================================================
+# NIVEAU MÉMOIRE
+# ============================================================================
+
+class MemoryLRUCache:
+    """LRU thread-safe borné en octets, avec expiration par entrée"""
+
+    def __init__(self, max_bytes: int, ttl_s: float):
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic() + self.ttl_s, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "evictions": self.evictions
+        }
+
+
+# ============================================================================
+# NIVEAUX PARTAGÉS
+# ============================================================================
+
+class SQLiteCacheBackend:
+    """Niveau partagé sur disque (plusieurs workers sur la même machine)"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, ttl_s: float):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl_s = ttl_s
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prediction_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM prediction_cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_s)
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM prediction_cache")
+
+
+class RedisCacheBackend:
+    """Niveau partagé Redis (ou compatible: KeyDB, Dragonfly...)"""
+
+    name = "redis"
+
+    def __init__(self, url: str, ttl_s: float):
+        import redis  # Dépendance optionnelle
+
+        self.ttl_s = int(ttl_s)
+        self._client = redis.Redis.from_url(url, socket_timeout=0.1)
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(f"prediction:{key}")
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        self._client.set(f"prediction:{key}", value, ex=self.ttl_s)
+
+    def clear(self) -> None:
+        for key in self._client.scan_iter("prediction:*"):
+            self._client.delete(key)
+
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class PredictionCache:
+    """Cache à deux niveaux (mémoire puis partagé) des résultats de prédiction"""
+
+    def __init__(self):
+        self.memory = MemoryLRUCache(
+            max_bytes=settings.PREDICTION_CACHE_MAX_BYTES,
+            ttl_s=settings.PREDICTION_CACHE_TTL_S
+        )
+        self.shared = self._create_shared_backend()
+        self._model_stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, model_name: str, outcome: str) -> None:
+        with self._stats_lock:
+            stats = self._model_stats.setdefault(model_name, {"hits": 0, "misses": 0})
+            stats[outcome] += 1
+
+    @staticmethod
+    def _create_shared_backend():
+        backend = settings.PREDICTION_CACHE_SHARED_BACKEND.lower()
+        if backend in ("", "none"):
+            return None
+        try:
+            if backend == "sqlite":
+                return SQLiteCacheBackend(settings.PREDICTION_CACHE_SQLITE_PATH, settings.PREDICTION_CACHE_TTL_S)
+            if backend == "redis":
+                return RedisCacheBackend(settings.PREDICTION_CACHE_REDIS_URL, settings.PREDICTION_CACHE_TTL_S)
+            logger.warning(f"⚠️ Backend de cache partagé inconnu: {backend}")
+        except Exception as e:
+            logger.warning(f"⚠️ Cache partagé '{backend}' indisponible, mémoire seule: {e}")
+        return None
+
+    def is_enabled_for(self, model_name: str) -> bool:
+        if not settings.ENABLE_PREDICTION_CACHE:
+            return False
+        disabled = {name.strip() for name in settings.PREDICTION_CACHE_DISABLED_MODELS.split(",")}
+        return model_name not in disabled
+
+    def get(self, model_name: str, key: str) -> Optional[Dict[str, Any]]:
+        """Cherche un résultat (mémoire puis partagé); None si absent"""
+        value = self.memory.get(key)
+        tier = "memory"
+
+        if value is None and self.shared is not None:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                logger.warning(f"⚠️ Lecture cache partagé échouée: {e}")
+            if value is not None:
+                tier = self.shared.name
+                self.memory.set(key, value)
+
+        if value is None:
+            cache_misses_counter.inc(model=model_name)
+            self._record(model_name, "misses")
+            return None
+
+        cache_hits_counter.inc(model=model_name, tier=tier)
+        self._record(model_name, "hits")
+        return json.loads(value)
+
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Enregistre un résultat dans les deux niveaux (erreurs ignorées)"""
+        if not _is_cacheable(result):
+            return
+        value = json.dumps(
+            {k: v for k, v in result.items() if k != "cached"}, ensure_ascii=False, default=str
+        )
+        self.memory.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, value)
+            except Exception as e:
+                logger.warning(f"⚠️ Écriture cache partagé échouée: {e}")
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            per_model = {name: dict(stats) for name, stats in self._model_stats.items()}
+        for stats in per_model.values():
+            total = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+
+        return {
+            "enabled": settings.ENABLE_PREDICTION_CACHE,
+            "memory": self.memory.stats(),
+            "shared_backend": self.shared.name if self.shared is not None else None,
+            "models": per_model
+        }
+
+
+_cache: Optional[PredictionCache] = None
+_cache_lock = threading.Lock()
+
+# Actif pendant un batch_predict en cache (les predict internes ne repassent
+# pas par le cache) et pendant un health check (le modèle doit être appelé)
+_bypass = threading.local()
+
+
+@contextmanager
+def bypass_cache():
+    """Les predict exécutés dans ce bloc (même thread) ignorent le cache"""
+    previous = getattr(_bypass, "active", False)
+    _bypass.active = True
+    try:
+        yield
+    finally:
+        _bypass.active = previous
+
+
+def get_prediction_cache() -> PredictionCache:
+    """Retourne le cache global (créé au premier usage)"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = PredictionCache()
+    return _cache
+
+
+# ============================================================================
+# DÉCORATEURS
+# ============================================================================
+
+def _bind_options(signature: inspect.Signature, args: tuple, kwargs: dict, text_param: str) -> Tuple[Any, Dict[str, Any]]:
+    """Extrait (texte(s), options avec valeurs par défaut appliquées)"""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop("self", None)
+    value = arguments.pop(text_param)
+    for name, param in signature.parameters.items():
+        if param.kind is inspect.Parameter.VAR_KEYWORD:
+            arguments.update(arguments.pop(name, {}))
+    return value, arguments
+
+
+def cached_predict(func: Callable) -> Callable:
+    """Met en cache `predict(self, text, **options)`"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = get_prediction_cache()
+        if getattr(_bypass, "active", False) or not cache.is_enabled_for(self.model_name):
+            return func(self, *args, **kwargs)
+
+        text, options = _bind_options(signature, (self,) + args, kwargs, "text")
+        if not isinstance(text, str):
+            return func(self, *args, **kwargs)
+
+        start = time.perf_counter()
+        key = make_cache_key(self.model_name, self.model_version, text, options)
+        cached = cache.get(self.model_name, key)
+        if cached is not None:
+            return _served_from_cache(cached, start)
+
+        result = func(self, *args, **kwargs)
+        cache.set(key, result)
+        return copy.deepcopy(result)
+
+    return wrapper
+
+
+def cached_apredict(func: Callable) -> Callable:
+    """Met en cache `async apredict(self, text, **options)` (mêmes clés que `predict`)"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        cache = get_prediction_cache()
+        if not cache.is_enabled_for(self.model_name):
+            return await func(self, *args, **kwargs)
+
+        text, options = _bind_options(signature, (self,) + args, kwargs, "text")
+        if not isinstance(text, str):
+            return await func(self, *args, **kwargs)
+
+        start = time.perf_counter()
+        key = make_cache_key(self.model_name, self.model_version, text, options)
+        cached = cache.get(self.model_name, key)
+        if cached is not None:
+            return _served_from_cache(cached, start)
+
+        result = await func(self, *args, **kwargs)
+        cache.set(key, result)
+        return copy.deepcopy(result)
+
+    return wrapper
+
+
+def cached_batch_predict(func: Callable) -> Callable:
+    """
+    Met en cache `batch_predict(self, texts, **options)` texte par texte.
+
+    Seuls les textes absents du cache sont envoyés au modèle, en un seul
+    appel; les résultats sont rendus dans l'ordre d'origine.
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = get_prediction_cache()
+        if not cache.is_enabled_for(self.model_name):
+            return func(self, *args, **kwargs)
+
+        texts, options = _bind_options(signature, (self,) + args, kwargs, "texts")
+        if not texts or not all(isinstance(text, str) for text in texts):
+            return func(self, *args, **kwargs)
+
+        results: List[Optional[Dict[str, Any]]] = []
+        keys = []
+        for text in texts:
+            start = time.perf_counter()
+            key = make_cache_key(self.model_name, self.model_version, text, options)
+            cached = cache.get(self.model_name, key)
+            keys.append(key)
+            results.append(_served_from_cache(cached, start) if cached is not None else None)
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        if missing:
+            with bypass_cache():
+                computed = func(self, [texts[i] for i in missing], **options)
+            for index, result in zip(missing, computed):
+                # Les éléments en échec (erreur, timeout du batch) ne sont pas mis en cache
+                cache.set(keys[index], result)
+                results[index] = copy.deepcopy(result)
+
+        return results
+
+    return wrapper
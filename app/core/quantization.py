@@ -0,0 +1,120 @@
+"""
+Quantification dynamique int8 des modèles transformers (inférence CPU)
+
+Les couches Linear sont converties en int8 (poids) avec quantification
+dynamique des activations. Le modèle quantifié peut être mis en cache sur
+disque pour que les démarrages suivants évitent le chargement fp32 et la
+quantification.
+"""
+import hashlib
+import os
+import re
+from pathlib import Path
+from typing import Callable, Optional
+from app.config import settings
+from app.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+INFERENCE_MODES = ("fp32", "int8")
+
+
+def resolve_inference_mode(mode: str, device) -> str:
+    """
+    Valide le mode d'inférence demandé pour un device.
+
+    La quantification dynamique n'existe que sur CPU: sur GPU on reste en fp32.
+    """
+    mode = (mode or "fp32").lower()
+    if mode not in INFERENCE_MODES:
+        logger.warning(f"⚠️  Mode d'inférence inconnu '{mode}', utilisation de fp32")
+        return "fp32"
+    if mode == "int8" and str(device) != "cpu":
+        logger.warning(f"⚠️  Quantification int8 disponible sur CPU uniquement ({device}), utilisation de fp32")
+        return "fp32"
+    return mode
+
+
+def quantize_dynamic_int8(model):
+    """Quantifie dynamiquement les couches Linear d'un modèle en int8"""
+    import torch
+    import torch.nn as nn
+
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def model_cache_path(cache_dir: str, source: str, suffix: str) -> Optional[Path]:
+    """
+    Fichier de cache d'un artefact dérivé d'un modèle (int8, ONNX...).
+
+    La clé inclut les versions de torch/transformers et, pour un dossier
+    local, la date de modification des fichiers: un modèle ré-entraîné ou une
+    mise à jour des bibliothèques invalide le cache.
+
+    Args:
+        cache_dir: Dossier de cache (vide = pas de cache)
+        source: Identifiant du modèle (nom HuggingFace ou dossier local)
+        suffix: Fin du nom de fichier (ex: "int8.pt", "1.0.0.onnx")
+    """
+    if not cache_dir:
+        return None
+
+    import torch
+    import transformers
+
+    fingerprint = [source, suffix, torch.__version__, transformers.__version__]
+    source_dir = Path(source)
+    if source_dir.is_dir():
+        fingerprint += [
+            f"{path.name}:{path.stat().st_mtime_ns}"
+            for path in sorted(source_dir.iterdir())
+            if path.is_file()
+        ]
+    digest = hashlib.sha256("|".join(fingerprint).encode("utf-8")).hexdigest()[:16]
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", source_dir.name or source)
+    return Path(cache_dir) / f"{name}-{digest}-{suffix}"
+
+
+def load_quantized_model(source: str, build_fp32: Callable[[], object]):
+    """
+    Retourne le modèle quantifié int8, depuis le cache disque si possible.
+
+    Le cache est un pickle torch complet du modèle: il n'est relu que depuis
+    QUANTIZED_MODEL_CACHE_DIR, écrit par ce service.
+
+    Args:
+        source: Identifiant du modèle (nom HuggingFace ou dossier local)
+        build_fp32: Callable qui charge le modèle fp32 (appelé si pas de cache)
+
+    Returns:
+        Modèle quantifié, en mode eval
+    """
+    import torch
+
+    path = model_cache_path(settings.QUANTIZED_MODEL_CACHE_DIR, source, "int8.pt")
+    if path is not None and path.exists():
+        try:
+            model = torch.load(path, map_location="cpu", weights_only=False)
+            model.eval()
+            logger.info(f"✓ Modèle int8 chargé depuis le cache: {path}")
+            return model
+        except Exception as e:
+            logger.warning(f"⚠️  Cache int8 illisible ({path}), re-quantification: {e}")
+
+    model = quantize_dynamic_int8(build_fp32())
+    logger.info(f"✓ Modèle quantifié en int8: {source}")
+
+    if path is not None:
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            torch.save(model, tmp_path)
+            os.replace(tmp_path, path)
+            logger.info(f"✓ Modèle int8 mis en cache: {path}")
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            logger.warning(f"⚠️  Impossible de mettre le modèle int8 en cache: {e}")
+
+    return model
@@ -0,0 +1,167 @@
+"""
+Sorties structurées (JSON) des LLM de détection
+
+- Schémas JSON envoyés aux providers qui savent contraindre le décodage
+  (Ollama `format`, OpenAI `response_format` json_schema)
+- `JsonObjectScanner`: détecte, fragment par fragment, la fermeture du premier
+  objet JSON pour arrêter une génération en streaming dès qu'il est complet
+- `parse_json_object`: chemin rapide `json.loads`, puis extraction du premier
+  objet complet au milieu d'un préambule ou d'un bloc ```json
+
+Chaque parsing est comptabilisé par provider (ok, recovered, failed): le taux
+d'échec est visible dans /metrics/runtime.
+"""
+import json
+from typing import Any, Callable, Dict, Optional, Sequence
+from app.core.metrics.runtime_metrics import runtime_metrics
+
+structured_output_counter = runtime_metrics.counter(
+    "llm_structured_outputs",
+    "Réponses JSON des LLM par provider (outcome: ok, recovered, failed)"
+)
+
+_decoder = json.JSONDecoder()
+
+
+def detection_schema(
+    predictions: Sequence[str],
+    severities: Sequence[str],
+    include_reasoning: bool = True
+) -> Dict[str, Any]:
+    """Schéma d'une prédiction de dépression (labels propres à chaque modèle)"""
+    properties: Dict[str, Any] = {
+        "prediction": {"type": "string", "enum": list(predictions)},
+        "confidence": {"type": "number"},  # Bornée à [0, 1] à la normalisation
+        "severity": {"type": "string", "enum": list(severities)},
+    }
+    if include_reasoning:
+        properties["reasoning"] = {"type": "string"}
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+
+def packed_schema(item_schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Schéma d'une réponse packée: {"results": [{"id": n, ...prédiction}]}"""
+    item = {
+        **item_schema,
+        "properties": {"id": {"type": "integer"}, **item_schema["properties"]},
+        "required": ["id", *item_schema["required"]],
+    }
+    return {
+        "type": "object",
+        "properties": {"results": {"type": "array", "items": item}},
+        "required": ["results"],
+        "additionalProperties": False
+    }
+
+
+class JsonObjectScanner:
+    """
+    Suit la profondeur des accolades d'un flux de texte (hors chaînes JSON).
+
+    Usage:
+        scanner = JsonObjectScanner()
+        for chunk in stream:
+            if scanner.feed(chunk):
+                break  # objet complet: inutile de générer la suite
+        raw = scanner.text
+    """
+
+    def __init__(self, prefix: str = ""):
+        self._parts = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self.complete = False
+        if prefix:
+            self.feed(prefix)
+
+    def feed(self, chunk: str) -> bool:
+        """Ajoute un fragment; retourne True dès que le premier objet est fermé"""
+        if self.complete:
+            return True
+        for index, char in enumerate(chunk):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._started:
+                self._in_string = True
+            elif char == "{":
+                self._started = True
+                self._depth += 1
+            elif char == "}" and self._started:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[:index + 1])
+                    self.complete = True
+                    return True
+        self._parts.append(chunk)
+        return False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+
+def _first_object(raw: str) -> Optional[Dict[str, Any]]:
+    """Premier objet JSON complet du texte (accolades imbriquées comprises)"""
+    start = raw.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(raw, start)
+            if isinstance(value, dict):
+                return value
+        except json.JSONDecodeError:
+            pass
+        start = raw.find("{", start + 1)
+    return None
+
+
+def parse_json_object(
+    raw: str,
+    provider: str,
+    validate: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Objet JSON d'une réponse LLM.
+
+    Args:
+        raw: Texte brut de la réponse
+        provider: Provider (ou modèle) pour les métriques d'échec
+        validate: Validation / normalisation de l'objet (lève une exception si invalide)
+
+    Returns:
+        L'objet JSON (validé si `validate` est fourni)
+
+    Raises:
+        ValueError: Si la réponse ne contient aucun objet JSON valide
+    """
+    outcome = "ok"
+    try:
+        value = json.loads(raw)
+    except (json.JSONDecodeError, TypeError):
+        value = None
+    if not isinstance(value, dict):
+        outcome = "recovered"
+        value = _first_object(raw or "")
+
+    try:
+        if value is None:
+            raise ValueError(f"aucun objet JSON dans la réponse: {(raw or '')[:80]!r}")
+        if validate is not None:
+            value = validate(value)
+    except Exception as e:
+        structured_output_counter.inc(provider=provider, outcome="failed")
+        raise ValueError(str(e)) from e
+
+    structured_output_counter.inc(provider=provider, outcome=outcome)
+    return value
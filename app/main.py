@@ -10,9 +10,24 @@ from app.routes.depression_api import router as depression_router
 from app.routes.metrics_api import router as metrics_router
 from app.models.schemas import HealthResponse
 from app.core.model_registry import registry
+from app.core.inference_executor import inference_executor
+from app.core.micro_batcher import release_batcher
+from app.core.ollama_client import close_ollama_clients
+from app.core.llm_clients import llm_clients
+from app.core.metrics.prometheus import (
+    PrometheusMiddleware,
+    multiprocess_enabled,
+    reset_multiprocess_dir,
+    run_multiprocess_sync,
+    write_worker_snapshot
+)
 from app.services.recommendation.recommendation_service import recommend_service
 from app.utils.logger import setup_logger
 from datetime import datetime
+from typing import List, Optional, Set
+import asyncio
+import importlib
+import time
 
 logger = setup_logger(__name__)
 
@@ -34,6 +49,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Métriques HTTP Prometheus (compteurs / durées par route, en mémoire)
+app.add_middleware(PrometheusMiddleware)
+
 # Inclure les routes
 app.include_router(router)
 app.include_router(hatecomment_router)
@@ -44,6 +62,56 @@ app.include_router(censure_router)
 app.include_router(depression_router)
 app.include_router(metrics_router)
 
+# Tâches de fond: chargement des modèles au démarrage, éviction (si activée),
+# publication des métriques du worker (Prometheus multi-process), maintenance
+# des partitions de métriques
+_loading_task: Optional[asyncio.Task] = None
+_eviction_task: Optional[asyncio.Task] = None
+_metrics_sync_task: Optional[asyncio.Task] = None
+_metrics_partition_task: Optional[asyncio.Task] = None
+
+# Modèles que ce replica doit servir avant d'être prêt (/ready)
+_required_models: List[str] = []
+
+
+def _model_factory(module_path: str, class_name: str):
+    """Factory qui importe et instancie le modèle seulement à son chargement"""
+    def build():
+        module = importlib.import_module(module_path)
+        return getattr(module, class_name)()
+    return build
+
+
+async def _load_models(model_names: List[str], fallback_only: Set[str]):
+    """Charge les modèles en parallèle puis résume l'état du registre"""
+    start = time.perf_counter()
+    if model_names:
+        logger.info(
+            f"⏳ Chargement de {len(model_names)} modèle(s) "
+            f"({settings.MODEL_LOAD_WORKERS} en parallèle)..."
+        )
+    results = await asyncio.to_thread(registry.load_many, model_names, settings.MODEL_LOAD_WORKERS)
+    
+    # Fallback CamemBERT seulement si Qwen n'a pas pu être chargé
+    if fallback_only and results.get("qwen-depression") is False:
+        logger.info("  Tentative de fallback vers CamemBERT...")
+        fallbacks = list(fallback_only)
+        await asyncio.to_thread(registry.load_many, fallbacks, settings.MODEL_LOAD_WORKERS)
+        if "qwen-depression" in _required_models:
+            _required_models.remove("qwen-depression")
+            _required_models.extend(name for name in fallbacks if name not in _required_models)
+    
+    # Résumé
+    logger.info("-"*70)
+    status = registry.get_load_status()
+    logger.info(f"✓ Chargement terminé en {time.perf_counter() - start:.1f}s:")
+    for name, info in registry.list_models().items():
+        default_marker = " [DÉFAUT]" if info.get('is_default') else ""
+        if "version" in info:
+            logger.info(f"  • {name} v{info['version']} by {info['author']}{default_marker}")
+        else:
+            logger.info(f"  • {name} ({status[name]['state']}){default_marker}")
+    logger.info("-"*70)
 
 
 @app.on_event("startup")
@@ -56,143 +124,147 @@ async def startup_event():
     
     # Connexion à la base de données PostgreSQL pour les métriques
     if settings.ENABLE_METRICS:
+        from app.core.metrics.ingestion import metrics_ingestion
         try:
             from app.core.metrics.database import db
             await db.connect()
             logger.info("✓ Connexion PostgreSQL établie (métriques)")
         except Exception as e:
             logger.warning(f"⚠️ Impossible de se connecter à PostgreSQL: {e}")
-            logger.warning("  Les métriques seront désactivées")
+            logger.warning("  Les métriques persistées seront désactivées")
+            # Prometheus et taux d'erreur restent alimentés en mémoire
+            metrics_ingestion.disable_persistence()
+        else:
+            # Partitions à venir / expirées, puis maintenance périodique
+            global _metrics_partition_task
+            from app.core.metrics.partitions import partition_manager
+            try:
+                await partition_manager.run_maintenance()
+            except Exception as e:
+                logger.warning(f"⚠️ Maintenance des partitions de métriques impossible: {e}")
+            _metrics_partition_task = asyncio.create_task(partition_manager.run_maintenance_loop())
+            # Écriture des métriques par lots en tâche de fond
+            await metrics_ingestion.start()
     
-    # Enregistrer les modèles disponibles
+    # Enregistrer les modèles disponibles (factories: construits au chargement)
     logger.info("\n📦 Enregistrement des modèles...")
     logger.info("-"*70)
     
     # 1. Modèle YANSNET LLM
-    try:
-        from app.services.yansnet_llm import YansnetLLMModel
-        registry.register(YansnetLLMModel(), set_as_default=True)
-    except Exception as e:
-        logger.error(f"✗ Erreur lors de l'enregistrement du modèle YANSNET LLM: {e}")
-        logger.error(f"  Vérifiez que .env est configuré avec les clés API")
+    registry.register_factory(
+        "yansnet-llm",
+        _model_factory("app.services.yansnet_llm", "YansnetLLMModel"),
+        set_as_default=True
+    )
     
     # 2. Modèle de détection de dépression selon la configuration
     detection_provider = settings.DETECTION_PROVIDER.lower()
     logger.info(f"📊 Provider de détection configuré: {detection_provider}")
+    camembert_factory = _model_factory("app.services.camembert_depression", "CamemBERTDepressionModel")
+    fallback_only = set()
     
-    if detection_provider == "qwen":
-        # Utiliser Qwen 2.5 1.5B via Ollama
-        try:
-            from app.services.qwen_depression import QwenDepressionModel
-            qwen_model = QwenDepressionModel()
-            registry.register_detection_model(qwen_model, priority=10)
-            logger.info("✓ Modèle Qwen 2.5 1.5B de détection de dépression enregistré (primaire)")
-        except Exception as e:
-            logger.error(f"✗ Erreur lors de l'enregistrement du modèle Qwen: {e}")
-            logger.error(f"  Vérifiez que Ollama est démarré et que qwen2.5:1.5b est téléchargé")
-            # Fallback to CamemBERT
-            logger.info("  Tentative de fallback vers CamemBERT...")
-            try:
-                from app.services.camembert_depression import CamemBERTDepressionModel
-                camembert_model = CamemBERTDepressionModel()
-                registry.register_detection_model(camembert_model, priority=10)
-                logger.info("✓ Fallback: Modèle CamemBERT enregistré comme primaire")
-            except Exception as e2:
-                logger.error(f"✗ Fallback CamemBERT également échoué: {e2}")
-    
-    elif detection_provider == "camembert":
-        # Utiliser CamemBERT (défaut)
-        try:
-            from app.services.camembert_depression import CamemBERTDepressionModel
-            camembert_model = CamemBERTDepressionModel()
-            registry.register_detection_model(camembert_model, priority=10)
-            logger.info("✓ Modèle CamemBERT de détection de dépression enregistré (primaire)")
-        except Exception as e:
-            logger.error(f"✗ Erreur lors de l'enregistrement du modèle CamemBERT: {e}")
-            logger.error(f"  Vérifiez que les dépendances sont installées (transformers, torch)")
-    
-    elif detection_provider == "xlm-roberta":
-        # Utiliser XLM-RoBERTa (multilingue)
-        logger.warning("⚠️ XLM-RoBERTa non encore implémenté, utilisation de CamemBERT")
-        try:
-            from app.services.camembert_depression import CamemBERTDepressionModel
-            camembert_model = CamemBERTDepressionModel()
-            registry.register_detection_model(camembert_model, priority=10)
-            logger.info("✓ Modèle CamemBERT de détection de dépression enregistré (primaire)")
-        except Exception as e:
-            logger.error(f"✗ Erreur lors de l'enregistrement du modèle CamemBERT: {e}")
-    
+    if detection_provider == "cascade":
+        # CamemBERT en premier étage, Qwen pour les textes incertains
+        registry.register_factory("camembert-depression", camembert_factory, detection_priority=10)
+        registry.register_factory(
+            "qwen-depression",
+            _model_factory("app.services.qwen_depression", "QwenDepressionModel"),
+            detection_priority=5
+        )
+    elif detection_provider == "qwen":
+        # Qwen 2.5 1.5B via Ollama, CamemBERT en secours si Qwen ne charge pas
+        registry.register_factory(
+            "qwen-depression",
+            _model_factory("app.services.qwen_depression", "QwenDepressionModel"),
+            detection_priority=10
+        )
+        registry.register_factory("camembert-depression", camembert_factory, detection_priority=5)
+        fallback_only.add("camembert-depression")
     else:
-        logger.warning(f"⚠️ Provider de détection inconnu: {detection_provider}")
-        logger.info("  Tentative d'enregistrement de CamemBERT par défaut...")
-        try:
-            from app.services.camembert_depression import CamemBERTDepressionModel
-            camembert_model = CamemBERTDepressionModel()
-            registry.register_detection_model(camembert_model, priority=10)
-            logger.info("✓ Modèle CamemBERT de détection de dépression enregistré (primaire)")
-        except Exception as e:
-            logger.error(f"✗ Erreur lors de l'enregistrement du modèle CamemBERT: {e}")
+        if detection_provider == "xlm-roberta":
+            logger.warning("⚠️ XLM-RoBERTa non encore implémenté, utilisation de CamemBERT")
+        elif detection_provider != "camembert":
+            logger.warning(f"⚠️ Provider de détection inconnu: {detection_provider}")
+            logger.info("  Utilisation de CamemBERT par défaut...")
+        registry.register_factory("camembert-depression", camembert_factory, detection_priority=10)
     
     # 3. Modèle de Détection de Contenu Sensible dans les Images
-    try:
-        from app.services.sensitive_image_caption import SensitiveImageCaptionModel
-        registry.register(SensitiveImageCaptionModel())
-        logger.info("✓ Modèle de détection de contenu sensible (images) enregistré")
-    except Exception as e:
-        logger.error(f"✗ Erreur lors de l'enregistrement du modèle d'images: {e}")
-        logger.error(f"  Vérifiez que les dépendances sont installées (transformers, torch, PIL)")
-
+    registry.register_factory(
+        "sensitive-image-caption",
+        _model_factory("app.services.sensitive_image_caption", "SensitiveImageCaptionModel")
+    )
+    
     # 4. Générateur de Contenu YANSNET
-    try:
-        from app.services.yansnet_content_generator import YansnetContentGeneratorModel
-        registry.register(YansnetContentGeneratorModel())
-        logger.info("✓ Générateur de contenu YANSNET enregistré")
-    except Exception as e:
-        logger.error(f"✗ Erreur lors de l'enregistrement du générateur: {e}")
-        logger.error(f"  Vérifiez que le LLM est configuré dans .env")
-
+    registry.register_factory(
+        "yansnet-content-generator",
+        _model_factory("app.services.yansnet_content_generator", "YansnetContentGeneratorModel")
+    )
+    
     # 5. Modèle HateComment BERT
-    try:
-        from app.services.hatecomment_bert import HateCommentBertModel
-        registry.register(HateCommentBertModel())
-        logger.info("✓ Modèle HateComment BERT enregistré")
-    except Exception as e:
-        logger.error(f"✗ Erreur lors de l'enregistrement du modèle HateComment BERT: {e}")
+    registry.register_factory(
+        "hatecomment-bert",
+        _model_factory("app.services.hatecomment_bert", "HateCommentBertModel")
+    )
     
     # 6. Système de Recommandation
-    try:
-        from app.services.recommendation import RecommendationModel
-        registry.register(RecommendationModel())
-        logger.info("✓ Système de recommandation enregistré")
-    except Exception as e:
-        logger.error(f"✗ Erreur lors de l'enregistrement du système de recommandation: {e}")
+    registry.register_factory(
+        "recommendation-system",
+        _model_factory("app.services.recommendation", "RecommendationModel")
+    )
     
     # 7. Modèle de Détection NSFW
-    try:
-        from app.services.model_censure import CensureModel
-        registry.register(CensureModel())
-        logger.info("✓ Modèle de détection NSFW enregistré")
-    except Exception as e:
-        logger.error(f"✗ Erreur lors de l'enregistrement du modèle NSFW: {e}")
+    registry.register_factory(
+        "censure-nsfw",
+        _model_factory("app.services.model_censure", "CensureModel")
+    )
     
     # 8. Autres modèles à ajouter ici
     # Exemple pour un futur étudiant:
-    # try:
-    #     from app.services.etudiant2_gcn import Etudiant2GCNModel
-    #     registry.register(Etudiant2GCNModel())
-    # except Exception as e:
-    #     logger.error(f"✗ Erreur: {e}")
+    # registry.register_factory(
+    #     "etudiant2-gcn",
+    #     _model_factory("app.services.etudiant2_gcn", "Etudiant2GCNModel")
+    # )
     
-    # Résumé
-    logger.info("-"*70)
-    models = registry.list_models()
-    if models:
-        logger.info(f"✓ {len(models)} modèle(s) enregistré(s):")
-        for name, info in models.items():
-            default_marker = " [DÉFAUT]" if info.get('is_default') else ""
-            logger.info(f"  • {name} v{info['version']} by {info['author']}{default_marker}")
+    # Un modèle déchargé ne doit plus être retenu par son micro-batcher
+    registry.add_unload_listener(release_batcher)
+    
+    # Chargement en tâche de fond: l'API répond (et /ready reflète l'avancement)
+    # pendant que les modèles se chargent en parallèle
+    global _required_models, _loading_task
+    configured = [name.strip() for name in settings.REQUIRED_MODELS.split(",") if name.strip()]
+    if settings.MODEL_LOADING_MODE.lower() == "lazy":
+        # Seuls les modèles requis sont préchargés, les autres au premier appel
+        logger.info("⏳ Mode lazy: chaque modèle sera chargé à son premier appel")
+        _required_models = configured
+        to_load = list(_required_models)
     else:
-        logger.warning("⚠️  Aucun modèle enregistré!")
+        # Les modèles requis par ce replica sont chargés d'abord, le reste ensuite
+        eager = [name for name in registry.get_model_names() if name not in fallback_only]
+        _required_models = configured or eager
+        to_load = _required_models + [name for name in eager if name not in _required_models]
+    _loading_task = asyncio.create_task(_load_models(to_load, fallback_only))
+    
+    # Éviction des modèles inactifs / pression mémoire
+    global _eviction_task
+    if settings.MODEL_IDLE_TIMEOUT_S > 0 or settings.MODEL_MEMORY_LIMIT_MB > 0:
+        _eviction_task = asyncio.create_task(registry.run_eviction_loop())
+        logger.info(
+            f"✓ Éviction des modèles activée (inactivité: {settings.MODEL_IDLE_TIMEOUT_S}s, "
+            f"limite RSS: {settings.MODEL_MEMORY_LIMIT_MB} Mo)"
+        )
+    
+    # Prometheus multi-process: chaque worker publie ses métriques (les
+    # snapshots d'un lancement précédent sont d'abord supprimés)
+    global _metrics_sync_task
+    if multiprocess_enabled():
+        reset_multiprocess_dir()
+        _metrics_sync_task = asyncio.create_task(run_multiprocess_sync())
+        logger.info(f"✓ Métriques Prometheus multi-process: {settings.METRICS_MULTIPROC_DIR}")
+    
+    logger.info("-"*70)
+    logger.info(f"✓ {len(registry.get_model_names())} modèle(s) enregistré(s)")
+    if _required_models:
+        logger.info(f"  Requis pour /ready: {', '.join(_required_models)}")
     
     logger.info("="*70)
     logger.info("✓ API démarrée avec succès!")
@@ -207,8 +279,17 @@ async def shutdown_event():
     """Événement à l'arrêt"""
     logger.info("Arrêt de l'API...")
     
-    # Fermer la connexion PostgreSQL
+    for task in (_loading_task, _eviction_task, _metrics_sync_task, _metrics_partition_task):
+        if task is not None:
+            task.cancel()
+    
+    # Écrire les métriques en attente puis fermer la connexion PostgreSQL
     if settings.ENABLE_METRICS:
+        try:
+            from app.core.metrics.ingestion import metrics_ingestion
+            await metrics_ingestion.stop()
+        except Exception as e:
+            logger.error(f"Erreur vidage des métriques: {e}")
         try:
             from app.core.metrics.database import db
             await db.disconnect()
@@ -216,6 +297,21 @@ async def shutdown_event():
         except Exception as e:
             logger.error(f"Erreur fermeture PostgreSQL: {e}")
 
+    # Arrêter les pools d'inférence
+    inference_executor.shutdown()
+
+    # Fermer les connexions Ollama
+    close_ollama_clients()
+
+    # Fermer les clients OpenAI / Anthropic partagés
+    await llm_clients.aclose()
+
+    # Dernier état des compteurs de ce worker (multi-process)
+    try:
+        write_worker_snapshot()
+    except Exception as e:
+        logger.error(f"Erreur écriture des métriques du worker: {e}")
+
 
 @app.get(
     "/",
@@ -241,7 +337,8 @@ async def root():
 )
 async def health():
     """Health check global"""
-    models_health = registry.health_check_all()
+    # Les health checks peuvent être bloquants (ping Ollama, etc.)
+    models_health = await asyncio.to_thread(registry.health_check_all)
     models_list = registry.list_models()
     
     return {
@@ -256,6 +353,31 @@ async def health():
     }
 
 
+@app.get(
+    "/ready",
+    response_model=dict,
+    summary="Readiness",
+    description=(
+        "200 dès que les modèles requis par ce replica sont chargés "
+        "(ou déchargés par l'éviction, rechargés au prochain appel), 503 sinon"
+    )
+)
+async def ready():
+    """Readiness: modèles requis chargés / évincés / en attente / en échec"""
+    readiness = registry.get_readiness(_required_models)
+    is_ready = not (readiness["pending"] or readiness["failed"] or readiness["unknown"])
+    
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "status": "ready" if is_ready else "not_ready",
+            "required": _required_models,
+            **readiness,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    )
+
+
 @app.get(
     "/recommend",
     response_model=dict,
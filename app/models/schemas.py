@@ -414,3 +414,46 @@ class GeneratePostWithCommentsResponse(BaseModel):
                 "timestamp": "2025-01-16T10:30:00Z"
             }
         }
+
+
+class GenerateDatasetRequest(BaseModel):
+    """Requête de génération d'un jeu de démo (K posts avec M commentaires)"""
+    num_posts: int = Field(
+        ...,
+        ge=1,
+        le=50,
+        description="Nombre de posts à générer"
+    )
+    num_comments: Optional[int] = Field(
+        None,
+        ge=0,
+        le=20,
+        description="Commentaires par post (8-12 aléatoire si non spécifié)"
+    )
+    post_type: Optional[PostTypeEnum] = Field(
+        None,
+        description="Type de post (aléatoire par post si non spécifié)"
+    )
+    topic: Optional[str] = Field(
+        None,
+        max_length=200,
+        description="Sujet (aléatoire par post si non spécifié)"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "num_posts": 10,
+                "num_comments": 5
+            }
+        }
+
+
+class GenerateDatasetResponse(BaseModel):
+    """Réponse de génération d'un jeu de démo"""
+    posts: List[GeneratePostWithCommentsResponse]
+    total_posts: int
+    total_comments: int
+    failed_posts: int = Field(0, description="Posts dont la génération a échoué (absents de la liste)")
+    processing_time: float = Field(..., description="Temps total de génération (secondes)")
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
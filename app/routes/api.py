@@ -2,7 +2,8 @@
 Routes API - Support multi-modèles
 """
 from fastapi import APIRouter, HTTPException, status, Query, UploadFile, File, Form
-from typing import Optional, List
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Callable, Optional, List
 from datetime import datetime
 from app.models.schemas import (
     PredictRequest,
@@ -15,12 +16,19 @@ from app.models.schemas import (
     GenerateCommentsRequest,
     GenerateCommentsResponse,
     GeneratePostWithCommentsRequest,
-    GeneratePostWithCommentsResponse
+    GeneratePostWithCommentsResponse,
+    GenerateDatasetRequest,
+    GenerateDatasetResponse
 )
+from app.config import settings
 from app.core.model_registry import registry
+from app.core.inference_executor import inference_executor, run_inference
+from app.core.image_cache import predict_images_cached
 from app.utils.logger import setup_logger
 from PIL import Image
+import asyncio
 import io
+import json
 import time
 
 logger = setup_logger(__name__)
@@ -43,12 +51,34 @@ async def list_models():
     - **default**: Nom du modèle par défaut
     """
     models = registry.list_models()
-    default_model = registry.get_default()
     
     return {
         "models": models,
         "total": len(models),
-        "default": default_model.model_name if default_model else None
+        "default": registry.get_default_name()
+    }
+
+
+@router.get(
+    "/models/status",
+    summary="État de chargement des modèles",
+    description="État de chargement, temps de chargement et mémoire de chaque modèle"
+)
+async def models_status():
+    """
+    État de chargement de chaque modèle (sans déclencher de chargement).
+
+    Retourne pour chaque modèle:
+    - **state**: unloaded, loading, loaded ou failed
+    - **load_time_s**: Durée du dernier chargement
+    - **memory_mb**: Taille des poids du modèle (paramètres + buffers PyTorch)
+    - **rss_delta_mb**: Mémoire résidente ajoutée par le chargement, indicatif
+      (null si d'autres modèles chargeaient en même temps)
+    - **idle_s**: Temps depuis la dernière utilisation
+    """
+    return {
+        "loading_mode": settings.MODEL_LOADING_MODE,
+        "models": registry.get_load_status()
     }
 
 
@@ -59,7 +89,7 @@ async def list_models():
 )
 async def model_health(model_name: str):
     """Vérifie la santé d'un modèle spécifique"""
-    model = registry.get(model_name)
+    model = await registry.aget(model_name)
     if not model:
         raise HTTPException(
             status_code=404,
@@ -106,7 +136,7 @@ async def predict(
         
         # Récupérer le modèle
         if model_name:
-            model = registry.get(model_name)
+            model = await registry.aget(model_name)
             if not model:
                 available = registry.get_model_names()
                 raise HTTPException(
@@ -114,7 +144,7 @@ async def predict(
                     detail=f"Modèle '{model_name}' non trouvé. Disponibles: {available}"
                 )
         else:
-            model = registry.get_default()
+            model = await registry.aget_default()
             if not model:
                 raise HTTPException(
                     status_code=500,
@@ -124,7 +154,8 @@ async def predict(
         logger.info(f"  → Utilisation du modèle: {model.model_name}")
         
         # Prédire
-        result = model.predict(
+        result = await run_inference(
+            model, "predict",
             text=request.text,
             include_reasoning=request.include_reasoning
         )
@@ -167,7 +198,7 @@ async def predict_image(
         logger.info(f"Requête de prédiction image (modèle: {model_name})")
         
         # Récupérer le modèle
-        model = registry.get(model_name)
+        model = await registry.aget(model_name)
         if not model:
             available = registry.get_model_names()
             raise HTTPException(
@@ -181,8 +212,8 @@ async def predict_image(
         
         logger.info(f"  → Image chargée: {pil_image.size}, mode: {pil_image.mode}")
         
-        # Prédire
-        result = model.predict(image=pil_image)
+        # Prédire (réutilise le résultat d'une image identique ou quasi identique)
+        result = (await predict_images_cached(model, [image_bytes], [pil_image]))[0]
         
         return {
             **result,
@@ -236,7 +267,7 @@ async def batch_predict(
         
         # Récupérer le modèle
         if model_name:
-            model = registry.get(model_name)
+            model = await registry.aget(model_name)
             if not model:
                 available = registry.get_model_names()
                 raise HTTPException(
@@ -244,7 +275,7 @@ async def batch_predict(
                     detail=f"Modèle '{model_name}' non trouvé. Disponibles: {available}"
                 )
         else:
-            model = registry.get_default()
+            model = await registry.aget_default()
             if not model:
                 raise HTTPException(
                     status_code=500,
@@ -255,7 +286,8 @@ async def batch_predict(
         
         # Prédire
         start_time = time.time()
-        results = model.batch_predict(
+        results = await run_inference(
+            model, "batch_predict",
             texts=request.texts,
             include_reasoning=request.include_reasoning
         )
@@ -310,7 +342,7 @@ async def batch_predict_image(
         logger.info(f"Requête batch image ({len(images)} images, modèle: {model_name})")
         
         # Récupérer le modèle
-        model = registry.get(model_name)
+        model = await registry.aget(model_name)
         if not model:
             available = registry.get_model_names()
             raise HTTPException(
@@ -320,16 +352,18 @@ async def batch_predict_image(
         
         # Charger toutes les images
         pil_images = []
+        images_bytes = []
         for img_file in images:
             image_bytes = await img_file.read()
             pil_image = Image.open(io.BytesIO(image_bytes))
             pil_images.append(pil_image)
+            images_bytes.append(image_bytes)
         
         logger.info(f"  → {len(pil_images)} images chargées")
         
         # Prédire en batch
         start_time = time.time()
-        results = model.batch_predict(images=pil_images)
+        results = await predict_images_cached(model, images_bytes, pil_images, batch=True)
         processing_time = time.time() - start_time
         
         return {
@@ -382,7 +416,7 @@ async def generate_post(request: GeneratePostRequest) -> GeneratePostResponse:
         logger.info(f"Génération de post (type: {request.post_type}, topic: {request.topic})")
         
         # Récupérer le générateur
-        generator = registry.get("yansnet-content-generator")
+        generator = await registry.aget("yansnet-content-generator")
         if not generator:
             raise HTTPException(
                 status_code=500,
@@ -390,7 +424,8 @@ async def generate_post(request: GeneratePostRequest) -> GeneratePostResponse:
             )
         
         # Générer le post
-        result = generator.generate_post(
+        result = await run_inference(
+            generator, "generate_post",
             post_type=request.post_type.value if request.post_type else None,
             topic=request.topic,
             sentiment=request.sentiment.value if request.sentiment else None
@@ -435,7 +470,7 @@ async def generate_comments(request: GenerateCommentsRequest) -> GenerateComment
         logger.info(f"Génération de {request.num_comments} commentaires")
         
         # Récupérer le générateur
-        generator = registry.get("yansnet-content-generator")
+        generator = await registry.aget("yansnet-content-generator")
         if not generator:
             raise HTTPException(
                 status_code=500,
@@ -443,7 +478,8 @@ async def generate_comments(request: GenerateCommentsRequest) -> GenerateComment
             )
         
         # Générer les commentaires
-        comments = generator.generate_comment(
+        comments = await run_inference(
+            generator, "generate_comment",
             post_content=request.post_content,
             sentiment=request.sentiment.value if request.sentiment else None,
             num_comments=request.num_comments
@@ -503,7 +539,7 @@ async def generate_post_with_comments(
         )
         
         # Récupérer le générateur
-        generator = registry.get("yansnet-content-generator")
+        generator = await registry.aget("yansnet-content-generator")
         if not generator:
             raise HTTPException(
                 status_code=500,
@@ -511,7 +547,8 @@ async def generate_post_with_comments(
             )
         
         # Générer le post avec commentaires
-        result = generator.generate_post_with_comments(
+        result = await run_inference(
+            generator, "generate_post_with_comments",
             post_type=request.post_type.value if request.post_type else None,
             topic=request.topic,
             num_comments=request.num_comments
@@ -549,3 +586,254 @@ async def generate_post_with_comments(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Erreur de génération: {str(e)}"
         )
+
+
+@content_router.post(
+    "/generate-dataset",
+    response_model=GenerateDatasetResponse,
+    summary="Générer un jeu de démo",
+    description="Génère K posts avec M commentaires chacun (génération parallélisée)"
+)
+async def generate_dataset(request: GenerateDatasetRequest) -> GenerateDatasetResponse:
+    """
+    Génère un jeu de posts avec commentaires pour peupler l'interface.
+    
+    - **num_posts**: Nombre de posts (1-50)
+    - **num_comments**: Commentaires par post (optionnel, 8-12 si non spécifié)
+    - **post_type** / **topic**: Optionnels, aléatoires par post sinon
+    
+    Posts et commentaires sont générés en parallèle (limite par provider:
+    CONTENT_GENERATION_CONCURRENCY); les posts en échec sont comptés dans
+    failed_posts.
+    """
+    try:
+        logger.info(f"Génération d'un jeu de démo ({request.num_posts} posts, comments: {request.num_comments})")
+        start_time = time.time()
+        
+        generator = await registry.aget("yansnet-content-generator")
+        if not generator:
+            raise HTTPException(
+                status_code=500,
+                detail="Générateur de contenu non disponible"
+            )
+        
+        dataset = await run_inference(
+            generator, "generate_dataset",
+            num_posts=request.num_posts,
+            num_comments=request.num_comments,
+            post_type=request.post_type.value if request.post_type else None,
+            topic=request.topic
+        )
+        
+        from app.models.schemas import CommentData
+        
+        posts = [
+            GeneratePostWithCommentsResponse(
+                post=GeneratePostResponse(
+                    content=item["post"]["content"],
+                    post_type=item["post"]["post_type"],
+                    topic=item["post"]["topic"],
+                    sentiment=item["post"]["sentiment"]
+                ),
+                comments=[
+                    CommentData(
+                        content=c["content"],
+                        sentiment=c["sentiment"],
+                        comment_number=c["comment_number"]
+                    )
+                    for c in item["comments"]
+                ],
+                total_comments=item["total_comments"]
+            )
+            for item in dataset
+            if "error" not in item
+        ]
+        
+        return GenerateDatasetResponse(
+            posts=posts,
+            total_posts=len(posts),
+            total_comments=sum(p.total_comments for p in posts),
+            failed_posts=len(dataset) - len(posts),
+            processing_time=round(time.time() - start_time, 2)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur lors de la génération du jeu de démo: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erreur de génération: {str(e)}"
+        )
+
+
+# ============================================================================
+# ROUTES DE GÉNÉRATION EN STREAMING (SSE / NDJSON)
+# ============================================================================
+
+STREAM_MEDIA_TYPES = {
+    "sse": "text/event-stream",
+    "ndjson": "application/x-ndjson"
+}
+
+
+def _format_event(event: dict, stream_format: str) -> str:
+    """Sérialise un événement {"event", "data"} en SSE ou en une ligne NDJSON"""
+    if stream_format == "sse":
+        data = json.dumps(event["data"], ensure_ascii=False, default=str)
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+
+class _SlotStream:
+    """
+    Corps de réponse en streaming qui détient un slot d'inférence.
+
+    Starlette n'appelle pas aclose() sur le corps: le slot est libéré à la fin
+    ou à l'interruption de l'itération, à aclose(), et en dernier recours à la
+    destruction de l'objet (flux jamais démarré, client déconnecté avant le
+    premier fragment, réponse abandonnée).
+    """
+
+    def __init__(self, chunks: AsyncIterator[str], release: Callable[[], None]):
+        self._chunks = chunks
+        self._release = release
+        self._loop = asyncio.get_running_loop()
+
+    def __aiter__(self) -> "_SlotStream":
+        return self
+
+    async def __anext__(self) -> str:
+        try:
+            return await self._chunks.__anext__()
+        except BaseException:  # Fin du flux, erreur ou annulation
+            self._release()
+            raise
+
+    async def aclose(self) -> None:
+        self._release()
+        await self._chunks.aclose()
+
+    def __del__(self):
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._release)
+
+
+async def _stream_generation(method: str, stream_format: str, **kwargs) -> StreamingResponse:
+    """
+    Relaie les événements d'une méthode de streaming du générateur.
+
+    Le slot d'inférence du générateur est réservé avant l'envoi des en-têtes
+    (saturation => 429) et libéré une seule fois par _SlotStream, même si le
+    flux n'est jamais itéré. Une erreur en cours de flux devient un événement
+    "error".
+    """
+    generator = await registry.aget("yansnet-content-generator")
+    if not generator:
+        raise HTTPException(
+            status_code=500,
+            detail="Générateur de contenu non disponible"
+        )
+
+    release = await inference_executor.reserve(generator.model_name)
+
+    async def body():
+        start_time = time.time()
+        try:
+            async for event in getattr(generator, method)(**kwargs):
+                yield _format_event(event, stream_format)
+            yield _format_event(
+                {"event": "done", "data": {"processing_time": round(time.time() - start_time, 2)}},
+                stream_format
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de la génération en streaming ({method}): {e}")
+            yield _format_event({"event": "error", "data": {"detail": f"Erreur de génération: {str(e)}"}}, stream_format)
+
+    return StreamingResponse(
+        _SlotStream(body(), release),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+STREAM_FORMAT_QUERY = Query(
+    "sse",
+    alias="format",
+    pattern="^(sse|ndjson)$",
+    description="Format du flux: sse (Server-Sent Events) ou ndjson"
+)
+
+
+@content_router.post(
+    "/generate-post/stream",
+    summary="Générer un post (streaming)",
+    description="Génère un post en relayant les tokens du LLM au fil de l'eau (SSE ou NDJSON)"
+)
+async def generate_post_stream(
+    request: GeneratePostRequest,
+    stream_format: str = STREAM_FORMAT_QUERY
+) -> StreamingResponse:
+    """
+    Variante streaming de /generate-post.
+    
+    Événements: post_start, token (fragments du post), post (post complet), done.
+    En cas d'erreur en cours de génération: événement error.
+    """
+    logger.info(f"Génération de post en streaming (type: {request.post_type}, topic: {request.topic})")
+    return await _stream_generation(
+        "stream_post", stream_format,
+        post_type=request.post_type.value if request.post_type else None,
+        topic=request.topic,
+        sentiment=request.sentiment.value if request.sentiment else None
+    )
+
+
+@content_router.post(
+    "/generate-comments/stream",
+    summary="Générer des commentaires (streaming)",
+    description="Génère des commentaires, chacun envoyé dès qu'il est terminé (SSE ou NDJSON)"
+)
+async def generate_comments_stream(
+    request: GenerateCommentsRequest,
+    stream_format: str = STREAM_FORMAT_QUERY
+) -> StreamingResponse:
+    """
+    Variante streaming de /generate-comments.
+    
+    Événements: token (avec comment_number), comment (commentaire complet), done.
+    """
+    logger.info(f"Génération de {request.num_comments} commentaires en streaming")
+    return await _stream_generation(
+        "stream_comments", stream_format,
+        post_content=request.post_content,
+        sentiment=request.sentiment.value if request.sentiment else None,
+        num_comments=request.num_comments
+    )
+
+
+@content_router.post(
+    "/generate-post-with-comments/stream",
+    summary="Générer un post avec commentaires (streaming)",
+    description="Génère un post puis ses commentaires en streaming (SSE ou NDJSON)"
+)
+async def generate_post_with_comments_stream(
+    request: GeneratePostWithCommentsRequest,
+    stream_format: str = STREAM_FORMAT_QUERY
+) -> StreamingResponse:
+    """
+    Variante streaming de /generate-post-with-comments.
+    
+    Événements: post_start, token, post, puis token / comment pour chaque
+    commentaire, et done.
+    """
+    logger.info(
+        f"Génération de post complet en streaming "
+        f"(type: {request.post_type}, comments: {request.num_comments})"
+    )
+    return await _stream_generation(
+        "stream_post_with_comments", stream_format,
+        post_type=request.post_type.value if request.post_type else None,
+        topic=request.topic,
+        num_comments=request.num_comments
+    )
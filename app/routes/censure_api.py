@@ -5,7 +5,9 @@ from fastapi import APIRouter, HTTPException, status, File, UploadFile
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from app.core.model_registry import registry
+from app.core.image_cache import predict_images_cached
 from app.utils.logger import setup_logger
+from app.config import settings
 from PIL import Image
 import io
 import time
@@ -50,7 +52,7 @@ class CensureHealthResponse(BaseModel):
 )
 async def censure_health():
     """Health check spécifique pour le modèle de censure"""
-    model = registry.get("censure-nsfw")
+    model = await registry.aget("censure-nsfw")
     if not model:
         raise HTTPException(
             status_code=404,
@@ -83,7 +85,7 @@ async def detect_nsfw(file: UploadFile = File(...)) -> CensureResponse:
         logger.info(f"Détection NSFW sur image: {file.filename}")
         
         # Récupérer le modèle
-        model = registry.get("censure-nsfw")
+        model = await registry.aget("censure-nsfw")
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -98,7 +100,7 @@ async def detect_nsfw(file: UploadFile = File(...)) -> CensureResponse:
         start_time = time.time()
         
         # Prédiction
-        result = model.predict(image=image)
+        result = (await predict_images_cached(model, [contents], [image]))[0]
         
         processing_time = time.time() - start_time
         result["processing_time"] = round(processing_time, 3)
@@ -136,7 +138,7 @@ async def batch_detect_nsfw(files: List[UploadFile] = File(...)):
         logger.info(f"Détection batch NSFW ({len(files)} images)")
         
         # Récupérer le modèle
-        model = registry.get("censure-nsfw")
+        model = await registry.aget("censure-nsfw")
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -145,16 +147,21 @@ async def batch_detect_nsfw(files: List[UploadFile] = File(...)):
         
         # Charger toutes les images
         images = []
+        images_bytes = []
         filenames = []
         for file in files:
             contents = await file.read()
             image = Image.open(io.BytesIO(contents))
             images.append(image)
+            images_bytes.append(contents)
             filenames.append(file.filename)
         
         # Traitement batch
         start_time = time.time()
-        results = model.batch_predict(images=images)
+        results = await predict_images_cached(
+            model, images_bytes, images, batch=True,
+            max_batch_size=settings.CENSURE_MAX_BATCH_SIZE
+        )
         processing_time = time.time() - start_time
         
         # Formater les résultats
@@ -190,7 +197,7 @@ async def batch_detect_nsfw(files: List[UploadFile] = File(...)):
 )
 async def censure_info():
     """Informations détaillées sur le modèle de détection NSFW"""
-    model = registry.get("censure-nsfw")
+    model = await registry.aget("censure-nsfw")
     if not model:
         raise HTTPException(
             status_code=404,
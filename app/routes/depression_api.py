@@ -4,7 +4,10 @@ Routes API spécialisées pour le modèle de détection de dépression YANSNET L
 from fastapi import APIRouter, HTTPException, status
 from typing import Optional, List
 from pydantic import BaseModel, Field
+from app.core.cascade import cascade_enabled, detection_cascade
 from app.core.model_registry import registry
+from app.core.micro_batcher import get_batcher
+from app.core.inference_executor import run_inference
 from app.utils.logger import setup_logger
 from app.config import settings
 import time
@@ -43,6 +46,7 @@ class DepressionDetectResponse(BaseModel):
     processing_time: Optional[float] = Field(None, description="Temps de traitement")
     model_used: str = Field(..., description="Modèle utilisé pour la détection")
     fallback_used: bool = Field(False, description="Indique si un modèle de fallback a été utilisé")
+    escalated: Optional[bool] = Field(None, description="Cascade: texte escaladé vers le modèle d'escalade")
 
 
 class DepressionBatchRequest(BaseModel):
@@ -68,6 +72,8 @@ class DepressionBatchResult(BaseModel):
     severity: str = Field(..., description="Sévérité")
     reasoning: Optional[str] = Field(None, description="Explication")
     model_used: Optional[str] = Field(None, description="Modèle utilisé")
+    escalated: Optional[bool] = Field(None, description="Cascade: texte escaladé vers le modèle d'escalade")
+    error: Optional[str] = Field(None, description="Erreur ou timeout sur ce texte")
 
 
 class DepressionBatchResponse(BaseModel):
@@ -88,6 +94,88 @@ class DepressionHealthResponse(BaseModel):
     llm_model: str = Field(..., description="Modèle LLM utilisé")
 
 
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+async def _predict_single(model, text: str, include_reasoning: bool):
+    """Prédiction unitaire, regroupée par le micro-batcher si activé"""
+    if settings.ENABLE_MICRO_BATCHING:
+        return await get_batcher(model).predict(
+            text=text,
+            include_reasoning=include_reasoning
+        )
+    return await run_inference(model, "predict", text=text, include_reasoning=include_reasoning)
+
+
+async def _detect_with_cascade(request: DepressionDetectRequest) -> DepressionDetectResponse:
+    """Détection par la cascade (DETECTION_PROVIDER=cascade)"""
+    start_time = time.time()
+    result = await detection_cascade.detect(request.text, request.include_reasoning)
+    processing_time = time.time() - start_time
+    
+    logger.info(
+        f"  → Prédiction: {result['prediction']} (confiance: {result['confidence']:.3f}) "
+        f"[{result['decided_by']}, escalade: {'oui' if result['escalated'] else 'non'}]"
+    )
+
+    if settings.ENABLE_METRICS:
+        try:
+            from app.core.metrics import record_prediction_async
+            await record_prediction_async(
+                model_name=result["decided_by"],
+                provider="cascade",
+                endpoint="/api/v1/depression/detect",
+                prediction=result["prediction"],
+                confidence=result.get("confidence"),
+                severity=result.get("severity"),
+                latency_ms=processing_time * 1000,
+                fallback_used=False,
+                input_length=len(request.text),
+                request_id=str(uuid.uuid4())
+            )
+        except Exception as metrics_error:
+            logger.debug(f"Erreur enregistrement métrique (non bloquant): {metrics_error}")
+
+    return DepressionDetectResponse(
+        prediction=result["prediction"],
+        confidence=float(result["confidence"]),
+        severity=result["severity"],
+        reasoning=result.get("reasoning") if request.include_reasoning else None,
+        processing_time=round(processing_time, 3),
+        model_used=result["decided_by"],
+        escalated=result["escalated"]
+    )
+
+
+async def _batch_detect_with_cascade(request: DepressionBatchRequest) -> DepressionBatchResponse:
+    """Détection batch par la cascade (DETECTION_PROVIDER=cascade)"""
+    start_time = time.time()
+    results = await detection_cascade.detect_batch(request.texts, request.include_reasoning)
+    processing_time = time.time() - start_time
+    
+    formatted_results = [
+        DepressionBatchResult(
+            text=text[:100] + "..." if len(text) > 100 else text,
+            prediction=result["prediction"],
+            confidence=float(result["confidence"]),
+            severity=result["severity"],
+            reasoning=result.get("reasoning") if request.include_reasoning else None,
+            model_used=result["decided_by"],
+            escalated=result["escalated"],
+            error=result.get("error")
+        )
+        for text, result in zip(request.texts, results)
+    ]
+    
+    return DepressionBatchResponse(
+        results=formatted_results,
+        total_processed=len(formatted_results),
+        processing_time=round(processing_time, 2),
+        model_used=f"cascade({settings.CASCADE_FAST_MODEL}, {settings.CASCADE_ESCALATION_MODEL})"
+    )
+
+
 # ============================================================================
 # ROUTES DÉTECTION DE DÉPRESSION
 # ============================================================================
@@ -102,13 +190,13 @@ async def depression_health():
     """Health check spécifique pour le modèle de détection de dépression"""
     try:
         # Try to get detection model from enhanced registry
-        model = registry.get_detection_model()
+        model = await registry.aget_detection_model()
         
         if not model:
             # Fallback to legacy behavior
-            model = registry.get("yansnet-llm")
+            model = await registry.aget("yansnet-llm")
             if not model:
-                model = registry.get_default()
+                model = await registry.aget_default()
                 if not model:
                     raise HTTPException(
                         status_code=404,
@@ -146,19 +234,23 @@ async def detect_depression(request: DepressionDetectRequest) -> DepressionDetec
     - **model_used**: Modèle utilisé pour la détection
     - **fallback_used**: Indique si un modèle de fallback a été utilisé
     """
+    model = None
     try:
         logger.info(f"Détection de dépression (texte: {len(request.text)} chars)")
         
+        if cascade_enabled():
+            return await _detect_with_cascade(request)
+        
         # Try to get detection model from enhanced registry
-        model = registry.get_detection_model()
+        model = await registry.aget_detection_model()
         fallback_used = False
         
         if not model:
             # Fallback to legacy behavior for backward compatibility
             logger.info("Modèle de détection non trouvé, utilisation du modèle legacy")
-            model = registry.get("yansnet-llm")
+            model = await registry.aget("yansnet-llm")
             if not model:
-                model = registry.get_default()
+                model = await registry.aget_default()
                 if not model:
                     available = registry.get_model_names()
                     raise HTTPException(
@@ -171,21 +263,17 @@ async def detect_depression(request: DepressionDetectRequest) -> DepressionDetec
         
         # Try primary model first
         try:
-            result = model.predict(
-                text=request.text,
-                include_reasoning=request.include_reasoning
-            )
+            result = await _predict_single(model, request.text, request.include_reasoning)
             model_used = model.model_name
         except Exception as primary_error:
             # Try fallback model if available
             logger.warning(f"Modèle primaire a échoué: {primary_error}, tentative de fallback")
-            fallback_model = registry.get_detection_fallback()
+            fallback_model = await registry.aget_detection_fallback()
             
             if fallback_model:
                 logger.info(f"Utilisation du modèle de fallback: {fallback_model.model_name}")
-                result = fallback_model.predict(
-                    text=request.text,
-                    include_reasoning=request.include_reasoning
+                result = await _predict_single(
+                    fallback_model, request.text, request.include_reasoning
                 )
                 model_used = fallback_model.model_name
                 fallback_used = True
@@ -278,16 +366,19 @@ async def batch_detect_depression(request: DepressionBatchRequest) -> Depression
     try:
         logger.info(f"Détection batch de dépression ({len(request.texts)} textes)")
         
+        if cascade_enabled():
+            return await _batch_detect_with_cascade(request)
+        
         # Try to get detection model from enhanced registry
-        model = registry.get_detection_model()
+        model = await registry.aget_detection_model()
         fallback_used = False
         
         if not model:
             # Fallback to legacy behavior for backward compatibility
             logger.info("Modèle de détection non trouvé, utilisation du modèle legacy")
-            model = registry.get("yansnet-llm")
+            model = await registry.aget("yansnet-llm")
             if not model:
-                model = registry.get_default()
+                model = await registry.aget_default()
                 if not model:
                     available = registry.get_model_names()
                     raise HTTPException(
@@ -300,7 +391,8 @@ async def batch_detect_depression(request: DepressionBatchRequest) -> Depression
         
         # Try primary model first
         try:
-            results = model.batch_predict(
+            results = await run_inference(
+                model, "batch_predict",
                 texts=request.texts,
                 include_reasoning=request.include_reasoning
             )
@@ -308,11 +400,12 @@ async def batch_detect_depression(request: DepressionBatchRequest) -> Depression
         except Exception as primary_error:
             # Try fallback model if available
             logger.warning(f"Modèle primaire a échoué: {primary_error}, tentative de fallback")
-            fallback_model = registry.get_detection_fallback()
+            fallback_model = await registry.aget_detection_fallback()
             
             if fallback_model:
                 logger.info(f"Utilisation du modèle de fallback: {fallback_model.model_name}")
-                results = fallback_model.batch_predict(
+                results = await run_inference(
+                    fallback_model, "batch_predict",
                     texts=request.texts,
                     include_reasoning=request.include_reasoning
                 )
@@ -333,7 +426,8 @@ async def batch_detect_depression(request: DepressionBatchRequest) -> Depression
                 confidence=float(result["confidence"]),
                 severity=result["severity"],
                 reasoning=result.get("reasoning") if request.include_reasoning else None,
-                model_used=model_used
+                model_used=model_used,
+                error=result.get("error")
             ))
         
         logger.info(
@@ -369,7 +463,7 @@ async def depression_health_all():
         health_results = {}
         
         # Check primary detection model
-        primary_model = registry.get_detection_model()
+        primary_model = await registry.aget_detection_model()
         if primary_model:
             try:
                 health_data = primary_model.health_check()
@@ -391,7 +485,7 @@ async def depression_health_all():
             }
         
         # Check fallback detection model
-        fallback_model = registry.get_detection_fallback()
+        fallback_model = await registry.aget_detection_fallback()
         if fallback_model:
             try:
                 health_data = fallback_model.health_check()
@@ -413,7 +507,7 @@ async def depression_health_all():
             }
         
         # Check legacy model for backward compatibility
-        legacy_model = registry.get("yansnet-llm")
+        legacy_model = await registry.aget("yansnet-llm")
         if legacy_model:
             try:
                 health_data = legacy_model.health_check()
@@ -457,13 +551,13 @@ async def depression_health_all():
 async def depression_info():
     """Informations détaillées sur le modèle de détection de dépression"""
     # Try to get detection model from enhanced registry
-    model = registry.get_detection_model()
+    model = await registry.aget_detection_model()
     
     if not model:
         # Fallback to legacy behavior
-        model = registry.get("yansnet-llm")
+        model = await registry.aget("yansnet-llm")
         if not model:
-            model = registry.get_default()
+            model = await registry.aget_default()
             if not model:
                 available = registry.get_model_names()
                 raise HTTPException(
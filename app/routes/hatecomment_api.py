@@ -5,6 +5,9 @@ from fastapi import APIRouter, HTTPException, status, Query
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from app.core.model_registry import registry
+from app.core.micro_batcher import get_batcher
+from app.core.inference_executor import run_inference
+from app.config import settings
 from app.utils.logger import setup_logger
 import time
 
@@ -136,7 +139,7 @@ class HateCommentHealthResponse(BaseModel):
 )
 async def hatecomment_health():
     """Health check spécifique pour HateComment BERT"""
-    model = registry.get("hatecomment-bert")
+    model = await registry.aget("hatecomment-bert")
     if not model:
         raise HTTPException(
             status_code=404,
@@ -172,7 +175,7 @@ async def detect_hate_speech(request: HateCommentRequest) -> HateCommentResponse
         logger.info(f"Détection hate speech (texte: {len(request.text)} chars)")
         
         # Récupérer le modèle HateComment BERT
-        model = registry.get("hatecomment-bert")
+        model = await registry.aget("hatecomment-bert")
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -182,11 +185,18 @@ async def detect_hate_speech(request: HateCommentRequest) -> HateCommentResponse
         # Mesurer le temps de traitement
         start_time = time.time()
         
-        # Prédiction
-        result = model.predict(
-            text=request.text,
-            include_reasoning=request.include_reasoning
-        )
+        # Prédiction (regroupée avec les requêtes concurrentes si activé)
+        if settings.ENABLE_MICRO_BATCHING:
+            result = await get_batcher(model).predict(
+                text=request.text,
+                include_reasoning=request.include_reasoning
+            )
+        else:
+            result = await run_inference(
+                model, "predict",
+                text=request.text,
+                include_reasoning=request.include_reasoning
+            )
         
         processing_time = time.time() - start_time
         result["processing_time"] = round(processing_time, 3)
@@ -229,7 +239,7 @@ async def batch_detect_hate_speech(request: BatchHateCommentRequest) -> BatchHat
         logger.info(f"Détection batch hate speech ({len(request.texts)} textes)")
         
         # Récupérer le modèle
-        model = registry.get("hatecomment-bert")
+        model = await registry.aget("hatecomment-bert")
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -238,7 +248,8 @@ async def batch_detect_hate_speech(request: BatchHateCommentRequest) -> BatchHat
         
         # Traitement batch
         start_time = time.time()
-        results = model.batch_predict(
+        results = await run_inference(
+            model, "batch_predict",
             texts=request.texts,
             include_reasoning=request.include_reasoning
         )
@@ -283,7 +294,7 @@ async def batch_detect_hate_speech(request: BatchHateCommentRequest) -> BatchHat
 )
 async def hatecomment_info():
     """Informations détaillées sur le modèle HateComment BERT"""
-    model = registry.get("hatecomment-bert")
+    model = await registry.aget("hatecomment-bert")
     if not model:
         raise HTTPException(
             status_code=404,
@@ -6,6 +6,7 @@ from typing import Optional, List
 from PIL import Image
 import io
 from app.core.model_registry import registry
+from app.core.image_cache import predict_images_cached
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -56,7 +57,7 @@ async def predict_image(
         
         # Récupérer le modèle
         if model_name:
-            model = registry.get(model_name)
+            model = await registry.aget(model_name)
             if not model:
                 available = registry.get_model_names()
                 raise HTTPException(
@@ -65,7 +66,7 @@ async def predict_image(
                 )
         else:
             # Chercher un modèle pour images
-            model = registry.get("sensitive-image-caption")
+            model = await registry.aget("sensitive-image-caption")
             if not model:
                 raise HTTPException(
                     status_code=500,
@@ -74,8 +75,8 @@ async def predict_image(
         
         logger.info(f"  → Utilisation du modèle: {model.model_name}")
         
-        # Prédire
-        result = model.predict(image=pil_image)
+        # Prédire (réutilise le résultat d'une image identique ou quasi identique)
+        result = (await predict_images_cached(model, [contents], [pil_image]))[0]
         
         logger.info(f"  → Prédiction: {result['prediction']}")
         
@@ -133,7 +134,7 @@ async def batch_predict_image(
         
         # Récupérer le modèle
         if model_name:
-            model = registry.get(model_name)
+            model = await registry.aget(model_name)
             if not model:
                 available = registry.get_model_names()
                 raise HTTPException(
@@ -141,7 +142,7 @@ async def batch_predict_image(
                     detail=f"Modèle '{model_name}' non trouvé. Disponibles: {available}"
                 )
         else:
-            model = registry.get("sensitive-image-caption")
+            model = await registry.aget("sensitive-image-caption")
             if not model:
                 raise HTTPException(
                     status_code=500,
@@ -152,13 +153,15 @@ async def batch_predict_image(
         
         # Charger toutes les images
         pil_images = []
+        images_bytes = []
         for img in images:
             contents = await img.read()
             pil_image = Image.open(io.BytesIO(contents)).convert("RGB")
             pil_images.append(pil_image)
+            images_bytes.append(contents)
         
         # Prédire en batch
-        results = model.batch_predict(images=pil_images)
+        results = await predict_images_cached(model, images_bytes, pil_images, batch=True)
         
         # Formater les résultats
         formatted_results = []
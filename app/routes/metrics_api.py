@@ -1,9 +1,11 @@
 """
 Routes API pour les métriques et le monitoring
 """
+import asyncio
 from typing import Optional, List
 from uuid import UUID
 from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import PlainTextResponse
 from app.core.metrics import (
     MetricsService,
     ModelStats,
@@ -13,6 +15,16 @@ from app.core.metrics import (
 )
 from app.core.metrics.metrics_models import MetricsSummary
 from app.core.metrics.database import db
+from app.core.metrics.error_rate import error_rate_monitor
+from app.core.metrics.ingestion import metrics_ingestion
+from app.core.metrics.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, render_prometheus
+from app.core.metrics.runtime_metrics import runtime_metrics
+from app.core.micro_batcher import get_batcher_stats
+from app.core.cascade import detection_cascade
+from app.core.inference_executor import inference_executor
+from app.core.ollama_client import get_ollama_stats
+from app.core.prediction_cache import get_prediction_cache
+from app.core.image_cache import image_cache
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -88,15 +100,56 @@ async def get_model_latency(
     return result
 
 
+@router.get("/runtime")
+async def get_runtime_metrics():
+    """
+    Récupère les métriques runtime en mémoire (sans accès base).
+
+    Inclut la profondeur des files et l'histogramme des tailles de batch
+    du micro-batching, l'occupation des pools d'inférence, les appels
+    Ollama en cours / en attente par modèle, le taux d'escalade de la
+    cascade de détection, le tampon d'ingestion des métriques et le taux
+    d'erreur glissant par modèle.
+    """
+    return {
+        "micro_batching": get_batcher_stats(),
+        "inference": inference_executor.get_stats(),
+        "ollama": get_ollama_stats(),
+        "cascade": detection_cascade.get_stats(),
+        "ingestion": metrics_ingestion.get_stats(),
+        "error_rates": error_rate_monitor.get_stats(),
+        "metrics": runtime_metrics.snapshot()
+    }
+
+
+@router.get("/cache")
+async def get_prediction_cache_stats():
+    """
+    Statistiques du cache de prédictions: hits/misses et taux de hit par
+    modèle, occupation du niveau mémoire, backend partagé.
+    """
+    return get_prediction_cache().get_stats()
+
+
+@router.get("/image-cache")
+async def get_image_cache_stats():
+    """
+    Statistiques du cache d'images: hits exacts / perceptuels, misses,
+    taux de hit, occupation et évictions.
+    """
+    return image_cache.get_stats()
+
+
 @router.get("/errors")
 async def get_recent_errors(
     model_name: Optional[str] = Query(None, description="Filtrer par nom de modèle"),
-    limit: int = Query(50, ge=1, le=500, description="Nombre maximum d'erreurs")
+    limit: int = Query(50, ge=1, le=500, description="Nombre maximum d'erreurs"),
+    hours: int = Query(24, ge=1, le=168, description="Période en heures")
 ):
     """
     Récupère les erreurs récentes.
     """
-    errors = await metrics.get_recent_errors(model_name=model_name, limit=limit)
+    errors = await metrics.get_recent_errors(model_name=model_name, limit=limit, hours=hours)
     return {
         "count": len(errors),
         "errors": errors
@@ -127,74 +180,19 @@ async def resolve_alert(alert_id: UUID):
     return {"status": "resolved", "alert_id": str(alert_id)}
 
 
-@router.get("/prometheus")
+@router.get("/prometheus", response_class=PlainTextResponse)
 async def prometheus_metrics():
     """
     Expose les métriques au format Prometheus.
     
-    Compatible avec Prometheus scraping.
+    Compteurs, jauges et histogrammes en mémoire (requêtes HTTP, appels de
+    modèle, prédictions par modèle / provider / endpoint...): le scrape ne
+    touche pas PostgreSQL et reste disponible si la base est hors service.
+    En multi-process (METRICS_MULTIPROC_DIR), agrège tous les workers.
     """
     try:
-        summary = await metrics.get_summary(hours=1)
-        
-        lines = [
-            "# HELP etsia_predictions_total Total number of predictions",
-            "# TYPE etsia_predictions_total counter",
-            f"etsia_predictions_total {summary.total_predictions}",
-            "",
-            "# HELP etsia_errors_total Total number of errors",
-            "# TYPE etsia_errors_total counter",
-            f"etsia_errors_total {summary.total_errors}",
-            "",
-            "# HELP etsia_alerts_active Number of active alerts",
-            "# TYPE etsia_alerts_active gauge",
-            f"etsia_alerts_active {summary.active_alerts}",
-            ""
-        ]
-        
-        # Métriques par modèle
-        for model in summary.models:
-            model_label = f'model="{model.model_name}",provider="{model.provider}"'
-            
-            lines.extend([
-                f"# HELP etsia_model_requests_total Total requests per model",
-                f"# TYPE etsia_model_requests_total counter",
-                f"etsia_model_requests_total{{{model_label}}} {model.total_requests}",
-                "",
-                f"# HELP etsia_model_latency_avg_ms Average latency in milliseconds",
-                f"# TYPE etsia_model_latency_avg_ms gauge",
-                f"etsia_model_latency_avg_ms{{{model_label}}} {model.avg_latency_ms:.2f}",
-                ""
-            ])
-            
-            if model.p50_latency_ms:
-                lines.extend([
-                    f"# HELP etsia_model_latency_p50_ms P50 latency in milliseconds",
-                    f"# TYPE etsia_model_latency_p50_ms gauge",
-                    f"etsia_model_latency_p50_ms{{{model_label}}} {model.p50_latency_ms:.2f}",
-                    ""
-                ])
-            
-            if model.p95_latency_ms:
-                lines.extend([
-                    f"# HELP etsia_model_latency_p95_ms P95 latency in milliseconds",
-                    f"# TYPE etsia_model_latency_p95_ms gauge",
-                    f"etsia_model_latency_p95_ms{{{model_label}}} {model.p95_latency_ms:.2f}",
-                    ""
-                ])
-            
-            lines.extend([
-                f"# HELP etsia_model_error_rate Error rate percentage",
-                f"# TYPE etsia_model_error_rate gauge",
-                f"etsia_model_error_rate{{{model_label}}} {model.error_rate:.2f}",
-                "",
-                f"# HELP etsia_model_fallback_rate Fallback rate percentage",
-                f"# TYPE etsia_model_fallback_rate gauge",
-                f"etsia_model_fallback_rate{{{model_label}}} {model.fallback_rate:.2f}",
-                ""
-            ])
-        
-        return "\n".join(lines)
+        body = await asyncio.to_thread(render_prometheus)
+        return PlainTextResponse(body, media_type=PROMETHEUS_CONTENT_TYPE)
     except Exception as e:
         logger.error(f"Erreur génération métriques Prometheus: {e}")
-        return f"# Error generating metrics: {e}"
+        return PlainTextResponse(f"# Error generating metrics: {e}\n", media_type=PROMETHEUS_CONTENT_TYPE)
@@ -105,7 +105,7 @@ class RecommendationHealthResponse(BaseModel):
 )
 async def recommendation_health():
     """Health check spécifique pour le système de recommandation"""
-    model = registry.get("recommendation-system")
+    model = await registry.aget("recommendation-system")
     if not model:
         raise HTTPException(
             status_code=404,
@@ -138,7 +138,7 @@ async def get_recommendations(request: RecommendationRequest) -> RecommendationR
         logger.info(f"Génération de recommandations pour user_id={request.user_id}")
         
         # Récupérer le modèle
-        model = registry.get("recommendation-system")
+        model = await registry.aget("recommendation-system")
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -199,7 +199,7 @@ async def batch_get_recommendations(request: BatchRecommendationRequest) -> Batc
         logger.info(f"Génération batch de recommandations ({len(request.user_ids)} utilisateurs)")
         
         # Récupérer le modèle
-        model = registry.get("recommendation-system")
+        model = await registry.aget("recommendation-system")
         if not model:
             raise HTTPException(
                 status_code=404,
@@ -250,7 +250,7 @@ async def batch_get_recommendations(request: BatchRecommendationRequest) -> Batc
 )
 async def recommendation_info():
     """Informations détaillées sur le système de recommandation"""
-    model = registry.get("recommendation-system")
+    model = await registry.aget("recommendation-system")
     if not model:
         raise HTTPException(
             status_code=404,
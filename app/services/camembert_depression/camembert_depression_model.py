@@ -7,6 +7,9 @@ Uses CamemBERT (110M parameters) for 20-50ms latency on CPU.
 from typing import Dict, Any, List, Optional
 import time
 from app.core.base_model import BaseMLModel
+from app.core.prediction_cache import cached_predict, cached_batch_predict, bypass_cache
+from app.core.quantization import resolve_inference_mode, load_quantized_model
+from app.core.onnx_backend import resolve_backend, load_with_fallback
 from app.config import settings
 from app.utils.logger import setup_logger
 
@@ -31,7 +34,8 @@ class CamemBERTDepressionModel(BaseMLModel):
     
     @property
     def model_version(self) -> str:
-        return "1.0.0"
+        # Les sorties int8 diffèrent légèrement: version distincte (caches, métriques)
+        return "1.0.0+int8" if self.inference_mode == "int8" else "1.0.0"
     
     @property
     def author(self) -> str:
@@ -45,12 +49,19 @@ class CamemBERTDepressionModel(BaseMLModel):
     def tags(self) -> List[str]:
         return ["camembert", "bert", "french", "depression", "fast"]
     
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        inference_mode: Optional[str] = None,
+        backend: Optional[str] = None
+    ):
         """
         Initialize CamemBERT model.
         
         Args:
             model_path: Path to model (default: from settings)
+            inference_mode: fp32 or int8 (default: settings.CAMEMBERT_INFERENCE_MODE)
+            backend: pytorch or onnx (default: settings.CAMEMBERT_BACKEND)
         """
         self._initialized = False
         self.model = None
@@ -58,12 +69,22 @@ class CamemBERTDepressionModel(BaseMLModel):
         self.device = settings.CAMEMBERT_DEVICE
         self.max_length = settings.CAMEMBERT_MAX_LENGTH
         self.model_path = model_path or settings.CAMEMBERT_MODEL
+        self.inference_mode = resolve_inference_mode(
+            inference_mode or settings.CAMEMBERT_INFERENCE_MODE, self.device
+        )
+        self.backend = resolve_backend(backend or settings.CAMEMBERT_BACKEND, self.device)
+        if self.backend == "onnx" and self.inference_mode == "int8":
+            logger.warning("⚠️  int8 ignoré avec le backend ONNX (graphe fp32)")
+            self.inference_mode = "fp32"
         
         try:
             self._load_model()
             self._initialized = True  # Set before warmup so warmup can call predict
             self._warmup_model()
-            logger.info(f"✓ {self.model_name} initialisé avec succès sur {self.device}")
+            logger.info(
+                f"✓ {self.model_name} initialisé avec succès sur {self.device} "
+                f"({self.backend}, {self.inference_mode})"
+            )
         except Exception as e:
             logger.error(f"✗ Erreur d'initialisation de {self.model_name}: {e}")
             self._initialized = False
@@ -72,7 +93,7 @@ class CamemBERTDepressionModel(BaseMLModel):
     def _load_model(self):
         """Load CamemBERT model and tokenizer from HuggingFace."""
         try:
-            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+            from transformers import AutoTokenizer
             import torch
             
             logger.info(f"Chargement de {self.model_path}...")
@@ -80,29 +101,25 @@ class CamemBERTDepressionModel(BaseMLModel):
             # Load tokenizer
             self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
             
-            # Load model for sequence classification
-            # Note: For zero-shot, we'll use the base model and add a simple classifier
-            # In production, this should be fine-tuned on depression data
-            try:
-                # Try to load a fine-tuned model first
-                self.model = AutoModelForSequenceClassification.from_pretrained(
+            # ONNX backend: exported graph served by onnxruntime (PyTorch on failure)
+            if self.backend == "onnx":
+                self.model = load_with_fallback(
+                    self.model_name,
                     self.model_path,
-                    num_labels=2  # Binary: DEPRESSION vs NORMAL
-                )
-            except Exception:
-                # Fallback: use base model with random classifier head
-                # This is for demonstration - in production, use a fine-tuned model
-                from transformers import AutoModel
-                logger.warning(
-                    f"Modèle de classification non trouvé, utilisation du modèle de base. "
-                    f"Pour de meilleurs résultats, utilisez un modèle fine-tuné."
+                    self.model_version,
+                    self._load_fp32_model,
+                    lambda: dict(self.tokenizer("Texte d'exemple", return_tensors="pt"))
                 )
-                base_model = AutoModel.from_pretrained(self.model_path)
-                # Create a simple classifier wrapper
-                self.model = self._create_classifier_wrapper(base_model)
+                if self.model is None:
+                    self.backend = "pytorch"
             
-            # Move to device
-            self.model.to(self.device)
+            # PyTorch backend (int8: quantized weights, cached on disk when configured)
+            if self.backend == "pytorch":
+                if self.inference_mode == "int8":
+                    self.model = load_quantized_model(self.model_path, self._load_fp32_model)
+                else:
+                    self.model = self._load_fp32_model()
+                    self.model.to(self.device)
             self.model.eval()  # Set to evaluation mode
             
             logger.info(f"✓ Modèle chargé: {self.model_path}")
@@ -117,6 +134,31 @@ class CamemBERTDepressionModel(BaseMLModel):
             logger.error(f"Erreur de chargement du modèle: {e}")
             raise
     
+    def _load_fp32_model(self):
+        """Load the fp32 classification model (fine-tuned head or base model wrapper)."""
+        from transformers import AutoModelForSequenceClassification
+        
+        # Load model for sequence classification
+        # Note: For zero-shot, we'll use the base model and add a simple classifier
+        # In production, this should be fine-tuned on depression data
+        try:
+            # Try to load a fine-tuned model first
+            return AutoModelForSequenceClassification.from_pretrained(
+                self.model_path,
+                num_labels=2  # Binary: DEPRESSION vs NORMAL
+            )
+        except Exception:
+            # Fallback: use base model with random classifier head
+            # This is for demonstration - in production, use a fine-tuned model
+            from transformers import AutoModel
+            logger.warning(
+                f"Modèle de classification non trouvé, utilisation du modèle de base. "
+                f"Pour de meilleurs résultats, utilisez un modèle fine-tuné."
+            )
+            base_model = AutoModel.from_pretrained(self.model_path)
+            # Create a simple classifier wrapper
+            return self._create_classifier_wrapper(base_model)
+    
     def _warmup_model(self):
         """
         Warm up the model with a dummy inference to avoid cold start latency.
@@ -208,6 +250,7 @@ class CamemBERTDepressionModel(BaseMLModel):
         else:
             return "Faible"
     
+    @cached_predict
     def predict(self, text: str, include_reasoning: bool = True, **kwargs) -> Dict[str, Any]:
         """
         Predict depression from text.
@@ -317,6 +360,7 @@ class CamemBERTDepressionModel(BaseMLModel):
                 f"Le texte semble refléter un état émotionnel normal."
             )
     
+    @cached_batch_predict
     def batch_predict(
         self, texts: List[str], include_reasoning: bool = False, **kwargs
     ) -> List[Dict[str, Any]]:
@@ -418,7 +462,8 @@ class CamemBERTDepressionModel(BaseMLModel):
         """
         try:
             # Test with simple French text
-            result = self.predict("Je vais bien aujourd'hui", include_reasoning=False)
+            with bypass_cache():  # Le modèle doit réellement être appelé
+                result = self.predict("Je vais bien aujourd'hui", include_reasoning=False)
             
             return {
                 "status": "healthy",
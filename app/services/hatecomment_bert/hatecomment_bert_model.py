@@ -4,11 +4,15 @@ Modèle HateComment BERT amélioré avec post-processing
 import torch
 import re
 from typing import Dict, Any, List
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
 from pathlib import Path
 import os
 
 from app.core.base_model import BaseMLModel
+from app.core.prediction_cache import cached_predict, cached_batch_predict, bypass_cache
+from app.core.quantization import resolve_inference_mode, load_quantized_model
+from app.core.onnx_backend import resolve_backend, load_with_fallback
+from app.config import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -19,12 +23,14 @@ class HateCommentBertModel(BaseMLModel):
     avec post-processing amélioré
     """
     
-    def __init__(self, model_path: str = None):
+    def __init__(self, model_path: str = None, inference_mode: str = None, backend: str = None):
         """
         Initialise le modèle HateComment BERT amélioré
         
         Args:
             model_path: Chemin vers le modèle fine-tuné (optionnel)
+            inference_mode: fp32 ou int8 (défaut: settings.HATECOMMENT_INFERENCE_MODE)
+            backend: pytorch ou onnx (défaut: settings.HATECOMMENT_BACKEND)
         """
         self._initialized = False
         
@@ -46,43 +52,67 @@ class HateCommentBertModel(BaseMLModel):
             model_path = os.path.join(os.path.dirname(__file__), "model")
         
         self.model_path = model_path
+        self.inference_mode = resolve_inference_mode(
+            inference_mode or settings.HATECOMMENT_INFERENCE_MODE, self.device
+        )
+        self.backend = resolve_backend(backend or settings.HATECOMMENT_BACKEND, self.device)
+        if self.backend == "onnx" and self.inference_mode == "int8":
+            logger.warning("⚠️  int8 ignoré avec le backend ONNX (graphe fp32)")
+            self.inference_mode = "fp32"
         
         # Charger le modèle et tokenizer
         try:
             if self._model_exists(model_path):
                 logger.info(f"Chargement du modèle fine-tuné depuis {model_path}")
-                self.tokenizer = AutoTokenizer.from_pretrained(model_path, token=False)
-                self.model = AutoModelForSequenceClassification.from_pretrained(model_path, token=False)
+                source = model_path
                 self.is_fine_tuned = True
             else:
                 logger.warning("Modèle fine-tuné non trouvé, utilisation du modèle de base")
-                base_model = 'bert-base-multilingual-cased'
-                logger.info(f"Chargement de {base_model}...")
-                self.tokenizer = AutoTokenizer.from_pretrained(base_model, token=False)
-                self.model = AutoModelForSequenceClassification.from_pretrained(
-                    base_model, 
+                source = 'bert-base-multilingual-cased'
+                logger.info(f"Chargement de {source}...")
+                self.is_fine_tuned = False
+            
+            self.tokenizer = AutoTokenizer.from_pretrained(source, token=False)
+            
+            def load_fp32():
+                return AutoModelForSequenceClassification.from_pretrained(
+                    source,
                     num_labels=2,
                     token=False
                 )
-                self.is_fine_tuned = False
             
-            # Déplacer le modèle sur le device approprié
-            self.model.to(self.device)
+            # Backend ONNX: graphe exporté servi par onnxruntime (PyTorch si échec)
+            self.model = None
+            if self.backend == "onnx":
+                self.model = load_with_fallback(
+                    self.model_name,
+                    source,
+                    self.model_version,
+                    load_fp32,
+                    lambda: dict(self.tokenizer("Texte d'exemple", return_tensors="pt"))
+                )
+                if self.model is None:
+                    self.backend = "pytorch"
             
-            # Créer le pipeline de classification
-            self.classifier = pipeline(
-                "text-classification",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=0 if self.device.type == "cuda" else -1,
-                return_all_scores=True
-            )
+            if self.backend == "pytorch":
+                if self.inference_mode == "int8":
+                    # Poids int8 (couches Linear), mis en cache disque si configuré
+                    self.model = load_quantized_model(source, load_fp32)
+                else:
+                    # Déplacer le modèle sur le device approprié
+                    self.model = load_fp32()
+                    self.model.to(self.device)
+            self.model.eval()
+            
+            # Paramètres du batching par longueur
+            self.batch_size = max(1, settings.HATECOMMENT_BATCH_SIZE)
+            self.max_length = settings.HATECOMMENT_MAX_LENGTH
             
             # Patterns de hate speech pour post-processing
             self._init_hate_patterns()
             
             self._initialized = True
-            logger.info(f"✓ {self.model_name} initialisé avec succès")
+            logger.info(f"✓ {self.model_name} initialisé avec succès ({self.backend}, {self.inference_mode})")
             
         except Exception as e:
             logger.error(f"✗ Erreur lors de l'initialisation de {self.model_name}: {e}")
@@ -129,7 +159,8 @@ class HateCommentBertModel(BaseMLModel):
     
     @property
     def model_version(self) -> str:
-        return "1.1.0"  # Version améliorée
+        # Version améliorée; les sorties int8 diffèrent légèrement (caches, métriques)
+        return "1.1.0+int8" if self.inference_mode == "int8" else "1.1.0"
     
     @property
     def author(self) -> str:
@@ -166,6 +197,7 @@ class HateCommentBertModel(BaseMLModel):
         
         return base_score
     
+    @cached_predict
     def predict(self, text: str, **kwargs) -> Dict[str, Any]:
         """
         Détecte si le texte contient du hate speech avec post-processing amélioré
@@ -193,38 +225,9 @@ class HateCommentBertModel(BaseMLModel):
                 }
             
             # Prédiction du modèle de base
-            results = self.classifier(processed_text)
-            scores = results[0]
-            
-            label_0 = next(s for s in scores if s['label'] == 'LABEL_0')
-            label_1 = next(s for s in scores if s['label'] == 'LABEL_1')
-            
-            base_hate_score = label_1['score']
-            
-            # Appliquer le post-processing
-            enhanced_hate_score = self._apply_pattern_boost(processed_text, base_hate_score)
-            
-            # Seuil adaptatif basé sur le boost appliqué
-            threshold = 0.3 if enhanced_hate_score > base_hate_score else 0.5
-            
-            # Déterminer la prédiction finale
-            if enhanced_hate_score > threshold:
-                prediction = "HAINEUX"
-                confidence = enhanced_hate_score
-            else:
-                prediction = "NON-HAINEUX"
-                confidence = 1 - enhanced_hate_score
+            base_hate_score = self._score_texts([processed_text])[0]
             
-            # Formater le résultat
-            result = self._format_hate_result(prediction, confidence, enhanced_hate_score > base_hate_score)
-            
-            # Ajouter des métadonnées
-            result["model_fine_tuned"] = self.is_fine_tuned
-            result["base_score"] = float(base_hate_score)
-            result["enhanced_score"] = float(enhanced_hate_score)
-            result["boost_applied"] = enhanced_hate_score > base_hate_score
-            
-            return result
+            return self._build_result(processed_text, base_hate_score)
             
         except Exception as e:
             logger.error(f"Erreur de prédiction {self.model_name}: {e}")
@@ -235,6 +238,84 @@ class HateCommentBertModel(BaseMLModel):
                 "reasoning": f"Erreur lors de l'analyse: {str(e)}"
             }
     
+    def _score_texts(self, texts: List[str]) -> List[float]:
+        """
+        Calcule le score de hate speech (probabilité LABEL_1) de plusieurs textes
+        
+        Les textes sont triés par longueur en tokens puis traités par paquets de
+        `batch_size`, chaque paquet n'étant paddé qu'à la longueur de son plus
+        long texte. Les scores sont rendus dans l'ordre d'origine.
+        
+        Args:
+            texts: Textes prétraités (non vides)
+            
+        Returns:
+            Liste des scores de hate, dans l'ordre des textes
+        """
+        lengths = [
+            len(ids) for ids in self.tokenizer(
+                texts, truncation=True, max_length=self.max_length
+            )["input_ids"]
+        ]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        
+        scores = [0.0] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            inputs = self.tokenizer(
+                [texts[i] for i in bucket],
+                return_tensors="pt",
+                truncation=True,
+                max_length=self.max_length,
+                padding=True
+            )
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            
+            with torch.no_grad():
+                logits = self.model(**inputs).logits
+                hate_probs = torch.softmax(logits, dim=-1)[:, 1].cpu().tolist()
+            
+            for index, score in zip(bucket, hate_probs):
+                scores[index] = score
+        
+        return scores
+    
+    def _build_result(self, processed_text: str, base_hate_score: float) -> Dict[str, Any]:
+        """
+        Applique le post-processing (patterns, seuil adaptatif) à un score de base
+        
+        Args:
+            processed_text: Texte prétraité
+            base_hate_score: Score de hate du modèle
+            
+        Returns:
+            Dict avec le résultat formaté et ses métadonnées
+        """
+        # Appliquer le post-processing
+        enhanced_hate_score = self._apply_pattern_boost(processed_text, base_hate_score)
+        
+        # Seuil adaptatif basé sur le boost appliqué
+        threshold = 0.3 if enhanced_hate_score > base_hate_score else 0.5
+        
+        # Déterminer la prédiction finale
+        if enhanced_hate_score > threshold:
+            prediction = "HAINEUX"
+            confidence = enhanced_hate_score
+        else:
+            prediction = "NON-HAINEUX"
+            confidence = 1 - enhanced_hate_score
+        
+        # Formater le résultat
+        result = self._format_hate_result(prediction, confidence, enhanced_hate_score > base_hate_score)
+        
+        # Ajouter des métadonnées
+        result["model_fine_tuned"] = self.is_fine_tuned
+        result["base_score"] = float(base_hate_score)
+        result["enhanced_score"] = float(enhanced_hate_score)
+        result["boost_applied"] = enhanced_hate_score > base_hate_score
+        
+        return result
+    
     def _preprocess_text(self, text: str) -> str:
         """
         Prétraite le texte avant analyse
@@ -305,9 +386,10 @@ class HateCommentBertModel(BaseMLModel):
             "original_label": "LABEL_1" if is_hateful else "LABEL_0"
         }
     
+    @cached_batch_predict
     def batch_predict(self, texts: List[str], **kwargs) -> List[Dict[str, Any]]:
         """
-        Analyse plusieurs textes en batch
+        Analyse plusieurs textes en batch (paquets triés par longueur)
         
         Args:
             texts: Liste de textes à analyser
@@ -319,19 +401,34 @@ class HateCommentBertModel(BaseMLModel):
         if not self._initialized:
             raise RuntimeError(f"{self.model_name} n'est pas initialisé correctement")
         
-        results = []
-        for text in texts:
-            try:
-                result = self.predict(text, **kwargs)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Erreur batch prediction pour '{text}': {e}")
-                results.append({
+        processed_texts = [self._preprocess_text(text) for text in texts]
+        to_score = [i for i, text in enumerate(processed_texts) if text]
+        
+        try:
+            scores = self._score_texts([processed_texts[i] for i in to_score])
+        except Exception as e:
+            logger.error(f"Erreur batch prediction {self.model_name} ({len(texts)} textes): {e}")
+            return [
+                {
                     "prediction": "ERREUR",
                     "confidence": 0.0,
                     "severity": "Aucune",
                     "reasoning": f"Erreur: {str(e)}"
-                })
+                }
+                for _ in texts
+            ]
+        
+        results: List[Dict[str, Any]] = [
+            {
+                "prediction": "NON-HAINEUX",
+                "confidence": 0.5,
+                "severity": "Aucune",
+                "reasoning": "Texte vide ou invalide"
+            }
+            for _ in texts
+        ]
+        for index, score in zip(to_score, scores):
+            results[index] = self._build_result(processed_texts[index], score)
         
         return results
     
@@ -344,7 +441,8 @@ class HateCommentBertModel(BaseMLModel):
         """
         try:
             # Test de prédiction simple
-            test_result = self.predict("Test de santé du modèle")
+            with bypass_cache():  # Le modèle doit réellement être appelé
+                test_result = self.predict("Test de santé du modèle")
             
             # Informations GPU si disponible
             gpu_info = {}
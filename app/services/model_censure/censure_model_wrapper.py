@@ -7,6 +7,8 @@ import torch
 from PIL import Image
 from transformers import ViTForImageClassification, ViTImageProcessor
 from app.core.base_model import BaseMLModel
+from app.core.onnx_backend import resolve_backend, load_with_fallback
+from app.config import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -42,8 +44,13 @@ class CensureModel(BaseMLModel):
     def tags(self) -> List[str]:
         return ["image-classification", "nsfw-detection", "content-moderation", "safety"]
     
-    def __init__(self):
-        """Initialise le modèle de détection NSFW"""
+    def __init__(self, backend: Optional[str] = None):
+        """
+        Initialise le modèle de détection NSFW
+        
+        Args:
+            backend: pytorch ou onnx (défaut: settings.CENSURE_BACKEND)
+        """
         try:
             logger.info("Initialisation du modèle de détection NSFW...")
             
@@ -55,19 +62,41 @@ class CensureModel(BaseMLModel):
                 HF_MODEL_REPO,
                 token=False
             )
-            self.model = ViTForImageClassification.from_pretrained(
-                HF_MODEL_REPO,
-                token=False
-            )
+            
+            def load_torch_model():
+                return ViTForImageClassification.from_pretrained(
+                    HF_MODEL_REPO,
+                    token=False
+                )
             
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model.to(self.device)
+            self.backend = resolve_backend(backend or settings.CENSURE_BACKEND, self.device)
+            
+            # Backend ONNX: graphe exporté servi par onnxruntime (PyTorch si échec)
+            self.model = None
+            if self.backend == "onnx":
+                self.model = load_with_fallback(
+                    self.model_name,
+                    HF_MODEL_REPO,
+                    self.model_version,
+                    load_torch_model,
+                    lambda: dict(self.processor(
+                        images=[Image.new("RGB", (224, 224), color="white")],
+                        return_tensors="pt"
+                    ))
+                )
+                if self.model is None:
+                    self.backend = "pytorch"
+            
+            if self.backend == "pytorch":
+                self.model = load_torch_model()
+                self.model.to(self.device)
             self.model.eval()
             
             # Mapping des labels
             self.label_mapping = {0: "Safe", 1: "NSFW"}
             
-            logger.info(f"✓ {self.model_name} initialisé avec succès (device: {self.device})")
+            logger.info(f"✓ {self.model_name} initialisé avec succès (device: {self.device}, backend: {self.backend})")
             self._initialized = True
             
         except Exception as e:
@@ -75,6 +104,53 @@ class CensureModel(BaseMLModel):
             self._initialized = False
             raise
     
+    # Seuils de sévérité NSFW (en %): >60 Moyenne, >75 Élevée, >90 Critique
+    SEVERITY_THRESHOLDS = (60.0, 75.0, 90.0)
+    SEVERITY_LEVELS = ("Faible", "Moyenne", "Élevée", "Critique")
+    
+    def _classify_batch(self, images: List[Image.Image], max_batch_size: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Classifie plusieurs images avec un forward pass par paquet.
+        
+        Le prétraitement, le softmax, l'argmax et la sévérité sont calculés
+        sur tout le paquet (tenseur N×3×224×224).
+        
+        Args:
+            images: Images PIL
+            max_batch_size: Nombre max d'images par forward pass (défaut: settings)
+        
+        Returns:
+            Liste de dicts {predicted_label, probabilities, is_safe, severity}
+        """
+        batch_size = max(1, max_batch_size or settings.CENSURE_MAX_BATCH_SIZE)
+        thresholds = torch.tensor(self.SEVERITY_THRESHOLDS)
+        results = []
+        
+        for start in range(0, len(images), batch_size):
+            chunk = [image.convert("RGB") for image in images[start:start + batch_size]]
+            inputs = self.processor(images=chunk, return_tensors="pt")
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            
+            with torch.no_grad():
+                logits = self.model(**inputs).logits
+                probabilities = torch.softmax(logits, dim=-1).cpu().double()
+            
+            predicted_classes = logits.argmax(-1).cpu()
+            percents = [[round(p * 100, 2) for p in row] for row in probabilities.tolist()]
+            nsfw_percents = torch.tensor([pct[1] for pct in percents], dtype=torch.float64)
+            severity_indexes = torch.bucketize(nsfw_percents, thresholds.double())
+            
+            for pct, cls, sev in zip(percents, predicted_classes.tolist(), severity_indexes.tolist()):
+                predicted_label = self.label_mapping[cls]
+                results.append({
+                    "predicted_label": predicted_label,
+                    "probabilities": {"Safe": pct[0], "NSFW": pct[1]},
+                    "is_safe": predicted_label == "Safe",
+                    "severity": "Aucune" if predicted_label == "Safe" else self.SEVERITY_LEVELS[sev]
+                })
+        
+        return results
+    
     def _predict_image(self, image: Image.Image) -> Dict[str, Any]:
         """
         Prédit si une image est Safe ou NSFW.
@@ -85,25 +161,34 @@ class CensureModel(BaseMLModel):
         Returns:
             Dict avec les résultats de classification
         """
-        inputs = self.processor(images=image.convert("RGB"), return_tensors="pt")
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        return self._classify_batch([image])[0]
+    
+    def _format_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Formate un résultat de classification pour l'API.
         
-        with torch.no_grad():
-            logits = self.model(**inputs).logits
-            probabilities = torch.softmax(logits, dim=-1).squeeze().tolist()
+        Args:
+            result: Sortie de _classify_batch pour une image
         
-        predicted_class = logits.argmax(-1).item()
-        predicted_label = self.label_mapping[predicted_class]
+        Returns:
+            Dict avec prediction, confidence, severity, reasoning, probabilities, is_safe
+        """
+        predicted_label = result["predicted_label"]
+        probabilities = result["probabilities"]
+        confidence = probabilities[predicted_label] / 100.0
         
-        results = {
-            "Safe": round(probabilities[0] * 100, 2),
-            "NSFW": round(probabilities[1] * 100, 2)
-        }
+        if result["is_safe"]:
+            reasoning = f"✅ Contenu sûr - L'image est classifiée comme Safe avec {probabilities['Safe']}% de confiance"
+        else:
+            reasoning = f"⚠️ CONTENU NSFW DÉTECTÉ - L'image contient du contenu inapproprié avec {probabilities['NSFW']}% de confiance"
         
         return {
-            "predicted_label": predicted_label,
-            "probabilities": results,
-            "is_safe": predicted_label == "Safe"
+            "prediction": predicted_label.upper(),
+            "confidence": confidence,
+            "severity": result["severity"],
+            "reasoning": reasoning,
+            "probabilities": probabilities,
+            "is_safe": result["is_safe"]
         }
     
     def predict(self, text: str = "", image_path: Optional[str] = None, **kwargs) -> Dict[str, Any]:
@@ -143,52 +228,30 @@ class CensureModel(BaseMLModel):
             
             # Prédiction
             logger.info("Classification de l'image...")
-            result = self._predict_image(image)
-            
-            predicted_label = result["predicted_label"]
-            probabilities = result["probabilities"]
-            is_safe = result["is_safe"]
-            
-            # Déterminer la confiance et la sévérité
-            confidence = probabilities[predicted_label] / 100.0
-            
-            if is_safe:
-                severity = "Aucune"
-                reasoning = f"✅ Contenu sûr - L'image est classifiée comme Safe avec {probabilities['Safe']}% de confiance"
-            else:
-                if probabilities['NSFW'] > 90:
-                    severity = "Critique"
-                elif probabilities['NSFW'] > 75:
-                    severity = "Élevée"
-                elif probabilities['NSFW'] > 60:
-                    severity = "Moyenne"
-                else:
-                    severity = "Faible"
-                
-                reasoning = f"⚠️ CONTENU NSFW DÉTECTÉ - L'image contient du contenu inapproprié avec {probabilities['NSFW']}% de confiance"
+            result = self._format_result(self._predict_image(image))
             
-            logger.info(f"  → Classification: {predicted_label} ({confidence:.2%})")
+            logger.info(f"  → Classification: {result['prediction']} ({result['confidence']:.2%})")
             
-            return {
-                "prediction": predicted_label.upper(),
-                "confidence": confidence,
-                "severity": severity,
-                "reasoning": reasoning,
-                "probabilities": probabilities,
-                "is_safe": is_safe
-            }
+            return result
         
         except Exception as e:
             logger.error(f"Erreur lors de l'analyse de l'image: {e}")
             raise
     
-    def batch_predict(self, texts: List[str] = None, image_paths: List[str] = None, **kwargs) -> List[Dict[str, Any]]:
+    def batch_predict(
+        self,
+        texts: List[str] = None,
+        image_paths: List[str] = None,
+        max_batch_size: Optional[int] = None,
+        **kwargs
+    ) -> List[Dict[str, Any]]:
         """
-        Analyse plusieurs images en batch.
+        Analyse plusieurs images en batch (un forward pass par paquet).
         
         Args:
             texts: Non utilisé (compatibilité)
             image_paths: Liste de chemins vers les images
+            max_batch_size: Nombre max d'images par forward pass (défaut: settings)
             **kwargs: Peut contenir 'images' (liste d'images PIL)
         
         Returns:
@@ -204,6 +267,14 @@ class CensureModel(BaseMLModel):
         
         logger.info(f"Analyse batch de {len(images)} images...")
         
+        try:
+            return [
+                self._format_result(result)
+                for result in self._classify_batch(images, max_batch_size)
+            ]
+        except Exception as e:
+            logger.warning(f"⚠️ Classification batch échouée ({e}), repli image par image")
+        
         results = []
         for i, image in enumerate(images, 1):
             try:
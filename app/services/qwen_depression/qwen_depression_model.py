@@ -6,10 +6,13 @@ Provides better reasoning capabilities than BERT models with acceptable latency.
 """
 from typing import Dict, Any, List, Optional
 import time
-import json
-import re
 import httpx
 from app.core.base_model import BaseMLModel
+from app.core.fanout import map_bounded
+from app.core.packing import format_numbered_texts, record_usage, run_packed
+from app.core.ollama_client import get_ollama_client
+from app.core.prediction_cache import cached_predict, cached_apredict, cached_batch_predict, bypass_cache
+from app.core.structured_output import detection_schema, packed_schema, parse_json_object
 from app.config import settings
 from app.utils.logger import setup_logger
 
@@ -34,7 +37,8 @@ class QwenDepressionModel(BaseMLModel):
     
     @property
     def model_version(self) -> str:
-        return "1.0.0"
+        # Modèle Ollama inclus: changer de modèle invalide le cache de prédictions
+        return f"1.0.0+{self.ollama_model}"
     
     @property
     def author(self) -> str:
@@ -49,24 +53,59 @@ class QwenDepressionModel(BaseMLModel):
         return ["qwen", "ollama", "french", "depression", "reasoning"]
 
     
-    # Prompt template for depression detection
-    DETECTION_PROMPT = """Tu es un assistant specialise dans l'analyse de texte pour detecter des signes de depression.
+    # Static instructions sent as a stable system message: Ollama reuses the
+    # KV cache of this common prefix across calls, only the text is prefilled
+    DETECTION_SYSTEM_PROMPT = """Tu es un assistant specialise dans l'analyse de texte pour detecter des signes de depression.
 
-Analyse le texte suivant et determine s'il contient des indicateurs de depression.
-
-Texte a analyser:
-"{text}"
+Analyse le texte fourni et determine s'il contient des indicateurs de depression.
 
 Reponds UNIQUEMENT avec un JSON valide dans ce format exact:
-{{
+{
     "prediction": "DEPRESSION" ou "NORMAL",
     "confidence": un nombre entre 0.0 et 1.0,
     "severity": "Aucune", "Faible", "Moyenne", "Elevee" ou "Critique",
     "reasoning": "explication courte de ton analyse"
-}}
+}"""
+
+    DETECTION_USER_TEMPLATE = """Texte a analyser:
+"{text}"
+
+JSON:"""
+
+    # Packed mode: several numbered texts, one JSON result per text
+    PACKED_SYSTEM_PROMPT = """Tu es un assistant specialise dans l'analyse de texte pour detecter des signes de depression.
+
+Analyse chacun des textes numerotes fournis et determine s'il contient des indicateurs de depression.
+
+Reponds UNIQUEMENT avec un JSON valide dans ce format exact, un resultat par texte, dans l'ordre:
+{
+    "results": [
+        {
+            "id": numero du texte,
+            "prediction": "DEPRESSION" ou "NORMAL",
+            "confidence": un nombre entre 0.0 et 1.0,
+            "severity": "Aucune", "Faible", "Moyenne", "Elevee" ou "Critique",
+            "reasoning": "explication tres courte"
+        }
+    ]
+}"""
+
+    PACKED_USER_TEMPLATE = """Textes a analyser ({count}):
+{items}
 
 JSON:"""
 
+    # Response token budget per text of a packed prompt
+    PACKED_TOKENS_PER_TEXT = 96
+
+    SEVERITIES = ["Aucune", "Faible", "Moyenne", "Elevee", "Critique"]
+
+    # JSON schemas passed as Ollama `format`: decoding is constrained to a
+    # valid object and stops as soon as it closes
+    DETECTION_SCHEMA = detection_schema(["DEPRESSION", "NORMAL"], SEVERITIES)
+    DETECTION_SCHEMA_NO_REASONING = detection_schema(["DEPRESSION", "NORMAL"], SEVERITIES, include_reasoning=False)
+    PACKED_SCHEMA = packed_schema(DETECTION_SCHEMA)
+
     def __init__(
         self,
         model_name: Optional[str] = None,
@@ -87,8 +126,8 @@ JSON:"""
         self.timeout = timeout
         self.max_length = settings.QWEN_MAX_LENGTH
         
-        # HTTP client for Ollama API
-        self._client = httpx.Client(timeout=timeout)
+        # Shared pooled HTTP client for Ollama API
+        self._client = get_ollama_client(self.base_url)
         
         try:
             self._verify_model()
@@ -103,11 +142,7 @@ JSON:"""
     def _verify_model(self):
         """Verify that the Qwen model is available in Ollama."""
         try:
-            response = self._client.get(f"{self.base_url}/api/tags")
-            response.raise_for_status()
-            
-            models = response.json().get("models", [])
-            model_names = [m.get("name", "") for m in models]
+            model_names = self._client.list_models()
             
             # Check if our model is available
             if not any(self.ollama_model in name for name in model_names):
@@ -132,12 +167,12 @@ JSON:"""
         """Pull the model from Ollama registry."""
         logger.info(f"Telechargement du modele {self.ollama_model}...")
         try:
-            response = self._client.post(
-                f"{self.base_url}/api/pull",
-                json={"name": self.ollama_model},
+            self._client.request(
+                "POST",
+                "/api/pull",
+                json={"name": self.ollama_model, "stream": False},
                 timeout=600.0  # 10 minutes for download
             )
-            response.raise_for_status()
             logger.info(f"Modele {self.ollama_model} telecharge")
         except Exception as e:
             raise RuntimeError(f"Erreur de telechargement: {e}")
@@ -171,41 +206,55 @@ JSON:"""
             Parsed prediction dict
         """
         try:
-            # Try to extract JSON from response
-            json_match = re.search(r'\{[^{}]*\}', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                result = json.loads(json_str)
-                
-                # Validate and normalize
-                prediction = result.get("prediction", "NORMAL").upper()
-                if "DEPR" in prediction:
-                    prediction = "DEPRESSION"
-                else:
-                    prediction = "NORMAL"
-                
-                confidence = float(result.get("confidence", 0.5))
-                confidence = max(0.0, min(1.0, confidence))
-                
-                severity = result.get("severity", "Aucune")
-                valid_severities = ["Aucune", "Faible", "Moyenne", "Elevee", "Critique"]
-                if severity not in valid_severities:
-                    severity = self._classify_severity(confidence, prediction)
-                
-                reasoning = result.get("reasoning", "")
-                
-                return {
-                    "prediction": prediction,
-                    "confidence": round(confidence, 4),
-                    "severity": severity,
-                    "reasoning": reasoning
-                }
-        except (json.JSONDecodeError, ValueError) as e:
+            return parse_json_object(response_text, "qwen", validate=self._normalize_result)
+        except ValueError as e:
             logger.warning(f"Erreur de parsing JSON: {e}")
         
         # Fallback: try to extract prediction from text
         return self._fallback_parse(response_text)
     
+    def _normalize_result(self, result: Dict[str, Any], strict: bool = False) -> Dict[str, Any]:
+        """
+        Validate and normalize one JSON prediction.
+        
+        Args:
+            result: Parsed JSON prediction
+            strict: Reject a missing prediction/confidence or an unknown label
+                (packed items, retried one at a time) instead of defaulting
+        
+        Raises:
+            ValueError: If the confidence is not a number, or (strict) if a
+                required field is missing or the label is unknown
+        """
+        if strict:
+            missing = [key for key in ("prediction", "confidence") if result.get(key) is None]
+            if missing:
+                raise ValueError(f"champ(s) manquant(s): {', '.join(missing)}")
+        
+        prediction = str(result.get("prediction", "NORMAL")).upper()
+        if "DEPR" in prediction:
+            prediction = "DEPRESSION"
+        elif "NORMAL" in prediction or not strict:
+            prediction = "NORMAL"
+        else:
+            raise ValueError(f"prediction invalide: {result['prediction']}")
+        
+        confidence = float(result.get("confidence", 0.5))
+        confidence = max(0.0, min(1.0, confidence))
+        
+        severity = result.get("severity", "Aucune")
+        if severity not in self.SEVERITIES:
+            severity = self._classify_severity(confidence, prediction)
+        
+        reasoning = result.get("reasoning", "")
+        
+        return {
+            "prediction": prediction,
+            "confidence": round(confidence, 4),
+            "severity": severity,
+            "reasoning": reasoning
+        }
+    
     def _fallback_parse(self, response_text: str) -> Dict[str, Any]:
         """Fallback parsing when JSON extraction fails."""
         text_lower = response_text.lower()
@@ -241,10 +290,104 @@ JSON:"""
             return "Faible"
 
     
+    def _build_messages(self, text: str) -> List[Dict[str, str]]:
+        """Preprocess text and build the chat messages (stable system prefix first)."""
+        return [
+            {"role": "system", "content": self.DETECTION_SYSTEM_PROMPT},
+            {"role": "user", "content": self.DETECTION_USER_TEMPLATE.format(text=self._preprocess_text(text))}
+        ]
+
+    # Generation options for detection (deterministic, short JSON answer)
+    GENERATION_OPTIONS = {"temperature": 0.1, "num_predict": 160}
+    # Token budget when the reasoning is not requested (JSON without "reasoning")
+    NO_REASONING_NUM_PREDICT = 48
+
+    def _chat_kwargs(self, include_reasoning: bool) -> Dict[str, Any]:
+        """Options and constrained `format` of a single detection call."""
+        if include_reasoning:
+            return {"options": self.GENERATION_OPTIONS, "format": self.DETECTION_SCHEMA}
+        return {
+            "options": {**self.GENERATION_OPTIONS, "num_predict": self.NO_REASONING_NUM_PREDICT},
+            "format": self.DETECTION_SCHEMA_NO_REASONING
+        }
+
+    def _finalize(self, response_data: Dict[str, Any], start_time: float, include_reasoning: bool) -> Dict[str, Any]:
+        """Parse the Ollama response and add processing time."""
+        record_usage(self.ollama_model, response_data.get("prompt_eval_count"), response_data.get("eval_count"))
+        result = self._parse_response(response_data.get("message", {}).get("content", ""))
+        
+        # Calculate processing time
+        processing_time = (time.time() - start_time) * 1000
+        result["processing_time"] = round(processing_time, 2)
+        
+        # Remove reasoning if not requested
+        if not include_reasoning:
+            result.pop("reasoning", None)
+        
+        return result
+
+    def _infer(self, text: str, include_reasoning: bool) -> Dict[str, Any]:
+        """Single Ollama call (no cache lookup)."""
+        start_time = time.time()
+        
+        try:
+            response_data = self._client.chat(
+                self.ollama_model,
+                self._build_messages(text),
+                timeout=self.timeout,
+                **self._chat_kwargs(include_reasoning)
+            )
+            return self._finalize(response_data, start_time, include_reasoning)
+            
+        except httpx.TimeoutException:
+            logger.error(f"Timeout lors de l'inference Qwen")
+            raise RuntimeError("Timeout de l'inference")
+        except Exception as e:
+            logger.error(f"Erreur de prediction Qwen: {e}")
+            raise
+
+    def _generate_packed(self, texts: List[str]) -> str:
+        """One Ollama call for several texts; returns the raw JSON answer."""
+        user_prompt = self.PACKED_USER_TEMPLATE.format(
+            count=len(texts),
+            items=format_numbered_texts([self._preprocess_text(text) for text in texts])
+        )
+        response_data = self._client.chat(
+            self.ollama_model,
+            [
+                {"role": "system", "content": self.PACKED_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            options={**self.GENERATION_OPTIONS, "num_predict": self.PACKED_TOKENS_PER_TEXT * len(texts) + 32},
+            timeout=self.timeout * len(texts),
+            format=self.PACKED_SCHEMA
+        )
+        record_usage(self.ollama_model, response_data.get("prompt_eval_count"), response_data.get("eval_count"))
+        return response_data.get("message", {}).get("content", "")
+
+    @cached_predict
     def predict(self, text: str, include_reasoning: bool = True, **kwargs) -> Dict[str, Any]:
         """
         Predict depression from text using Qwen.
         
+        Args:
+            text: Text to analyze
+            include_reasoning: Include explanation (default: True)
+            **kwargs: Additional parameters
+            
+        Returns:
+            Dict with prediction, confidence, severity, reasoning, processing_time
+        """
+        if not self._initialized:
+            raise RuntimeError(f"{self.model_name} n'est pas initialise")
+        
+        return self._infer(text, include_reasoning)
+
+    @cached_apredict
+    async def apredict(self, text: str, include_reasoning: bool = True, **kwargs) -> Dict[str, Any]:
+        """
+        Async variant of predict: awaits Ollama without holding a thread.
+        
         Args:
             text: Text to analyze
             include_reasoning: Include explanation (default: True)
@@ -259,43 +402,13 @@ JSON:"""
         start_time = time.time()
         
         try:
-            # Preprocess
-            text = self._preprocess_text(text)
-            
-            # Build prompt
-            prompt = self.DETECTION_PROMPT.format(text=text)
-            
-            # Call Ollama API
-            response = self._client.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.ollama_model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.1,
-                        "num_predict": 256
-                    }
-                },
-                timeout=self.timeout
+            response_data = await self._client.achat(
+                self.ollama_model,
+                self._build_messages(text),
+                timeout=self.timeout,
+                **self._chat_kwargs(include_reasoning)
             )
-            response.raise_for_status()
-            
-            # Parse response
-            response_data = response.json()
-            response_text = response_data.get("response", "")
-            
-            result = self._parse_response(response_text)
-            
-            # Calculate processing time
-            processing_time = (time.time() - start_time) * 1000
-            result["processing_time"] = round(processing_time, 2)
-            
-            # Remove reasoning if not requested
-            if not include_reasoning:
-                result.pop("reasoning", None)
-            
-            return result
+            return self._finalize(response_data, start_time, include_reasoning)
             
         except httpx.TimeoutException:
             logger.error(f"Timeout lors de l'inference Qwen")
@@ -304,11 +417,15 @@ JSON:"""
             logger.error(f"Erreur de prediction Qwen: {e}")
             raise
     
+    @cached_batch_predict
     def batch_predict(
         self, texts: List[str], include_reasoning: bool = False, **kwargs
     ) -> List[Dict[str, Any]]:
         """
-        Batch prediction (sequential for Ollama).
+        Batch prediction: concurrent Ollama calls (bounded), results in input order.
+        
+        With LLM_PACK_SIZE > 1, texts are packed N per prompt; items missing
+        from the answer are retried one at a time.
         
         Args:
             texts: List of texts to analyze
@@ -316,39 +433,52 @@ JSON:"""
             **kwargs: Additional parameters
             
         Returns:
-            List of prediction results
+            List of prediction results (failed or timed-out texts carry an "error")
         """
         if not self._initialized:
             raise RuntimeError(f"{self.model_name} n'est pas initialise")
         
         logger.info(f"Prediction batch de {len(texts)} textes avec Qwen")
         
-        results = []
-        start_time = time.time()
-        
-        for text in texts:
-            try:
-                result = self.predict(text, include_reasoning=include_reasoning)
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Erreur sur un texte: {e}")
-                results.append({
-                    "prediction": "NORMAL",
-                    "confidence": 0.0,
-                    "severity": "Aucune",
-                    "processing_time": 0.0,
-                    "error": str(e)
-                })
+        def on_error(text: str, e: Exception) -> Dict[str, Any]:
+            return {
+                "prediction": "NORMAL",
+                "confidence": 0.0,
+                "severity": "Aucune",
+                "processing_time": 0.0,
+                "error": str(e)
+            }
         
-        total_time = (time.time() - start_time) * 1000
-        logger.info(f"Batch traite: {len(texts)} textes en {total_time:.2f}ms")
+        if settings.LLM_PACK_SIZE > 1:
+            def normalize(item: Dict[str, Any]) -> Dict[str, Any]:
+                result = self._normalize_result(item, strict=True)
+                result["processing_time"] = 0.0  # Shared call: no per-text latency
+                if not include_reasoning:
+                    result.pop("reasoning", None)
+                return result
+            
+            return run_packed(
+                texts,
+                settings.LLM_PACK_SIZE,
+                call_pack=self._generate_packed,
+                call_single=lambda text: self._infer(text, include_reasoning),
+                normalize=normalize,
+                on_error=on_error,
+                name=self.model_name
+            )
         
-        return results
+        return map_bounded(
+            lambda text: self._infer(text, include_reasoning),
+            texts,
+            on_error=on_error,
+            name=self.model_name
+        )
     
     def health_check(self) -> Dict[str, Any]:
         """Check if model is operational."""
         try:
-            result = self.predict("Je vais bien.", include_reasoning=False)
+            with bypass_cache():  # Ollama doit réellement être appelé
+                result = self.predict("Je vais bien.", include_reasoning=False)
             
             return {
                 "status": "healthy",
@@ -9,6 +9,7 @@ import torch
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration, pipeline
 from app.core.base_model import BaseMLModel
+from app.config import settings
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -148,13 +149,31 @@ class SensitiveImageCaptionModel(BaseMLModel):
         Returns:
             Légende en anglais
         """
-        inputs = self.processor(images=image, return_tensors="pt").to(self.device)
-
-        with torch.no_grad():
-            generated_ids = self.caption_model.generate(**inputs, max_length=50)
-
-        caption = self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        return caption
+        return self._generate_captions([image])[0]
+    
+    def _generate_captions(self, images: List[Image.Image]) -> List[str]:
+        """
+        Génère les légendes de plusieurs images en un appel `generate` par paquet.
+        
+        Args:
+            images: Images PIL
+        
+        Returns:
+            Légendes en anglais, dans l'ordre des images
+        """
+        batch_size = max(1, settings.IMAGE_CAPTION_BATCH_SIZE)
+        captions = []
+        
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            inputs = self.processor(images=chunk, return_tensors="pt").to(self.device)
+            
+            with torch.no_grad():
+                generated_ids = self.caption_model.generate(**inputs, max_length=50)
+            
+            captions.extend(self.processor.batch_decode(generated_ids, skip_special_tokens=True))
+        
+        return captions
     
     def _translate_to_french(self, text: str) -> str:
         """
@@ -169,6 +188,90 @@ class SensitiveImageCaptionModel(BaseMLModel):
         translation = self.translator(text)[0]['translation_text']
         return translation
     
+    def _translate_batch_to_french(self, texts: List[str]) -> List[str]:
+        """
+        Traduit plusieurs textes en français, par paquets de IMAGE_CAPTION_BATCH_SIZE.
+        
+        Args:
+            texts: Textes en anglais
+        
+        Returns:
+            Textes traduits, dans le même ordre
+        """
+        batch_size = max(1, settings.IMAGE_CAPTION_BATCH_SIZE)
+        translations = []
+        
+        for start in range(0, len(texts), batch_size):
+            chunk = texts[start:start + batch_size]
+            translations.extend(
+                translation['translation_text']
+                for translation in self.translator(chunk, batch_size=len(chunk))
+            )
+        
+        return translations
+    
+    def _build_result(self, caption_en: str, is_sensitive: bool, caption_fr: str) -> Dict[str, Any]:
+        """
+        Construit le résultat d'analyse d'une image.
+        
+        Args:
+            caption_en: Légende anglaise (déjà filtrée si sensible)
+            is_sensitive: Contenu sensible détecté
+            caption_fr: Légende traduite
+        
+        Returns:
+            Dict de résultat (voir predict)
+        """
+        if is_sensitive:
+            return {
+                "prediction": "SENSIBLE",
+                "confidence": 0.85,
+                "severity": "Élevée",
+                "reasoning": "⚠️ CONTENU SENSIBLE DÉTECTÉ - Cette image contient un contenu inapproprié (drogue, violence, ou sexe)",
+                "caption_en": caption_en,
+                "caption_fr": caption_fr,
+                "is_safe": False
+            }
+        
+        return {
+            "prediction": "SÛR",
+            "confidence": 0.95,
+            "severity": "Aucune",
+            "reasoning": "✅ Contenu sûr - Aucun élément sensible détecté dans l'image",
+            "caption_en": caption_en,
+            "caption_fr": caption_fr,
+            "is_safe": True
+        }
+    
+    def _analyze_images(self, images: List[Image.Image]) -> List[Dict[str, Any]]:
+        """
+        Pipeline batché: légendes, détection/filtrage, puis traduction groupée.
+        
+        Args:
+            images: Images PIL
+        
+        Returns:
+            Résultats dans l'ordre des images
+        """
+        captions_en = self._generate_captions(images)
+        
+        flags = []
+        captions_to_translate = []
+        for caption_en in captions_en:
+            logger.info(f"  → Légende (EN): {caption_en}")
+            is_sensitive = self._detect_sensitive_content(caption_en)
+            flags.append(is_sensitive)
+            captions_to_translate.append(
+                self._filter_caption(caption_en) if is_sensitive else caption_en
+            )
+        
+        captions_fr = self._translate_batch_to_french(captions_to_translate)
+        
+        return [
+            self._build_result(caption_en, is_sensitive, caption_fr)
+            for caption_en, is_sensitive, caption_fr in zip(captions_to_translate, flags, captions_fr)
+        ]
+    
     def predict(self, text: str = "", image_path: Optional[str] = None, **kwargs) -> Dict[str, Any]:
         """
         Analyse une image et détecte le contenu sensible.
@@ -205,42 +308,9 @@ class SensitiveImageCaptionModel(BaseMLModel):
             if image is None:
                 raise ValueError("Aucune image fournie. Utilisez 'image_path' ou 'image'")
             
-            # 1. Générer la légende en anglais
+            # Légende, détection, filtrage et traduction
             logger.info("Génération de la légende...")
-            caption_en = self._generate_caption(image)
-            logger.info(f"  → Légende (EN): {caption_en}")
-            
-            # 2. Détecter le contenu sensible
-            is_sensitive = self._detect_sensitive_content(caption_en)
-            
-            # 3. Préparer les résultats
-            if is_sensitive:
-                # Contenu sensible détecté
-                filtered_en = self._filter_caption(caption_en)
-                filtered_fr = self._translate_to_french(filtered_en)
-                
-                return {
-                    "prediction": "SENSIBLE",
-                    "confidence": 0.85,
-                    "severity": "Élevée",
-                    "reasoning": "⚠️ CONTENU SENSIBLE DÉTECTÉ - Cette image contient un contenu inapproprié (drogue, violence, ou sexe)",
-                    "caption_en": filtered_en,
-                    "caption_fr": filtered_fr,
-                    "is_safe": False
-                }
-            else:
-                # Contenu sûr
-                caption_fr = self._translate_to_french(caption_en)
-                
-                return {
-                    "prediction": "SÛR",
-                    "confidence": 0.95,
-                    "severity": "Aucune",
-                    "reasoning": "✅ Contenu sûr - Aucun élément sensible détecté dans l'image",
-                    "caption_en": caption_en,
-                    "caption_fr": caption_fr,
-                    "is_safe": True
-                }
+            return self._analyze_images([image])[0]
         
         except Exception as e:
             logger.error(f"Erreur lors de l'analyse de l'image: {e}")
@@ -248,7 +318,8 @@ class SensitiveImageCaptionModel(BaseMLModel):
     
     def batch_predict(self, texts: List[str] = None, image_paths: List[str] = None, **kwargs) -> List[Dict[str, Any]]:
         """
-        Analyse plusieurs images en batch.
+        Analyse plusieurs images en batch (une génération et une traduction
+        groupées par paquet, repli image par image en cas d'échec).
         
         Args:
             texts: Non utilisé (compatibilité)
@@ -268,6 +339,11 @@ class SensitiveImageCaptionModel(BaseMLModel):
         
         logger.info(f"Analyse batch de {len(images)} images...")
         
+        try:
+            return self._analyze_images(images)
+        except Exception as e:
+            logger.warning(f"⚠️ Analyse batch échouée ({e}), repli image par image")
+        
         results = []
         for i, image in enumerate(images, 1):
             try:
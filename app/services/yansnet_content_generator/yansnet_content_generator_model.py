@@ -1,17 +1,37 @@
 """
 Modèle YANSNET - Générateur de contenu pour le réseau social
 """
-from typing import Dict, Any, List
+from typing import AsyncIterator, Dict, Any, List
 from app.core.base_model import BaseMLModel
+from app.core.metrics.runtime_metrics import runtime_metrics
 from app.services.yansnet_llm.llm_predictor import get_llm_predictor
-from app.config import settings
+from app.core.fanout import map_bounded
+from app.config import settings, parse_key_value_list
 from app.utils.logger import setup_logger
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import asyncio
 import random
 import json
+import time
 
 logger = setup_logger(__name__)
 
 
+# Buckets en secondes: du premier token (~100 ms) à une génération complète (~60 s)
+STREAM_BUCKETS_S = (0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+
+llm_ttft_histogram = runtime_metrics.histogram(
+    "llm_time_to_first_token_seconds",
+    "Délai avant le premier fragment de texte d'une génération en streaming",
+    buckets=STREAM_BUCKETS_S
+)
+llm_stream_duration_histogram = runtime_metrics.histogram(
+    "llm_stream_duration_seconds",
+    "Durée totale d'une génération en streaming",
+    buckets=STREAM_BUCKETS_S
+)
+
+
 class YansnetContentGeneratorModel(BaseMLModel):
     """
     Générateur de posts et commentaires pour peupler l'interface YANSNET.
@@ -108,27 +128,8 @@ class YansnetContentGeneratorModel(BaseMLModel):
         if not self._initialized:
             raise RuntimeError(f"{self.model_name} n'est pas initialisé")
         
-        # Sélection aléatoire si non spécifié
-        post_type = post_type or random.choice(self.POST_TYPES)
-        topic = topic or random.choice(self.TOPICS)
-        
-        # Déterminer le sentiment selon le type
-        if sentiment is None:
-            sentiment = self._auto_sentiment(post_type)
-        
-        # Construire le prompt
-        system_prompt = (
-            "Tu es un assistant qui génère des publications réalistes "
-            "pour un forum d'école d'ingénieurs. Génère du contenu crédible, "
-            "naturel, sans marqueurs artificiels. Réponds UNIQUEMENT avec le texte "
-            "du post, sans préfixes ni métadonnées."
-        )
-        
-        user_prompt = (
-            f"Génère un post de type '{post_type}' sur le sujet '{topic}', "
-            f"avec un sentiment '{sentiment}'. "
-            f"Minimum 3 phrases, style étudiant naturel, crédible."
-        )
+        post_type, topic, sentiment = self._resolve_post_options(post_type, topic, sentiment)
+        system_prompt, user_prompt = self._post_prompts(post_type, topic, sentiment)
         
         try:
             # Appeler le LLM
@@ -163,49 +164,55 @@ class YansnetContentGeneratorModel(BaseMLModel):
             num_comments: Nombre de commentaires à générer
         
         Returns:
-            Liste de commentaires générés
+            Liste de commentaires générés (dans l'ordre; générés en parallèle,
+            CONTENT_GENERATION_CONCURRENCY appels simultanés max)
         """
         if not self._initialized:
             raise RuntimeError(f"{self.model_name} n'est pas initialisé")
         
-        comments = []
+        # Sentiments tirés avant le fan-out (ordre reproductible)
+        sentiments = [sentiment or random.choice(self.SENTIMENTS) for _ in range(num_comments)]
         
-        for i in range(num_comments):
-            # Sentiment aléatoire si non spécifié
-            comment_sentiment = sentiment or random.choice(self.SENTIMENTS)
-            
-            system_prompt = (
-                "Tu es un assistant qui génère des commentaires réalistes "
-                "sur un forum étudiant. Génère des réponses naturelles, crédibles, "
-                "sans marqueurs artificiels. Réponds UNIQUEMENT avec le texte "
-                "du commentaire, sans préfixes."
-            )
-            
-            user_prompt = (
-                f"Post original: \"{post_content}\"\n\n"
-                f"Génère un commentaire avec sentiment '{comment_sentiment}', "
-                f"au moins 2 phrases, naturel et pertinent au post."
-            )
-            
-            try:
-                content = self._call_llm(system_prompt, user_prompt)
-                
-                comments.append({
-                    "content": content,
-                    "sentiment": comment_sentiment,
-                    "comment_number": i + 1
-                })
-                
-            except Exception as e:
-                logger.error(f"Erreur génération commentaire {i+1}: {e}")
-                # Continuer avec les autres commentaires
-                comments.append({
-                    "content": f"[Erreur de génération: {str(e)}]",
-                    "sentiment": "neutre",
-                    "comment_number": i + 1
-                })
-        
-        return comments
+        return map_bounded(
+            lambda i: self._generate_one_comment(post_content, sentiments[i], i + 1),
+            list(range(num_comments)),
+            on_error=lambda i, e: self._comment_error(i + 1, e),
+            max_concurrency=self._generation_concurrency(),
+            deadline_s=0,
+            name=f"{self.model_name}-comments"
+        )
+    
+    def _generate_one_comment(self, post_content: str, sentiment: str, number: int) -> Dict[str, Any]:
+        """Génère un commentaire; une erreur donne un commentaire d'erreur"""
+        system_prompt, user_prompt = self._comment_prompts(post_content, sentiment)
+        try:
+            content = self._call_llm(system_prompt, user_prompt)
+            return {
+                "content": content,
+                "sentiment": sentiment,
+                "comment_number": number
+            }
+        except Exception as e:
+            return self._comment_error(number, e)
+    
+    @staticmethod
+    def _comment_error(number: int, e: Exception) -> Dict[str, Any]:
+        logger.error(f"Erreur génération commentaire {number}: {e}")
+        return {
+            "content": f"[Erreur de génération: {str(e)}]",
+            "sentiment": "neutre",
+            "comment_number": number
+        }
+    
+    @staticmethod
+    def _generation_concurrency() -> int:
+        """Appels LLM simultanés pour le provider courant"""
+        provider = settings.LLM_PROVIDER.lower()
+        overrides = parse_key_value_list(settings.CONTENT_GENERATION_CONCURRENCY_OVERRIDES)
+        try:
+            return max(1, int(overrides.get(provider, settings.CONTENT_GENERATION_CONCURRENCY)))
+        except ValueError:
+            return max(1, settings.CONTENT_GENERATION_CONCURRENCY)
     
     def generate_post_with_comments(
         self,
@@ -243,6 +250,342 @@ class YansnetContentGeneratorModel(BaseMLModel):
             "total_comments": len(comments)
         }
     
+    # ------------------------------------------------------------------
+    # Prompts
+    # ------------------------------------------------------------------
+    
+    def _resolve_post_options(self, post_type: str, topic: str, sentiment: str):
+        """Complète type, sujet et sentiment (aléatoires si non spécifiés)"""
+        post_type = post_type or random.choice(self.POST_TYPES)
+        topic = topic or random.choice(self.TOPICS)
+        
+        # Déterminer le sentiment selon le type
+        if sentiment is None:
+            sentiment = self._auto_sentiment(post_type)
+        return post_type, topic, sentiment
+    
+    @staticmethod
+    def _post_prompts(post_type: str, topic: str, sentiment: str):
+        """Prompts (système, utilisateur) de génération d'un post"""
+        system_prompt = (
+            "Tu es un assistant qui génère des publications réalistes "
+            "pour un forum d'école d'ingénieurs. Génère du contenu crédible, "
+            "naturel, sans marqueurs artificiels. Réponds UNIQUEMENT avec le texte "
+            "du post, sans préfixes ni métadonnées."
+        )
+        
+        user_prompt = (
+            f"Génère un post de type '{post_type}' sur le sujet '{topic}', "
+            f"avec un sentiment '{sentiment}'. "
+            f"Minimum 3 phrases, style étudiant naturel, crédible."
+        )
+        return system_prompt, user_prompt
+    
+    @staticmethod
+    def _comment_prompts(post_content: str, sentiment: str):
+        """Prompts (système, utilisateur) de génération d'un commentaire"""
+        system_prompt = (
+            "Tu es un assistant qui génère des commentaires réalistes "
+            "sur un forum étudiant. Génère des réponses naturelles, crédibles, "
+            "sans marqueurs artificiels. Réponds UNIQUEMENT avec le texte "
+            "du commentaire, sans préfixes."
+        )
+        
+        user_prompt = (
+            f"Post original: \"{post_content}\"\n\n"
+            f"Génère un commentaire avec sentiment '{sentiment}', "
+            f"au moins 2 phrases, naturel et pertinent au post."
+        )
+        return system_prompt, user_prompt
+    
+    # ------------------------------------------------------------------
+    # Streaming
+    # ------------------------------------------------------------------
+    
+    async def stream_post(
+        self,
+        post_type: str = None,
+        topic: str = None,
+        sentiment: str = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Génère un post en streaming.
+        
+        Événements produits (dict {"event", "data"}):
+        - post_start: type, sujet et sentiment retenus
+        - token: fragment de texte du post
+        - post: post complet (mêmes champs que generate_post)
+        """
+        if not self._initialized:
+            raise RuntimeError(f"{self.model_name} n'est pas initialisé")
+        
+        post_type, topic, sentiment = self._resolve_post_options(post_type, topic, sentiment)
+        system_prompt, user_prompt = self._post_prompts(post_type, topic, sentiment)
+        yield {"event": "post_start", "data": {"post_type": post_type, "topic": topic, "sentiment": sentiment}}
+        
+        parts = []
+        async for token in self._stream_llm(system_prompt, user_prompt, kind="post"):
+            parts.append(token)
+            yield {"event": "token", "data": {"target": "post", "text": token}}
+        
+        yield {"event": "post", "data": {
+            "content": "".join(parts).strip(),
+            "post_type": post_type,
+            "topic": topic,
+            "sentiment": sentiment
+        }}
+    
+    async def stream_comments(
+        self,
+        post_content: str,
+        sentiment: str = None,
+        num_comments: int = 1
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Génère des commentaires en streaming.
+        
+        Les commentaires sont générés en parallèle (même limite que
+        generate_comment: CONTENT_GENERATION_CONCURRENCY appels simultanés);
+        les fragments de plusieurs commentaires peuvent donc s'entremêler,
+        chacun portant son comment_number.
+        
+        Événements produits:
+        - token: fragment de texte (avec comment_number)
+        - comment: commentaire complet, dès qu'il est terminé
+        """
+        if not self._initialized:
+            raise RuntimeError(f"{self.model_name} n'est pas initialisé")
+        
+        # Sentiments tirés avant le fan-out (ordre reproductible)
+        sentiments = [sentiment or random.choice(self.SENTIMENTS) for _ in range(num_comments)]
+        semaphore = asyncio.Semaphore(self._generation_concurrency())
+        events: asyncio.Queue = asyncio.Queue()
+        
+        async def stream_one(number: int, comment_sentiment: str) -> None:
+            async with semaphore:
+                system_prompt, user_prompt = self._comment_prompts(post_content, comment_sentiment)
+                parts = []
+                try:
+                    async for token in self._stream_llm(system_prompt, user_prompt, kind="comment"):
+                        parts.append(token)
+                        await events.put({"event": "token", "data": {
+                            "target": "comment", "comment_number": number, "text": token
+                        }})
+                    comment = {
+                        "content": "".join(parts).strip(),
+                        "sentiment": comment_sentiment,
+                        "comment_number": number
+                    }
+                except Exception as e:
+                    # Continuer avec les autres commentaires
+                    comment = self._comment_error(number, e)
+                await events.put({"event": "comment", "data": comment})
+        
+        tasks = [
+            asyncio.ensure_future(stream_one(i + 1, comment_sentiment))
+            for i, comment_sentiment in enumerate(sentiments)
+        ]
+        try:
+            remaining = num_comments
+            while remaining:
+                event = await events.get()
+                if event["event"] == "comment":
+                    remaining -= 1
+                yield event
+        finally:
+            # Client déconnecté: les générations en cours sont abandonnées
+            for task in tasks:
+                task.cancel()
+    
+    async def stream_post_with_comments(
+        self,
+        post_type: str = None,
+        topic: str = None,
+        num_comments: int = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Post puis commentaires en streaming (événements de stream_post et stream_comments)"""
+        post = None
+        async for event in self.stream_post(post_type=post_type, topic=topic):
+            if event["event"] == "post":
+                post = event["data"]
+            yield event
+        
+        if num_comments is None:
+            num_comments = random.randint(8, 12)
+        
+        async for event in self.stream_comments(post_content=post["content"], num_comments=num_comments):
+            yield event
+    
+    async def _stream_llm(self, system_prompt: str, user_prompt: str, kind: str) -> AsyncIterator[str]:
+        """
+        Fragments de texte du LLM au fil de leur génération.
+        
+        Le temps jusqu'au premier fragment (TTFT) et la durée totale sont
+        enregistrés dans les métriques runtime.
+        """
+        provider = settings.LLM_PROVIDER.lower()
+        if provider == "gpt":
+            stream = self._stream_gpt(system_prompt, user_prompt)
+        elif provider == "claude":
+            stream = self._stream_claude(system_prompt, user_prompt)
+        elif provider == "local":
+            stream = self._stream_local(system_prompt, user_prompt)
+        elif provider == "mock":
+            stream = self._stream_mock(system_prompt, user_prompt)
+        else:
+            raise ValueError(f"Provider non supporté: {provider}")
+        
+        start = time.perf_counter()
+        first = True
+        async for token in stream:
+            if not token:
+                continue
+            if first:
+                first = False
+                llm_ttft_histogram.observe(time.perf_counter() - start, provider=provider, kind=kind)
+            yield token
+        llm_stream_duration_histogram.observe(time.perf_counter() - start, provider=provider, kind=kind)
+    
+    async def _stream_gpt(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Streaming GPT (mêmes paramètres que _call_gpt)"""
+        from app.core.llm_clients import llm_clients
+        
+        client = llm_clients.get_async("gpt")
+        stream = await client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.9,
+            max_tokens=500,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    async def _stream_claude(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Streaming Claude (mêmes paramètres que _call_claude)"""
+        from app.core.llm_clients import llm_clients
+        
+        client = llm_clients.get_async("claude")
+        async with client.messages.stream(
+            model=settings.ANTHROPIC_MODEL,
+            max_tokens=1024,
+            system=system_prompt,
+            messages=[
+                {"role": "user", "content": user_prompt}
+            ]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+    
+    async def _stream_local(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Streaming Ollama (mêmes paramètres que _call_local)"""
+        from app.core.ollama_client import get_ollama_client
+        
+        async for chunk in get_ollama_client().astream_chat(
+            settings.OLLAMA_MODEL,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            options={
+                "temperature": 0.9,
+                "num_predict": 500
+            }
+        ):
+            yield chunk.get("message", {}).get("content", "")
+    
+    async def _stream_mock(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        """Streaming du LLM simulé"""
+        from app.core.llm_clients import llm_clients
+        
+        async for token in llm_clients.get("mock").astream(system_prompt, user_prompt):
+            yield token
+    
+    def generate_dataset(
+        self,
+        num_posts: int,
+        num_comments: int = None,
+        post_type: str = None,
+        topic: str = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Génère un jeu de démo: num_posts posts, chacun avec ses commentaires.
+        
+        Posts et commentaires partagent un même pool borné (limite du
+        provider). Au plus `concurrency` posts sont en cours à la fois: quand
+        un post est généré, le post suivant est soumis avec les commentaires
+        du post terminé, qui s'exécutent donc pendant que les posts suivants
+        sont encore en cours (au lieu d'attendre derrière tous les posts).
+        
+        Args:
+            num_posts: Nombre de posts
+            num_comments: Commentaires par post (8-12 aléatoire si None)
+            post_type: Type de post (aléatoire par post si None)
+            topic: Sujet (aléatoire par post si None)
+        
+        Returns:
+            Liste dans l'ordre des posts de {"post", "comments", "total_comments"},
+            ou {"error"} pour un post dont la génération a échoué
+        """
+        if not self._initialized:
+            raise RuntimeError(f"{self.model_name} n'est pas initialisé")
+        
+        concurrency = self._generation_concurrency()
+        logger.info(f"Génération d'un jeu de {num_posts} posts (concurrence: {concurrency})")
+        
+        # Nombre de commentaires par post, tiré à l'avance
+        counts = [num_comments if num_comments is not None else random.randint(8, 12) for _ in range(num_posts)]
+        
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"{self.model_name}-dataset") as pool:
+            posts: List[Any] = [None] * num_posts
+            comment_futures: List[List[Any]] = [[] for _ in range(num_posts)]
+            post_futures: Dict[Any, int] = {}
+            next_post = 0
+            
+            def submit_next_post() -> None:
+                nonlocal next_post
+                if next_post < num_posts:
+                    future = pool.submit(self.generate_post, post_type=post_type, topic=topic)
+                    post_futures[future] = next_post
+                    next_post += 1
+            
+            for _ in range(min(concurrency, num_posts)):
+                submit_next_post()
+            
+            while post_futures:
+                done, _ = wait(post_futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = post_futures.pop(future)
+                    submit_next_post()
+                    try:
+                        post = future.result()
+                    except Exception as e:
+                        logger.error(f"Erreur génération post {index + 1}: {e}")
+                        posts[index] = e
+                        continue
+                    posts[index] = post
+                    comment_futures[index] = [
+                        pool.submit(
+                            self._generate_one_comment, post["content"],
+                            random.choice(self.SENTIMENTS), number
+                        )
+                        for number in range(1, counts[index] + 1)
+                    ]
+            
+            dataset = []
+            for post, futures in zip(posts, comment_futures):
+                if isinstance(post, Exception):
+                    dataset.append({"error": str(post)})
+                    continue
+                comments = [f.result() for f in futures]
+                dataset.append({"post": post, "comments": comments, "total_comments": len(comments)})
+        
+        return dataset
+    
     def _auto_sentiment(self, post_type: str) -> str:
         """Détermine automatiquement le sentiment selon le type de post"""
         sentiment_map = {
@@ -270,16 +613,16 @@ class YansnetContentGeneratorModel(BaseMLModel):
             return self._call_claude(system_prompt, user_prompt)
         elif provider == "local":
             return self._call_local(system_prompt, user_prompt)
+        elif provider == "mock":
+            return self._call_mock(system_prompt, user_prompt)
         else:
             raise ValueError(f"Provider non supporté: {provider}")
     
     def _call_gpt(self, system_prompt: str, user_prompt: str) -> str:
         """Appel GPT pour génération de texte"""
-        from openai import OpenAI
-        
-        client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        from app.core.llm_clients import llm_clients
         
-        response = client.chat.completions.create(
+        response = llm_clients.get("gpt").chat.completions.create(
             model=settings.OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -293,11 +636,9 @@ class YansnetContentGeneratorModel(BaseMLModel):
     
     def _call_claude(self, system_prompt: str, user_prompt: str) -> str:
         """Appel Claude pour génération de texte"""
-        import anthropic
-        
-        client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        from app.core.llm_clients import llm_clients
         
-        message = client.messages.create(
+        message = llm_clients.get("claude").messages.create(
             model=settings.ANTHROPIC_MODEL,
             max_tokens=1024,
             system=system_prompt,
@@ -309,28 +650,29 @@ class YansnetContentGeneratorModel(BaseMLModel):
         return message.content[0].text.strip()
     
     def _call_local(self, system_prompt: str, user_prompt: str) -> str:
-        """Appel LLM local pour génération de texte"""
-        import requests
-        
-        response = requests.post(
-            f"{settings.OLLAMA_BASE_URL}/api/chat",
-            json={
-                "model": settings.OLLAMA_MODEL,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                "stream": False,
-                "options": {
-                    "temperature": 0.9,
-                    "num_predict": 500
-                }
-            },
-            timeout=120
+        """Appel LLM local pour génération de texte (client Ollama partagé)"""
+        from app.core.ollama_client import get_ollama_client
+        
+        data = get_ollama_client().chat(
+            settings.OLLAMA_MODEL,
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            options={
+                "temperature": 0.9,
+                "num_predict": 500
+            }
         )
-        response.raise_for_status()
         
-        return response.json()['message']['content'].strip()
+        return data['message']['content'].strip()
+    
+    def _call_mock(self, system_prompt: str, user_prompt: str) -> str:
+        """Appel du LLM simulé (tests de charge hors ligne)"""
+        from app.core.llm_clients import llm_clients
+        
+        content, _ = llm_clients.get("mock").complete(system_prompt, user_prompt)
+        return content
     
     def health_check(self) -> Dict[str, Any]:
         """Vérifie que le générateur est opérationnel"""
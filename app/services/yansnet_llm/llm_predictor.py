@@ -1,9 +1,11 @@
 """
 Prédicteurs LLM (code déplacé depuis llm_service.py)
 """
-import json
-from typing import Dict, Any
+import asyncio
+from typing import Dict, Any, List, Optional, Tuple
 from app.config import settings
+from app.core.packing import format_numbered_texts, record_usage
+from app.core.structured_output import JsonObjectScanner, detection_schema, packed_schema, parse_json_object
 from app.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -34,150 +36,319 @@ USER_PROMPT_TEMPLATE = """Analyse ce texte:
 Réponds en JSON uniquement."""
 
 
+# Mode packé: plusieurs textes numérotés dans un seul prompt
+PACKED_SYSTEM_PROMPT = """Analyse chaque texte numéroté et détecte les signes de dépression.
+
+DÉPRESSION: désespoir, pensées suicidaires, vide, inutilité, isolement
+NORMAL: émotions passagères, fatigue physique, stress temporaire, positivité
+
+Réponds en JSON avec un résultat par texte, dans l'ordre, en reprenant son numéro:
+{
+    "results": [
+        {
+            "id": 1,
+            "prediction": "DÉPRESSION" ou "NORMAL",
+            "confidence": 0.0 à 1.0,
+            "reasoning": "Explication courte (max 20 mots)",
+            "severity": "Aucune", "Faible", "Moyenne", "Élevée", "Critique"
+        }
+    ]
+}"""
+
+
+PACKED_USER_PROMPT_TEMPLATE = """Analyse ces {count} textes:
+
+{items}
+
+Réponds en JSON uniquement, avec exactement {count} résultats."""
+
+
+# Budget de tokens de réponse par texte d'un prompt packé
+PACKED_TOKENS_PER_TEXT = 80
+
+SEVERITIES = ["Aucune", "Faible", "Moyenne", "Élevée", "Critique"]
+
+# Schéma JSON attendu pour chaque prompt système (décodage contraint quand
+# le provider le permet): prompt -> (nom, schéma)
+DETECTION_SCHEMA = detection_schema(["DÉPRESSION", "NORMAL"], SEVERITIES)
+RESPONSE_SCHEMAS = {
+    SYSTEM_PROMPT: ("depression_detection", DETECTION_SCHEMA),
+    PACKED_SYSTEM_PROMPT: ("depression_detection_batch", packed_schema(DETECTION_SCHEMA)),
+}
+
+# Budget de tokens d'une réponse unitaire (JSON + raisonnement de 50 mots max)
+DETECTION_MAX_TOKENS = 160
+
+
+def normalize_prediction(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Valide et normalise un résultat de prédiction renvoyé par le LLM.
+
+    Raises:
+        ValueError: Si la prédiction ou la confiance est absente ou invalide
+    """
+    label = str(item["prediction"]).upper()
+    if "DÉPR" in label or "DEPR" in label:
+        prediction = "DÉPRESSION"
+    elif "NORMAL" in label:
+        prediction = "NORMAL"
+    else:
+        raise ValueError(f"prédiction invalide: {item['prediction']}")
+
+    confidence = max(0.0, min(1.0, float(item["confidence"])))
+    severity = item.get("severity")
+    if severity not in SEVERITIES:
+        severity = "Aucune" if prediction == "NORMAL" else "Moyenne"
+
+    return {
+        "prediction": prediction,
+        "confidence": confidence,
+        "reasoning": str(item.get("reasoning", "")),
+        "severity": severity
+    }
+
+
 # ============================================================================
 # PRÉDICTEURS LLM
 # ============================================================================
 
 class BaseLLMPredictor:
-    """Classe de base pour les prédicteurs LLM"""
+    """
+    Classe de base pour les prédicteurs LLM.
+
+    Les sous-classes implémentent `_complete` (un appel au provider); la
+    prédiction unitaire et le mode packé sont construits dessus.
+    """
+    
+    provider = "llm"
+    model = ""
+    max_tokens: Optional[int] = DETECTION_MAX_TOKENS  # Longueur max de la réponse unitaire
+    
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int]) -> Tuple[str, Dict[str, int]]:
+        """Appel au provider: retourne (contenu, {prompt_tokens, completion_tokens})"""
+        raise NotImplementedError
+    
+    def complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int] = None) -> str:
+        """Appel au provider avec comptabilisation des tokens"""
+        content, usage = self._complete(system_prompt, user_prompt, max_tokens)
+        record_usage(self.model, usage.get("prompt_tokens"), usage.get("completion_tokens"))
+        return content
+    
+    def _error_result(self, e: Exception) -> Dict[str, Any]:
+        logger.error(f"Erreur {self.provider}: {e}")
+        return {
+            "prediction": "ERREUR",
+            "confidence": 0.0,
+            "reasoning": f"Erreur: {str(e)}",
+            "severity": "Aucune"
+        }
+    
+    def _parse(self, content: str) -> Dict[str, Any]:
+        result = parse_json_object(content, self.provider, validate=normalize_prediction)
+        logger.debug(f"Prédiction {self.provider}: {result['prediction']} (confiance: {result['confidence']})")
+        return result
     
     def predict(self, text: str) -> Dict[str, Any]:
         """Prédit si le texte indique de la dépression"""
-        raise NotImplementedError
+        try:
+            content = self.complete(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE.format(text=text), self.max_tokens)
+            return self._parse(content)
+        except Exception as e:
+            return self._error_result(e)
+
+    async def apredict(self, text: str) -> Dict[str, Any]:
+        """Variante async (par défaut: `predict` dans un thread)"""
+        return await asyncio.to_thread(self.predict, text)
+    
+    def predict_packed(self, texts: List[str]) -> str:
+        """
+        Analyse plusieurs textes en un seul appel.
+
+        Returns:
+            Réponse brute (à parser avec `parse_packed_response`)
+        """
+        user_prompt = PACKED_USER_PROMPT_TEMPLATE.format(
+            count=len(texts),
+            items=format_numbered_texts(texts)
+        )
+        return self.complete(PACKED_SYSTEM_PROMPT, user_prompt, PACKED_TOKENS_PER_TEXT * len(texts) + 50)
 
 
 class GPTPredictor(BaseLLMPredictor):
     """Prédicteur avec GPT (OpenAI)"""
     
+    provider = "GPT"
+    
     def __init__(self):
-        from openai import OpenAI
-        
-        if not settings.OPENAI_API_KEY:
-            raise ValueError("OPENAI_API_KEY non définie dans .env")
+        from app.core.llm_clients import llm_clients
         
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = llm_clients.get("gpt")
         self.model = settings.OPENAI_MODEL
         logger.info(f"✓ GPT Predictor initialisé (modèle: {self.model})")
     
-    def predict(self, text: str) -> Dict[str, Any]:
-        """Prédit avec GPT"""
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": USER_PROMPT_TEMPLATE.format(text=text)}
-                ],
-                temperature=0.1,
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            logger.debug(f"Prédiction GPT: {result['prediction']} (confiance: {result['confidence']})")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Erreur GPT: {e}")
-            return {
-                "prediction": "ERREUR",
-                "confidence": 0.0,
-                "reasoning": f"Erreur: {str(e)}",
-                "severity": "Aucune"
-            }
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int]) -> Tuple[str, Dict[str, int]]:
+        """Appel GPT (sortie contrainte par le schéma JSON du prompt)"""
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        if system_prompt in RESPONSE_SCHEMAS:
+            name, schema = RESPONSE_SCHEMAS[system_prompt]
+            response_format = {"type": "json_schema", "json_schema": {"name": name, "schema": schema, "strict": True}}
+        else:
+            response_format = {"type": "json_object"}
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.1,
+            response_format=response_format,
+            **kwargs
+        )
+        usage = response.usage
+        return response.choices[0].message.content, {
+            "prompt_tokens": getattr(usage, "prompt_tokens", 0),
+            "completion_tokens": getattr(usage, "completion_tokens", 0)
+        }
 
 
 class ClaudePredictor(BaseLLMPredictor):
     """Prédicteur avec Claude (Anthropic)"""
     
+    provider = "Claude"
+    
     def __init__(self):
-        import anthropic
+        from app.core.llm_clients import llm_clients
         
-        if not settings.ANTHROPIC_API_KEY:
-            raise ValueError("ANTHROPIC_API_KEY non définie dans .env")
-        
-        self.client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        self.client = llm_clients.get("claude")
         self.model = settings.ANTHROPIC_MODEL
         logger.info(f"✓ Claude Predictor initialisé (modèle: {self.model})")
     
-    def predict(self, text: str) -> Dict[str, Any]:
-        """Prédit avec Claude"""
-        try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=1024,
-                system=SYSTEM_PROMPT,
-                messages=[
-                    {"role": "user", "content": USER_PROMPT_TEMPLATE.format(text=text)}
-                ]
-            )
-            
-            result = json.loads(message.content[0].text)
-            logger.debug(f"Prédiction Claude: {result['prediction']} (confiance: {result['confidence']})")
-            return result
-            
-        except Exception as e:
-            logger.error(f"Erreur Claude: {e}")
-            return {
-                "prediction": "ERREUR",
-                "confidence": 0.0,
-                "reasoning": f"Erreur: {str(e)}",
-                "severity": "Aucune"
-            }
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int]) -> Tuple[str, Dict[str, int]]:
+        """
+        Appel Claude en streaming.
+        
+        La réponse est préremplie par "{" (pas de préambule possible) et la
+        génération est interrompue dès que l'objet JSON est fermé.
+        """
+        scanner = JsonObjectScanner(prefix="{")
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens or self.max_tokens,
+            system=system_prompt,
+            messages=[
+                {"role": "user", "content": user_prompt},
+                {"role": "assistant", "content": "{"}
+            ]
+        ) as stream:
+            for text in stream.text_stream:
+                if scanner.feed(text):
+                    break
+            usage = stream.current_message_snapshot.usage
+        return scanner.text, {
+            "prompt_tokens": getattr(usage, "input_tokens", 0),
+            "completion_tokens": getattr(usage, "output_tokens", 0)
+        }
 
 
 class LocalLLMPredictor(BaseLLMPredictor):
-    """Prédicteur avec LLM local (Ollama)"""
+    """
+    Prédicteur avec LLM local (Ollama, via le client HTTP partagé).
+    
+    Le prompt système est identique d'un appel à l'autre et envoyé en tête:
+    Ollama réutilise son cache KV, seul le texte analysé est réévalué.
+    """
+    
+    provider = "Local LLM"
     
     def __init__(self):
-        import requests
+        from app.core.ollama_client import get_ollama_client
         
         self.base_url = settings.OLLAMA_BASE_URL
         self.model = settings.OLLAMA_MODEL
+        self.client = get_ollama_client(self.base_url)
         
         # Vérifier que Ollama est accessible
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            response.raise_for_status()
+            self.client.list_models(timeout=5)
             logger.info(f"✓ Local LLM Predictor initialisé (modèle: {self.model})")
         except Exception as e:
             raise ValueError(f"Ollama non accessible à {self.base_url}: {e}")
+        
+        # Charger le modèle (gardé résident via keep_alive) et mettre en cache
+        # KV le message système commun à toutes les requêtes
+        self.predict("Ceci est un test.")
     
-    def predict(self, text: str) -> Dict[str, Any]:
-        """Prédit avec LLM local"""
+    @staticmethod
+    def _messages(system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    @staticmethod
+    def _options(max_tokens: Optional[int]) -> Dict[str, Any]:
+        return {"temperature": 0.1, "num_predict": max_tokens or LocalLLMPredictor.max_tokens}
+    
+    @staticmethod
+    def _format(system_prompt: str) -> Any:
+        """Schéma JSON imposé au décodage (Ollama >= 0.5), sinon mode JSON libre"""
+        return RESPONSE_SCHEMAS[system_prompt][1] if system_prompt in RESPONSE_SCHEMAS else "json"
+    
+    @staticmethod
+    def _usage(data: Dict[str, Any]) -> Dict[str, int]:
+        return {
+            "prompt_tokens": data.get("prompt_eval_count", 0),
+            "completion_tokens": data.get("eval_count", 0)
+        }
+    
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int]) -> Tuple[str, Dict[str, int]]:
+        """Appel Ollama /api/chat (sortie contrainte par le schéma JSON)"""
+        data = self.client.chat(
+            self.model, self._messages(system_prompt, user_prompt),
+            options=self._options(max_tokens), format=self._format(system_prompt)
+        )
+        return data['message']['content'], self._usage(data)
+    
+    async def apredict(self, text: str) -> Dict[str, Any]:
+        """Prédit avec LLM local sans bloquer de thread"""
+        try:
+            data = await self.client.achat(
+                self.model, self._messages(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE.format(text=text)),
+                options=self._options(self.max_tokens), format=self._format(SYSTEM_PROMPT)
+            )
+            usage = self._usage(data)
+            record_usage(self.model, usage["prompt_tokens"], usage["completion_tokens"])
+            return self._parse(data['message']['content'])
+        except Exception as e:
+            return self._error_result(e)
+
+
+class MockPredictor(BaseLLMPredictor):
+    """Prédicteur avec le LLM simulé (tests de charge hors ligne)"""
+    
+    provider = "Mock LLM"
+    model = "mock"
+    
+    def __init__(self):
+        from app.core.llm_clients import llm_clients
+        
+        self.client = llm_clients.get("mock")
+        logger.info(f"✓ Mock Predictor initialisé (latence: {settings.MOCK_LLM_LATENCY_MS:.0f} ms)")
+    
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: Optional[int]) -> Tuple[str, Dict[str, int]]:
+        """Appel simulé (mode JSON)"""
+        return self.client.complete(system_prompt, user_prompt, json_mode=True)
+    
+    async def apredict(self, text: str) -> Dict[str, Any]:
+        """Prédit sans bloquer de thread"""
         try:
-            import requests
-            
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": USER_PROMPT_TEMPLATE.format(text=text)}
-                    ],
-                    "stream": False,
-                    "format": "json",
-                    "options": {
-                        "temperature": 0.1,
-                        "num_predict": 200  # Limiter la longueur de réponse
-                    }
-                },
-                timeout=120  # Augmenter le timeout à 2 minutes
+            content, usage = await self.client.acomplete(
+                SYSTEM_PROMPT, USER_PROMPT_TEMPLATE.format(text=text), json_mode=True
             )
-            response.raise_for_status()
-            
-            result = json.loads(response.json()['message']['content'])
-            logger.debug(f"Prédiction Local: {result['prediction']} (confiance: {result['confidence']})")
-            return result
-            
+            record_usage(self.model, usage["prompt_tokens"], usage["completion_tokens"])
+            return self._parse(content)
         except Exception as e:
-            logger.error(f"Erreur Local LLM: {e}")
-            return {
-                "prediction": "ERREUR",
-                "confidence": 0.0,
-                "reasoning": f"Erreur: {str(e)}",
-                "severity": "Aucune"
-            }
+            return self._error_result(e)
 
 
 # ============================================================================
@@ -202,5 +373,7 @@ def get_llm_predictor() -> BaseLLMPredictor:
         return ClaudePredictor()
     elif provider == "local":
         return LocalLLMPredictor()
+    elif provider == "mock":
+        return MockPredictor()
     else:
         raise ValueError(f"Provider LLM non supporté: {provider}")
@@ -3,7 +3,10 @@ Modèle YANSNET - Détection de dépression avec LLM
 """
 from typing import Dict, Any, List
 from app.core.base_model import BaseMLModel
-from app.services.yansnet_llm.llm_predictor import get_llm_predictor
+from app.core.fanout import map_bounded
+from app.core.packing import run_packed
+from app.core.prediction_cache import cached_predict, cached_apredict, cached_batch_predict, bypass_cache
+from app.services.yansnet_llm.llm_predictor import get_llm_predictor, normalize_prediction
 from app.config import settings
 from app.utils.logger import setup_logger
 
@@ -26,7 +29,8 @@ class YansnetLLMModel(BaseMLModel):
     
     @property
     def model_version(self) -> str:
-        return "1.0.0"
+        # Provider et modèle inclus: en changer invalide le cache de prédictions
+        return f"1.0.0+{self._backend()}"
     
     @property
     def author(self) -> str:
@@ -34,6 +38,11 @@ class YansnetLLMModel(BaseMLModel):
     
     @property
     def description(self) -> str:
+        return f"Détection de dépression avec LLM ({self._backend().replace(':', ': ', 1)})"
+    
+    @staticmethod
+    def _backend() -> str:
+        """Provider et modèle LLM configurés (ex: 'gpt:gpt-4o-mini')"""
         provider = settings.LLM_PROVIDER
         if provider == "gpt":
             model = settings.OPENAI_MODEL
@@ -41,8 +50,7 @@ class YansnetLLMModel(BaseMLModel):
             model = settings.ANTHROPIC_MODEL
         else:
             model = settings.OLLAMA_MODEL
-        
-        return f"Détection de dépression avec LLM ({provider}: {model})"
+        return f"{provider}:{model}"
     
     @property
     def tags(self) -> List[str]:
@@ -59,6 +67,23 @@ class YansnetLLMModel(BaseMLModel):
             self._initialized = False
             raise
     
+    def _infer(self, text: str, include_reasoning: bool) -> Dict[str, Any]:
+        """Appel LLM pour un texte (sans passer par le cache)"""
+        try:
+            # Appeler le LLM
+            result = self.predictor.predict(text)
+            
+            # Retirer le reasoning si non demandé
+            if not include_reasoning:
+                result.pop('reasoning', None)
+            
+            return result
+            
+        except Exception as e:
+            logger.error(f"Erreur de prédiction {self.model_name}: {e}")
+            raise
+    
+    @cached_predict
     def predict(self, text: str, include_reasoning: bool = True, **kwargs) -> Dict[str, Any]:
         """
         Prédit si le texte indique de la dépression.
@@ -77,11 +102,27 @@ class YansnetLLMModel(BaseMLModel):
         if not self._initialized:
             raise RuntimeError(f"{self.model_name} n'est pas initialisé correctement")
         
+        return self._infer(text, include_reasoning)
+    
+    @cached_apredict
+    async def apredict(self, text: str, include_reasoning: bool = True, **kwargs) -> Dict[str, Any]:
+        """
+        Variante async de `predict` (Ollama: appel non bloquant via le client partagé).
+        
+        Args:
+            text: Texte à analyser
+            include_reasoning: Inclure l'explication (défaut: True)
+            **kwargs: Paramètres additionnels (ignorés)
+        
+        Returns:
+            Dict avec prediction, confidence, severity, reasoning
+        """
+        if not self._initialized:
+            raise RuntimeError(f"{self.model_name} n'est pas initialisé correctement")
+        
         try:
-            # Appeler le LLM
-            result = self.predictor.predict(text)
+            result = await self.predictor.apredict(text)
             
-            # Retirer le reasoning si non demandé
             if not include_reasoning:
                 result.pop('reasoning', None)
             
@@ -91,9 +132,13 @@ class YansnetLLMModel(BaseMLModel):
             logger.error(f"Erreur de prédiction {self.model_name}: {e}")
             raise
     
+    @cached_batch_predict
     def batch_predict(self, texts: List[str], include_reasoning: bool = False, **kwargs) -> List[Dict[str, Any]]:
         """
-        Prédiction batch optimisée.
+        Prédiction batch: appels LLM concurrents (bornés), résultats dans l'ordre.
+        
+        Avec LLM_PACK_SIZE > 1, les textes sont regroupés par N dans un même
+        prompt; les éléments absents de la réponse sont retentés un par un.
         
         Args:
             texts: Liste de textes
@@ -101,30 +146,45 @@ class YansnetLLMModel(BaseMLModel):
             **kwargs: Paramètres additionnels
         
         Returns:
-            Liste de résultats
+            Liste de résultats (textes en échec ou hors délai: prediction ERREUR)
         """
+        if not self._initialized:
+            raise RuntimeError(f"{self.model_name} n'est pas initialisé correctement")
+        
         logger.info(f"Prédiction batch de {len(texts)} textes avec {self.model_name}")
         
-        results = []
-        for i, text in enumerate(texts, 1):
-            try:
-                result = self.predict(text, include_reasoning=include_reasoning, **kwargs)
-                results.append(result)
-                
-                if i % 10 == 0:
-                    logger.debug(f"  Traité {i}/{len(texts)} textes")
-                    
-            except Exception as e:
-                logger.error(f"Erreur sur texte {i}: {e}")
-                # Ajouter un résultat d'erreur
-                results.append({
-                    "prediction": "ERREUR",
-                    "confidence": 0.0,
-                    "severity": "Aucune",
-                    "reasoning": f"Erreur: {str(e)}"
-                })
+        def on_error(text: str, e: Exception) -> Dict[str, Any]:
+            return {
+                "prediction": "ERREUR",
+                "confidence": 0.0,
+                "severity": "Aucune",
+                "reasoning": f"Erreur: {str(e)}",
+                "error": str(e)
+            }
+        
+        if settings.LLM_PACK_SIZE > 1:
+            def normalize(item: Dict[str, Any]) -> Dict[str, Any]:
+                result = normalize_prediction(item)
+                if not include_reasoning:
+                    result.pop('reasoning', None)
+                return result
+            
+            return run_packed(
+                texts,
+                settings.LLM_PACK_SIZE,
+                call_pack=self.predictor.predict_packed,
+                call_single=lambda text: self._infer(text, include_reasoning),
+                normalize=normalize,
+                on_error=on_error,
+                name=self.model_name
+            )
         
-        return results
+        return map_bounded(
+            lambda text: self._infer(text, include_reasoning),
+            texts,
+            on_error=on_error,
+            name=self.model_name
+        )
     
     def health_check(self) -> Dict[str, Any]:
         """
@@ -135,7 +195,8 @@ class YansnetLLMModel(BaseMLModel):
         """
         try:
             # Test avec un texte simple
-            result = self.predict("test", include_reasoning=False)
+            with bypass_cache():  # Le provider doit réellement être appelé
+                result = self.predict("test", include_reasoning=False)
             
             return {
                 "status": "healthy",
@@ -0,0 +1,77 @@
+"""
+Mesure de la mémoire résidente (RSS) du process
+"""
+import os
+import sys
+from typing import Optional
+
+
+def get_rss_mb() -> float:
+    """
+    Retourne la mémoire résidente actuelle du process en Mo.
+
+    Lit /proc/self/statm sous Linux, sinon psutil s'il est installé,
+    sinon le pic de RSS (resource) en dernier recours.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en Ko sous Linux
+    return max_rss / (1024 * 1024) if sys.platform == "darwin" else max_rss / 1024
+
+
+def _tensor_bytes(value, seen: set) -> int:
+    """Octets des tenseurs d'une valeur de state_dict (tenseurs partagés comptés une fois)"""
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item, seen) for item in value)
+    numel = getattr(value, "numel", None)
+    element_size = getattr(value, "element_size", None)
+    if numel is None or element_size is None:
+        return 0
+    try:
+        key = (value.device.type, value.data_ptr())
+    except Exception:
+        key = id(value)
+    if key in seen:
+        return 0
+    seen.add(key)
+    return numel() * element_size()
+
+
+def get_model_memory_mb(instance) -> Optional[float]:
+    """
+    Taille des poids d'un modèle en Mo (paramètres et buffers des
+    torch.nn.Module portés par ses attributs, CPU ou CUDA).
+
+    Contrairement au delta de RSS, la valeur ne dépend pas des chargements
+    simultanés. Retourne None si aucun module PyTorch n'est trouvé (modèle
+    distant via API, session ONNX...).
+    """
+    try:
+        from torch import nn
+    except ImportError:
+        return None
+
+    modules = [value for value in vars(instance).values() if isinstance(value, nn.Module)]
+    if not modules:
+        return None
+
+    seen: set = set()
+    total = 0
+    for module in modules:
+        # state_dict inclut les poids packés des modules quantifiés
+        for value in module.state_dict(keep_vars=True).values():
+            total += _tensor_bytes(value, seen)
+    return total / (1024 * 1024)
@@ -0,0 +1,110 @@
+"""
+Comparaison batch packé vs un appel par texte (Qwen, yansnet-llm)
+
+Passe le même jeu de textes par `batch_predict` en mode unitaire
+(LLM_PACK_SIZE=0) puis en mode packé, et affiche: textes/seconde, appels LLM,
+tokens de prompt et de réponse par texte, éléments retentés et accord des
+prédictions entre les deux modes.
+
+Usage:
+    python scripts/benchmark_packing.py
+    python scripts/benchmark_packing.py --model yansnet --pack-size 16 --samples samples.txt --concurrency 1
+
+Format de --samples: un texte par ligne (.txt) ou du JSONL {"text": "..."}.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.core.metrics.runtime_metrics import runtime_metrics
+from scripts.benchmark_quantization import load_samples
+
+
+def build_model(name: str):
+    if name == "qwen":
+        from app.services.qwen_depression import QwenDepressionModel
+        return QwenDepressionModel()
+    from app.services.yansnet_llm import YansnetLLMModel
+    return YansnetLLMModel()
+
+
+def _counter_total(name: str, **labels) -> float:
+    """Somme d'un compteur runtime sur les valeurs qui ont ces labels"""
+    snapshot = runtime_metrics.snapshot().get(name, {"values": []})
+    return sum(
+        entry["value"] for entry in snapshot["values"]
+        if all(entry["labels"].get(k) == v for k, v in labels.items())
+    )
+
+
+def run_mode(model, texts: List[str], pack_size: int, runs: int) -> Dict:
+    settings.LLM_PACK_SIZE = pack_size
+    before = {
+        "calls": _counter_total("llm_calls"),
+        "prompt": _counter_total("llm_tokens", kind="prompt"),
+        "completion": _counter_total("llm_tokens", kind="completion"),
+        "retries": _counter_total("llm_packed_retries"),
+    }
+
+    durations = []
+    predictions = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        predictions = model.batch_predict(texts)
+        durations.append(time.perf_counter() - start)
+
+    processed = len(texts) * runs
+    return {
+        "predictions": predictions,
+        "texts_per_s": processed / sum(durations),
+        "calls": (_counter_total("llm_calls") - before["calls"]) / processed,
+        "prompt_tokens": (_counter_total("llm_tokens", kind="prompt") - before["prompt"]) / processed,
+        "completion_tokens": (_counter_total("llm_tokens", kind="completion") - before["completion"]) / processed,
+        "retries": (_counter_total("llm_packed_retries") - before["retries"]) / processed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=["qwen", "yansnet"], default="qwen")
+    parser.add_argument("--samples", help="Fichier d'exemples (.txt ou .jsonl)")
+    parser.add_argument("--pack-size", type=int, default=8, help="Textes par prompt en mode packé")
+    parser.add_argument("--concurrency", type=int, default=1, help="Appels LLM simultanés (BATCH_FANOUT_CONCURRENCY)")
+    parser.add_argument("--runs", type=int, default=2, help="Passes de mesure par mode")
+    args = parser.parse_args()
+
+    # Mesurer les appels LLM, pas le cache de prédictions
+    settings.ENABLE_PREDICTION_CACHE = False
+    settings.BATCH_FANOUT_CONCURRENCY = args.concurrency
+
+    texts = [text for text, _ in load_samples(args.samples)]
+    model = build_model(args.model)
+
+    single = run_mode(model, texts, 0, args.runs)
+    packed = run_mode(model, texts, args.pack_size, args.runs)
+
+    agreement = sum(
+        a["prediction"] == b["prediction"]
+        for a, b in zip(single["predictions"], packed["predictions"])
+    ) / len(texts)
+
+    print(f"\n=== {args.model}: {len(texts)} textes, {args.runs} passes, concurrence {args.concurrency} ===")
+    print(f"{'':24}{'unitaire':>12}{f'packé x{args.pack_size}':>12}")
+    for key, label in (
+        ("texts_per_s", "textes / s"),
+        ("calls", "appels LLM / texte"),
+        ("prompt_tokens", "tokens prompt / texte"),
+        ("completion_tokens", "tokens réponse / texte"),
+        ("retries", "retentés / texte"),
+    ):
+        print(f"{label:24}{single[key]:>12.2f}{packed[key]:>12.2f}")
+    print(f"accord des prédictions: {agreement:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Réutilisation du préfixe de prompt (cache KV) pour la détection Qwen via Ollama
+
+Compare, requête par requête, le prefill (évaluation du prompt) de:
+- legacy: /api/generate, instructions et texte dans un même prompt (le texte
+  est au milieu du template, tout ce qui le suit est réévalué à chaque appel)
+- chat: /api/chat avec un message système stable (QwenDepressionModel), seul
+  le message utilisateur est réévalué
+- chat, keep_alive=0: même format, mais le modèle est déchargé après chaque
+  appel (rechargement + prefill complet)
+
+Par défaut, un substitut local d'Ollama simule le cache de préfixe par slot
+(OLLAMA_NUM_PARALLEL), le coût du prefill par token et le rechargement du
+modèle. Avec --url, les mêmes requêtes partent vers un vrai serveur Ollama
+(les durées affichées sont alors celles rapportées par le serveur).
+
+Usage:
+    python scripts/benchmark_prefix_cache.py
+    python scripts/benchmark_prefix_cache.py --samples samples.txt --prefill-ms 0.5
+    python scripts/benchmark_prefix_cache.py --url http://localhost:11434 --model qwen2.5:1.5b
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+from app.core.ollama_client import OllamaClient
+from app.services.qwen_depression.qwen_depression_model import QwenDepressionModel
+from scripts.benchmark_quantization import load_samples
+
+
+# Ancien format: un seul prompt /api/generate, texte au milieu des instructions
+LEGACY_PROMPT = """Tu es un assistant specialise dans l'analyse de texte pour detecter des signes de depression.
+
+Analyse le texte suivant et determine s'il contient des indicateurs de depression.
+
+Texte a analyser:
+"{text}"
+
+Reponds UNIQUEMENT avec un JSON valide dans ce format exact:
+{{
+    "prediction": "DEPRESSION" ou "NORMAL",
+    "confidence": un nombre entre 0.0 et 1.0,
+    "severity": "Aucune", "Faible", "Moyenne", "Elevee" ou "Critique",
+    "reasoning": "explication courte de ton analyse"
+}}
+
+JSON:"""
+
+ANSWER = '{"prediction": "NORMAL", "confidence": 0.8, "severity": "Aucune", "reasoning": "simulé"}'
+
+
+# ============================================================================
+# SUBSTITUT LOCAL D'OLLAMA
+# ============================================================================
+
+def _tokens(text: str) -> List[str]:
+    """Tokenisation approximative (mots et ponctuation)"""
+    return re.findall(r"\w+|[^\w\s]", text)
+
+
+def _keep_alive_s(value: Any) -> float:
+    """Durée keep_alive ("30m", "300s", "1h", 300, "-1") en secondes (inf si négative)"""
+    text = str(value).strip()
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)([smh]?)", text)
+    if match is None:
+        return 300.0
+    seconds = float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float("inf") if seconds < 0 else seconds
+
+
+class OllamaStandIn:
+    """
+    Serveur Ollama simulé (transport httpx).
+
+    Chaque slot garde les tokens de sa dernière requête: une nouvelle requête
+    prend le slot au plus long préfixe commun et seul le reste du prompt est
+    « évalué » (prefill_ms par token). Le modèle est déchargé (slots vidés)
+    quand keep_alive expire, et rechargé (load_ms) à l'appel suivant.
+    """
+
+    def __init__(self, num_parallel: int, prefill_ms: float, load_ms: float, time_scale: float):
+        self.slots: List[List[str]] = [[] for _ in range(num_parallel)]
+        self.busy = [False] * num_parallel
+        self.prefill_ms = prefill_ms
+        self.load_ms = load_ms
+        self.time_scale = time_scale
+        self.expires_at: Optional[float] = None
+
+    @staticmethod
+    def _render(body: Dict[str, Any]) -> str:
+        if "messages" in body:
+            # Gabarit de chat façon Qwen (ChatML)
+            return "".join(
+                f"<|im_start|>{m['role']}\n{m['content']}<|im_end|>\n" for m in body["messages"]
+            ) + "<|im_start|>assistant\n"
+        return body.get("prompt", "")
+
+    def _pick_slot(self, tokens: List[str]) -> Tuple[Optional[int], int]:
+        best, best_common = None, -1
+        for index, cached in enumerate(self.slots):
+            if self.busy[index]:
+                continue
+            common = 0
+            for a, b in zip(cached, tokens):
+                if a != b:
+                    break
+                common += 1
+            if common > best_common:
+                best, best_common = index, common
+        return best, best_common
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        now = time.monotonic()
+
+        load_ms = 0.0
+        if self.expires_at is None or now > self.expires_at:
+            load_ms = self.load_ms
+            self.slots = [[] for _ in self.slots]
+        await asyncio.sleep(load_ms / 1000 * self.time_scale)
+
+        tokens = _tokens(self._render(body))
+        while True:
+            slot, common = self._pick_slot(tokens)
+            if slot is not None:
+                break
+            await asyncio.sleep(0.001)
+        self.busy[slot] = True
+        try:
+            evaluated = max(1, len(tokens) - common)
+            prefill_ms = evaluated * self.prefill_ms
+            await asyncio.sleep(prefill_ms / 1000 * self.time_scale)
+            self.slots[slot] = tokens + _tokens(ANSWER)
+        finally:
+            self.busy[slot] = False
+
+        keep_alive = _keep_alive_s(body.get("keep_alive", "5m"))
+        self.expires_at = None if keep_alive == 0 else time.monotonic() + keep_alive
+
+        data = {
+            "model": body["model"],
+            "done": True,
+            "load_duration": int(load_ms * 1e6),
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prefill_ms * 1e6),
+            "eval_count": len(_tokens(ANSWER)),
+        }
+        if "messages" in body:
+            data["message"] = {"role": "assistant", "content": ANSWER}
+        else:
+            data["response"] = ANSWER
+        return httpx.Response(200, json=data)
+
+
+# ============================================================================
+# MESURE
+# ============================================================================
+
+def run_mode(client: OllamaClient, model: QwenDepressionModel, texts: List[str], mode: str) -> Dict[str, float]:
+    prefill, tokens, load = [], [], []
+    start = time.perf_counter()
+    for text in texts:
+        if mode == "legacy":
+            data = client.generate(
+                model.ollama_model,
+                LEGACY_PROMPT.format(text=model._preprocess_text(text)),
+                options=model.GENERATION_OPTIONS
+            )
+        else:
+            keep_alive = {"keep_alive": 0} if mode == "chat_unload" else {}
+            data = client.chat(
+                model.ollama_model,
+                model._build_messages(text),
+                options=model.GENERATION_OPTIONS,
+                **keep_alive
+            )
+        prefill.append(data.get("prompt_eval_duration", 0) / 1e6)
+        tokens.append(data.get("prompt_eval_count", 0))
+        load.append(data.get("load_duration", 0) / 1e6)
+    elapsed = time.perf_counter() - start
+
+    # La première requête remplit le cache: mesurer l'état stable
+    steady = slice(1, None) if len(texts) > 1 else slice(None)
+    return {
+        "prefill_ms": sum(prefill[steady]) / len(prefill[steady]),
+        "prompt_tokens": sum(tokens[steady]) / len(tokens[steady]),
+        "load_ms": sum(load[steady]) / len(load[steady]),
+        "requests_per_s": len(texts) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Vrai serveur Ollama (sinon substitut local)")
+    parser.add_argument("--model", default=settings.QWEN_DETECTION_MODEL)
+    parser.add_argument("--samples", help="Fichier d'exemples (.txt ou .jsonl)")
+    parser.add_argument("--prefill-ms", type=float, default=1.0, help="Substitut: coût du prefill par token (ms)")
+    parser.add_argument("--load-ms", type=float, default=1500.0, help="Substitut: chargement du modèle (ms)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Substitut: facteur appliqué aux attentes simulées (0 = instantané)")
+    args = parser.parse_args()
+
+    texts = [text for text, _ in load_samples(args.samples)]
+
+    if args.url:
+        client = OllamaClient(args.url)
+    else:
+        stand_in = OllamaStandIn(settings.OLLAMA_NUM_PARALLEL, args.prefill_ms, args.load_ms, args.time_scale)
+        client = OllamaClient("http://ollama.stand-in", transport=httpx.MockTransport(stand_in.handle))
+
+    # Modèle non connecté: seuls les prompts et options de QwenDepressionModel servent
+    model = QwenDepressionModel.__new__(QwenDepressionModel)
+    model.ollama_model = args.model
+    model.max_length = settings.QWEN_MAX_LENGTH
+
+    try:
+        results = {mode: run_mode(client, model, texts, mode) for mode in ("legacy", "chat", "chat_unload")}
+    finally:
+        client.close()
+
+    target = args.url or "substitut local"
+    print(f"\n=== {args.model} ({target}): {len(texts)} requêtes, keep_alive={settings.OLLAMA_KEEP_ALIVE} ===")
+    print(f"{'':26}{'legacy':>12}{'chat':>12}{'keep_alive=0':>14}")
+    for key, label in (
+        ("prompt_tokens", "tokens évalués / req"),
+        ("prefill_ms", "prefill ms / req"),
+        ("load_ms", "chargement ms / req"),
+        ("requests_per_s", "requêtes / s"),
+    ):
+        row = "".join(f"{results[mode][key]:>12.1f}" for mode in ("legacy", "chat"))
+        print(f"{label:26}{row}{results['chat_unload'][key]:>14.1f}")
+    saved = results["legacy"]["prefill_ms"] - results["chat"]["prefill_ms"]
+    print(f"prefill économisé par requête: {saved:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Comparaison précision / latence fp32 vs int8 (CamemBERT, HateComment BERT)
+
+Charge chaque modèle dans les deux modes d'inférence, passe le même jeu
+d'exemples et affiche: accord des prédictions, écart de confiance,
+exactitude (si les exemples sont étiquetés) et latences.
+
+Usage:
+    python scripts/benchmark_quantization.py
+    python scripts/benchmark_quantization.py --model hatecomment --samples samples.jsonl --runs 5
+
+Format de --samples: un texte par ligne (.txt) ou du JSONL
+{"text": "...", "label": "DÉPRESSION"} (label optionnel).
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings
+
+
+DEFAULT_SAMPLES = [
+    "Je me sens vide depuis des semaines, plus rien n'a de sens.",
+    "Super journée à la plage avec les amis, on remet ça demain !",
+    "Je n'arrive plus à dormir, je pense tout le temps que je suis un fardeau.",
+    "Le match d'hier soir était incroyable, quelle ambiance au stade.",
+    "Je déteste tous ces gens, ils devraient dégager de notre pays.",
+    "Merci pour votre aide, le TP est enfin terminé.",
+    "I hate all those people, they should go back where they came from.",
+    "Personne ne remarquerait si je disparaissais.",
+    "On se retrouve à la bibliothèque à 14h pour réviser ?",
+    "Sale race, vous êtes tous inférieurs.",
+]
+
+
+def load_samples(path: Optional[str]) -> List[Tuple[str, Optional[str]]]:
+    """Retourne la liste (texte, label attendu ou None)"""
+    if path is None:
+        return [(text, None) for text in DEFAULT_SAMPLES]
+
+    samples = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        if path.endswith(".jsonl"):
+            record = json.loads(line)
+            samples.append((record["text"], record.get("label")))
+        else:
+            samples.append((line.strip(), None))
+    return samples
+
+
+def build_model(name: str, mode: str):
+    """Instancie un modèle dans le mode d'inférence demandé"""
+    if name == "camembert":
+        from app.services.camembert_depression import CamemBERTDepressionModel
+        return CamemBERTDepressionModel(inference_mode=mode)
+    from app.services.hatecomment_bert import HateCommentBertModel
+    return HateCommentBertModel(inference_mode=mode)
+
+
+def run_variant(model, texts: List[str], runs: int) -> Dict:
+    """Prédictions + latences unitaires et batch d'une variante"""
+    predictions = [model.predict(text) for text in texts]  # Aussi échauffement
+
+    latencies_ms = []
+    for _ in range(runs):
+        for text in texts:
+            start = time.perf_counter()
+            model.predict(text)
+            latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    batch_ms = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.batch_predict(texts)
+        batch_ms.append((time.perf_counter() - start) * 1000)
+
+    latencies_ms.sort()
+    return {
+        "predictions": predictions,
+        "p50_ms": statistics.median(latencies_ms),
+        "p95_ms": latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))],
+        "batch_ms": statistics.median(batch_ms),
+    }
+
+
+def compare(name: str, samples: List[Tuple[str, Optional[str]]], runs: int) -> None:
+    texts = [text for text, _ in samples]
+    labels = [label for _, label in samples]
+    variants = {}
+
+    for mode in ("fp32", "int8"):
+        print(f"\n⏳ {name} [{mode}] chargement...")
+        start = time.perf_counter()
+        model = build_model(name, mode)
+        load_s = time.perf_counter() - start
+        variants[mode] = {**run_variant(model, texts, runs), "load_s": load_s}
+        del model
+
+    fp32, int8 = variants["fp32"], variants["int8"]
+    agreement = sum(
+        a["prediction"] == b["prediction"]
+        for a, b in zip(fp32["predictions"], int8["predictions"])
+    ) / len(texts)
+    confidence_delta = statistics.mean(
+        abs(float(a["confidence"]) - float(b["confidence"]))
+        for a, b in zip(fp32["predictions"], int8["predictions"])
+    )
+
+    print(f"\n=== {name}: {len(texts)} exemples, {runs} passes ===")
+    print(f"{'':12}{'fp32':>12}{'int8':>12}")
+    for key, label in (("load_s", "load (s)"), ("p50_ms", "p50 (ms)"), ("p95_ms", "p95 (ms)"), ("batch_ms", "batch (ms)")):
+        print(f"{label:12}{fp32[key]:>12.1f}{int8[key]:>12.1f}")
+
+    if all(labels):
+        for mode, variant in variants.items():
+            accuracy = sum(
+                result["prediction"] == label
+                for result, label in zip(variant["predictions"], labels)
+            ) / len(labels)
+            print(f"exactitude {mode}: {accuracy:.1%}")
+
+    print(f"accord fp32/int8: {agreement:.1%}")
+    print(f"écart moyen de confiance: {confidence_delta:.4f}")
+    print(f"accélération p50: x{fp32['p50_ms'] / int8['p50_ms']:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=["camembert", "hatecomment", "all"], default="all")
+    parser.add_argument("--samples", help="Fichier d'exemples (.txt ou .jsonl)")
+    parser.add_argument("--runs", type=int, default=3, help="Passes de mesure par variante")
+    args = parser.parse_args()
+
+    # Mesurer les modèles, pas le cache de prédictions
+    settings.ENABLE_PREDICTION_CACHE = False
+
+    samples = load_samples(args.samples)
+    names = ["camembert", "hatecomment"] if args.model == "all" else [args.model]
+    for name in names:
+        compare(name, samples, args.runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,21 @@
 -- Extension pour UUID
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Partitions expirées détachées (METRICS_RETENTION_ACTION=archive)
+CREATE SCHEMA IF NOT EXISTS metrics_archive;
+
+-- Les tables de métriques brutes et les rollups sont partitionnés par plage
+-- sur leur horodatage: les partitions (jour/heure) sont créées à l'avance et
+-- expirées par app/core/metrics/partitions.py. La partition DEFAULT reçoit
+-- les lignes hors des partitions existantes (ex: avant la 1re maintenance).
+
 -- ============================================================================
 -- TABLE: model_predictions
 -- Stocke toutes les prédictions effectuées par les modèles
 -- ============================================================================
 CREATE TABLE IF NOT EXISTS model_predictions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     
     -- Informations sur le modèle
     model_name VARCHAR(100) NOT NULL,
@@ -36,11 +44,17 @@ CREATE TABLE IF NOT EXISTS model_predictions (
     batch_size INTEGER DEFAULT 1,
     
     -- Index pour les requêtes fréquentes
-    CONSTRAINT chk_confidence CHECK (confidence >= 0 AND confidence <= 1)
-);
+    CONSTRAINT chk_confidence CHECK (confidence >= 0 AND confidence <= 1),
+    
+    -- La clé de partitionnement fait partie de la clé primaire
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS model_predictions_default PARTITION OF model_predictions DEFAULT;
 
 -- Index pour les requêtes de performance
-CREATE INDEX idx_predictions_model ON model_predictions(model_name);
+-- (model_name, created_at) couvrant: stats par modèle sur une fenêtre
+CREATE INDEX idx_predictions_model_created ON model_predictions(model_name, created_at) INCLUDE (provider, latency_ms);
 CREATE INDEX idx_predictions_created ON model_predictions(created_at);
 CREATE INDEX idx_predictions_provider ON model_predictions(provider);
 CREATE INDEX idx_predictions_endpoint ON model_predictions(endpoint);
@@ -50,8 +64,8 @@ CREATE INDEX idx_predictions_endpoint ON model_predictions(endpoint);
 -- Stocke les erreurs rencontrées lors des prédictions
 -- ============================================================================
 CREATE TABLE IF NOT EXISTS model_errors (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     
     -- Informations sur le modèle
     model_name VARCHAR(100) NOT NULL,
@@ -65,10 +79,14 @@ CREATE TABLE IF NOT EXISTS model_errors (
     
     -- Contexte
     input_length INTEGER,
-    stack_trace TEXT
-);
+    stack_trace TEXT,
+    
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
 
-CREATE INDEX idx_errors_model ON model_errors(model_name);
+CREATE TABLE IF NOT EXISTS model_errors_default PARTITION OF model_errors DEFAULT;
+
+CREATE INDEX idx_errors_model_created ON model_errors(model_name, created_at) INCLUDE (provider, error_type);
 CREATE INDEX idx_errors_created ON model_errors(created_at);
 CREATE INDEX idx_errors_type ON model_errors(error_type);
 
@@ -77,8 +95,8 @@ CREATE INDEX idx_errors_type ON model_errors(error_type);
 -- Stocke l'historique des health checks
 -- ============================================================================
 CREATE TABLE IF NOT EXISTS model_health_checks (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    checked_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    checked_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     
     model_name VARCHAR(100) NOT NULL,
     provider VARCHAR(50) NOT NULL,
@@ -87,10 +105,14 @@ CREATE TABLE IF NOT EXISTS model_health_checks (
     latency_ms DECIMAL(10,2),
     memory_mb DECIMAL(10,2),
     
-    details JSONB
-);
+    details JSONB,
+    
+    PRIMARY KEY (id, checked_at)
+) PARTITION BY RANGE (checked_at);
+
+CREATE TABLE IF NOT EXISTS model_health_checks_default PARTITION OF model_health_checks DEFAULT;
 
-CREATE INDEX idx_health_model ON model_health_checks(model_name);
+CREATE INDEX idx_health_model_checked ON model_health_checks(model_name, checked_at);
 CREATE INDEX idx_health_checked ON model_health_checks(checked_at);
 CREATE INDEX idx_health_status ON model_health_checks(status);
 
@@ -126,13 +148,49 @@ CREATE TABLE IF NOT EXISTS latency_percentiles (
 CREATE INDEX idx_percentiles_model ON latency_percentiles(model_name);
 CREATE INDEX idx_percentiles_period ON latency_percentiles(period_start, period_end);
 
+-- ============================================================================
+-- TABLE: metrics_rollup_minute
+-- Agrégats par minute (alimentés à chaque lot d'ingestion), lus par l'API
+-- au lieu de PERCENTILE_CONT sur model_predictions
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics_rollup_minute (
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    
+    model_name VARCHAR(100) NOT NULL,
+    provider VARCHAR(50) NOT NULL,
+    endpoint VARCHAR(200) NOT NULL DEFAULT '',
+    
+    -- Compteurs
+    request_count INTEGER NOT NULL DEFAULT 0,  -- Prédictions réussies
+    error_count INTEGER NOT NULL DEFAULT 0,
+    fallback_count INTEGER NOT NULL DEFAULT 0,
+    depression_count INTEGER NOT NULL DEFAULT 0,
+    normal_count INTEGER NOT NULL DEFAULT 0,
+    
+    -- Latence: sommes, extrêmes et DDSketch {"<bin>": effectif, "z": effectif}
+    latency_sum_ms DOUBLE PRECISION NOT NULL DEFAULT 0,
+    latency_min_ms DOUBLE PRECISION,
+    latency_max_ms DOUBLE PRECISION,
+    latency_sketch JSONB NOT NULL DEFAULT '{}',
+    
+    -- Confiance
+    confidence_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    confidence_count INTEGER NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (bucket_start, model_name, provider, endpoint)
+) PARTITION BY RANGE (bucket_start);
+
+CREATE TABLE IF NOT EXISTS metrics_rollup_minute_default PARTITION OF metrics_rollup_minute DEFAULT;
+
+CREATE INDEX idx_rollup_model_bucket ON metrics_rollup_minute(model_name, bucket_start);
+
 -- ============================================================================
 -- TABLE: throughput_metrics
 -- Stocke les métriques de débit (requêtes par seconde)
 -- ============================================================================
 CREATE TABLE IF NOT EXISTS throughput_metrics (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    recorded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    recorded_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     
     model_name VARCHAR(100) NOT NULL,
     provider VARCHAR(50) NOT NULL,
@@ -143,10 +201,14 @@ CREATE TABLE IF NOT EXISTS throughput_metrics (
     concurrent_requests INTEGER,
     
     -- Période de mesure
-    window_seconds INTEGER DEFAULT 60
-);
+    window_seconds INTEGER DEFAULT 60,
+    
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE TABLE IF NOT EXISTS throughput_metrics_default PARTITION OF throughput_metrics DEFAULT;
 
-CREATE INDEX idx_throughput_model ON throughput_metrics(model_name);
+CREATE INDEX idx_throughput_model_recorded ON throughput_metrics(model_name, recorded_at);
 CREATE INDEX idx_throughput_recorded ON throughput_metrics(recorded_at);
 
 -- ============================================================================
@@ -182,29 +244,104 @@ CREATE INDEX idx_alerts_severity ON alerts(severity);
 CREATE INDEX idx_alerts_created ON alerts(created_at);
 CREATE INDEX idx_alerts_model ON alerts(model_name);
 
+-- ============================================================================
+-- FONCTIONS DDSketch (précision relative 1%, voir app/core/metrics/sketch.py)
+-- ============================================================================
+
+-- Fusion de deux sketches: addition des effectifs bin par bin
+CREATE OR REPLACE FUNCTION merge_latency_sketch(p_left JSONB, p_right JSONB)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(key, total), '{}'::jsonb)
+    FROM (
+        SELECT key, SUM(value::bigint) AS total
+        FROM (
+            SELECT key, value FROM jsonb_each_text(COALESCE(p_left, '{}'::jsonb))
+            UNION ALL
+            SELECT key, value FROM jsonb_each_text(COALESCE(p_right, '{}'::jsonb))
+        ) bins
+        GROUP BY key
+    ) merged;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Agrégat: fusion des sketches d'une fenêtre de rollups
+CREATE OR REPLACE AGGREGATE latency_sketch_agg(JSONB) (
+    SFUNC = merge_latency_sketch,
+    STYPE = JSONB,
+    INITCOND = '{}'
+);
+
+-- Quantile d'un sketch (représentant du bin contenant le rang demandé)
+CREATE OR REPLACE FUNCTION latency_sketch_quantile(
+    p_sketch JSONB,
+    p_quantile DOUBLE PRECISION,
+    p_relative_accuracy DOUBLE PRECISION DEFAULT 0.01
+) RETURNS DOUBLE PRECISION AS $$
+DECLARE
+    v_gamma DOUBLE PRECISION := (1 + p_relative_accuracy) / (1 - p_relative_accuracy);
+    v_total DOUBLE PRECISION;
+    v_seen DOUBLE PRECISION := 0;
+    v_bin RECORD;
+BEGIN
+    SELECT SUM(value::double precision) INTO v_total FROM jsonb_each_text(p_sketch);
+    IF v_total IS NULL OR v_total = 0 THEN
+        RETURN NULL;
+    END IF;
+    FOR v_bin IN
+        SELECT key, value::double precision AS n
+        FROM jsonb_each_text(p_sketch)
+        ORDER BY (key = 'z') DESC, CASE WHEN key = 'z' THEN 0 ELSE key::integer END
+    LOOP
+        v_seen := v_seen + v_bin.n;
+        IF v_seen > p_quantile * (v_total - 1) THEN
+            IF v_bin.key = 'z' THEN
+                RETURN 0;
+            END IF;
+            RETURN 2 * power(v_gamma, v_bin.key::integer) / (v_gamma + 1);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
 -- ============================================================================
 -- VUES pour faciliter les requêtes
 -- ============================================================================
 
--- Vue: Statistiques des dernières 24h par modèle
+-- Vue: Statistiques des dernières 24h par modèle (depuis les rollups par minute)
 CREATE OR REPLACE VIEW v_model_stats_24h AS
 SELECT 
     model_name,
     provider,
-    COUNT(*) as total_requests,
-    AVG(latency_ms) as avg_latency_ms,
-    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY latency_ms) as p50_latency_ms,
-    PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms) as p95_latency_ms,
-    PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY latency_ms) as p99_latency_ms,
-    MIN(latency_ms) as min_latency_ms,
-    MAX(latency_ms) as max_latency_ms,
-    AVG(confidence) as avg_confidence,
-    SUM(CASE WHEN fallback_used THEN 1 ELSE 0 END) as fallback_count,
-    SUM(CASE WHEN prediction = 'DÉPRESSION' THEN 1 ELSE 0 END) as depression_count,
-    SUM(CASE WHEN prediction = 'NORMAL' THEN 1 ELSE 0 END) as normal_count
-FROM model_predictions
-WHERE created_at > NOW() - INTERVAL '24 hours'
-GROUP BY model_name, provider;
+    total_requests,
+    latency_sum_ms / total_requests as avg_latency_ms,
+    LEAST(GREATEST(latency_sketch_quantile(sketch, 0.5), min_latency_ms), max_latency_ms) as p50_latency_ms,
+    LEAST(GREATEST(latency_sketch_quantile(sketch, 0.95), min_latency_ms), max_latency_ms) as p95_latency_ms,
+    LEAST(GREATEST(latency_sketch_quantile(sketch, 0.99), min_latency_ms), max_latency_ms) as p99_latency_ms,
+    min_latency_ms,
+    max_latency_ms,
+    confidence_sum / NULLIF(confidence_count, 0) as avg_confidence,
+    fallback_count,
+    depression_count,
+    normal_count
+FROM (
+    SELECT
+        model_name,
+        provider,
+        SUM(request_count) as total_requests,
+        SUM(latency_sum_ms) as latency_sum_ms,
+        MIN(latency_min_ms) as min_latency_ms,
+        MAX(latency_max_ms) as max_latency_ms,
+        SUM(confidence_sum) as confidence_sum,
+        SUM(confidence_count) as confidence_count,
+        SUM(fallback_count) as fallback_count,
+        SUM(depression_count) as depression_count,
+        SUM(normal_count) as normal_count,
+        latency_sketch_agg(latency_sketch) as sketch
+    FROM metrics_rollup_minute
+    WHERE bucket_start >= date_trunc('minute', NOW() - INTERVAL '24 hours')
+    GROUP BY model_name, provider
+    HAVING SUM(request_count) > 0
+) r;
 
 -- Vue: Taux d'erreur par modèle (dernière heure)
 CREATE OR REPLACE VIEW v_error_rates_1h AS
@@ -246,6 +383,7 @@ ORDER BY
 -- ============================================================================
 
 -- Fonction: Calculer et stocker les percentiles pour une période
+-- (fusion des rollups par minute, sans relire model_predictions)
 CREATE OR REPLACE FUNCTION calculate_latency_percentiles(
     p_period_start TIMESTAMP WITH TIME ZONE,
     p_period_end TIMESTAMP WITH TIME ZONE
@@ -259,26 +397,34 @@ BEGIN
     SELECT 
         p_period_start,
         p_period_end,
-        p.model_name,
-        p.provider,
-        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY p.latency_ms),
-        PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY p.latency_ms),
-        PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY p.latency_ms),
-        AVG(p.latency_ms),
-        MIN(p.latency_ms),
-        MAX(p.latency_ms),
-        COUNT(*),
-        COALESCE(e.error_count, 0),
-        SUM(CASE WHEN p.fallback_used THEN 1 ELSE 0 END)
-    FROM model_predictions p
-    LEFT JOIN (
-        SELECT model_name, provider, COUNT(*) as error_count
-        FROM model_errors
-        WHERE created_at BETWEEN p_period_start AND p_period_end
+        r.model_name,
+        r.provider,
+        LEAST(GREATEST(latency_sketch_quantile(r.sketch, 0.5), r.min_ms), r.max_ms),
+        LEAST(GREATEST(latency_sketch_quantile(r.sketch, 0.95), r.min_ms), r.max_ms),
+        LEAST(GREATEST(latency_sketch_quantile(r.sketch, 0.99), r.min_ms), r.max_ms),
+        r.latency_sum_ms / r.total_requests,
+        r.min_ms,
+        r.max_ms,
+        r.total_requests,
+        r.error_count,
+        r.fallback_count
+    FROM (
+        SELECT
+            model_name,
+            provider,
+            SUM(request_count) as total_requests,
+            SUM(error_count) as error_count,
+            SUM(fallback_count) as fallback_count,
+            SUM(latency_sum_ms) as latency_sum_ms,
+            MIN(latency_min_ms) as min_ms,
+            MAX(latency_max_ms) as max_ms,
+            latency_sketch_agg(latency_sketch) as sketch
+        FROM metrics_rollup_minute
+        WHERE bucket_start >= date_trunc('minute', p_period_start)
+        AND bucket_start < p_period_end
         GROUP BY model_name, provider
-    ) e ON p.model_name = e.model_name AND p.provider = e.provider
-    WHERE p.created_at BETWEEN p_period_start AND p_period_end
-    GROUP BY p.model_name, p.provider, e.error_count
+        HAVING SUM(request_count) > 0
+    ) r
     ON CONFLICT (period_start, period_end, model_name) 
     DO UPDATE SET
         p50_ms = EXCLUDED.p50_ms,
@@ -313,5 +459,6 @@ COMMENT ON TABLE model_predictions IS 'Stocke toutes les prédictions effectuée
 COMMENT ON TABLE model_errors IS 'Stocke les erreurs rencontrées lors des prédictions';
 COMMENT ON TABLE model_health_checks IS 'Historique des health checks des modèles';
 COMMENT ON TABLE latency_percentiles IS 'Percentiles de latence agrégés par période';
+COMMENT ON TABLE metrics_rollup_minute IS 'Agrégats par minute (compteurs + DDSketch des latences)';
 COMMENT ON TABLE throughput_metrics IS 'Métriques de débit (requêtes/seconde)';
 COMMENT ON TABLE alerts IS 'Alertes générées par le système de monitoring';
@@ -0,0 +1,216 @@
+"""
+Tests pour la cascade de détection (CamemBERT puis escalade des cas incertains)
+"""
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.core.cascade import DetectionCascade, cascade_decisions_counter, cascade_saved_counter
+from app.routes import depression_api
+
+# Confiance du premier étage par texte
+FAST_CONFIDENCE = {"clair": 0.97, "ambigu": 0.62, "limite": 0.85}
+
+
+class FastModel:
+    model_name = "fast-test"
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, text, include_reasoning=True, **kwargs):
+        self.calls.append(text)
+        result = {"prediction": "NORMAL", "confidence": FAST_CONFIDENCE[text], "severity": "Aucune"}
+        if include_reasoning:
+            result["reasoning"] = "analyse rapide"
+        return result
+
+    def batch_predict(self, texts, include_reasoning=False, **kwargs):
+        return [self.predict(text, include_reasoning) for text in texts]
+
+
+class EscalationModel:
+    model_name = "slow-test"
+
+    def __init__(self, fail=False, error_result=False, erreur_result=False):
+        self.calls = []
+        self.fail = fail
+        self.error_result = error_result
+        self.erreur_result = erreur_result
+
+    def predict(self, text, include_reasoning=True, **kwargs):
+        self.calls.append(text)
+        if self.fail:
+            raise RuntimeError("ollama down")
+        if self.error_result:
+            # Comme le on_error de batch_predict Qwen (via le micro-batcher)
+            return {"prediction": "NORMAL", "confidence": 0.0, "severity": "Aucune", "error": "ollama down"}
+        if self.erreur_result:
+            # Comme BaseLLMPredictor._error_result (yansnet-llm): pas de champ error
+            return {"prediction": "ERREUR", "confidence": 0.0, "severity": "Aucune", "reasoning": "Erreur: provider down"}
+        result = {"prediction": "DEPRESSION", "confidence": 0.9, "severity": "Elevee"}
+        if include_reasoning:
+            result["reasoning"] = "analyse détaillée"
+        return result
+
+    def batch_predict(self, texts, include_reasoning=False, **kwargs):
+        return [self.predict(text, include_reasoning) for text in texts]
+
+
+@pytest.fixture
+def models(monkeypatch):
+    fast, slow = FastModel(), EscalationModel()
+    monkeypatch.setattr(settings, "DETECTION_PROVIDER", "cascade")
+    monkeypatch.setattr(settings, "CASCADE_FAST_MODEL", "fast-test")
+    monkeypatch.setattr(settings, "CASCADE_ESCALATION_MODEL", "slow-test")
+    monkeypatch.setattr(settings, "CASCADE_UNCERTAINTY_MIN", 0.0)
+    monkeypatch.setattr(settings, "CASCADE_UNCERTAINTY_MAX", 0.85)
+    monkeypatch.setattr(settings, "CASCADE_ESCALATE_ON_REASONING", True)
+    monkeypatch.setattr(settings, "ENABLE_MICRO_BATCHING", False)
+
+    async def aget(name):
+        return {"fast-test": fast, "slow-test": slow}.get(name)
+
+    monkeypatch.setattr("app.core.cascade.registry.aget", aget)
+    return fast, slow
+
+
+def test_only_uncertain_texts_are_escalated(models):
+    fast, slow = models
+    cascade = DetectionCascade()
+
+    clear = asyncio.run(cascade.detect("clair"))
+    borderline = asyncio.run(cascade.detect("limite"))
+
+    assert clear["decided_by"] == "fast-test" and clear["escalated"] is False
+    assert borderline["decided_by"] == "slow-test" and borderline["escalated"] is True
+    # Libellés du modèle d'escalade ramenés au vocabulaire du premier étage
+    assert borderline["prediction"] == "DÉPRESSION"
+    assert borderline["severity"] == "Élevée"
+    assert slow.calls == ["limite"]
+
+
+def test_reasoning_request_escalates(models):
+    fast, slow = models
+    before = cascade_decisions_counter.get(stage="escalated", reason="reasoning")
+
+    result = asyncio.run(DetectionCascade().detect("clair", include_reasoning=True))
+    batch = asyncio.run(DetectionCascade().detect_batch(["clair", "ambigu"], include_reasoning=True))
+
+    assert result["escalated"] is True
+    assert result["reasoning"] == "analyse détaillée"
+    assert [r["escalated"] for r in batch] == [True, True]
+    # Escalade imposée: le premier étage n'est pas exécuté
+    assert fast.calls == []
+    assert slow.calls == ["clair", "clair", "ambigu"]
+    assert cascade_decisions_counter.get(stage="escalated", reason="reasoning") == before + 3
+
+
+def test_failed_reasoning_escalation_falls_back_to_fast_model(models, monkeypatch):
+    fast, _ = models
+    failing = EscalationModel(fail=True)
+
+    async def aget(name):
+        return {"fast-test": fast, "slow-test": failing}.get(name)
+
+    monkeypatch.setattr("app.core.cascade.registry.aget", aget)
+    cascade = DetectionCascade()
+
+    result = asyncio.run(cascade.detect("clair", include_reasoning=True))
+    batch = asyncio.run(cascade.detect_batch(["ambigu", "limite"], include_reasoning=True))
+
+    assert result["decided_by"] == "fast-test" and result["confidence"] == 0.97
+    assert [r["confidence"] for r in batch] == [0.62, 0.85]
+    assert all(r["escalated"] is False for r in batch)
+    assert fast.calls == ["clair", "ambigu", "limite"]
+    # L'explication demandée est conservée par le repli
+    assert result["reasoning"] == "analyse rapide"
+    assert all(r["reasoning"] == "analyse rapide" for r in batch)
+
+
+def test_escalation_failure_keeps_fast_result(models, monkeypatch):
+    fast, _ = models
+    failing = EscalationModel(fail=True)
+
+    async def aget(name):
+        return {"fast-test": fast, "slow-test": failing}.get(name)
+
+    monkeypatch.setattr("app.core.cascade.registry.aget", aget)
+    result = asyncio.run(DetectionCascade().detect("ambigu"))
+
+    assert result["decided_by"] == "fast-test"
+    assert result["confidence"] == 0.62
+
+
+def test_escalation_error_result_keeps_fast_result(models, monkeypatch):
+    fast, _ = models
+    failing = EscalationModel(error_result=True)
+
+    async def aget(name):
+        return {"fast-test": fast, "slow-test": failing}.get(name)
+
+    monkeypatch.setattr("app.core.cascade.registry.aget", aget)
+    cascade = DetectionCascade()
+    before = cascade_decisions_counter.get(stage="fast", reason="escalation_error")
+
+    cascade._escalation_latency_s = 1.0  # Latence d'escalade déjà mesurée
+    saved_before = cascade_saved_counter.get()
+
+    result = asyncio.run(cascade.detect("ambigu"))
+
+    assert result["decided_by"] == "fast-test" and result["escalated"] is False
+    assert result["confidence"] == 0.62 and "error" not in result
+    assert cascade_decisions_counter.get(stage="fast", reason="escalation_error") == before + 1
+    assert cascade.get_stats()["escalation_rate"] == 0.0
+    # Escalade tentée: aucune latence économisée
+    assert cascade_saved_counter.get() == saved_before
+
+
+def test_escalation_erreur_result_keeps_fast_result(models, monkeypatch):
+    fast, _ = models
+    failing = EscalationModel(erreur_result=True)
+
+    async def aget(name):
+        return {"fast-test": fast, "slow-test": failing}.get(name)
+
+    monkeypatch.setattr("app.core.cascade.registry.aget", aget)
+    cascade = DetectionCascade()
+
+    single = asyncio.run(cascade.detect("ambigu"))
+    batch = asyncio.run(cascade.detect_batch(["clair", "limite"]))
+
+    assert single["decided_by"] == "fast-test" and single["prediction"] == "NORMAL"
+    assert [r["decided_by"] for r in batch] == ["fast-test", "fast-test"]
+    assert [r["confidence"] for r in batch] == [0.97, 0.85]
+    assert cascade.get_stats()["escalated"] == 0
+
+
+def test_batch_escalates_subset_and_reports_rate(models):
+    _, slow = models
+    cascade = DetectionCascade()
+
+    asyncio.run(cascade.detect("limite"))  # Mesure de la latence d'escalade
+    results = asyncio.run(cascade.detect_batch(["clair", "ambigu", "clair", "limite"]))
+    stats = cascade.get_stats()
+
+    assert [r["escalated"] for r in results] == [False, True, False, True]
+    assert slow.calls == ["limite", "ambigu", "limite"]
+    assert stats["texts"] == 5
+    assert stats["escalation_rate"] == 0.6
+    assert stats["escalation_latency_ms"] is not None
+
+
+def test_depression_route_reports_deciding_stage(models):
+    app = FastAPI()
+    app.include_router(depression_api.router)
+    client = TestClient(app)
+
+    single = client.post("/api/v1/depression/detect", json={"text": "clair", "include_reasoning": False})
+    batch = client.post("/api/v1/depression/batch-detect", json={"texts": ["clair", "ambigu"]})
+
+    assert single.status_code == 200
+    assert single.json()["model_used"] == "fast-test"
+    assert single.json()["escalated"] is False
+    assert [r["model_used"] for r in batch.json()["results"]] == ["fast-test", "slow-test"]
+    assert [r["escalated"] for r in batch.json()["results"]] == [False, True]
@@ -0,0 +1,73 @@
+"""
+Tests pour le modèle de détection NSFW (batch vectorisé)
+"""
+import torch
+from PIL import Image
+from app.services.model_censure.censure_model_wrapper import CensureModel
+
+
+class _FakeProcessor:
+    """Processeur factice: un tenseur par image, valeur = canal rouge"""
+
+    def __call__(self, images, return_tensors=None):
+        return {"pixel_values": torch.tensor([[image.getpixel((0, 0))[0] / 255.0] for image in images])}
+
+
+class _FakeViT(torch.nn.Module):
+    """ViT factice: logit NSFW proportionnel au canal rouge"""
+
+    def __init__(self):
+        super().__init__()
+        self.forward_batch_sizes = []
+
+    def forward(self, pixel_values):
+        self.forward_batch_sizes.append(pixel_values.shape[0])
+        red = pixel_values[:, 0]
+        logits = torch.stack([torch.zeros_like(red), (red - 0.5) * 12], dim=-1)
+        return type("Output", (), {"logits": logits})()
+
+
+def _fake_censure_model():
+    model = CensureModel.__new__(CensureModel)
+    model.processor = _FakeProcessor()
+    model.model = _FakeViT()
+    model.device = "cpu"
+    model.label_mapping = {0: "Safe", 1: "NSFW"}
+    model._initialized = True
+    return model
+
+
+def test_batch_predict_single_forward_pass():
+    """Un seul forward pass par paquet, résultats dans l'ordre"""
+    model = _fake_censure_model()
+    images = [Image.new("RGB", (8, 8), color=(red, 0, 0)) for red in (0, 255, 200, 0)]
+
+    results = model.batch_predict(images=images, max_batch_size=8)
+
+    assert model.model.forward_batch_sizes == [4]
+    assert [r["prediction"] for r in results] == ["SAFE", "NSFW", "NSFW", "SAFE"]
+    assert results[0]["severity"] == "Aucune"
+    assert results[1]["severity"] == "Critique"
+
+
+def test_batch_predict_respects_max_batch_size():
+    """Les images sont découpées en paquets de max_batch_size"""
+    model = _fake_censure_model()
+    images = [Image.new("RGB", (8, 8), color=(255, 0, 0)) for _ in range(5)]
+
+    results = model.batch_predict(images=images, max_batch_size=2)
+
+    assert model.model.forward_batch_sizes == [2, 2, 1]
+    assert len(results) == 5
+
+
+def test_batch_matches_single_predict():
+    """Le batch vectorisé donne les mêmes résultats que predict"""
+    model = _fake_censure_model()
+    images = [Image.new("RGB", (8, 8), color=(red, 0, 0)) for red in (0, 140, 160, 180, 200, 255)]
+
+    batch_results = model.batch_predict(images=images)
+    single_results = [model.predict(image=image) for image in images]
+
+    assert batch_results == single_results
+    assert {r["severity"] for r in batch_results} >= {"Aucune", "Moyenne", "Élevée", "Critique"}
@@ -0,0 +1,90 @@
+"""
+Tests pour la génération parallèle des commentaires et des jeux de démo
+"""
+import threading
+import time
+import pytest
+from app.config import settings
+from app.services.yansnet_content_generator.yansnet_content_generator_model import YansnetContentGeneratorModel
+
+
+LLM_DELAY_S = 0.05
+
+
+@pytest.fixture
+def generator(monkeypatch):
+    """Générateur dont l'appel LLM est simulé (latence fixe, concurrence mesurée)"""
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "local")
+    monkeypatch.setattr(settings, "CONTENT_GENERATION_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "CONTENT_GENERATION_CONCURRENCY_OVERRIDES", "")
+
+    model = YansnetContentGeneratorModel.__new__(YansnetContentGeneratorModel)
+    model._initialized = True
+    model.state = {"active": 0, "peak": 0, "calls": 0, "starts": []}
+    lock = threading.Lock()
+
+    def call_llm(system_prompt, user_prompt):
+        with lock:
+            model.state["active"] += 1
+            model.state["calls"] += 1
+            model.state["peak"] = max(model.state["peak"], model.state["active"])
+            # Le prompt d'un commentaire contient le post généré
+            model.state["starts"].append("comment" if "texte pour:" in user_prompt else "post")
+        time.sleep(LLM_DELAY_S)
+        with lock:
+            model.state["active"] -= 1
+        if "ÉCHEC" in user_prompt:
+            raise RuntimeError("LLM indisponible")
+        return f"texte pour: {user_prompt[:20]}"
+
+    model._call_llm = call_llm
+    return model
+
+
+def test_comments_are_generated_concurrently_in_order(generator):
+    start = time.perf_counter()
+    comments = generator.generate_comment("Un post", sentiment="positif", num_comments=8)
+    elapsed = time.perf_counter() - start
+
+    assert [c["comment_number"] for c in comments] == list(range(1, 9))
+    assert all(c["sentiment"] == "positif" for c in comments)
+    assert generator.state["peak"] == 4
+    assert elapsed < 8 * LLM_DELAY_S * 0.75
+
+
+def test_comment_errors_stay_per_comment(generator):
+    """Un post qui fait échouer le LLM donne des commentaires d'erreur, pas une exception"""
+    comments = generator.generate_comment("ÉCHEC", num_comments=3)
+
+    assert [c["comment_number"] for c in comments] == [1, 2, 3]
+    assert all(c["content"].startswith("[Erreur de génération") for c in comments)
+    assert all(c["sentiment"] == "neutre" for c in comments)
+
+
+def test_concurrency_limit_per_provider(generator, monkeypatch):
+    monkeypatch.setattr(settings, "CONTENT_GENERATION_CONCURRENCY_OVERRIDES", "local=2,gpt=8")
+    generator.generate_comment("Un post", num_comments=6)
+
+    assert generator.state["peak"] == 2
+
+
+def test_dataset_pipelines_posts_and_comments(generator):
+    """8 posts x 2 commentaires (concurrence 4): les commentaires démarrent avant le dernier post"""
+    start = time.perf_counter()
+    dataset = generator.generate_dataset(num_posts=8, num_comments=2, post_type="blague", topic="le hackathon")
+    elapsed = time.perf_counter() - start
+    starts = generator.state["starts"]
+
+    assert len(dataset) == 8
+    assert all(item["total_comments"] == 2 for item in dataset)
+    assert all(item["post"]["post_type"] == "blague" for item in dataset)
+    assert generator.state["calls"] == 24
+    assert generator.state["peak"] <= 4
+    assert starts.index("comment") < len(starts) - 1 - starts[::-1].index("post")
+    assert elapsed < 24 * LLM_DELAY_S / 2
+
+
+def test_dataset_reports_failed_posts(generator):
+    dataset = generator.generate_dataset(num_posts=2, num_comments=1, topic="ÉCHEC")
+
+    assert dataset == [{"error": "LLM indisponible"}, {"error": "LLM indisponible"}]
@@ -0,0 +1,188 @@
+"""
+Tests pour la génération de contenu en streaming (Ollama NDJSON, SSE/NDJSON, TTFT)
+"""
+import asyncio
+import json
+import time
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.core.ollama_client import OllamaClient
+from app.routes import api
+from app.services.yansnet_content_generator.yansnet_content_generator_model import (
+    YansnetContentGeneratorModel,
+    llm_ttft_histogram
+)
+
+
+def _ndjson(*contents):
+    lines = [json.dumps({"message": {"content": c}, "done": False}) for c in contents]
+    lines.append(json.dumps({"message": {"content": ""}, "done": True}))
+    return "\n".join(lines) + "\n"
+
+
+class FakeStreamingClient:
+    """Client Ollama factice: chaque appel produit les fragments donnés"""
+
+    def __init__(self, *contents):
+        self.contents = contents
+        self.calls = 0
+
+    async def astream_chat(self, model, messages, options=None, **extra):
+        self.calls += 1
+        for content in self.contents:
+            await asyncio.sleep(0)
+            yield {"message": {"content": content}}
+
+
+def _generator(monkeypatch, client) -> YansnetContentGeneratorModel:
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "local")
+    monkeypatch.setattr("app.core.ollama_client.get_ollama_client", lambda *a: client)
+    model = YansnetContentGeneratorModel.__new__(YansnetContentGeneratorModel)
+    model._initialized = True
+    return model
+
+
+def test_ollama_stream_relays_chunks_across_loops():
+    """Les fragments NDJSON arrivent dans la boucle appelante, dans l'ordre"""
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=_ndjson("Bon", "jour"))
+
+    client = OllamaClient("http://ollama.test", transport=httpx.MockTransport(handler))
+
+    async def run():
+        return [chunk["message"]["content"] async for chunk in client.astream_chat("m", [])]
+
+    try:
+        assert asyncio.run(run()) == ["Bon", "jour", ""]
+    finally:
+        client.close()
+
+
+def test_comments_are_emitted_as_soon_as_done(monkeypatch):
+    """token... comment(1) token... comment(2); le TTFT est mesuré"""
+    monkeypatch.setattr(settings, "CONTENT_GENERATION_CONCURRENCY", 1)
+    model = _generator(monkeypatch, FakeStreamingClient("Courage", " !"))
+    before = sum(v["count"] for v in llm_ttft_histogram.snapshot()["values"])
+
+    async def run():
+        return [e async for e in model.stream_comments("Post de test", sentiment="positif", num_comments=2)]
+
+    events = asyncio.run(run())
+
+    assert [e["event"] for e in events] == ["token", "token", "comment"] * 2
+    assert events[2]["data"] == {"content": "Courage !", "sentiment": "positif", "comment_number": 1}
+    assert events[3]["data"]["comment_number"] == 2
+    assert sum(v["count"] for v in llm_ttft_histogram.snapshot()["values"]) == before + 2
+
+
+def test_comments_are_streamed_concurrently(monkeypatch):
+    """Les commentaires sont générés en parallèle, bornés par la concurrence"""
+    monkeypatch.setattr(settings, "CONTENT_GENERATION_CONCURRENCY", 3)
+    monkeypatch.setattr(settings, "CONTENT_GENERATION_CONCURRENCY_OVERRIDES", "")
+    in_flight, peak = 0, 0
+
+    class SlowClient:
+        async def astream_chat(self, model, messages, options=None, **extra):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            try:
+                await asyncio.sleep(0.05)
+                yield {"message": {"content": "Courage !"}}
+            finally:
+                in_flight -= 1
+
+    model = _generator(monkeypatch, SlowClient())
+
+    async def run():
+        start = time.perf_counter()
+        events = [e async for e in model.stream_comments("Post de test", num_comments=6)]
+        return events, time.perf_counter() - start
+
+    events, elapsed = asyncio.run(run())
+    comments = [e["data"] for e in events if e["event"] == "comment"]
+
+    assert peak == 3
+    assert elapsed < 0.25  # 2 vagues de 3, et non 6 appels successifs
+    assert sorted(c["comment_number"] for c in comments) == [1, 2, 3, 4, 5, 6]
+    assert all(c["content"] == "Courage !" for c in comments)
+
+
+def test_stream_route_formats(monkeypatch):
+    """SSE par défaut, NDJSON sur demande, terminé par un événement done"""
+    model = _generator(monkeypatch, FakeStreamingClient("Salut", " tout le monde."))
+
+    async def aget(name):
+        return model
+
+    monkeypatch.setattr(api.registry, "aget", aget)
+    app = FastAPI()
+    app.include_router(api.content_router)
+    client = TestClient(app)
+    body = {"post_type": "blague", "topic": "les partiels stressants"}
+
+    sse = client.post("/api/v1/content/generate-post/stream", json=body)
+    assert sse.headers["content-type"].startswith("text/event-stream")
+    assert sse.text.startswith("event: post_start\ndata: ")
+    assert "event: done" in sse.text
+
+    ndjson = client.post("/api/v1/content/generate-post/stream?format=ndjson", json=body)
+    events = [json.loads(line) for line in ndjson.text.splitlines()]
+    assert [e["event"] for e in events] == ["post_start", "token", "token", "post", "done"]
+    assert events[3]["data"]["content"] == "Salut tout le monde."
+
+
+def test_stream_error_becomes_event(monkeypatch):
+    """Une erreur du LLM après l'envoi des en-têtes devient un événement error"""
+    class FailingClient:
+        async def astream_chat(self, *args, **kwargs):
+            raise httpx.ConnectError("ollama down")
+            yield  # pragma: no cover
+
+    model = _generator(monkeypatch, FailingClient())
+
+    async def aget(name):
+        return model
+
+    monkeypatch.setattr(api.registry, "aget", aget)
+    app = FastAPI()
+    app.include_router(api.content_router)
+
+    response = TestClient(app).post("/api/v1/content/generate-post/stream?format=ndjson", json={})
+    events = [json.loads(line) for line in response.text.splitlines()]
+
+    assert response.status_code == 200
+    assert [e["event"] for e in events] == ["post_start", "error"]
+    assert "ollama down" in events[1]["data"]["detail"]
+
+
+def test_stream_slot_released_when_never_iterated(monkeypatch):
+    """Réponse abandonnée avant le premier fragment: le slot est quand même libéré"""
+    model = _generator(monkeypatch, FakeStreamingClient("Salut"))
+
+    async def aget(name):
+        return model
+
+    monkeypatch.setattr(api.registry, "aget", aget)
+
+    def running():
+        return api.inference_executor.get_stats()[model.model_name]["running"]
+
+    async def run():
+        response = await api._stream_generation("stream_post", "ndjson")
+        held = running()
+        del response  # Jamais itérée (ex: client déconnecté avant l'envoi)
+        await asyncio.sleep(0)
+        return held, running()
+
+    async def run_aclose():
+        response = await api._stream_generation("stream_post", "ndjson")
+        await response.body_iterator.aclose()
+        await response.body_iterator.aclose()  # Idempotent
+        return running()
+
+    assert asyncio.run(run()) == (1, 0)
+    assert asyncio.run(run_aclose()) == 0
@@ -0,0 +1,156 @@
+"""
+Tests pour le taux d'erreur glissant et les alertes associées
+"""
+import asyncio
+from uuid import uuid4
+import pytest
+from app.config import settings
+from app.core.metrics import MetricsService
+from app.core.metrics.error_rate import ErrorRateMonitor, SlidingWindowCounter
+from app.core.metrics.metrics_models import AlertSeverity
+
+
+@pytest.fixture(autouse=True)
+def window(monkeypatch):
+    monkeypatch.setattr(settings, "ERROR_RATE_WINDOW_S", 600)
+    monkeypatch.setattr(settings, "ERROR_RATE_BUCKET_S", 60)
+    monkeypatch.setattr(settings, "ERROR_RATE_ALERT_THRESHOLD_PCT", 10.0)
+    monkeypatch.setattr(settings, "ERROR_RATE_CRITICAL_PCT", 20.0)
+    monkeypatch.setattr(settings, "ERROR_RATE_MIN_REQUESTS", 1)
+
+
+def test_sliding_window_expires_old_buckets():
+    counter = SlidingWindowCounter(window_s=600, bucket_s=60)
+    counter.add(3, now=0)
+    counter.add(2, now=300)
+
+    assert counter.total(now=590) == 5
+    assert counter.total(now=610) == 2  # Bucket [0, 60) sorti de la fenêtre
+    assert counter.total(now=5000) == 0
+    counter.add(now=10)  # Plus ancien que la fenêtre: ignoré
+    assert counter.total(now=5000) == 0
+
+
+def test_alert_fires_once_and_resolves_below_hysteresis():
+    monitor = ErrorRateMonitor()
+    for i in range(8):
+        monitor.record("qwen-depression", "qwen", error=i < 2, now=0)
+
+    fired = monitor.evaluate("qwen-depression", "qwen", now=1)
+    assert fired.action == "fire"
+    assert fired.severity is AlertSeverity.CRITICAL  # 25% > 20%
+    monitor.apply("qwen-depression", "qwen", fired)
+    assert monitor.evaluate("qwen-depression", "qwen", now=2) is None  # Déjà active
+
+    # 2 / 21 = 9.5%: sous le seuil mais au-dessus de 80% du seuil, alerte maintenue
+    for _ in range(13):
+        monitor.record("qwen-depression", "qwen", now=120)
+    assert monitor.evaluate("qwen-depression", "qwen", now=121) is None
+
+    # Erreurs sorties de la fenêtre: résolution
+    resolved = monitor.evaluate("qwen-depression", "qwen", now=700)
+    assert resolved.action == "resolve"
+
+
+def test_min_requests_prevents_early_alerts(monkeypatch):
+    monkeypatch.setattr(settings, "ERROR_RATE_MIN_REQUESTS", 5)
+    monitor = ErrorRateMonitor()
+    monitor.record("camembert-depression", "camembert", error=True, now=0)
+
+    assert monitor.rate("camembert-depression", "camembert", now=1) == (1, 1, 100.0)
+    assert monitor.evaluate("camembert-depression", "camembert", now=1) is None
+
+
+def test_database_touched_only_on_state_changes(monkeypatch):
+    monitor = ErrorRateMonitor()
+    monkeypatch.setattr("app.core.metrics.metrics_service.error_rate_monitor", monitor)
+    queries, alerts = [], []
+
+    class FakeDatabase:
+        async def fetchval(self, query, *args):
+            queries.append(query)
+            return None
+
+        async def execute(self, query, *args):
+            queries.append(query)
+
+    async def create_alert(self, alert):
+        alerts.append(alert)
+        return uuid4()
+
+    monkeypatch.setattr("app.core.metrics.metrics_service.db", FakeDatabase())
+    monkeypatch.setattr(MetricsService, "create_alert", create_alert)
+    service = MetricsService()
+
+    async def scenario():
+        for _ in range(20):
+            monitor.record("qwen-depression", "qwen", error=True)
+            await service._check_error_rate_alert("qwen-depression", "qwen")
+        for _ in range(500):
+            monitor.record("qwen-depression", "qwen")
+        await service._check_error_rate_alert("qwen-depression", "qwen")
+
+    asyncio.run(scenario())
+
+    # Chargement de l'état au premier passage, une recherche d'alerte
+    # existante au déclenchement, un UPDATE à la résolution
+    assert len(alerts) == 1
+    assert alerts[0].severity is AlertSeverity.CRITICAL
+    assert len(queries) == 3
+    assert "UPDATE alerts" in queries[2]
+    assert not any("COUNT(*)" in query for query in queries)
+
+
+def test_failed_alert_write_is_retried(monkeypatch):
+    monitor = ErrorRateMonitor()
+    monkeypatch.setattr("app.core.metrics.metrics_service.error_rate_monitor", monitor)
+    attempts = []
+
+    class FakeDatabase:
+        async def fetchval(self, query, *args):
+            return None
+
+    async def create_alert(self, alert):
+        attempts.append(alert)
+        return None if len(attempts) == 1 else uuid4()  # Premier INSERT en échec
+
+    monkeypatch.setattr("app.core.metrics.metrics_service.db", FakeDatabase())
+    monkeypatch.setattr(MetricsService, "create_alert", create_alert)
+    service = MetricsService()
+
+    async def scenario():
+        monitor.record("qwen-depression", "qwen", error=True)
+        for _ in range(3):
+            await service._check_error_rate_alert("qwen-depression", "qwen")
+
+    asyncio.run(scenario())
+
+    assert len(attempts) == 2
+    assert monitor.get_stats()[0]["alert"] == "critical"
+
+
+def test_alert_active_before_restart_is_resolved(monkeypatch):
+    monitor = ErrorRateMonitor()
+    monkeypatch.setattr("app.core.metrics.metrics_service.error_rate_monitor", monitor)
+    updates = []
+
+    class FakeDatabase:
+        async def fetchval(self, query, *args):
+            return "warning"  # Alerte restée active en base
+
+        async def execute(self, query, *args):
+            updates.append(query)
+
+    monkeypatch.setattr("app.core.metrics.metrics_service.db", FakeDatabase())
+    service = MetricsService()
+
+    async def scenario():
+        for _ in range(10):
+            monitor.record("qwen-depression", "qwen")
+        await service._check_error_rate_alert("qwen-depression", "qwen")
+        await service._check_error_rate_alert("qwen-depression", "qwen")
+
+    asyncio.run(scenario())
+
+    assert len(updates) == 1 and "status = 'resolved'" in updates[0]
+    assert monitor.get_stats()[0]["alert"] is None
@@ -0,0 +1,92 @@
+"""
+Tests pour le fan-out borné des batch LLM
+"""
+import threading
+import time
+from app.config import settings
+from app.core.fanout import BatchDeadlineExceeded, map_bounded
+from app.services.yansnet_llm.yansnet_llm_model import YansnetLLMModel
+
+
+def _error(item, e):
+    return {"item": item, "error": type(e).__name__}
+
+
+def test_results_keep_input_order_and_concurrency_is_bounded():
+    """Les éléments lents ne décalent pas les résultats; au plus N appels simultanés"""
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0}
+
+    def work(i):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(0.02 * (i % 3))
+        with lock:
+            state["active"] -= 1
+        return i * 10
+
+    start = time.perf_counter()
+    results = map_bounded(work, list(range(12)), _error, max_concurrency=4, deadline_s=5)
+    elapsed = time.perf_counter() - start
+
+    assert results == [i * 10 for i in range(12)]
+    assert state["peak"] == 4
+    assert elapsed < 12 * 0.02
+
+
+def test_errors_are_isolated_per_item():
+    def work(i):
+        if i == 1:
+            raise ValueError("boom")
+        return i
+
+    assert map_bounded(work, [0, 1, 2], _error, max_concurrency=2) == [
+        0, {"item": 1, "error": "ValueError"}, 2
+    ]
+
+
+def test_deadline_turns_slow_items_into_timeouts():
+    """Le batch rend la main à l'échéance, les éléments en retard sont en timeout"""
+    release = threading.Event()
+
+    def work(i):
+        if i == 2:
+            release.wait(2)
+        return i
+
+    start = time.perf_counter()
+    results = map_bounded(work, [0, 1, 2, 3], _error, max_concurrency=4, deadline_s=0.1)
+    elapsed = time.perf_counter() - start
+    release.set()
+
+    assert results[:2] == [0, 1] and results[3] == 3
+    assert results[2] == {"item": 2, "error": BatchDeadlineExceeded.__name__}
+    assert elapsed < 1
+
+
+def test_llm_batch_predict_fans_out(monkeypatch):
+    """YansnetLLMModel.batch_predict parallélise les appels au prédicteur"""
+    monkeypatch.setattr(settings, "BATCH_FANOUT_CONCURRENCY", 8)
+    monkeypatch.setattr(settings, "ENABLE_PREDICTION_CACHE", False)
+
+    class SlowPredictor:
+        def predict(self, text):
+            time.sleep(0.05)
+            if text == "fail":
+                raise RuntimeError("provider down")
+            return {"prediction": "NORMAL", "confidence": 0.9, "severity": "Aucune", "reasoning": text}
+
+    model = YansnetLLMModel.__new__(YansnetLLMModel)
+    model.predictor = SlowPredictor()
+    model._initialized = True
+
+    texts = [f"texte {i}" for i in range(7)] + ["fail"]
+    start = time.perf_counter()
+    results = model.batch_predict(texts)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.05 * len(texts) / 2
+    assert [r["prediction"] for r in results] == ["NORMAL"] * 7 + ["ERREUR"]
+    assert "reasoning" not in results[0]
+    assert results[-1]["error"] == "provider down"
@@ -93,6 +93,52 @@ def test_model_info():
     assert isinstance(info["tags"], list)
 
 
+def _tiny_model():
+    """Modèle minimal (BERT aléatoire + tokenizer local) sans téléchargement"""
+    import os
+    import torch
+    from transformers import AutoTokenizer, BertConfig, BertForSequenceClassification
+
+    model_dir = os.path.join(
+        os.path.dirname(__file__), "..", "app", "services", "hatecomment_bert", "model"
+    )
+    torch.manual_seed(0)
+    model = HateCommentBertModel.__new__(HateCommentBertModel)
+    model.device = torch.device("cpu")
+    model.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model.model = BertForSequenceClassification(BertConfig(
+        vocab_size=model.tokenizer.vocab_size, hidden_size=32, num_hidden_layers=2,
+        num_attention_heads=2, intermediate_size=64, num_labels=2
+    )).eval()
+    model.is_fine_tuned = False
+    model.inference_mode = "fp32"
+    model.batch_size = 2
+    model.max_length = 64
+    model._init_hate_patterns()
+    model._initialized = True
+    return model
+
+
+def test_batch_predict_matches_single_predict_order():
+    """Le batch par paquets de longueur rend les mêmes résultats, dans l'ordre"""
+    model = _tiny_model()
+    texts = [
+        "Un texte assez long pour être trié après les autres dans son paquet",
+        "",
+        "Court",
+        "I hate all those people",
+        "Bonjour à tous",
+    ]
+
+    batch_results = model.batch_predict(texts)
+    single_results = [model.predict(text) for text in texts]
+
+    assert len(batch_results) == len(texts)
+    assert batch_results[1]["reasoning"] == "Texte vide ou invalide"
+    for batch_result, single_result in zip(batch_results, single_results):
+        assert batch_result["prediction"] == single_result["prediction"]
+        assert batch_result["confidence"] == pytest.approx(single_result["confidence"], abs=1e-5)
+
 if __name__ == "__main__":
     # Tests rapides pour développement
     print("Test d'initialisation...")
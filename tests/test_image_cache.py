@@ -0,0 +1,162 @@
+"""
+Tests pour le cache d'images (hash exact + perceptuel)
+"""
+import asyncio
+import io
+import random
+import pytest
+from typing import Dict, Any, List
+from PIL import Image
+from app.config import settings
+from app.core import image_cache as image_cache_module
+from app.core.image_cache import ImageResultCache, compute_dhash, hamming_distance, predict_images_cached
+
+
+def _pattern_image(seed=0, size=(256, 256)) -> Image.Image:
+    """Image à motif aléatoire (graine fixe), agrandie pour rester lisse"""
+    rng = random.Random(seed)
+    small = Image.frombytes("RGB", (16, 16), bytes(rng.randrange(256) for _ in range(16 * 16 * 3)))
+    return small.resize(size, Image.BILINEAR)
+
+
+def _encode(image: Image.Image, fmt="PNG", **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **kwargs)
+    return buffer.getvalue()
+
+
+class ImageModel:
+    """Modèle image factice qui compte les images analysées"""
+
+    model_name = "censure-nsfw"
+    model_version = "1.0.0-test"
+
+    def __init__(self):
+        self.analyzed = 0
+        self.batch_calls = 0
+
+    def predict(self, image=None, **kwargs) -> Dict[str, Any]:
+        if image.size == (1, 1):
+            raise ValueError("image invalide")
+        self.analyzed += 1
+        return {"prediction": "SAFE", "confidence": 0.99, "severity": "Aucune"}
+
+    def batch_predict(self, images: List[Image.Image] = None, **kwargs) -> List[Dict[str, Any]]:
+        self.batch_calls += 1
+        results = []
+        for image in images:
+            try:
+                results.append(self.predict(image=image))
+            except ValueError as e:
+                results.append({"prediction": "ERREUR", "error": str(e)})
+        return results
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_IMAGE_CACHE", True)
+    monkeypatch.setattr(settings, "IMAGE_CACHE_MODELS", "censure-nsfw")
+    fresh = ImageResultCache(max_entries=16, ttl_s=60, hamming_threshold=4)
+    monkeypatch.setattr(image_cache_module, "image_cache", fresh)
+    return fresh
+
+
+def test_dhash_is_stable_under_reencoding_and_resizing():
+    """Une image ré-encodée en JPEG et redimensionnée garde un dHash proche"""
+    original = _pattern_image()
+    reencoded = Image.open(io.BytesIO(_encode(original.resize((128, 128)), "JPEG", quality=70)))
+    different = _pattern_image(seed=1)
+
+    assert hamming_distance(compute_dhash(original), compute_dhash(reencoded)) <= 4
+    assert hamming_distance(compute_dhash(original), compute_dhash(different)) > 4
+
+
+def test_exact_and_near_duplicate_hits(cache):
+    """Upload identique => hit exact; version ré-encodée => hit perceptuel"""
+    model = ImageModel()
+    original = _pattern_image()
+    original_bytes = _encode(original)
+    resized = original.resize((128, 128))
+    resized_bytes = _encode(resized, "JPEG", quality=80)
+
+    async def run():
+        await predict_images_cached(model, [original_bytes], [original])
+        await predict_images_cached(model, [original_bytes], [original])
+        await predict_images_cached(model, [resized_bytes], [Image.open(io.BytesIO(resized_bytes))])
+
+    asyncio.run(run())
+    stats = cache.get_stats()
+
+    assert model.analyzed == 1
+    assert stats["hits_exact"] == 1
+    assert stats["hits_perceptual"] == 1
+    assert stats["misses"] == 1
+
+
+def test_batch_only_analyzes_new_images(cache):
+    """Dans un batch, seules les images inconnues passent par le modèle"""
+    model = ImageModel()
+    known = _pattern_image()
+    new = _pattern_image(seed=1)
+
+    async def run():
+        await predict_images_cached(model, [_encode(known)], [known])
+        return await predict_images_cached(model, [_encode(new), _encode(known)], [new, known], batch=True)
+
+    results = asyncio.run(run())
+
+    assert model.analyzed == 2
+    assert len(results) == 2
+
+
+def test_batch_with_one_image_keeps_batch_semantics(cache):
+    """Batch d'une seule image invalide => entrée ERREUR (batch_predict), pas d'exception"""
+    model = ImageModel()
+    bad = Image.new("RGB", (1, 1))
+
+    async def run():
+        await predict_images_cached(model, [_encode(bad)], [bad], batch=True)
+        return await predict_images_cached(model, [_encode(bad)], [bad], batch=True)
+
+    results = asyncio.run(run())
+
+    assert model.batch_calls == 2  # Erreur non mise en cache
+    assert results[0]["prediction"] == "ERREUR"
+
+
+def test_error_entries_are_not_cached():
+    """Un résultat avec champ error (on_error de batch_predict) n'est pas mis en cache"""
+    cache = ImageResultCache(max_entries=4, ttl_s=60, hamming_threshold=-1)
+    cache.set("m", "1", "sha0", 0, {"prediction": "SAFE", "confidence": 0.0, "error": "timeout"})
+    cache.set("m", "1", "sha1", 1, {"prediction": "ERREUR"})
+
+    assert cache.get("m", "1", "sha0", 0) is None
+    assert cache.get("m", "1", "sha1", 1) is None
+
+
+def test_cache_is_bounded():
+    """Le nombre d'entrées ne dépasse jamais max_entries"""
+    cache = ImageResultCache(max_entries=2, ttl_s=60, hamming_threshold=-1)
+    for i in range(5):
+        cache.set("m", "1", f"sha{i}", i, {"prediction": "SAFE"})
+
+    stats = cache.get_stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 3
+    assert cache.get("m", "1", "sha0", 0) is None
+    assert cache.get("m", "1", "sha4", 4) == {"prediction": "SAFE"}
+
+
+def test_disabled_cache_always_calls_model(monkeypatch):
+    """Cache désactivé => chaque upload est analysé"""
+    monkeypatch.setattr(settings, "ENABLE_IMAGE_CACHE", False)
+    model = ImageModel()
+    image = _pattern_image()
+
+    async def run():
+        for _ in range(2):
+            await predict_images_cached(model, [_encode(image)], [image])
+
+    asyncio.run(run())
+
+    assert model.analyzed == 2
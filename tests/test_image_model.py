@@ -6,6 +6,7 @@ from PIL import Image
 import io
 from fastapi.testclient import TestClient
 from app.main import app
+from app.config import settings
 from app.services.sensitive_image_caption import SensitiveImageCaptionModel
 
 client = TestClient(app)
@@ -85,6 +86,77 @@ def test_health_check():
         pytest.skip(f"Modèle non disponible: {e}")
 
 
+class _FakeInputs(dict):
+    def to(self, device):
+        return self
+
+
+class _FakeProcessor:
+    """Processeur factice: une 'légende' par image, selon sa couleur"""
+
+    def __call__(self, images, return_tensors=None):
+        return _FakeInputs(pixel_values=[image.getpixel((0, 0)) for image in images])
+
+    def batch_decode(self, generated_ids, skip_special_tokens=True):
+        return ["a knife on a table" if pixel == (255, 0, 0) else "a cat" for pixel in generated_ids]
+
+
+class _FakeCaptionModel:
+    def __init__(self):
+        self.generate_calls = 0
+
+    def generate(self, pixel_values, max_length=50):
+        self.generate_calls += 1
+        return pixel_values
+
+
+class _FakeTranslator:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, batch_size=None):
+        texts = [texts] if isinstance(texts, str) else texts
+        self.calls.append(list(texts))
+        return [{"translation_text": f"FR: {text}"} for text in texts]
+
+
+def test_batch_predict_single_generate_and_translation():
+    """Le batch fait un seul generate et une seule traduction, dans l'ordre"""
+    model = SensitiveImageCaptionModel.__new__(SensitiveImageCaptionModel)
+    model.processor = _FakeProcessor()
+    model.caption_model = _FakeCaptionModel()
+    model.translator = _FakeTranslator()
+    model.device = "cpu"
+    model._initialized = True
+
+    images = [Image.new('RGB', (10, 10), color=c) for c in ('white', 'red', 'white')]
+    results = model.batch_predict(images=images)
+
+    assert model.caption_model.generate_calls == 1
+    assert len(model.translator.calls) == 1
+    assert [r["prediction"] for r in results] == ["SÛR", "SENSIBLE", "SÛR"]
+    assert results[1]["caption_en"] == "a *** on a table"
+    assert results[1]["caption_fr"] == "FR: a *** on a table"
+
+
+def test_batch_predict_chunks_generate_and_translation(monkeypatch):
+    """Légendes et traductions sont découpées par IMAGE_CAPTION_BATCH_SIZE"""
+    monkeypatch.setattr(settings, "IMAGE_CAPTION_BATCH_SIZE", 2)
+    model = SensitiveImageCaptionModel.__new__(SensitiveImageCaptionModel)
+    model.processor = _FakeProcessor()
+    model.caption_model = _FakeCaptionModel()
+    model.translator = _FakeTranslator()
+    model.device = "cpu"
+    model._initialized = True
+
+    images = [Image.new('RGB', (10, 10), color='white') for _ in range(5)]
+    results = model.batch_predict(images=images)
+
+    assert model.caption_model.generate_calls == 3
+    assert [len(call) for call in model.translator.calls] == [2, 2, 1]
+    assert [r["caption_fr"] for r in results] == ["FR: a cat"] * 5
+
+
 # ============================================================================
 # TESTS D'INTÉGRATION AVEC L'API
 # ============================================================================
@@ -0,0 +1,190 @@
+"""
+Tests pour le pool d'exécution des inférences
+"""
+import asyncio
+import threading
+import time
+from app.config import settings, parse_key_value_list
+from app.core.inference_executor import InferenceExecutor, InferenceSaturatedError
+
+
+def test_inference_runs_off_event_loop():
+    """L'appel bloquant ne tourne pas dans le thread de la boucle"""
+    executor = InferenceExecutor()
+
+    async def run():
+        loop_thread = threading.get_ident()
+        worker_thread = await executor.run("model-a", threading.get_ident)
+        return loop_thread, worker_thread
+
+    loop_thread, worker_thread = asyncio.run(run())
+    executor.shutdown()
+
+    assert loop_thread != worker_thread
+
+
+def test_event_loop_stays_responsive():
+    """Une inférence lente ne bloque pas les autres coroutines"""
+    executor = InferenceExecutor()
+
+    async def run():
+        slow = asyncio.ensure_future(executor.run("model-a", time.sleep, 0.3))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        await slow
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    executor.shutdown()
+
+    assert elapsed < 0.2
+
+
+def test_saturated_queue_returns_429(monkeypatch):
+    """File pleine => InferenceSaturatedError (HTTP 429)"""
+    monkeypatch.setattr(settings, "INFERENCE_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "INFERENCE_MAX_QUEUE", 1)
+    executor = InferenceExecutor()
+
+    async def run():
+        return await asyncio.gather(
+            *(executor.run("model-a", time.sleep, 0.1) for _ in range(4)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    executor.shutdown()
+
+    errors = [r for r in results if isinstance(r, InferenceSaturatedError)]
+    assert len(errors) == 2
+    assert errors[0].status_code == 429
+
+
+def test_queue_timeout_returns_429(monkeypatch):
+    """Attente plus longue que le timeout => InferenceSaturatedError"""
+    monkeypatch.setattr(settings, "INFERENCE_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "INFERENCE_QUEUE_TIMEOUT_S", 0.05)
+    executor = InferenceExecutor()
+
+    async def run():
+        return await asyncio.gather(
+            executor.run("model-a", time.sleep, 0.3),
+            executor.run("model-a", time.sleep, 0.01),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    executor.shutdown()
+
+    assert results[0] is None
+    assert isinstance(results[1], InferenceSaturatedError)
+
+
+def test_timeout_racing_acquire_returns_the_slot(monkeypatch):
+    """Slot obtenu au moment du timeout: il est rendu au sémaphore"""
+    monkeypatch.setattr(settings, "INFERENCE_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "INFERENCE_QUEUE_TIMEOUT_S", 0.05)
+    executor = InferenceExecutor()
+
+    async def run():
+        semaphore = executor._get_lane("model-a").get_semaphore()
+        acquire = semaphore.acquire
+
+        async def acquire_during_timeout():
+            await acquire()
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                pass  # L'annulation arrive après l'obtention du slot
+            return True
+
+        semaphore.acquire = acquire_during_timeout
+        try:
+            await executor.run("model-a", time.sleep, 0.01)
+        except InferenceSaturatedError:
+            pass
+        semaphore.acquire = acquire
+        await asyncio.sleep(0.01)  # Fin de l'acquisition annulée
+        return semaphore.locked(), await executor.run("model-a", time.sleep, 0.01)
+
+    locked, result = asyncio.run(run())
+    executor.shutdown()
+
+    assert locked is False
+    assert result is None
+
+
+def test_cancelled_call_keeps_its_slot_until_thread_ends(monkeypatch):
+    """Appelant annulé: le slot reste occupé tant que le thread tourne (file bornée)"""
+    monkeypatch.setattr(settings, "INFERENCE_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(settings, "INFERENCE_MAX_QUEUE", 1)
+    executor = InferenceExecutor()
+
+    async def run():
+        slow = asyncio.ensure_future(executor.run("model-a", time.sleep, 0.3))
+        await asyncio.sleep(0.05)
+        slow.cancel()
+        await asyncio.sleep(0)
+        running_after_cancel = executor.get_stats()["model-a"]["running"]
+
+        results = await asyncio.gather(
+            *(executor.run("model-a", time.sleep, 0.01) for _ in range(3)),
+            return_exceptions=True
+        )
+        return running_after_cancel, results
+
+    running_after_cancel, results = asyncio.run(run())
+    stats = executor.get_stats()["model-a"]
+    executor.shutdown()
+
+    assert running_after_cancel == 1
+    # 1 slot (thread annulé toujours actif) + 1 place en file => 2 rejets sur 3
+    assert sum(isinstance(r, InferenceSaturatedError) for r in results) == 2
+    assert stats["running"] == 0 and stats["completed"] == 2
+
+
+def test_concurrency_overrides(monkeypatch):
+    """Les limites par modèle surchargent la valeur par défaut"""
+    monkeypatch.setattr(settings, "INFERENCE_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(settings, "INFERENCE_CONCURRENCY_OVERRIDES", "yansnet-llm=8, bad")
+    executor = InferenceExecutor()
+
+    assert executor._concurrency_for("yansnet-llm") == 8
+    assert executor._concurrency_for("camembert-depression") == 2
+    assert parse_key_value_list("a=1,b = 2,,c") == {"a": "1", "b": "2"}
+
+
+def test_run_inference_awaits_async_variant(monkeypatch):
+    """Un modèle avec `apredict` est attendu sur la boucle, sous la limite du modèle"""
+    from app.core import inference_executor as module
+
+    monkeypatch.setattr(settings, "INFERENCE_MAX_CONCURRENCY", 1)
+    executor = InferenceExecutor()
+    monkeypatch.setattr(module, "inference_executor", executor)
+
+    class AsyncModel:
+        model_name = "async-model"
+        active = peak = 0
+
+        def predict(self, text):
+            raise AssertionError("la variante synchrone ne doit pas être appelée")
+
+        async def apredict(self, text):
+            AsyncModel.active += 1
+            AsyncModel.peak = max(AsyncModel.peak, AsyncModel.active)
+            await asyncio.sleep(0.01)
+            AsyncModel.active -= 1
+            return {"text": text, "thread": threading.get_ident()}
+
+    async def run():
+        model = AsyncModel()
+        results = await asyncio.gather(*(module.run_inference(model, "predict", text=t) for t in "abc"))
+        return threading.get_ident(), results
+
+    loop_thread, results = asyncio.run(run())
+
+    assert [r["text"] for r in results] == ["a", "b", "c"]
+    assert all(r["thread"] == loop_thread for r in results)
+    assert AsyncModel.peak == 1
+    assert executor.get_stats()["async-model"]["completed"] == 3
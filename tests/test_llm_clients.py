@@ -0,0 +1,87 @@
+"""
+Tests pour le registre de clients LLM partagés et le provider mock
+"""
+import asyncio
+import pytest
+from app.config import settings
+from app.core.llm_clients import LLMClientRegistry, MockLLMClient
+from app.services.yansnet_llm.llm_predictor import MockPredictor, get_llm_predictor
+from app.services.yansnet_llm.yansnet_llm_model import YansnetLLMModel
+from app.services.yansnet_content_generator.yansnet_content_generator_model import YansnetContentGeneratorModel
+
+
+@pytest.fixture(autouse=True)
+def fast_mock(monkeypatch):
+    monkeypatch.setattr(settings, "MOCK_LLM_LATENCY_MS", 0)
+    monkeypatch.setattr(settings, "MOCK_LLM_TOKEN_DELAY_MS", 0)
+
+
+def test_sync_client_is_reused_with_configured_pool(monkeypatch):
+    """Un seul client OpenAI par provider, pool et retries issus de la config"""
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "LLM_CLIENT_MAX_RETRIES", 5)
+    registry = LLMClientRegistry()
+
+    client = registry.get("gpt")
+
+    assert registry.get("GPT") is client
+    assert client.max_retries == 5
+    assert client.timeout.connect == settings.LLM_CLIENT_CONNECT_TIMEOUT_S
+    asyncio.run(registry.aclose())
+    assert registry.get("gpt") is not client
+
+
+def test_async_clients_are_per_event_loop(monkeypatch):
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "sk-ant-test")
+    registry = LLMClientRegistry()
+
+    async def get_twice():
+        first = registry.get_async("claude")
+        assert registry.get_async("claude") is first
+        await registry.aclose()
+        return first
+
+    assert asyncio.run(get_twice()) is not asyncio.run(get_twice())
+
+
+def test_missing_key_and_unknown_provider(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "")
+    registry = LLMClientRegistry()
+
+    with pytest.raises(ValueError, match="OPENAI_API_KEY"):
+        registry.get("gpt")
+    with pytest.raises(ValueError, match="non supporté"):
+        registry.get("inconnu")
+
+
+def test_mock_predictor_single_and_packed(monkeypatch):
+    """Chaîne complète hors ligne: prédiction unitaire, async et batch packé"""
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(settings, "LLM_PACK_SIZE", 2)
+    monkeypatch.setattr(settings, "ENABLE_PREDICTION_CACHE", False)
+    predictor = get_llm_predictor()
+    assert isinstance(predictor, MockPredictor)
+
+    assert predictor.predict("Je me sens vide et inutile")["prediction"] == "DÉPRESSION"
+    assert asyncio.run(predictor.apredict("Belle journée au campus"))["prediction"] == "NORMAL"
+
+    model = YansnetLLMModel.__new__(YansnetLLMModel)
+    model.predictor = predictor
+    model._initialized = True
+    results = model.batch_predict(["Super cours", "Je suis un fardeau", "On mange ?"])
+
+    assert [r["prediction"] for r in results] == ["NORMAL", "DÉPRESSION", "NORMAL"]
+
+
+def test_mock_generator_calls_and_streams(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "mock")
+    model = YansnetContentGeneratorModel.__new__(YansnetContentGeneratorModel)
+    model._initialized = True
+
+    text = model._call_llm("système", "Écris un post")
+
+    async def stream():
+        return [token async for token in model._stream_llm("système", "Écris un post", kind="post")]
+
+    assert "".join(asyncio.run(stream())) == text
+    assert MockLLMClient()._text("a") == MockLLMClient()._text("a")
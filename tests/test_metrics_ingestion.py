@@ -0,0 +1,167 @@
+"""
+Tests pour l'ingestion par lots des métriques PostgreSQL
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+import pytest
+from app.config import settings
+from app.core.metrics import ErrorMetric, PredictionMetric, record_prediction_metric
+from app.core.metrics.ingestion import MetricsIngestion, ingestion_events_counter
+
+
+class FakeConnection:
+    def __init__(self, copy_fails=False):
+        self.copies = []
+        self.inserts = []
+        self.copy_fails = copy_fails
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.copy_fails:
+            raise RuntimeError("COPY non supporté")
+        self.copies.append((table, list(records), columns))
+
+    async def executemany(self, query, records):
+        self.inserts.append((query, list(records)))
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class FakeDatabase:
+    def __init__(self, conn):
+        self.conn = conn
+        self.acquired = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        self.acquired += 1
+        yield self.conn
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    conn = FakeConnection()
+    monkeypatch.setattr("app.core.metrics.ingestion.db", FakeDatabase(conn))
+    monkeypatch.setattr(settings, "METRICS_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "METRICS_FLUSH_INTERVAL_S", 60.0)
+    monkeypatch.setattr(settings, "METRICS_BUFFER_SIZE", 100)
+    monkeypatch.setattr(settings, "METRICS_WRITE_METHOD", "copy")
+    return conn
+
+
+def prediction(i=0, model="camembert-depression"):
+    return PredictionMetric(
+        model_name=model, provider="camembert", endpoint="/detect",
+        prediction="NORMAL", confidence=0.9, latency_ms=float(i)
+    )
+
+
+def test_batch_size_triggers_a_single_copy(conn):
+    ingestion = MetricsIngestion()
+
+    async def scenario():
+        await ingestion.start()
+        for i in range(3):
+            ingestion.enqueue_prediction(prediction(i))
+        for _ in range(50):
+            if conn.copies:
+                break
+            await asyncio.sleep(0.01)
+        await ingestion.stop()
+
+    asyncio.run(scenario())
+
+    # Vidé sans attendre l'intervalle de 60s, en un seul COPY
+    assert len(conn.copies) == 1
+    table, records, columns = conn.copies[0]
+    assert table == "model_predictions"
+    assert [record[columns.index("latency_ms")] for record in records] == [0.0, 1.0, 2.0]
+    assert records[0][columns.index("created_at")] is not None
+
+
+def test_full_buffer_drops_oldest(conn, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_BUFFER_SIZE", 2)
+    monkeypatch.setattr(settings, "METRICS_BATCH_SIZE", 10)
+    ingestion = MetricsIngestion()
+    before = ingestion_events_counter.get(table="model_predictions", outcome="dropped")
+
+    for i in range(5):
+        ingestion.enqueue_prediction(prediction(i))
+    asyncio.run(ingestion.flush())
+
+    latencies = [record[8] for record in conn.copies[0][1]]
+    assert latencies == [3.0, 4.0]
+    assert ingestion_events_counter.get(table="model_predictions", outcome="dropped") == before + 3
+
+
+def test_copy_failure_falls_back_to_executemany(conn):
+    conn.copy_fails = True
+    ingestion = MetricsIngestion()
+    ingestion.enqueue_prediction(prediction(1))
+
+    asyncio.run(ingestion.flush())
+
+    query, records = conn.inserts[0]
+    assert query.startswith("INSERT INTO model_predictions (model_name,")
+    assert "$13" in query
+    assert len(records) == 1
+
+
+def test_stop_flushes_and_checks_alerts_once_per_model(conn, monkeypatch):
+    checked = []
+
+    async def check(self, model_name, provider):
+        checked.append((model_name, provider))
+
+    monkeypatch.setattr("app.core.metrics.metrics_service.MetricsService._check_error_rate_alert", check)
+    ingestion = MetricsIngestion()
+
+    async def scenario():
+        await ingestion.start()
+        for _ in range(2):
+            ingestion.enqueue_error(ErrorMetric(model_name="qwen-depression", provider="qwen", error_type="Timeout"))
+        await ingestion.stop()
+
+    asyncio.run(scenario())
+
+    assert [table for table, _, _ in conn.copies] == ["model_errors"]
+    assert len(conn.copies[0][1]) == 2
+    assert checked == [("qwen-depression", "qwen")]
+    assert ingestion.pending() == 0
+
+
+def test_sync_helper_enqueues_from_worker_thread(conn, monkeypatch):
+    ingestion = MetricsIngestion()
+    monkeypatch.setattr("app.core.metrics.ingestion.metrics_ingestion", ingestion)
+    monkeypatch.setattr(settings, "ENABLE_METRICS", True)
+
+    worker = threading.Thread(target=record_prediction_metric, kwargs=dict(
+        model_name="camembert-depression", provider="camembert", endpoint="/detect",
+        prediction="NORMAL", confidence=0.9, severity="Aucune", latency_ms=12.0
+    ))
+    worker.start()
+    worker.join()
+
+    assert ingestion.pending() == 1
+    assert asyncio.run(ingestion.flush()) == 1
+
+
+def test_without_database_only_in_memory_metrics_are_fed(conn):
+    """Connexion PostgreSQL en échec: rien n'est mis en tampon ni écrit"""
+    from app.core.metrics.error_rate import error_rate_monitor
+    from app.core.metrics.prometheus import predictions_counter
+
+    ingestion = MetricsIngestion()
+    ingestion.disable_persistence()
+    labels = dict(model="no-db-model", provider="camembert", endpoint="/detect", fallback="false")
+    before = predictions_counter.get(**labels)
+
+    ingestion.enqueue_prediction(prediction(model="no-db-model"))
+    ingestion.enqueue_error(ErrorMetric(model_name="no-db-model", provider="camembert", error_type="Timeout"))
+
+    assert ingestion.pending() == 0
+    assert asyncio.run(ingestion.flush()) == 0 and not conn.copies
+    assert predictions_counter.get(**labels) == before + 1
+    assert error_rate_monitor.rate("no-db-model", "camembert")[:2] == (1, 2)
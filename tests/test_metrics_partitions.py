@@ -0,0 +1,119 @@
+"""
+Tests pour les partitions temporelles et la rétention des métriques
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.config import settings
+from app.core.metrics.partitions import PartitionManager, partition_name, partition_range
+
+NOW = datetime(2026, 10, 17, 12, 30, tzinfo=timezone.utc)
+
+
+class FakeConnection:
+    def __init__(self, partitions=None, partitioned=True, lock=True):
+        self.partitions = partitions or {}
+        self.partitioned = partitioned
+        self.lock = lock
+        self.executed = []
+
+    async def fetchval(self, query, *args):
+        if "pg_try_advisory_lock" in query:
+            return self.lock
+        return self.partitioned
+
+    async def fetch(self, query, *args):
+        return [{"relname": name} for name in self.partitions.get(args[0], [])]
+
+    async def execute(self, query, *args):
+        self.executed.append((" ".join(query.split()), args))
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    def statements(self, prefix):
+        return [query for query, _ in self.executed if query.startswith(prefix)]
+
+
+class FakeDatabase:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+@pytest.fixture(autouse=True)
+def partition_settings(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_PARTITION_INTERVAL", "day")
+    monkeypatch.setattr(settings, "METRICS_PARTITIONS_AHEAD", 2)
+    monkeypatch.setattr(settings, "METRICS_RETENTION_DAYS", 30)
+    monkeypatch.setattr(settings, "METRICS_ROLLUP_RETENTION_DAYS", 400)
+    monkeypatch.setattr(settings, "METRICS_RETENTION_ACTION", "drop")
+
+
+def test_partition_names_and_ranges():
+    start = datetime(2026, 10, 17, 9, tzinfo=timezone.utc)
+
+    assert partition_name("model_errors", start, timedelta(days=1)) == "model_errors_p20261017"
+    assert partition_name("model_errors", start, timedelta(hours=1)) == "model_errors_p2026101709"
+    assert partition_range("model_errors_p2026101709") == (start, start + timedelta(hours=1))
+    assert partition_range("model_errors_p20261017")[1] == datetime(2026, 10, 18, tzinfo=timezone.utc)
+    assert partition_range("model_errors_default") is None
+
+
+def test_creates_partitions_ahead_moving_default_rows():
+    conn = FakeConnection({"model_predictions": ["model_predictions_default", "model_predictions_p20261017"]})
+
+    result = asyncio.run(PartitionManager().maintain_table(conn, "model_predictions", NOW))
+
+    assert result["created"] == ["model_predictions_p20261018", "model_predictions_p20261019"]
+    moves = [args for query, args in conn.executed if query.startswith("WITH moved")]
+    assert moves[0] == (datetime(2026, 10, 18, tzinfo=timezone.utc), datetime(2026, 10, 19, tzinfo=timezone.utc))
+    attach = conn.statements("ALTER TABLE model_predictions ATTACH PARTITION model_predictions_p20261018")
+    assert "FROM ('2026-10-18T00:00:00+00:00') TO ('2026-10-19T00:00:00+00:00')" in attach[0]
+
+
+def test_hourly_interval_and_rollups_stay_daily(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_PARTITION_INTERVAL", "hour")
+    conn = FakeConnection()
+    manager = PartitionManager()
+
+    raw = asyncio.run(manager.maintain_table(conn, "model_errors", NOW))
+    rollups = asyncio.run(manager.maintain_table(conn, "metrics_rollup_minute", NOW))
+
+    assert raw["created"] == ["model_errors_p2026101712", "model_errors_p2026101713", "model_errors_p2026101714"]
+    assert rollups["created"][0] == "metrics_rollup_minute_p20261017"
+
+
+def test_expired_partitions_dropped_or_archived(monkeypatch):
+    old = ["model_errors_p20260901", "model_errors_p20261010"]
+    conn = FakeConnection({"model_errors": old + ["model_errors_default"]})
+    monkeypatch.setattr(settings, "METRICS_PARTITIONS_AHEAD", 0)
+
+    dropped = asyncio.run(PartitionManager().maintain_table(conn, "model_errors", NOW))
+
+    assert dropped["expired"] == ["model_errors_p20260901"]
+    assert conn.statements("DROP TABLE") == ["DROP TABLE model_errors_p20260901"]
+
+    monkeypatch.setattr(settings, "METRICS_RETENTION_ACTION", "archive")
+    conn = FakeConnection({"model_errors": old})
+    asyncio.run(PartitionManager().maintain_table(conn, "model_errors", NOW))
+
+    assert conn.statements("ALTER TABLE model_errors DETACH") == ["ALTER TABLE model_errors DETACH PARTITION model_errors_p20260901"]
+    assert conn.statements("ALTER TABLE model_errors_p20260901 SET SCHEMA metrics_archive")
+    assert not conn.statements("DROP TABLE") and not conn.statements("DELETE")
+
+
+def test_skips_unpartitioned_tables_and_other_replicas(monkeypatch):
+    legacy = FakeConnection(partitioned=False)
+    result = asyncio.run(PartitionManager().maintain_table(legacy, "throughput_metrics", NOW))
+    assert result == {"created": [], "expired": []} and not legacy.executed
+
+    busy = FakeConnection(lock=False)
+    monkeypatch.setattr("app.core.metrics.partitions.db", FakeDatabase(busy))
+    assert asyncio.run(PartitionManager().run_maintenance(NOW)) == {}
+    assert not busy.executed
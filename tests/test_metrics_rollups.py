@@ -0,0 +1,150 @@
+"""
+Tests pour les rollups par minute et les sketches de latence
+"""
+import asyncio
+import json
+import random
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from app.core.metrics import MetricsService, PredictionMetric
+from app.core.metrics.ingestion import MetricsIngestion, TABLE_COLUMNS, error_record, prediction_record
+from app.core.metrics.metrics_models import ErrorMetric
+from app.core.metrics.rollups import ROLLUP_UPSERT, build_rollups
+from app.core.metrics.sketch import DDSketch, SKETCH_RELATIVE_ACCURACY
+
+AT = datetime(2026, 10, 17, 12, 30, 15, tzinfo=timezone.utc)
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+def test_sketch_quantiles_within_relative_accuracy_after_merge():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(4, 1) for _ in range(5000)]
+    left, right = DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        (left if i % 2 else right).add(value)
+
+    merged = DDSketch.from_dict(json.dumps(left.to_dict())).merge(right)
+
+    assert merged.count == len(values)
+    for q in (0.5, 0.95, 0.99):
+        exact = exact_quantile(values, q)
+        assert abs(merged.quantile(q) - exact) / exact <= SKETCH_RELATIVE_ACCURACY + 1e-9
+
+
+def test_sketch_zero_bin_and_empty():
+    sketch = DDSketch()
+    assert sketch.quantile(0.5) is None
+    sketch.add(0.0, count=3)
+    sketch.add(10.0)
+    assert sketch.to_dict()["z"] == 3
+    assert sketch.quantile(0.5) == 0.0
+    assert abs(sketch.quantile(1.0) - 10.0) <= 10.0 * SKETCH_RELATIVE_ACCURACY
+
+
+def test_build_rollups_groups_by_minute_and_endpoint():
+    def metric(latency, endpoint="/detect", minute=30, prediction="DÉPRESSION"):
+        return PredictionMetric(
+            model_name="qwen-depression", provider="qwen", endpoint=endpoint,
+            prediction=prediction, confidence=0.5, latency_ms=latency,
+            created_at=AT.replace(minute=minute)
+        )
+
+    records = [prediction_record(m) for m in (
+        metric(100.0), metric(300.0, prediction="NORMAL"), metric(50.0, endpoint="/batch"), metric(70.0, minute=31)
+    )]
+    rollups = {r.key: r for r in build_rollups("model_predictions", TABLE_COLUMNS["model_predictions"], records)}
+
+    main = rollups[(AT.replace(second=0), "qwen-depression", "qwen", "/detect")]
+    assert len(rollups) == 3
+    assert (main.request_count, main.depression_count, main.normal_count) == (2, 1, 1)
+    assert (main.latency_sum_ms, main.latency_min_ms, main.latency_max_ms) == (400.0, 100.0, 300.0)
+    assert main.sketch.count == 2
+
+    errors = build_rollups("model_errors", TABLE_COLUMNS["model_errors"], [error_record(ErrorMetric(
+        model_name="qwen-depression", provider="qwen", error_type="Timeout", created_at=AT
+    ))])
+    assert errors[0].key[3] == "" and errors[0].error_count == 1 and errors[0].request_count == 0
+
+
+def test_flush_upserts_rollups_in_the_batch_transaction(monkeypatch):
+    events = []
+
+    class Connection:
+        async def copy_records_to_table(self, table, records, columns):
+            events.append(("copy", table))
+
+        async def executemany(self, query, records):
+            events.append(("rollup" if query == ROLLUP_UPSERT else "insert", list(records)))
+
+        @asynccontextmanager
+        async def transaction(self):
+            events.append("begin")
+            yield
+            events.append("commit")
+
+    class Database:
+        @asynccontextmanager
+        async def acquire(self):
+            yield Connection()
+
+    monkeypatch.setattr("app.core.metrics.ingestion.db", Database())
+    ingestion = MetricsIngestion()
+    for latency in (10.0, 20.0):
+        ingestion.enqueue_prediction(PredictionMetric(
+            model_name="camembert-depression", provider="camembert", endpoint="/detect",
+            prediction="NORMAL", latency_ms=latency, created_at=AT
+        ))
+
+    asyncio.run(ingestion.flush())
+
+    # Transaction du lot, savepoint du COPY, puis un seul rollup fusionné
+    assert [e if isinstance(e, str) else e[0] for e in events] == [
+        "begin", "begin", "copy", "commit", "rollup", "commit"
+    ]
+    (rollup,) = events[4][1]
+    assert rollup[4] == 2 and rollup[9] == 30.0
+    assert json.loads(rollup[14])
+
+
+def test_read_apis_merge_rollups_without_raw_scans(monkeypatch):
+    sketch = DDSketch()
+    for latency in range(1, 101):
+        sketch.add(float(latency))
+    row = {
+        "model_name": "qwen-depression", "provider": "qwen",
+        "total_requests": 100, "error_count": 5, "fallback_count": 10,
+        "depression_count": 40, "normal_count": 60, "latency_sum_ms": 5050.0,
+        "min_latency_ms": 1.0, "max_latency_ms": 100.0,
+        "confidence_sum": 80.0, "confidence_count": 100,
+        "latency_sketch": json.dumps(sketch.to_dict())
+    }
+    queries, params = [], []
+
+    class Database:
+        async def fetch(self, query, *args):
+            queries.append(query)
+            params.append(args)
+            return [row]
+
+        async def fetchval(self, query, *args):
+            queries.append(query)
+            return 2
+
+    monkeypatch.setattr("app.core.metrics.metrics_service.db", Database())
+    summary = asyncio.run(MetricsService().get_summary(hours=6))
+
+    (stats,) = summary.models
+    assert (summary.total_predictions, summary.total_errors, summary.active_alerts) == (100, 5, 2)
+    assert stats.avg_latency_ms == 50.5 and stats.error_rate == 5.0
+    assert abs(stats.p95_latency_ms - 95.0) <= 95.0 * SKETCH_RELATIVE_ACCURACY
+    assert stats.p99_latency_ms <= 100.0
+    assert stats.avg_confidence == 0.8
+    assert len(queries) == 2  # Rollups + alertes actives
+    assert "metrics_rollup_minute" in queries[0] and "INTERVAL" not in queries[0]
+    since = params[0][0]  # Borne constante: élagage des partitions à la planification
+    assert since.second == 0 and timedelta(hours=5, minutes=59) < datetime.now(timezone.utc) - since <= timedelta(hours=6, minutes=1)
+    assert not any("PERCENTILE_CONT" in query or "model_predictions" in query for query in queries)
@@ -0,0 +1,177 @@
+"""
+Tests pour le micro-batching dynamique
+"""
+import asyncio
+import time
+from typing import Dict, Any, List
+from app.core.base_model import BaseMLModel
+from app.core.micro_batcher import MicroBatcher
+
+
+class CountingModel(BaseMLModel):
+    """Modèle factice qui enregistre chaque appel batch_predict"""
+
+    def __init__(self):
+        self.batch_calls: List[List[str]] = []
+
+    @property
+    def model_name(self) -> str:
+        return "counting-model"
+
+    @property
+    def model_version(self) -> str:
+        return "1.0.0-test"
+
+    @property
+    def author(self) -> str:
+        return "Test Suite"
+
+    def predict(self, text: str, **kwargs) -> Dict[str, Any]:
+        return self.batch_predict(texts=[text], **kwargs)[0]
+
+    def batch_predict(self, texts: List[str], include_reasoning: bool = False, **kwargs) -> List[Dict[str, Any]]:
+        self.batch_calls.append(list(texts))
+        return [
+            {
+                "prediction": text.upper(),
+                "confidence": 1.0,
+                "severity": "Aucune",
+                "reasoning": "ok" if include_reasoning else None
+            }
+            for text in texts
+        ]
+
+
+def test_concurrent_requests_are_coalesced():
+    """Les requêtes concurrentes partagent un seul appel batch_predict"""
+    model = CountingModel()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        texts = [f"texte {i}" for i in range(5)]
+        return texts, await asyncio.gather(*(batcher.predict(text=t) for t in texts))
+
+    texts, results = asyncio.run(run())
+
+    assert len(model.batch_calls) == 1
+    assert [r["prediction"] for r in results] == [t.upper() for t in texts]
+
+
+def test_max_batch_size_is_respected():
+    """Un batch ne dépasse jamais max_batch_size"""
+    model = CountingModel()
+    batcher = MicroBatcher(model, max_batch_size=3, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(batcher.predict(text=str(i)) for i in range(7)))
+
+    results = asyncio.run(run())
+
+    assert len(results) == 7
+    assert all(len(call) <= 3 for call in model.batch_calls)
+    assert sum(len(call) for call in model.batch_calls) == 7
+
+
+def test_different_options_are_not_mixed():
+    """include_reasoning différent => batchs séparés"""
+    model = CountingModel()
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.predict(text="a", include_reasoning=True),
+            batcher.predict(text="b", include_reasoning=False),
+            batcher.predict(text="c", include_reasoning=True),
+        )
+
+    results = asyncio.run(run())
+
+    assert len(model.batch_calls) == 2
+    assert results[0]["reasoning"] == "ok"
+    assert results[1]["reasoning"] is None
+
+
+def test_batch_error_is_propagated_to_callers():
+    """Une erreur de batch_predict est remontée à chaque appelant"""
+    model = CountingModel()
+    model.batch_predict = lambda texts, **kwargs: (_ for _ in ()).throw(RuntimeError("boom"))
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.predict(text="a"),
+            batcher.predict(text="b"),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_item_error_result_is_raised_to_caller():
+    """Un résultat {"error": ...} de batch_predict devient une exception (fallback possible)"""
+    model = CountingModel()
+    model.batch_predict = lambda texts, **kwargs: [
+        {"prediction": "NORMAL", "confidence": 0.0, "error": "Ollama indisponible"} if t == "b"
+        else {"prediction": t.upper(), "confidence": 1.0}
+        for t in texts
+    ]
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.predict(text="a"),
+            batcher.predict(text="b"),
+            return_exceptions=True
+        )
+
+    ok, failed = asyncio.run(run())
+
+    assert ok["prediction"] == "A"
+    assert isinstance(failed, RuntimeError) and "Ollama indisponible" in str(failed)
+
+
+def test_item_erreur_result_is_raised_to_caller():
+    """Un résultat prediction "ERREUR" sans champ error (prédicteurs LLM) devient une exception"""
+    model = CountingModel()
+    model.batch_predict = lambda texts, **kwargs: [
+        {"prediction": "ERREUR", "confidence": 0.0, "reasoning": "Erreur: timeout"} if t == "b"
+        else {"prediction": t.upper(), "confidence": 1.0}
+        for t in texts
+    ]
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=5)
+
+    async def run():
+        return await asyncio.gather(
+            batcher.predict(text="a"),
+            batcher.predict(text="b"),
+            return_exceptions=True
+        )
+
+    ok, failed = asyncio.run(run())
+
+    assert ok["prediction"] == "A"
+    assert isinstance(failed, RuntimeError) and "timeout" in str(failed)
+
+
+def test_close_waits_for_in_flight_batches():
+    """Les batchs en cours sont référencés et terminés avant l'arrêt du worker"""
+    model = CountingModel()
+    batch_predict = model.batch_predict
+    model.batch_predict = lambda texts, **kwargs: (time.sleep(0.1), batch_predict(texts, **kwargs))[1]
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=5)
+
+    async def run():
+        pending = asyncio.ensure_future(batcher.predict(text="a"))
+        await asyncio.sleep(0.03)  # Batch dispatché, inférence en cours
+        in_flight = len(batcher._tasks)
+        batcher.close()
+        await batcher._worker
+        return in_flight, pending.done(), len(batcher._tasks), await pending
+
+    in_flight, done_at_close, remaining, result = asyncio.run(run())
+
+    assert in_flight == 1
+    assert done_at_close and remaining == 0
+    assert result["prediction"] == "A"
@@ -0,0 +1,242 @@
+"""
+Tests pour le chargement à la demande et l'éviction du registre de modèles
+"""
+import asyncio
+import time
+import pytest
+from typing import Dict, Any
+from app.config import settings
+from app.core.base_model import BaseMLModel
+from app.core.model_registry import EnhancedModelRegistry
+
+
+class FakeModel(BaseMLModel):
+    """Modèle factice dont le nom est fixé à la construction"""
+
+    def __init__(self, name: str):
+        self._name = name
+
+    @property
+    def model_name(self) -> str:
+        return self._name
+
+    @property
+    def model_version(self) -> str:
+        return "1.0.0-test"
+
+    @property
+    def author(self) -> str:
+        return "Test Suite"
+
+    def predict(self, text: str, **kwargs) -> Dict[str, Any]:
+        return {"prediction": "NORMAL", "confidence": 1.0, "severity": "Aucune"}
+
+
+class CountingFactory:
+    """Factory qui compte ses appels (et peut être lente ou échouer)"""
+
+    def __init__(self, name: str, delay_s: float = 0.0, fail: bool = False):
+        self.name = name
+        self.delay_s = delay_s
+        self.fail = fail
+        self.calls = 0
+
+    def __call__(self) -> FakeModel:
+        self.calls += 1
+        time.sleep(self.delay_s)
+        if self.fail:
+            raise RuntimeError("poids introuvables")
+        return FakeModel(self.name)
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    """Registre vierge (le singleton global est restauré après le test)"""
+    monkeypatch.setattr(EnhancedModelRegistry, "_instance", None)
+    return EnhancedModelRegistry()
+
+
+def test_factory_is_not_called_until_first_use(fresh_registry):
+    """Enregistrer par factory ne charge rien; le premier get charge"""
+    factory = CountingFactory("lazy-model")
+    fresh_registry.register_factory("lazy-model", factory)
+
+    assert factory.calls == 0
+    assert fresh_registry.get_load_status()["lazy-model"]["state"] == "unloaded"
+    assert "lazy-model" in fresh_registry.list_models()
+
+    model = fresh_registry.get("lazy-model")
+
+    assert model.model_name == "lazy-model"
+    assert factory.calls == 1
+    assert fresh_registry.get_load_status()["lazy-model"]["state"] == "loaded"
+
+
+def test_concurrent_first_requests_load_once(fresh_registry):
+    """Requêtes concurrentes pendant le chargement => un seul appel à la factory"""
+    factory = CountingFactory("slow-model", delay_s=0.2)
+    fresh_registry.register_factory("slow-model", factory)
+
+    async def run():
+        return await asyncio.gather(*(fresh_registry.aget("slow-model") for _ in range(8)))
+
+    models = asyncio.run(run())
+
+    assert factory.calls == 1
+    assert all(model is models[0] for model in models)
+
+
+def test_async_load_does_not_block_event_loop(fresh_registry):
+    """Un chargement lent via aget laisse la boucle asyncio répondre"""
+    fresh_registry.register_factory("slow-model", CountingFactory("slow-model", delay_s=0.3))
+
+    async def run():
+        loading = asyncio.ensure_future(fresh_registry.aget("slow-model"))
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        await loading
+        return elapsed
+
+    assert asyncio.run(run()) < 0.2
+
+
+def test_idle_model_is_evicted_and_reloaded(fresh_registry, monkeypatch):
+    """Un modèle inactif est déchargé puis rechargé au prochain appel"""
+    monkeypatch.setattr(settings, "MODEL_IDLE_TIMEOUT_S", 60)
+    monkeypatch.setattr(settings, "MODEL_MEMORY_LIMIT_MB", 0)
+    factory = CountingFactory("idle-model")
+    fresh_registry.register_factory("idle-model", factory)
+    unloaded = []
+    fresh_registry.add_unload_listener(unloaded.append)
+    fresh_registry.add_unload_listener(unloaded.append)  # Ex: second startup
+
+    fresh_registry.get("idle-model")
+    assert fresh_registry.evict_idle_models() == []
+
+    fresh_registry._slots["idle-model"].last_used -= 120
+    assert fresh_registry.evict_idle_models() == ["idle-model"]
+    assert unloaded == ["idle-model"]
+    assert fresh_registry.get_load_status()["idle-model"]["state"] == "unloaded"
+
+    fresh_registry.get("idle-model")
+    assert factory.calls == 2
+
+
+def test_memory_pressure_evicts_only_enough_models(fresh_registry, monkeypatch):
+    """RSS non relu après déchargement: on s'arrête quand les tailles couvrent le dépassement"""
+    monkeypatch.setattr(settings, "MODEL_IDLE_TIMEOUT_S", 0)
+    monkeypatch.setattr(settings, "MODEL_MEMORY_LIMIT_MB", 1000)
+    monkeypatch.setattr("app.core.model_registry.get_rss_mb", lambda: 1150.0)
+    names = ["oldest", "older", "recent", "newest"]
+    for age, name in enumerate(names):
+        fresh_registry.register_factory(name, CountingFactory(name))
+        fresh_registry.get(name)
+        slot = fresh_registry._slots[name]
+        slot.rss_delta_mb = 100.0
+        slot.last_used = age
+
+    assert fresh_registry.evict_idle_models() == ["oldest", "older"]
+
+    fresh_registry._slots["recent"].rss_delta_mb = None  # Taille inconnue: un seul par passe
+    assert fresh_registry.evict_idle_models() == ["recent"]
+
+
+def test_failed_primary_detection_falls_back(fresh_registry):
+    """Si le modèle de détection primaire ne charge pas, le suivant est utilisé"""
+    fresh_registry.register_factory("primary", CountingFactory("primary", fail=True), detection_priority=10)
+    fresh_registry.register_factory("secondary", CountingFactory("secondary"), detection_priority=5)
+
+    model = fresh_registry.get_detection_model()
+
+    assert model.model_name == "secondary"
+    status = fresh_registry.get_load_status()
+    assert status["primary"]["state"] == "failed"
+    assert "poids introuvables" in status["primary"]["error"]
+
+
+def test_load_many_loads_models_concurrently(fresh_registry):
+    """Des chargements indépendants se recouvrent au lieu de s'additionner"""
+    names = [f"model-{i}" for i in range(4)]
+    for name in names:
+        fresh_registry.register_factory(name, CountingFactory(name, delay_s=0.2))
+
+    start = time.perf_counter()
+    results = fresh_registry.load_many(names, max_workers=4)
+    elapsed = time.perf_counter() - start
+
+    assert results == {name: True for name in names}
+    assert elapsed < 0.6
+    # Chargements recouverts: le delta de RSS n'est pas attribuable à un modèle
+    status = fresh_registry.get_load_status()
+    assert all(status[name]["rss_delta_mb"] is None for name in names)
+
+
+def test_weight_size_is_reported_despite_concurrent_loads(fresh_registry):
+    """Taille des poids déterministe, même quand les chargements se recouvrent"""
+    torch = pytest.importorskip("torch")
+
+    class TorchModel(FakeModel):
+        def __init__(self, name):
+            super().__init__(name)
+            time.sleep(0.1)  # Chargements recouverts
+            self.model = torch.nn.Linear(512, 512)  # (512*512 + 512) * 4 octets
+
+    names = ["torch-a", "torch-b"]
+    for name in names:
+        fresh_registry.register_factory(name, lambda name=name: TorchModel(name))
+
+    fresh_registry.load_many(names, max_workers=2)
+    status = fresh_registry.get_load_status()
+
+    assert all(status[name]["memory_mb"] == round((512 * 512 + 512) * 4 / 1024 ** 2, 1) for name in names)
+
+
+def test_serialized_load_reports_rss_delta(fresh_registry):
+    """Un chargement seul mesure son delta de RSS"""
+    fresh_registry.register_factory("solo", CountingFactory("solo"))
+
+    fresh_registry.load_many(["solo"], max_workers=4)
+
+    assert fresh_registry.get_load_status()["solo"]["rss_delta_mb"] is not None
+
+
+def test_readiness_reports_loaded_pending_and_failed(fresh_registry):
+    """get_readiness classe les modèles requis sans déclencher de chargement"""
+    fresh_registry.register_factory("ok", CountingFactory("ok"))
+    fresh_registry.register_factory("broken", CountingFactory("broken", fail=True))
+    fresh_registry.register_factory("later", CountingFactory("later"))
+    fresh_registry.load_many(["ok", "broken"], max_workers=2)
+
+    readiness = fresh_registry.get_readiness(["ok", "broken", "later", "missing"])
+
+    assert readiness == {
+        "loaded": ["ok"],
+        "evicted": [],
+        "pending": ["later"],
+        "failed": ["broken"],
+        "unknown": ["missing"]
+    }
+
+
+def test_evicted_required_model_keeps_replica_ready(fresh_registry, monkeypatch):
+    """Un modèle requis déchargé par l'éviction ne rend pas /ready indisponible"""
+    from fastapi.testclient import TestClient
+    from app import main
+
+    monkeypatch.setattr(settings, "MODEL_IDLE_TIMEOUT_S", 0.01)
+    monkeypatch.setattr(settings, "MODEL_MEMORY_LIMIT_MB", 0)
+    monkeypatch.setattr(main, "registry", fresh_registry)
+    monkeypatch.setattr(main, "_required_models", ["required"])
+    fresh_registry.register_factory("required", CountingFactory("required"))
+    client = TestClient(main.app)
+
+    assert client.get("/ready").status_code == 503  # Jamais chargé
+    fresh_registry.load("required")
+    time.sleep(0.02)
+    assert fresh_registry.evict_idle_models() == ["required"]
+
+    response = client.get("/ready")
+
+    assert response.status_code == 200
+    assert response.json()["evicted"] == ["required"]
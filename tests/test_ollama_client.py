@@ -0,0 +1,114 @@
+"""
+Tests pour le client Ollama partagé (retries, concurrence par modèle, sync/async)
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from app.config import settings
+from app.core.ollama_client import OllamaClient, ollama_requests_counter
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "OLLAMA_RETRY_BACKOFF_S", 0.001)
+    monkeypatch.setattr(settings, "OLLAMA_RETRY_MAX_BACKOFF_S", 0.001)
+
+
+def _client(handler) -> OllamaClient:
+    return OllamaClient("http://ollama.test", transport=httpx.MockTransport(handler))
+
+
+def test_transient_errors_are_retried(monkeypatch):
+    """Un 503 puis une erreur de connexion sont retentés jusqu'au succès"""
+    monkeypatch.setattr(settings, "OLLAMA_MAX_RETRIES", 2)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(503)
+        if len(calls) == 2:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"response": "ok"})
+
+    client = _client(handler)
+    try:
+        data = client.generate("retry-model", "prompt", options={"temperature": 0.1})
+    finally:
+        client.close()
+
+    assert data == {"response": "ok"}
+    assert len(calls) == 3
+    assert ollama_requests_counter.get(model="retry-model", outcome="retry") == 2
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    """Un 404 (modèle absent) échoue immédiatement"""
+    monkeypatch.setattr(settings, "OLLAMA_MAX_RETRIES", 3)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404, json={"error": "model not found"})
+
+    client = _client(handler)
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.chat("missing-model", [{"role": "user", "content": "hi"}])
+    finally:
+        client.close()
+
+    assert len(calls) == 1
+
+
+def test_concurrency_is_limited_per_model(monkeypatch):
+    """Au plus OLLAMA_NUM_PARALLEL appels simultanés vers un même modèle"""
+    monkeypatch.setattr(settings, "OLLAMA_NUM_PARALLEL", 2)
+    monkeypatch.setattr(settings, "OLLAMA_PARALLEL_OVERRIDES", "wide-model=5")
+    active = {"wide-model": 0, "narrow-model": 0}
+    peak = {"wide-model": 0, "narrow-model": 0}
+
+    async def handler(request):
+        model = json.loads(request.content)["model"]
+        active[model] += 1
+        peak[model] = max(peak[model], active[model])
+        await asyncio.sleep(0.02)
+        active[model] -= 1
+        return httpx.Response(200, json={"response": "ok"})
+
+    client = _client(handler)
+
+    async def run():
+        await asyncio.gather(*(
+            client.agenerate(model, "prompt")
+            for model in ["narrow-model"] * 6 + ["wide-model"] * 6
+        ))
+
+    try:
+        asyncio.run(run())
+    finally:
+        client.close()
+
+    assert peak["narrow-model"] == 2
+    assert peak["wide-model"] == 5
+
+
+def test_sync_and_async_calls_share_the_client():
+    """Les appels bloquants et async passent par la même boucle et le même pool"""
+    def handler(request):
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": [{"name": "qwen2.5:1.5b"}]})
+        return httpx.Response(200, json={"message": {"content": "{}"}})
+
+    client = _client(handler)
+    try:
+        assert client.list_models() == ["qwen2.5:1.5b"]
+        data = asyncio.run(client.achat("qwen2.5:1.5b", [{"role": "user", "content": "hi"}]))
+        http_client = client._client
+        client.chat("qwen2.5:1.5b", [{"role": "user", "content": "hi"}])
+        assert client._client is http_client
+    finally:
+        client.close()
+
+    assert data == {"message": {"content": "{}"}}
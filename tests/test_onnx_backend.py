@@ -0,0 +1,101 @@
+"""
+Tests pour le backend ONNX Runtime (wrapper de session et fallback PyTorch)
+"""
+import numpy as np
+import pytest
+import torch
+from app.config import settings
+from app.core import onnx_backend
+from app.core.onnx_backend import OnnxSessionModel, load_onnx_model, load_with_fallback, resolve_backend
+
+
+class TinyClassifier(torch.nn.Module):
+    """Classifieur minimal: embeddings moyennés sur le masque puis couche linéaire"""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.embeddings = torch.nn.Embedding(32, 8)
+        self.classifier = torch.nn.Linear(8, 2)
+
+    def forward(self, input_ids, attention_mask):
+        mask = attention_mask.unsqueeze(-1).to(torch.float32)
+        pooled = (self.embeddings(input_ids) * mask).sum(dim=1) / mask.sum(dim=1)
+        return self.classifier(pooled)
+
+
+class FakeSession:
+    """Session onnxruntime factice: logits = somme des ids par ligne"""
+
+    def __init__(self):
+        self.feeds = []
+
+    def get_inputs(self):
+        class Node:
+            def __init__(self, name):
+                self.name = name
+        return [Node("input_ids"), Node("attention_mask")]
+
+    def run(self, output_names, feed):
+        self.feeds.append(feed)
+        total = feed["input_ids"].sum(axis=1, keepdims=True).astype(np.float32)
+        return [np.concatenate([-total, total], axis=1)]
+
+
+def test_session_model_behaves_like_hf_model():
+    """Entrées torch -> numpy, entrées élaguées ignorées, logits en tenseur torch"""
+    session = FakeSession()
+    model = OnnxSessionModel(session, "fake.onnx")
+
+    outputs = model(
+        input_ids=torch.tensor([[1, 2], [3, 4]]),
+        attention_mask=torch.ones(2, 2, dtype=torch.long),
+        token_type_ids=torch.zeros(2, 2, dtype=torch.long)
+    )
+
+    assert set(session.feeds[0]) == {"input_ids", "attention_mask"}
+    assert torch.equal(outputs.logits.argmax(dim=-1), torch.tensor([1, 1]))
+    assert model.eval() is model
+
+
+def test_failed_export_falls_back_to_pytorch(monkeypatch):
+    """Un échec d'export ou d'import onnxruntime retourne None (fallback PyTorch)"""
+    def failing_load(*args, **kwargs):
+        raise RuntimeError("export impossible")
+
+    monkeypatch.setattr(onnx_backend, "load_onnx_model", failing_load)
+
+    assert load_with_fallback("m", "source", "1.0.0", lambda: None, lambda: {}) is None
+
+
+def test_onnx_backend_is_cpu_only():
+    assert resolve_backend("onnx", "cpu") == "onnx"
+    assert resolve_backend("ONNX", "cuda") == "pytorch"
+    assert resolve_backend("tensorrt", "cpu") == "pytorch"
+
+
+def test_exported_graph_matches_pytorch_logits(monkeypatch, tmp_path):
+    """Export réel puis inférence onnxruntime: mêmes logits que PyTorch, axes dynamiques"""
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    monkeypatch.setattr(settings, "ONNX_CACHE_DIR", str(tmp_path))
+    torch_model = TinyClassifier().eval()
+
+    def sample_inputs():
+        return {"input_ids": torch.tensor([[1, 2, 3, 0]]), "attention_mask": torch.tensor([[1, 1, 1, 0]])}
+
+    model = load_onnx_model("tiny-classifier", "1.0.0", lambda: torch_model, sample_inputs)
+
+    # Batch et longueur de séquence différents de l'exemple d'export
+    inputs = {
+        "input_ids": torch.tensor([[5, 6, 7, 8, 9, 0], [10, 11, 0, 0, 0, 0], [1, 2, 3, 4, 5, 6]]),
+        "attention_mask": torch.tensor([[1, 1, 1, 1, 1, 0], [1, 1, 0, 0, 0, 0], [1, 1, 1, 1, 1, 1]])
+    }
+    with torch.no_grad():
+        expected = torch_model(**inputs)
+
+    assert model.path.endswith("1.0.0.onnx")
+    assert torch.allclose(model(**inputs).logits, expected, atol=1e-5)
+    # Graphe en cache: rechargé sans ré-export
+    reloaded = load_onnx_model("tiny-classifier", "1.0.0", lambda: pytest.fail("ré-export"), sample_inputs)
+    assert torch.allclose(reloaded(**inputs).logits, expected, atol=1e-5)
@@ -0,0 +1,119 @@
+"""
+Tests pour le mode packé (plusieurs textes par prompt LLM)
+"""
+import json
+from app.config import settings
+from app.core.packing import format_numbered_texts, parse_packed_response, run_packed
+from app.services.qwen_depression.qwen_depression_model import QwenDepressionModel
+from app.services.yansnet_llm.llm_predictor import BaseLLMPredictor
+from app.services.yansnet_llm.yansnet_llm_model import YansnetLLMModel
+
+
+def test_numbered_texts_cannot_forge_items():
+    """Retours à la ligne et guillemets restent dans la chaîne JSON du texte"""
+    block = format_numbered_texts(['ligne 1\n[2] "faux"', "ok"])
+
+    assert block.splitlines() == ['[1] "ligne 1\\n[2] \\"faux\\""', '[2] "ok"']
+
+
+def test_parse_accepts_array_object_and_surrounding_text():
+    raw_array = '[{"id": 2, "prediction": "NORMAL"}, {"prediction": "x"}]'
+    raw_object = '```json\n{"results": [{"id": 1}, {"id": 1}, {"id": 9}, "bad"]}\n```'
+
+    assert set(parse_packed_response(raw_array, 2)) == {2}
+    assert parse_packed_response(raw_object, 3) == {1: {"id": 1}}
+
+
+def test_only_missing_or_malformed_items_are_retried():
+    """Élément absent + élément invalide => 2 appels unitaires, le reste vient du pack"""
+    texts = ["a", "b", "c", "d"]
+    packs, singles = [], []
+
+    def call_pack(pack):
+        packs.append(pack)
+        return json.dumps({"results": [
+            {"id": 1, "label": "A"},
+            {"id": 2, "label": None},  # invalide
+            {"id": 4, "label": "D"},  # id 3 manquant
+        ]})
+
+    def normalize(item):
+        return {"label": item["label"].lower()}
+
+    def call_single(text):
+        singles.append(text)
+        return {"label": text, "single": True}
+
+    results = run_packed(
+        texts, 10, call_pack, call_single, normalize,
+        on_error=lambda text, e: {"error": str(e)}
+    )
+
+    assert packs == [texts]
+    assert singles == ["b", "c"]
+    assert [r["label"] for r in results] == ["a", "b", "c", "d"]
+    assert [r.get("single", False) for r in results] == [False, True, True, False]
+
+
+def test_yansnet_batch_uses_packed_prompts(monkeypatch):
+    """LLM_PACK_SIZE=3 sur 7 textes => 3 appels LLM au lieu de 7"""
+    monkeypatch.setattr(settings, "LLM_PACK_SIZE", 3)
+    monkeypatch.setattr(settings, "ENABLE_PREDICTION_CACHE", False)
+    prompts = []
+
+    class FakePredictor(BaseLLMPredictor):
+        model = "fake-llm"
+
+        def _complete(self, system_prompt, user_prompt, max_tokens):
+            prompts.append(user_prompt)
+            count = user_prompt.count("\n[") + 1
+            results = [
+                {"id": i, "prediction": "DEPRESSION", "confidence": 1.4, "severity": "Critique", "reasoning": "r"}
+                for i in range(1, count + 1)
+            ]
+            return json.dumps({"results": results}), {"prompt_tokens": 10, "completion_tokens": 5}
+
+    model = YansnetLLMModel.__new__(YansnetLLMModel)
+    model.predictor = FakePredictor()
+    model._initialized = True
+
+    results = model.batch_predict([f"texte {i}" for i in range(7)])
+
+    assert len(prompts) == 3
+    assert len(results) == 7
+    assert results[0] == {"prediction": "DÉPRESSION", "confidence": 1.0, "severity": "Critique"}
+
+
+def test_qwen_packed_malformed_items_are_retried(monkeypatch):
+    """Éléments packés sans champ requis ou au libellé inconnu => retry unitaire"""
+    monkeypatch.setattr(settings, "LLM_PACK_SIZE", 4)
+    monkeypatch.setattr(settings, "ENABLE_PREDICTION_CACHE", False)
+    singles = []
+
+    class FakeClient:
+        def chat(self, model, messages, **kwargs):
+            results = [
+                {"id": 1, "prediction": "DEPRESSION", "confidence": 0.9, "severity": "Elevee"},
+                {"id": 2},
+                {"id": 3, "prediction": "??", "confidence": 0.8},
+                {"id": 4, "prediction": "NORMAL"},
+            ]
+            return {"message": {"content": json.dumps({"results": results})}}
+
+    def infer(text, include_reasoning):
+        singles.append(text)
+        return {"prediction": "NORMAL", "confidence": 0.7, "severity": "Aucune", "single": True}
+
+    model = QwenDepressionModel.__new__(QwenDepressionModel)
+    model._initialized = True
+    model._client = FakeClient()
+    model.ollama_model = "qwen-test"
+    model.timeout = 1.0
+    model.max_length = 1000
+    model._infer = infer
+
+    results = model.batch_predict(["a", "b", "c", "d"])
+
+    assert singles == ["b", "c", "d"]
+    assert results[0]["prediction"] == "DEPRESSION" and "single" not in results[0]
+    assert all(result.get("single") for result in results[1:])
@@ -0,0 +1,200 @@
+"""
+Tests pour le cache de prédictions texte
+"""
+import pytest
+from typing import Dict, Any, List
+from app.config import settings
+from app.core import prediction_cache
+from app.core.base_model import BaseMLModel
+from app.core.prediction_cache import (
+    MemoryLRUCache,
+    PredictionCache,
+    cached_predict,
+    cached_batch_predict,
+    make_cache_key
+)
+
+
+class CachedModel(BaseMLModel):
+    """Modèle factice qui compte les textes réellement calculés"""
+
+    def __init__(self):
+        self.computed: List[str] = []
+
+    @property
+    def model_name(self) -> str:
+        return "cached-model"
+
+    @property
+    def model_version(self) -> str:
+        return "1.0.0-test"
+
+    @property
+    def author(self) -> str:
+        return "Test Suite"
+
+    @cached_predict
+    def predict(self, text: str, include_reasoning: bool = True, **kwargs) -> Dict[str, Any]:
+        self.computed.append(text)
+        if text == "boom":
+            return {"prediction": "ERREUR", "confidence": 0.0, "severity": "Aucune"}
+        return {
+            "prediction": text.upper(),
+            "confidence": 1.0,
+            "severity": "Aucune",
+            "reasoning": "ok" if include_reasoning else None
+        }
+
+    @cached_batch_predict
+    def batch_predict(self, texts: List[str], include_reasoning: bool = False, **kwargs) -> List[Dict[str, Any]]:
+        return [self.predict(text, include_reasoning=include_reasoning) for text in texts]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_PREDICTION_CACHE", True)
+    monkeypatch.setattr(settings, "PREDICTION_CACHE_DISABLED_MODELS", "")
+    monkeypatch.setattr(settings, "PREDICTION_CACHE_SHARED_BACKEND", "none")
+    fresh = PredictionCache()
+    monkeypatch.setattr(prediction_cache, "_cache", fresh)
+    return fresh
+
+
+def test_repeated_predict_is_served_from_cache(cache):
+    """Même texte (à la normalisation près) => un seul calcul"""
+    model = CachedModel()
+
+    first = model.predict("bonjour  le monde")
+    first["processing_time"] = 123  # Les routes modifient le résultat
+    second = model.predict(" bonjour le monde ")
+
+    assert model.computed == ["bonjour  le monde"]
+    assert "processing_time" not in second
+    assert second["prediction"] == "BONJOUR  LE MONDE"
+    assert second["cached"] is True and "cached" not in first
+
+
+def test_options_are_part_of_the_key(cache):
+    """include_reasoning différent => entrées différentes; défaut == explicite"""
+    model = CachedModel()
+
+    model.predict("texte")
+    model.predict("texte", include_reasoning=True)
+    model.predict("texte", include_reasoning=False)
+
+    assert model.computed == ["texte", "texte"]
+
+
+def test_batch_only_computes_missing_texts_in_order(cache):
+    """Le batch ne calcule que les textes absents et garde l'ordre"""
+    model = CachedModel()
+    model.batch_predict(["a", "b"])
+    model.computed.clear()
+
+    results = model.batch_predict(["c", "a", "d", "b"])
+
+    assert model.computed == ["c", "d"]
+    assert [r["prediction"] for r in results] == ["C", "A", "D", "B"]
+    assert cache.get_stats()["models"]["cached-model"]["hits"] == 2
+
+
+def test_hit_reports_lookup_latency(cache):
+    """Un hit ne renvoie pas la latence du calcul d'origine"""
+    model = CachedModel()
+    key = make_cache_key(model.model_name, model.model_version, "lent", {"include_reasoning": True})
+    cache.set(key, {"prediction": "LENT", "confidence": 1.0, "processing_time": 2500.0})
+
+    single = model.predict("lent")
+    batch = model.batch_predict(["lent"], include_reasoning=True)
+
+    assert model.computed == []
+    assert single["cached"] is True and single["processing_time"] < 2500.0
+    assert batch[0]["cached"] is True and batch[0]["processing_time"] < 2500.0
+
+
+def test_llm_backend_is_part_of_the_version(monkeypatch):
+    """Changer de modèle Ollama ou de provider LLM change la clé de cache"""
+    from app.services.qwen_depression.qwen_depression_model import QwenDepressionModel
+    from app.services.yansnet_llm.yansnet_llm_model import YansnetLLMModel
+
+    qwen = QwenDepressionModel.__new__(QwenDepressionModel)
+    qwen.ollama_model = "qwen2.5:1.5b"
+    llm = YansnetLLMModel.__new__(YansnetLLMModel)
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "gpt")
+    versions = {qwen.model_version, llm.model_version}
+
+    qwen.ollama_model = "qwen2.5:7b"
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "claude")
+
+    assert qwen.model_version == "1.0.0+qwen2.5:7b"
+    assert {qwen.model_version, llm.model_version}.isdisjoint(versions)
+
+
+def test_health_check_bypasses_cache(cache):
+    """Chaque health check appelle réellement le modèle"""
+    from app.services.yansnet_llm.yansnet_llm_model import YansnetLLMModel
+
+    class CountingPredictor:
+        calls = 0
+
+        def predict(self, text):
+            self.calls += 1
+            return {"prediction": "NORMAL", "confidence": 0.9, "severity": "Aucune"}
+
+    model = YansnetLLMModel.__new__(YansnetLLMModel)
+    model.predictor = CountingPredictor()
+    model._initialized = True
+
+    model.health_check()
+    second = model.health_check()
+    model.predict("test", include_reasoning=False)  # Rien n'a été mis en cache par les sondes
+
+    assert second["status"] == "healthy"
+    assert model.predictor.calls == 3
+
+
+def test_errors_are_not_cached(cache):
+    """Un résultat ERREUR est recalculé à chaque appel"""
+    model = CachedModel()
+
+    model.predict("boom")
+    model.predict("boom")
+
+    assert model.computed == ["boom", "boom"]
+
+
+def test_disabled_model_bypasses_cache(cache, monkeypatch):
+    """Un modèle listé dans PREDICTION_CACHE_DISABLED_MODELS n'est pas mis en cache"""
+    monkeypatch.setattr(settings, "PREDICTION_CACHE_DISABLED_MODELS", "other,cached-model")
+    model = CachedModel()
+
+    model.predict("x")
+    model.predict("x")
+
+    assert model.computed == ["x", "x"]
+
+
+def test_sqlite_shared_tier(cache, monkeypatch, tmp_path):
+    """Une entrée écrite par un process est relue depuis le niveau partagé"""
+    monkeypatch.setattr(settings, "PREDICTION_CACHE_SHARED_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "PREDICTION_CACHE_SQLITE_PATH", str(tmp_path / "cache.sqlite3"))
+    writer, reader = PredictionCache(), PredictionCache()
+    key = make_cache_key("m", "1", "texte", {})
+
+    writer.set(key, {"prediction": "NORMAL", "confidence": 0.9})
+
+    assert reader.get("m", key) == {"prediction": "NORMAL", "confidence": 0.9}
+
+
+def test_memory_lru_is_bounded_in_bytes():
+    """Le niveau mémoire évince les entrées les plus anciennes au-delà de max_bytes"""
+    lru = MemoryLRUCache(max_bytes=20, ttl_s=60)
+
+    lru.set("a", "x" * 10)
+    lru.set("b", "y" * 10)
+    lru.get("a")
+    lru.set("c", "z" * 10)
+
+    assert lru.get("b") is None
+    assert lru.get("a") is not None
+    assert lru.stats()["bytes"] <= 20
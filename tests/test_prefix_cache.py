@@ -0,0 +1,94 @@
+"""
+Tests pour la réutilisation du préfixe de prompt Ollama (chat, keep_alive, prefill)
+"""
+import asyncio
+import json
+import httpx
+import pytest
+from app.config import settings
+from app.core.ollama_client import OllamaClient, ollama_prefill_histogram
+from app.services.qwen_depression.qwen_depression_model import QwenDepressionModel
+from scripts.benchmark_prefix_cache import OllamaStandIn
+
+ANSWER = '{"prediction": "DEPRESSION", "confidence": 0.9, "severity": "Critique", "reasoning": "r"}'
+
+
+@pytest.fixture
+def requests_seen():
+    return []
+
+
+@pytest.fixture
+def qwen(requests_seen, monkeypatch):
+    """Qwen branché sur un Ollama factice qui enregistre les requêtes"""
+    monkeypatch.setattr(settings, "ENABLE_PREDICTION_CACHE", False)
+    monkeypatch.setattr(settings, "OLLAMA_KEEP_ALIVE", "45m")
+
+    def handler(request):
+        requests_seen.append((request.url.path, json.loads(request.content)))
+        return httpx.Response(200, json={
+            "message": {"role": "assistant", "content": ANSWER},
+            "prompt_eval_count": 12,
+            "prompt_eval_duration": 30_000_000,
+            "eval_count": 20
+        })
+
+    model = QwenDepressionModel.__new__(QwenDepressionModel)
+    model._client = OllamaClient("http://ollama.test", transport=httpx.MockTransport(handler))
+    model.ollama_model = "qwen-prefix-test"
+    model.max_length = settings.QWEN_MAX_LENGTH
+    model.timeout = 5.0
+    model._initialized = True
+    yield model
+    model._client.close()
+
+
+def test_system_prefix_is_stable_and_model_kept_resident(qwen, requests_seen):
+    """Même message système à chaque appel, seul le message utilisateur change"""
+    qwen.predict("Je me sens vide")
+    asyncio.run(qwen.apredict("Belle journée"))
+
+    assert [path for path, _ in requests_seen] == ["/api/chat", "/api/chat"]
+    (_, first), (_, second) = requests_seen
+    assert first["keep_alive"] == second["keep_alive"] == "45m"
+    assert first["messages"][0] == second["messages"][0]
+    assert first["messages"][0]["role"] == "system"
+    assert "Je me sens vide" in first["messages"][1]["content"]
+    assert "Je me sens vide" not in first["messages"][0]["content"]
+
+
+def test_chat_response_is_parsed_and_prefill_recorded(qwen):
+    before = sum(v["count"] for v in ollama_prefill_histogram.snapshot()["values"])
+
+    result = qwen.predict("Je me sens vide", include_reasoning=False)
+
+    assert result["prediction"] == "DEPRESSION"
+    assert result["severity"] == "Critique"
+    assert "reasoning" not in result
+    assert sum(v["count"] for v in ollama_prefill_histogram.snapshot()["values"]) == before + 1
+
+
+def test_packed_prompt_uses_stable_system_message(qwen, requests_seen):
+    qwen._generate_packed(["a", "b"])
+    qwen._generate_packed(["c"])
+
+    (_, first), (_, second) = requests_seen
+    assert first["messages"][0] == second["messages"][0]
+    assert first["format"] == QwenDepressionModel.PACKED_SCHEMA
+    assert '[2] "b"' in first["messages"][1]["content"]
+
+
+def test_stand_in_reuses_common_prefix():
+    """Le substitut Ollama du benchmark ne réévalue que la partie qui change"""
+    stand_in = OllamaStandIn(num_parallel=1, prefill_ms=1.0, load_ms=0.0, time_scale=0.0)
+    client = OllamaClient("http://ollama.stand-in", transport=httpx.MockTransport(stand_in.handle))
+    model = QwenDepressionModel.__new__(QwenDepressionModel)
+    model.max_length = settings.QWEN_MAX_LENGTH
+
+    try:
+        first = client.chat("m", model._build_messages("Premier texte"))
+        second = client.chat("m", model._build_messages("Deuxième texte"))
+    finally:
+        client.close()
+
+    assert second["prompt_eval_count"] < first["prompt_eval_count"] / 3
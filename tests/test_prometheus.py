@@ -0,0 +1,126 @@
+"""
+Tests pour l'exposition Prometheus des métriques runtime
+"""
+import asyncio
+import json
+import os
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.core.inference_executor import inference_calls_counter, run_inference
+from app.core.metrics import prometheus
+from app.core.metrics.prometheus import PrometheusMiddleware, merge_snapshots, render_prometheus
+from app.core.metrics.runtime_metrics import RuntimeMetricsRegistry
+from app.routes import metrics_api
+
+
+def test_render_text_exposition():
+    registry = RuntimeMetricsRegistry()
+    registry.counter("jobs", "Travaux").inc(2, model='qwen "1.5b"')
+    registry.histogram("job_seconds", "Durée", buckets=(0.1, 1.0)).observe(0.5, model="qwen")
+
+    text = render_prometheus(merge_snapshots([(1, True, registry.snapshot())]))
+
+    assert "# TYPE etsia_jobs_total counter" in text
+    assert 'etsia_jobs_total{model="qwen \\"1.5b\\""} 2.0' in text
+    assert 'etsia_job_seconds_bucket{model="qwen",le="0.1"} 0' in text
+    assert 'etsia_job_seconds_bucket{model="qwen",le="1.0"} 1' in text
+    assert 'etsia_job_seconds_bucket{model="qwen",le="+Inf"} 1' in text
+    assert 'etsia_job_seconds_count{model="qwen"} 1' in text
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    app.add_middleware(PrometheusMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    client = TestClient(app)
+    counter = prometheus.http_requests_counter
+    before = counter.get(method="GET", endpoint="/items/{item_id}", status="200")
+    missing = counter.get(method="GET", endpoint="unmatched", status="404")
+
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/nowhere")
+
+    assert counter.get(method="GET", endpoint="/items/{item_id}", status="200") == before + 2
+    assert counter.get(method="GET", endpoint="unmatched", status="404") == missing + 1
+    assert prometheus.http_in_progress_gauge.get(method="GET") == 0
+
+
+def test_endpoint_serves_without_database(monkeypatch):
+    class BrokenDatabase:
+        async def fetch(self, *args):
+            raise ConnectionError("PostgreSQL hors service")
+
+        fetchval = fetchrow = fetch
+
+    monkeypatch.setattr("app.core.metrics.metrics_service.db", BrokenDatabase())
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", "")
+    app = FastAPI()
+    app.include_router(metrics_api.router)
+
+    response = TestClient(app).get("/api/v1/metrics/prometheus")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE etsia_model_prediction_latency_seconds histogram" in response.text
+
+
+def test_multiprocess_merges_worker_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    dead_pid = 2 ** 22 + 12345  # Au-delà de pid_max par défaut: worker arrêté
+
+    def worker(pid, requests, depth, error_rate):
+        registry = RuntimeMetricsRegistry()
+        registry.counter("worker_requests").inc(requests)
+        registry.gauge("queue_depth").set(depth)
+        registry.gauge("error_pct", multiprocess_mode="max").set(error_rate)
+        (tmp_path / f"metrics_{pid}.json").write_text(json.dumps({"pid": pid, "metrics": registry.snapshot()}))
+
+    worker(os.getppid(), requests=3, depth=4, error_rate=12.0)
+    worker(dead_pid, requests=5, depth=100, error_rate=50.0)
+
+    merged = prometheus.collect()
+
+    assert merged["worker_requests"]["series"][()] == 8  # Compteurs des workers arrêtés conservés
+    assert merged["queue_depth"]["series"][()] == 4  # Jauges des workers arrêtés ignorées
+    assert merged["error_pct"]["series"][()] == 12.0
+    assert (tmp_path / f"metrics_{os.getpid()}.json").exists()  # État de ce worker publié
+
+
+def test_new_server_run_clears_previous_snapshots(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    stale = tmp_path / f"metrics_{os.getpid()}.json"  # PID réutilisé après redémarrage
+    stale.write_text(json.dumps({"pid": os.getpid(), "metrics": {}}))
+    (tmp_path / "server_run").write_text("1:42")  # Lancement précédent
+
+    prometheus.reset_multiprocess_dir()
+    assert not stale.exists()
+
+    # Autre worker du même lancement: les snapshots publiés sont conservés
+    prometheus.write_worker_snapshot()
+    prometheus.reset_multiprocess_dir()
+    assert stale.exists()
+
+
+def test_run_inference_counts_outcomes():
+    class Model:
+        model_name = "prometheus-test"
+
+        def predict(self, text):
+            if text == "boom":
+                raise RuntimeError("échec")
+            return {"prediction": "NORMAL"}
+
+    asyncio.run(run_inference(Model(), "predict", text="ok"))
+    try:
+        asyncio.run(run_inference(Model(), "predict", text="boom"))
+    except RuntimeError:
+        pass
+
+    assert inference_calls_counter.get(model="prometheus-test", method="predict", outcome="ok") == 1
+    assert inference_calls_counter.get(model="prometheus-test", method="predict", outcome="error") == 1
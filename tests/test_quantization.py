@@ -0,0 +1,51 @@
+"""
+Tests pour la quantification int8 et son cache disque
+"""
+import torch
+import torch.nn as nn
+from app.config import settings
+from app.core.quantization import load_quantized_model, quantize_dynamic_int8, resolve_inference_mode
+
+
+def _tiny_classifier() -> nn.Module:
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Linear(16, 32), nn.ReLU(), nn.Linear(32, 2)).eval()
+
+
+def test_int8_model_matches_fp32_predictions():
+    """Les couches Linear sont quantifiées et les classes prédites restent les mêmes"""
+    fp32 = _tiny_classifier()
+    int8 = quantize_dynamic_int8(_tiny_classifier())
+    inputs = torch.randn(64, 16)
+
+    with torch.no_grad():
+        expected = fp32(inputs).argmax(dim=-1)
+        actual = int8(inputs).argmax(dim=-1)
+
+    assert isinstance(int8[0], torch.ao.nn.quantized.dynamic.Linear)
+    assert (expected == actual).float().mean() >= 0.95
+
+
+def test_quantized_model_is_reused_from_disk(monkeypatch, tmp_path):
+    """Le second chargement relit le cache sans reconstruire le modèle fp32"""
+    monkeypatch.setattr(settings, "QUANTIZED_MODEL_CACHE_DIR", str(tmp_path))
+    builds = []
+
+    def build():
+        builds.append(1)
+        return _tiny_classifier()
+
+    first = load_quantized_model("tiny-classifier", build)
+    second = load_quantized_model("tiny-classifier", build)
+    inputs = torch.randn(4, 16)
+
+    assert len(builds) == 1
+    assert len(list(tmp_path.glob("*.pt"))) == 1
+    assert torch.equal(first(inputs), second(inputs))
+
+
+def test_int8_falls_back_to_fp32_off_cpu():
+    """La quantification dynamique n'est proposée que sur CPU"""
+    assert resolve_inference_mode("int8", "cpu") == "int8"
+    assert resolve_inference_mode("INT8", "cuda") == "fp32"
+    assert resolve_inference_mode("fp16", "cpu") == "fp32"
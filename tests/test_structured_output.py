@@ -0,0 +1,109 @@
+"""
+Tests pour les sorties JSON structurées des LLM de détection
+"""
+import contextlib
+import types
+import pytest
+from app.core.structured_output import JsonObjectScanner, parse_json_object, structured_output_counter
+from app.services.yansnet_llm.llm_predictor import (
+    ClaudePredictor,
+    DETECTION_SCHEMA,
+    GPTPredictor,
+    PACKED_SYSTEM_PROMPT,
+    SYSTEM_PROMPT
+)
+
+REPLY = '{"prediction": "DÉPRESSION", "confidence": 0.8, "reasoning": "dit {rien} \\"ok\\"", "severity": "Élevée"}'
+
+
+def test_scanner_stops_when_object_closes():
+    """Accolades et guillemets échappés dans les chaînes ne comptent pas"""
+    scanner = JsonObjectScanner(prefix="{")
+    chunks = [REPLY[1:30], REPLY[30:70], REPLY[70:] + "\n\nJ'espère que cela aide", " !"]
+
+    consumed = 0
+    for chunk in chunks:
+        consumed += 1
+        if scanner.feed(chunk):
+            break
+
+    assert consumed == 3
+    assert scanner.text == REPLY
+
+
+def test_parse_fast_path_recovery_and_failures():
+    def count(outcome):
+        return structured_output_counter.get(provider="test-provider", outcome=outcome)
+
+    before = {outcome: count(outcome) for outcome in ("ok", "recovered", "failed")}
+
+    assert parse_json_object(REPLY, "test-provider")["confidence"] == 0.8
+    recovered = parse_json_object('Voici mon analyse:\n```json\n{"a": {"b": 1}}\n```', "test-provider")
+    assert recovered == {"a": {"b": 1}}
+    with pytest.raises(ValueError):
+        parse_json_object("Je ne peux pas répondre.", "test-provider")
+    with pytest.raises(ValueError):
+        parse_json_object('{"a": 1}', "test-provider", validate=lambda item: item["prediction"])
+
+    assert count("ok") == before["ok"] + 1
+    assert count("recovered") == before["recovered"] + 1
+    assert count("failed") == before["failed"] + 2
+
+
+def test_gpt_sends_the_prompt_schema():
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        message = types.SimpleNamespace(content=REPLY)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=message)],
+            usage=types.SimpleNamespace(prompt_tokens=10, completion_tokens=20)
+        )
+
+    predictor = GPTPredictor.__new__(GPTPredictor)
+    predictor.model = "gpt-test"
+    predictor.client = types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+    )
+
+    result = predictor.predict("Je me sens vide")
+    predictor.complete(PACKED_SYSTEM_PROMPT, "[1] \"a\"")
+
+    assert result["prediction"] == "DÉPRESSION"
+    assert calls[0]["response_format"]["json_schema"]["schema"] == DETECTION_SCHEMA
+    assert calls[0]["response_format"]["json_schema"]["strict"] is True
+    assert calls[0]["max_tokens"] == predictor.max_tokens
+    assert calls[1]["response_format"]["json_schema"]["name"] == "depression_detection_batch"
+
+
+def test_claude_prefills_and_stops_at_closing_brace():
+    """Réponse préremplie par "{", flux abandonné dès la fermeture de l'objet"""
+    pulled = []
+
+    class FakeStream:
+        current_message_snapshot = types.SimpleNamespace(usage=types.SimpleNamespace(input_tokens=50, output_tokens=30))
+
+        @property
+        def text_stream(self):
+            for chunk in (REPLY[1:40], REPLY[40:], " Bonne journée", " à vous"):
+                pulled.append(chunk)
+                yield chunk
+
+    calls = []
+
+    @contextlib.contextmanager
+    def stream(**kwargs):
+        calls.append(kwargs)
+        yield FakeStream()
+
+    predictor = ClaudePredictor.__new__(ClaudePredictor)
+    predictor.model = "claude-test"
+    predictor.client = types.SimpleNamespace(messages=types.SimpleNamespace(stream=stream))
+
+    result = predictor.predict("Je me sens vide")
+
+    assert result["severity"] == "Élevée"
+    assert calls[0]["system"] == SYSTEM_PROMPT
+    assert calls[0]["messages"][-1] == {"role": "assistant", "content": "{"}
+    assert len(pulled) == 2